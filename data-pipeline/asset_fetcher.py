@@ -0,0 +1,448 @@
+"""
+轻量资产并发下载器（启动同步步骤 2：metadata.json / 预览音频 / RPP）
+
+- 有界线程池 + 每个主机的并发上限，避免把 Storage 打满
+- 预览音频有 6 种可能的存储路径：先用一次 list 请求确定实际存在的文件，
+  解析结果按 (owner, 胶囊文件夹, 文件类型) 记在 storage_path_cache 表中，
+  下次直接命中，不再逐个路径试探；确认不存在的文件在 TTL 内不再重试
+- 文件先写临时文件再原子替换，中断不会留下半截文件
+- 进度按总字节数 / 耗时输出聚合速率
+- 下载经过全局带宽限制（http_pool），默认普通优先级；只有用户正在等待的下载
+  （试听 / 点击下载）才由调用方传入交互优先级，启动同步和预取使用批量优先级
+- 提供 sign_urls_fn 时用签名 URL 经共享连接池流式下载，每块按优先级申请带宽，
+  限速真实生效；签名失败时回退到 bucket.download，整块返回后才计入带宽，
+  这种情况下单个文件不受限速，只会推迟后续请求
+
+bucket 只需要提供 list(folder) 和 download(path) 两个方法
+（supabase-py 的 storage.from_(bucket) 对象，或测试用的本地 HTTP 替身）。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from http_pool import get_bandwidth_limiter, get_http_session, PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> asset_fetch 覆盖）
+DEFAULT_FETCH_CONFIG = {
+    'max_workers': 8,            # 线程池大小
+    'per_host_limit': 4,         # 单个主机的最大并发请求数
+    'negative_ttl_hours': 24,    # 确认不存在的文件在多久内不再重试
+    'progress_interval': 2.0,    # 进度日志间隔（秒）
+    'signed_url_ttl': 600,       # 签名 URL 有效期（秒）
+    'chunk_size_kb': 64,         # 流式下载的分块大小（每块申请一次带宽）
+    'timeout': 30,               # 单个请求超时（秒）
+}
+
+
+def get_fetch_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取下载器参数：默认值 < config.json 的 asset_fetch 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_FETCH_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('asset_fetch') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_FETCH_CONFIG and value is not None:
+                config[key] = type(DEFAULT_FETCH_CONFIG[key])(value)
+
+    return config
+
+
+class HostLimiter:
+    """按主机限制并发请求数"""
+
+    def __init__(self, per_host_limit: int):
+        self.per_host_limit = max(1, per_host_limit)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    @contextmanager
+    def slot(self, host: str):
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[host] = semaphore
+        with semaphore:
+            yield
+
+
+class StoragePathCache:
+    """
+    已解析的存储路径缓存（storage_path_cache 表）
+
+    storage_path 为 NULL 表示已确认云端不存在该文件。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_table()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self):
+        """创建缓存表（如果不存在）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage_path_cache (
+                    owner_id TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    storage_path TEXT,
+                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (owner_id, folder, file_type)
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def load(self, negative_ttl_hours: int) -> Dict[Tuple[str, str, str], Optional[str]]:
+        """
+        一次载入全部有效缓存
+
+        Returns:
+            {(owner_id, folder, file_type): storage_path 或 None（确认不存在）}
+        """
+        conn = self._get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT owner_id, folder, file_type, storage_path
+                FROM storage_path_cache
+                WHERE storage_path IS NOT NULL
+                   OR checked_at > datetime('now', ?)
+            """, (f"-{int(negative_ttl_hours)} hours",)).fetchall()
+            return {(r['owner_id'], r['folder'], r['file_type']): r['storage_path'] for r in rows}
+        finally:
+            conn.close()
+
+    def save(self, entries: Dict[Tuple[str, str, str], Optional[str]]):
+        """批量写入解析结果（单事务）"""
+        if not entries:
+            return
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO storage_path_cache (owner_id, folder, file_type, storage_path, checked_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(owner_id, folder, file_type) DO UPDATE SET
+                    storage_path = excluded.storage_path,
+                    checked_at = excluded.checked_at
+            """, [(owner, folder, file_type, path) for (owner, folder, file_type), path in entries.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _default_path_variants(owner_id: str, folder: str, file_type: str) -> List[str]:
+    from supabase_client import SupabaseClient
+    return SupabaseClient.storage_path_variants(owner_id, folder, file_type)
+
+
+class LightweightAssetFetcher:
+    """
+    并发下载胶囊的轻量资产
+
+    任务格式：
+        {
+            'capsule_id': int,
+            'owner_id': str,          # 云端文件夹所属用户
+            'folder': str,            # 云端胶囊文件夹名
+            'local_dir': Path,        # 本地胶囊目录
+            'files': [(file_type, local_filename), ...],
+            'priority': int,          # 可选，带宽优先级（默认 PRIORITY_NORMAL）
+        }
+    """
+
+    def __init__(self, bucket, db_path: str, host: str = 'storage',
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 path_variants_fn: Optional[Callable[[str, str, str], List[str]]] = None,
+                 sign_urls_fn: Optional[Callable[[List[str], int], Dict[str, str]]] = None):
+        """
+        Args:
+            bucket: 提供 list(folder) / download(path) 的存储对象
+            db_path: 数据库路径（存放 storage_path_cache）
+            host: 存储主机名（用于并发限制）
+            config_overrides: 覆盖 DEFAULT_FETCH_CONFIG
+            path_variants_fn: (owner_id, folder, file_type) -> 候选存储路径列表
+            sign_urls_fn: (存储路径列表, 有效期) -> {存储路径: 签名 URL}（可选，用于流式限速下载）
+        """
+        self.bucket = bucket
+        self.sign_urls_fn = sign_urls_fn
+        self.host = host
+        self.config = get_fetch_config(config_overrides)
+        self.path_cache = StoragePathCache(db_path)
+        self.limiter = HostLimiter(self.config['per_host_limit'])
+        self._path_variants = path_variants_fn or _default_path_variants
+
+        self._stats_lock = threading.Lock()
+        self._bytes = 0
+        self._requests = 0
+
+    def _count(self, requests: int = 0, nbytes: int = 0):
+        with self._stats_lock:
+            self._requests += requests
+            self._bytes += nbytes
+
+    def _list_folder(self, folder: str) -> Optional[set]:
+        """列出云端文件夹（一次请求），失败返回 None"""
+        try:
+            with self.limiter.slot(self.host):
+                self._count(requests=1)
+                entries = self.bucket.list(folder)
+            return {entry.get('name') for entry in entries or [] if entry.get('name')}
+        except Exception as e:
+            logger.debug(f"列出 {folder} 失败: {e}")
+            return None
+
+    def _sign(self, storage_paths: List[str]) -> Dict[str, str]:
+        """批量生成签名 URL（一次请求），不可用时返回空字典"""
+        if not self.sign_urls_fn or not storage_paths:
+            return {}
+        try:
+            with self.limiter.slot(self.host):
+                self._count(requests=1)
+                return self.sign_urls_fn(storage_paths, self.config['signed_url_ttl']) or {}
+        except Exception as e:
+            logger.debug(f"生成签名 URL 失败，回退到直接下载: {e}")
+            return {}
+
+    def _download(self, storage_path: str, local_path: Path, priority: int = PRIORITY_NORMAL,
+                  signed_url: Optional[str] = None) -> int:
+        """
+        下载单个对象并原子写入本地，返回字节数
+
+        有签名 URL 时流式读取，每块申请带宽（限速生效）；否则用 bucket.download 整块下载，
+        存储 SDK 读完整个响应体后才返回，只能事后计入带宽（推迟后续请求，不限制本次下载）
+        """
+        bandwidth = get_bandwidth_limiter()
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = local_path.with_name(local_path.name + '.part')
+
+        with self.limiter.slot(self.host), bandwidth.transfer(priority):
+            self._count(requests=1)
+            if signed_url:
+                nbytes = 0
+                chunk_size = self.config['chunk_size_kb'] * 1024
+                try:
+                    with get_http_session().get(signed_url, stream=True,
+                                                timeout=self.config['timeout']) as response:
+                        response.raise_for_status()
+                        with open(tmp_path, 'wb') as f:
+                            for chunk in bandwidth.iter_content(response, chunk_size, priority):
+                                f.write(chunk)
+                                nbytes += len(chunk)
+                except Exception:
+                    tmp_path.unlink(missing_ok=True)
+                    raise
+            else:
+                data = self.bucket.download(storage_path)
+                bandwidth.acquire(len(data), priority)
+                nbytes = len(data)
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+
+        os.replace(tmp_path, local_path)
+        self._count(nbytes=nbytes)
+        return nbytes
+
+    def _resolve(self, job: Dict[str, Any], cached: Dict[Tuple[str, str, str], Optional[str]],
+                 resolved: Dict[Tuple[str, str, str], Optional[str]], force_list: bool = False):
+        """为任务中未命中缓存的文件类型解析存储路径（整个文件夹只 list 一次）"""
+        owner_id, folder = job['owner_id'], job['folder']
+        pending = [ft for ft, _ in job['files']
+                   if force_list or (owner_id, folder, ft) not in cached]
+        if not pending:
+            return
+
+        names = self._list_folder(f"{owner_id}/{folder}")
+        for file_type in pending:
+            variants = self._path_variants(owner_id, folder, file_type)
+            if names is None:
+                # list 不可用：按优先级保留全部候选，下载时逐个尝试
+                resolved[(owner_id, folder, file_type)] = variants
+                continue
+            match = next((p for p in variants if p.rsplit('/', 1)[-1] in names), None)
+            resolved[(owner_id, folder, file_type)] = match
+
+    def _fetch_job(self, job: Dict[str, Any],
+                   cached: Dict[Tuple[str, str, str], Optional[str]]) -> Dict[str, Any]:
+        """下载一个胶囊的全部缺失文件"""
+        owner_id, folder = job['owner_id'], job['folder']
+        resolved: Dict[Tuple[str, str, str], Any] = {}
+        outcome = {'capsule_id': job['capsule_id'], 'downloaded': [], 'missing': [],
+                   'errors': [], 'cache_updates': {}}
+
+        self._resolve(job, cached, resolved)
+        priority = job.get('priority')
+        if priority is None:
+            priority = PRIORITY_NORMAL
+
+        # 一次请求为本任务的全部候选路径签名
+        candidates_by_type = {}
+        for file_type, _ in job['files']:
+            candidates = resolved.get((owner_id, folder, file_type), cached.get((owner_id, folder, file_type)))
+            candidates_by_type[file_type] = [candidates] if isinstance(candidates, str) else candidates
+        signed = self._sign([p for c in candidates_by_type.values() if c for p in c])
+
+        for file_type, filename in job['files']:
+            key = (owner_id, folder, file_type)
+            candidates = candidates_by_type[file_type]
+            if not candidates:
+                outcome['missing'].append(file_type)
+                if key in resolved:
+                    # 只记录新确认的不存在，已缓存的条目保持原检查时间以便 TTL 到期后重试
+                    outcome['cache_updates'][key] = None
+                continue
+
+            local_path = Path(job['local_dir']) / filename
+            for attempt, storage_path in enumerate(candidates):
+                try:
+                    self._download(storage_path, local_path, priority, signed.get(storage_path))
+                    outcome['downloaded'].append(file_type)
+                    outcome['cache_updates'][key] = storage_path
+                    break
+                except Exception as e:
+                    last_error = e
+            else:
+                if key in cached and key not in resolved:
+                    # 缓存的路径失效（文件被重新上传为其他格式），重新解析一次
+                    self._resolve(job, {}, resolved, force_list=True)
+                    retry = resolved.get(key)
+                    if isinstance(retry, str):
+                        try:
+                            self._download(retry, local_path, priority, self._sign([retry]).get(retry))
+                            outcome['downloaded'].append(file_type)
+                            outcome['cache_updates'][key] = retry
+                            continue
+                        except Exception as e:
+                            last_error = e
+                outcome['errors'].append(f"{folder}/{filename}: {last_error}")
+
+        return outcome
+
+    def fetch_all(self, jobs: List[Dict[str, Any]],
+                  progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        并发执行全部下载任务
+
+        Args:
+            jobs: 任务列表（见类文档）
+            progress_callback: 进度回调，参数为当前统计
+
+        Returns:
+            {
+                'downloaded': {capsule_id: [file_type, ...]},
+                'files_downloaded': int,
+                'files_missing': int,
+                'bytes': int,
+                'requests': int,
+                'bytes_per_sec': float,
+                'duration_seconds': float,
+                'errors': [str]
+            }
+        """
+        result = {'downloaded': {}, 'files_downloaded': 0, 'files_missing': 0,
+                  'bytes': 0, 'requests': 0, 'bytes_per_sec': 0.0,
+                  'duration_seconds': 0.0, 'errors': []}
+        if not jobs:
+            return result
+
+        cached = self.path_cache.load(self.config['negative_ttl_hours'])
+        cache_updates: Dict[Tuple[str, str, str], Optional[str]] = {}
+
+        started = time.perf_counter()
+        last_report = started
+        done = 0
+
+        def snapshot() -> Dict[str, Any]:
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            with self._stats_lock:
+                return {'done': done, 'total': len(jobs), 'bytes': self._bytes,
+                        'requests': self._requests, 'bytes_per_sec': self._bytes / elapsed,
+                        'elapsed': elapsed}
+
+        with ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
+            futures = [executor.submit(self._fetch_job, job, cached) for job in jobs]
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    result['errors'].append(str(e))
+                    continue
+
+                if outcome['downloaded']:
+                    result['downloaded'][outcome['capsule_id']] = outcome['downloaded']
+                result['files_downloaded'] += len(outcome['downloaded'])
+                result['files_missing'] += len(outcome['missing'])
+                result['errors'].extend(outcome['errors'])
+                cache_updates.update(outcome['cache_updates'])
+
+                now = time.perf_counter()
+                if now - last_report >= self.config['progress_interval'] or done == len(jobs):
+                    last_report = now
+                    stats = snapshot()
+                    logger.info(f"   📦 [{done}/{len(jobs)}] {stats['bytes'] / 1048576:.1f} MB, "
+                                f"{stats['bytes_per_sec'] / 1048576:.2f} MB/s, {stats['requests']} 次请求")
+                    if progress_callback:
+                        progress_callback(stats)
+
+        try:
+            self.path_cache.save(cache_updates)
+        except Exception as e:
+            logger.warning(f"⚠️ 保存存储路径缓存失败: {e}")
+
+        stats = snapshot()
+        result['bytes'] = stats['bytes']
+        result['requests'] = stats['requests']
+        result['bytes_per_sec'] = stats['bytes_per_sec']
+        result['duration_seconds'] = stats['elapsed']
+        return result
+
+
+def get_asset_fetcher(supabase, db_path: str,
+                      config_overrides: Optional[Dict[str, Any]] = None) -> LightweightAssetFetcher:
+    """
+    基于 SupabaseClient 创建下载器
+
+    Args:
+        supabase: SupabaseClient 实例
+        db_path: 数据库路径
+        config_overrides: 覆盖 DEFAULT_FETCH_CONFIG
+
+    Returns:
+        LightweightAssetFetcher 实例
+    """
+    from urllib.parse import urlparse
+
+    bucket = supabase.client.storage.from_('capsule-files')
+    host = urlparse(supabase.url or '').netloc or 'supabase'
+    return LightweightAssetFetcher(bucket, db_path, host=host, config_overrides=config_overrides,
+                                   path_variants_fn=supabase.storage_path_variants,
+                                   sign_urls_fn=supabase.create_signed_urls)
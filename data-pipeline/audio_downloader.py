@@ -0,0 +1,243 @@
+"""
+Audio 文件夹并发流式下载器
+
+- 一次批量请求为整个文件夹生成签名 URL，每个文件交给 ResumableDownloader：
+  分块流式写入 <文件>.part，Range 断点续传，完成后原子重命名，内存占用与文件大小无关
+- 有界线程池并发下载
+- 本地已存在且大小与云端一致的文件直接跳过
+- 大文件（>= 2 × min_segment_mb）按字节范围分段多连接下载
+- 签名 URL 不可用时回退到 storage.download（整块读入，仍然原子写入）
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+from resumable_downloader import ResumableDownloader
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> audio_download 覆盖）
+DEFAULT_DOWNLOAD_CONFIG = {
+    'max_workers': 4,             # 并发下载的文件数
+    'chunk_size_kb': 1024,        # 流式写入的分块大小
+    'signed_url_ttl': 3600,       # 签名 URL 有效期（秒）
+    'max_retries': 3,             # 单个文件的网络重试次数
+    'timeout': 30,                # 单个请求超时（秒）
+    'segments': 4,                # 大文件的并行分段数（1 表示单连接）
+    'min_segment_mb': 32,         # 每段最小大小，小文件不分段
+}
+
+
+def get_download_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取下载器参数：默认值 < config.json 的 audio_download 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_DOWNLOAD_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('audio_download') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_DOWNLOAD_CONFIG and value is not None:
+                config[key] = type(DEFAULT_DOWNLOAD_CONFIG[key])(value)
+
+    return config
+
+
+def _remote_size(file_info: Dict[str, Any]) -> Optional[int]:
+    """storage.list 返回的文件大小（metadata.size）"""
+    metadata = file_info.get('metadata') or {}
+    try:
+        return int(metadata.get('size'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AudioFolderDownloader:
+    """并发流式下载 Audio 文件夹"""
+
+    def __init__(self, bucket,
+                 sign_urls_fn: Optional[Callable[[List[str], int], Dict[str, str]]] = None,
+                 config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            bucket: 提供 download(path) 的存储对象（签名 URL 不可用时回退）
+            sign_urls_fn: (storage_paths, expires_in) -> {storage_path: 签名 URL}
+            config_overrides: 覆盖 DEFAULT_DOWNLOAD_CONFIG
+        """
+        self.bucket = bucket
+        self.sign_urls_fn = sign_urls_fn
+        self.config = get_download_config(config_overrides)
+
+    def download_folder(self, cloud_folder: str, local_dir: Path, files: List[Dict[str, Any]],
+                        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+                        cancel_event: Optional[threading.Event] = None,
+                        bytes_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        下载 cloud_folder 下的文件到 local_dir
+
+        Args:
+            cloud_folder: 云端目录（如 {user_id}/{胶囊文件夹}/Audio）
+            local_dir: 本地目录（自动创建）
+            files: storage.list 的结果（需要 name，可选 metadata.size）
+            progress_callback: (files_done, total_files, filename)
+            cancel_event: 取消令牌（set() 后未开始的文件不再下载，进行中的下载停止并保留 .part）
+            bytes_callback: (downloaded_bytes, total_bytes)，待下载文件的累计字节进度
+                （来自 ResumableDownloader 的进度回调，约每秒一次；total_bytes 只统计已知大小的文件）
+
+        Returns:
+            {'files_downloaded', 'files_skipped', 'total_size', 'errors', 'duration_seconds', 'cancelled'}
+        """
+        started = time.perf_counter()
+        local_dir = Path(local_dir)
+        local_dir.mkdir(parents=True, exist_ok=True)
+
+        pending = []
+        skipped = 0
+        for file_info in files:
+            name = file_info.get('name')
+            if not name or name.startswith('.'):
+                continue
+            size = _remote_size(file_info)
+            local_path = local_dir / name
+            if size is not None and local_path.exists() and local_path.stat().st_size == size:
+                skipped += 1
+                continue
+            pending.append((f"{cloud_folder.rstrip('/')}/{name}", local_path, size))
+
+        signed = {}
+        if pending and self.sign_urls_fn:
+            try:
+                signed = self.sign_urls_fn([p[0] for p in pending], self.config['signed_url_ttl']) or {}
+            except Exception as e:
+                logger.warning(f"生成签名 URL 失败，回退到直接下载: {e}")
+
+        files_downloaded = 0
+        total_size = 0
+        errors = []
+        done = 0
+
+        # 字节进度：每个文件最近一次上报的已下载字节（含续传前已有的部分）
+        bytes_total = sum(size for _, _, size in pending if size is not None)
+        bytes_lock = threading.Lock()
+        file_bytes: Dict[str, int] = {}
+
+        def report_bytes(storage_path: str, downloaded: int):
+            with bytes_lock:
+                file_bytes[storage_path] = downloaded
+                downloaded_total = sum(file_bytes.values())
+            if bytes_callback:
+                try:
+                    bytes_callback(downloaded_total, bytes_total)
+                except Exception:
+                    pass
+
+        if pending:
+            workers = max(1, min(self.config['max_workers'], len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-download') as executor:
+                futures = {
+                    executor.submit(self._download_one, storage_path, local_path, size, signed.get(storage_path),
+                                    cancel_event,
+                                    lambda downloaded, path=storage_path: report_bytes(path, downloaded)):
+                        local_path.name
+                    for storage_path, local_path, size in pending
+                }
+                for future in as_completed(futures):
+                    filename = futures[future]
+                    done += 1
+                    try:
+                        total_size += future.result()
+                        files_downloaded += 1
+                        print(f"  ✓ {filename}")
+                    except Exception as e:
+                        errors.append(f"{filename}: {e}")
+                        print(f"  ✗ {filename}: {e}")
+                    if progress_callback:
+                        try:
+                            progress_callback(done, len(pending), filename)
+                        except Exception:
+                            pass
+
+        return {
+            'files_downloaded': files_downloaded,
+            'files_skipped': skipped,
+            'total_size': total_size,
+            'errors': errors,
+            'duration_seconds': round(time.perf_counter() - started, 3),
+            'cancelled': bool(cancel_event and cancel_event.is_set()),
+        }
+
+    def _download_one(self, storage_path: str, local_path: Path, size: Optional[int],
+                      signed_url: Optional[str], cancel_event: Optional[threading.Event] = None,
+                      on_bytes: Optional[Callable[[int], None]] = None) -> int:
+        """下载单个文件，返回文件大小（on_bytes 接收该文件已下载的字节数）"""
+        if cancel_event and cancel_event.is_set():
+            raise Exception('下载已取消')
+
+        if signed_url:
+            downloader = ResumableDownloader(
+                db_path=None,
+                task_id=None,
+                chunk_size=self.config['chunk_size_kb'] * 1024,
+                max_retries=self.config['max_retries'],
+                timeout=self.config['timeout'],
+                segments=self.config['segments'],
+                min_segment_size=self.config['min_segment_mb'] * 1024 * 1024,
+                cancel_event=cancel_event,
+            )
+            if on_bytes:
+                downloader.progress_callback = lambda progress: on_bytes(progress.downloaded_bytes)
+            result = downloader.download_with_resume(
+                remote_url=signed_url,
+                local_path=str(local_path),
+                expected_size=size,
+            )
+            if not result.get('success'):
+                raise Exception(result.get('error') or '下载失败')
+            file_size = result.get('file_size') or 0
+            if on_bytes:
+                on_bytes(file_size)
+            return file_size
+
+        # 回退：整块下载后原子写入
+        content = self.bucket.download(storage_path)
+        part_path = f"{local_path}.part"
+        with open(part_path, 'wb') as f:
+            f.write(content)
+        os.replace(part_path, local_path)
+        if on_bytes:
+            on_bytes(len(content))
+        return len(content)
+
+
+def get_audio_downloader(supabase, config_overrides: Optional[Dict[str, Any]] = None) -> AudioFolderDownloader:
+    """
+    基于 SupabaseClient 创建下载器
+
+    Args:
+        supabase: SupabaseClient 实例
+        config_overrides: 覆盖 DEFAULT_DOWNLOAD_CONFIG
+
+    Returns:
+        AudioFolderDownloader 实例
+    """
+    return AudioFolderDownloader(
+        supabase.client.storage.from_('capsule-files'),
+        sign_urls_fn=supabase.create_signed_urls,
+        config_overrides=config_overrides,
+    )
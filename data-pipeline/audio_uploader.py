@@ -0,0 +1,455 @@
+"""
+Audio 文件夹并发流式上传器
+
+- 有界线程池并发上传，文件以文件句柄流式传给 Storage，不再整块读入内存
+- 大文件走 Supabase Storage 的 TUS 断点续传接口（/storage/v1/upload/resumable），
+  按固定大小分块 PATCH；上传地址和最后一个确认的偏移量记在 resumable_uploads 表，
+  崩溃或中断后从最后确认的分块继续
+- 所有文件的字节进度汇总后按间隔回调（调用方转给 _set_upload_progress）
+"""
+
+import base64
+import logging
+import mimetypes
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> audio_upload 覆盖）
+DEFAULT_UPLOAD_CONFIG = {
+    'max_workers': 4,                 # 并发上传的文件数
+    'resumable_threshold_mb': 6,      # 超过该大小的文件使用断点续传
+    'chunk_size_mb': 6,               # TUS 分块大小（Supabase 要求 6 MB）
+    'progress_interval': 0.5,         # 进度回调最小间隔（秒）
+    'timeout': 120,                   # 单个请求超时（秒）
+}
+
+TUS_VERSION = '1.0.0'
+
+# progress_callback(files_done, total_files, filename, bytes_sent, total_bytes)
+ProgressCallback = Callable[[int, int, str, int, int], None]
+
+
+def get_upload_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取上传器参数：默认值 < config.json 的 audio_upload 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_UPLOAD_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('audio_upload') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_UPLOAD_CONFIG and value is not None:
+                config[key] = type(DEFAULT_UPLOAD_CONFIG[key])(value)
+
+    return config
+
+
+class ResumableUploadStore:
+    """
+    断点续传状态（resumable_uploads 表）
+
+    以存储路径为键，记录 TUS 上传地址、最后确认的偏移量和本地文件签名；
+    本地文件大小或 mtime 变化后旧状态作废。
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_table()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self):
+        """创建状态表（如果不存在）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resumable_uploads (
+                    storage_path TEXT PRIMARY KEY,
+                    local_path TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    file_mtime_ns INTEGER NOT NULL,
+                    upload_url TEXT NOT NULL,
+                    confirmed_offset INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, storage_path: str, file_size: int, file_mtime_ns: int) -> Optional[Dict[str, Any]]:
+        """获取与本地文件签名一致的续传状态"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute("""
+                SELECT upload_url, confirmed_offset FROM resumable_uploads
+                WHERE storage_path = ? AND file_size = ? AND file_mtime_ns = ?
+            """, (storage_path, file_size, file_mtime_ns)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def start(self, storage_path: str, local_path: str, file_size: int, file_mtime_ns: int, upload_url: str):
+        """记录新建的上传会话"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO resumable_uploads
+                    (storage_path, local_path, file_size, file_mtime_ns, upload_url, confirmed_offset)
+                VALUES (?, ?, ?, ?, ?, 0)
+                ON CONFLICT(storage_path) DO UPDATE SET
+                    local_path = excluded.local_path,
+                    file_size = excluded.file_size,
+                    file_mtime_ns = excluded.file_mtime_ns,
+                    upload_url = excluded.upload_url,
+                    confirmed_offset = 0,
+                    created_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (storage_path, local_path, file_size, file_mtime_ns, upload_url))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def confirm(self, storage_path: str, offset: int):
+        """记录服务端已确认的偏移量"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                UPDATE resumable_uploads
+                SET confirmed_offset = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE storage_path = ?
+            """, (offset, storage_path))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def finish(self, storage_path: str):
+        """上传完成或会话失效后删除状态"""
+        conn = self._get_connection()
+        try:
+            conn.execute("DELETE FROM resumable_uploads WHERE storage_path = ?", (storage_path,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class _ProgressAggregator:
+    """汇总多个并发上传的字节进度，按间隔回调"""
+
+    def __init__(self, total_files: int, total_bytes: int,
+                 callback: Optional[ProgressCallback], interval: float):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.callback = callback
+        self.interval = interval
+        self.files_done = 0
+        self.bytes_sent = 0
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def add_bytes(self, filename: str, nbytes: int):
+        with self._lock:
+            self.bytes_sent += nbytes
+            self._emit(filename, force=False)
+
+    def file_done(self, filename: str):
+        with self._lock:
+            self.files_done += 1
+            self._emit(filename, force=True)
+
+    def _emit(self, filename: str, force: bool):
+        if not self.callback:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.interval:
+            return
+        self._last_emit = now
+        try:
+            self.callback(self.files_done, self.total_files, filename,
+                          min(self.bytes_sent, self.total_bytes), self.total_bytes)
+        except Exception as e:
+            logger.debug(f"上传进度回调失败: {e}")
+
+
+class AudioFolderUploader:
+    """并发流式上传音频文件，大文件断点续传"""
+
+    def __init__(self, bucket, bucket_name: str = 'capsule-files',
+                 tus_endpoint: Optional[str] = None,
+                 auth_headers: Optional[Dict[str, str]] = None,
+                 db_path: Optional[str] = None,
+                 config_overrides: Optional[Dict[str, Any]] = None,
+                 session=None):
+        """
+        Args:
+            bucket: supabase-py 的 storage.from_(bucket) 对象（小文件上传）
+            bucket_name: Storage bucket 名称
+            tus_endpoint: TUS 接口地址（None 则所有文件都走普通上传）
+            auth_headers: TUS 请求的认证头
+            db_path: 数据库路径（存放续传状态；None 则不持久化）
+            config_overrides: 覆盖 DEFAULT_UPLOAD_CONFIG
+            session: requests.Session（默认新建）
+        """
+        self.bucket = bucket
+        self.bucket_name = bucket_name
+        self.tus_endpoint = tus_endpoint
+        self.auth_headers = auth_headers or {}
+        self.config = get_upload_config(config_overrides)
+        self.store = ResumableUploadStore(db_path) if db_path else None
+        if session is None and tus_endpoint:
+            import requests
+            session = requests.Session()
+        self.session = session
+
+        self.threshold = int(self.config['resumable_threshold_mb'] * 1024 * 1024)
+        self.chunk_size = int(self.config['chunk_size_mb'] * 1024 * 1024)
+
+    def upload_files(self, storage_prefix: str, audio_files: List[Path],
+                     progress_callback: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        并发上传文件到 {storage_prefix}/{文件名}
+
+        Args:
+            storage_prefix: 云端目录（如 {user_id}/{胶囊文件夹}/Audio）
+            audio_files: 本地文件列表
+            progress_callback: (files_done, total_files, filename, bytes_sent, total_bytes)
+
+        Returns:
+            {'success', 'files_uploaded', 'total_size', 'resumed', 'errors', 'duration_seconds'}
+        """
+        files = [Path(f) for f in audio_files]
+        sizes = {}
+        for f in files:
+            try:
+                sizes[f] = f.stat().st_size
+            except OSError:
+                sizes[f] = 0
+
+        progress = _ProgressAggregator(len(files), sum(sizes.values()), progress_callback,
+                                       self.config['progress_interval'])
+        started = time.perf_counter()
+        files_uploaded = 0
+        total_size = 0
+        resumed = 0
+        errors = []
+
+        if files:
+            workers = max(1, min(self.config['max_workers'], len(files)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-upload') as executor:
+                futures = {
+                    executor.submit(self._upload_one, f"{storage_prefix}/{f.name}", f, sizes[f], progress): f
+                    for f in files
+                }
+                for future in as_completed(futures):
+                    audio_file = futures[future]
+                    try:
+                        was_resumed = future.result()
+                        files_uploaded += 1
+                        total_size += sizes[audio_file]
+                        resumed += 1 if was_resumed else 0
+                        progress.file_done(audio_file.name)
+                    except Exception as e:
+                        errors.append(f"{audio_file.name}: {e}")
+                        logger.warning(f"  ✗ {audio_file.name}: {e}")
+
+        return {
+            'success': len(errors) == 0,
+            'files_uploaded': files_uploaded,
+            'total_size': total_size,
+            'resumed': resumed,
+            'errors': errors,
+            'duration_seconds': round(time.perf_counter() - started, 3),
+        }
+
+    def _upload_one(self, storage_path: str, local_path: Path, size: int,
+                    progress: _ProgressAggregator) -> bool:
+        """上传单个文件，返回是否从已有会话续传"""
+        content_type = mimetypes.guess_type(local_path.name)[0] or 'application/octet-stream'
+
+        if self.tus_endpoint and size > self.threshold:
+            return self._upload_resumable(storage_path, local_path, size, content_type, progress)
+
+        # 小文件：直接把文件句柄交给 Storage 客户端，由 httpx 分块读取
+        with open(local_path, 'rb') as f:
+            self.bucket.upload(
+                path=storage_path,
+                file=f,
+                file_options={"upsert": "true", "content-type": content_type}
+            )
+        progress.add_bytes(local_path.name, size)
+        return False
+
+    # ------------------------------------------------------------------
+    # TUS 断点续传
+    # ------------------------------------------------------------------
+
+    def _tus_headers(self, **extra) -> Dict[str, str]:
+        headers = {'Tus-Resumable': TUS_VERSION, **self.auth_headers}
+        headers.update(extra)
+        return headers
+
+    def _create_session(self, storage_path: str, size: int, content_type: str) -> str:
+        """POST 创建上传会话，返回上传地址"""
+        def b64(value: str) -> str:
+            return base64.b64encode(value.encode('utf-8')).decode('ascii')
+
+        metadata = ",".join([
+            f"bucketName {b64(self.bucket_name)}",
+            f"objectName {b64(storage_path)}",
+            f"contentType {b64(content_type)}",
+        ])
+        response = self.session.post(
+            self.tus_endpoint,
+            headers=self._tus_headers(**{
+                'Upload-Length': str(size),
+                'Upload-Metadata': metadata,
+                'x-upsert': 'true',
+            }),
+            timeout=self.config['timeout'],
+        )
+        if response.status_code not in (200, 201):
+            raise Exception(f"创建续传会话失败: HTTP {response.status_code} {response.text[:200]}")
+
+        location = response.headers.get('Location')
+        if not location:
+            raise Exception("创建续传会话失败: 缺少 Location")
+        if location.startswith('/'):
+            from urllib.parse import urljoin
+            location = urljoin(self.tus_endpoint, location)
+        return location
+
+    def _server_offset(self, upload_url: str) -> Optional[int]:
+        """HEAD 查询服务端已确认的偏移量，会话失效返回 None"""
+        try:
+            response = self.session.head(upload_url, headers=self._tus_headers(),
+                                         timeout=self.config['timeout'])
+        except Exception:
+            return None
+        if response.status_code not in (200, 204):
+            return None
+        try:
+            return int(response.headers.get('Upload-Offset'))
+        except (TypeError, ValueError):
+            return None
+
+    def _upload_resumable(self, storage_path: str, local_path: Path, size: int,
+                          content_type: str, progress: _ProgressAggregator) -> bool:
+        """分块上传，返回是否续传了已有会话"""
+        mtime_ns = local_path.stat().st_mtime_ns
+        upload_url = None
+        offset = 0
+        resumed = False
+
+        state = self.store.get(storage_path, size, mtime_ns) if self.store else None
+        if state:
+            server_offset = self._server_offset(state['upload_url'])
+            if server_offset is not None and server_offset <= size:
+                upload_url = state['upload_url']
+                offset = server_offset
+                resumed = offset > 0
+                if resumed:
+                    logger.info(f"  ↻ 续传 {local_path.name}: {offset:,}/{size:,} bytes")
+                    progress.add_bytes(local_path.name, offset)
+
+        if upload_url is None:
+            upload_url = self._create_session(storage_path, size, content_type)
+            if self.store:
+                self.store.start(storage_path, str(local_path), size, mtime_ns, upload_url)
+
+        with open(local_path, 'rb') as f:
+            f.seek(offset)
+            while offset < size:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                response = self.session.patch(
+                    upload_url,
+                    data=chunk,
+                    headers=self._tus_headers(**{
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream',
+                    }),
+                    timeout=self.config['timeout'],
+                )
+                if response.status_code == 409:
+                    # 偏移量不一致：以服务端为准重新定位
+                    server_offset = self._server_offset(upload_url)
+                    if server_offset is None:
+                        raise Exception("续传会话已失效")
+                    progress.add_bytes(local_path.name, server_offset - offset)
+                    offset = server_offset
+                    f.seek(offset)
+                    continue
+                if response.status_code not in (200, 204):
+                    if response.status_code in (404, 410) and self.store:
+                        self.store.finish(storage_path)
+                    raise Exception(f"分块上传失败: HTTP {response.status_code} {response.text[:200]}")
+
+                new_offset = int(response.headers.get('Upload-Offset', offset + len(chunk)))
+                progress.add_bytes(local_path.name, new_offset - offset)
+                offset = new_offset
+                f.seek(offset)
+                if self.store:
+                    self.store.confirm(storage_path, offset)
+
+        if self.store:
+            self.store.finish(storage_path)
+        return resumed
+
+
+def get_audio_uploader(supabase, db_path: Optional[str] = None,
+                       config_overrides: Optional[Dict[str, Any]] = None) -> AudioFolderUploader:
+    """
+    基于 SupabaseClient 创建上传器
+
+    Args:
+        supabase: SupabaseClient 实例
+        db_path: 数据库路径（默认从 PathManager 获取）
+        config_overrides: 覆盖 DEFAULT_UPLOAD_CONFIG
+
+    Returns:
+        AudioFolderUploader 实例
+    """
+    if db_path is None:
+        try:
+            from common import PathManager
+            db_path = str(PathManager.get_instance().db_path)
+        except Exception:
+            db_path = None
+
+    bucket_name = 'capsule-files'
+    tus_endpoint = None
+    auth_headers = {}
+    if getattr(supabase, 'url', None) and getattr(supabase, 'key', None):
+        tus_endpoint = f"{supabase.url.rstrip('/')}/storage/v1/upload/resumable"
+        auth_headers = {'Authorization': f"Bearer {supabase.key}", 'apikey': supabase.key}
+
+    return AudioFolderUploader(
+        supabase.client.storage.from_(bucket_name),
+        bucket_name=bucket_name,
+        tus_endpoint=tus_endpoint,
+        auth_headers=auth_headers,
+        db_path=db_path,
+        config_overrides=config_overrides,
+    )
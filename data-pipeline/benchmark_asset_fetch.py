@@ -0,0 +1,160 @@
+"""
+轻量资产下载评测：逐个串行下载 vs LightweightAssetFetcher
+
+用本地 HTTP 服务模拟 Supabase Storage（每个请求注入固定延迟），
+比较启动同步步骤 2 的耗时、请求数和聚合速率。
+
+用法:
+    python benchmark_asset_fetch.py --capsules 200 --latency-ms 80
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from asset_fetcher import LightweightAssetFetcher
+from supabase_client import SupabaseClient
+
+OWNER = "bench-user"
+
+
+class StorageStandIn(BaseHTTPRequestHandler):
+    """GET /object/<path> 返回文件内容，GET /list/<folder> 返回 [{"name": ...}]"""
+
+    root: Path = None
+    latency: float = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        kind, _, rel = self.path.lstrip("/").partition("/")
+        target = self.root / urllib.parse.unquote(rel)
+
+        if kind == "list" and target.is_dir():
+            body = json.dumps([{"name": p.name} for p in target.iterdir()]).encode()
+        elif kind == "object" and target.is_file():
+            body = target.read_bytes()
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HttpBucket:
+    """与 supabase storage.from_(bucket) 相同的 list / download 接口"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def list(self, folder):
+        with urllib.request.urlopen(f"{self.base_url}/list/{urllib.parse.quote(folder)}") as resp:
+            return json.loads(resp.read())
+
+    def download(self, path):
+        with urllib.request.urlopen(f"{self.base_url}/object/{urllib.parse.quote(path)}") as resp:
+            return resp.read()
+
+
+def build_storage(root: Path, n_capsules: int, seed: int = 3):
+    """生成云端文件：新旧两种预览命名混合，部分旧胶囊没有 metadata.json"""
+    random.seed(seed)
+    jobs = []
+    for i in range(n_capsules):
+        name = f"capsule_{i:05d}"
+        folder = root / OWNER / name
+        folder.mkdir(parents=True)
+
+        preview_name = random.choice([f"{name}.ogg", "preview.ogg", "preview.mp3"])
+        (folder / preview_name).write_bytes(random.randbytes(random.randint(60_000, 200_000)))
+        (folder / f"{name}.rpp").write_bytes(random.randbytes(20_000))
+        files = [("preview", f"{name}.ogg"), ("rpp", f"{name}.rpp")]
+        if i % 5:
+            (folder / "metadata.json").write_text(json.dumps({"name": name}))
+        files.insert(0, ("metadata", "metadata.json"))
+        jobs.append({"capsule_id": i + 1, "owner_id": OWNER, "folder": name, "files": files})
+    return jobs
+
+
+def run_sequential(bucket, jobs, local_root: Path):
+    """原实现：逐个胶囊、逐个文件、逐个候选路径"""
+    requests = 0
+    nbytes = 0
+    for job in jobs:
+        for file_type, filename in job["files"]:
+            for storage_path in SupabaseClient.storage_path_variants(job["owner_id"], job["folder"], file_type):
+                requests += 1
+                try:
+                    data = bucket.download(storage_path)
+                except urllib.error.HTTPError:
+                    continue
+                target = local_root / job["folder"] / filename
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+                nbytes += len(data)
+                break
+    return requests, nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="轻量资产下载评测")
+    parser.add_argument("--capsules", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host", type=int, default=6)
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp())
+    storage_root = work / "storage"
+    jobs = build_storage(storage_root, args.capsules)
+
+    StorageStandIn.root = storage_root
+    StorageStandIn.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StorageStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bucket = HttpBucket(f"http://127.0.0.1:{server.server_address[1]}")
+
+    print(f"🧪 {args.capsules} 个胶囊, 每请求延迟 {args.latency_ms:.0f} ms")
+
+    started = time.perf_counter()
+    requests, nbytes = run_sequential(bucket, jobs, work / "sequential")
+    elapsed = time.perf_counter() - started
+    print(f"串行:        {elapsed:7.2f}s  {requests:5d} 次请求  {nbytes / 1048576 / elapsed:6.2f} MB/s")
+
+    db_path = str(work / "bench.db")
+    sqlite3.connect(db_path).close()
+    overrides = {"max_workers": args.workers, "per_host_limit": args.per_host, "progress_interval": 3600.0}
+
+    for label in ("并发(首次)", "并发(缓存)"):
+        local_root = work / "concurrent"
+        shutil.rmtree(local_root, ignore_errors=True)
+        for job in jobs:
+            job["local_dir"] = local_root / job["folder"]
+        fetcher = LightweightAssetFetcher(bucket, db_path, host="stand-in", config_overrides=overrides,
+                                          path_variants_fn=SupabaseClient.storage_path_variants)
+        result = fetcher.fetch_all(jobs)
+        print(f"{label}: {result['duration_seconds']:7.2f}s  {result['requests']:5d} 次请求  "
+              f"{result['bytes_per_sec'] / 1048576:6.2f} MB/s  (缺失 {result['files_missing']})")
+
+    server.shutdown()
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+缓存淘汰评测：旧实现（最旧 100 个候选）vs CacheEvictionEngine（lru / lfu / gdsf）
+
+生成模拟的 local_cache（默认 10 万条：预览、WAV、RPP 混合，访问热度服从 Zipf 分布，
+最后访问时间分布在 90 天内），比较各策略能否达到释放目标、释放字节数和耗时，
+再按同一热度分布回放后续访问，统计淘汰后的对象命中率和字节命中率。
+文件删除是模拟的（不创建真实文件）。
+
+用法:
+    python benchmark_cache_eviction.py --entries 100000 --free-percent 30
+"""
+
+import argparse
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from cache_eviction import CacheEvictionEngine, EVICTION_POLICIES
+
+FILE_TYPES = {
+    # file_type: (最小字节, 最大字节)
+    "preview": (100_000, 800_000),
+    "rpp": (20_000, 200_000),
+    "wav": (5_000_000, 80_000_000),
+}
+
+
+class SimulatedEvictionEngine(CacheEvictionEngine):
+    """只删除记录，不操作文件"""
+
+    def _remove_file(self, file_path: str) -> bool:
+        return True
+
+
+def build_cache(db_path: str, n_entries: int, pinned_ratio: float, seed: int = 7):
+    """生成模拟缓存，返回每个条目的访问热度 {(capsule_id, file_type): weight}"""
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1)
+    types = list(FILE_TYPES)
+    n_capsules = (n_entries + len(types) - 1) // len(types)
+
+    # 胶囊热度：Zipf（排名随机打乱，避免与 ID 相关）
+    ranks = list(range(1, n_capsules + 1))
+    rng.shuffle(ranks)
+    popularity = [1.0 / (r ** 0.9) for r in ranks]
+    top = max(popularity)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE local_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            capsule_id INTEGER NOT NULL,
+            file_type TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_size INTEGER,
+            last_accessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            access_count INTEGER DEFAULT 0,
+            is_pinned BOOLEAN DEFAULT 0,
+            cache_priority INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(capsule_id, file_type)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_local_cache_accessed_at ON local_cache(last_accessed_at ASC)")
+
+    weights = {}
+    rows = []
+    for i in range(n_entries):
+        capsule_id = i // len(types) + 1
+        file_type = types[i % len(types)]
+        heat = popularity[capsule_id - 1] / top
+        # 预览被试听的次数远多于整个 WAV 被下载使用
+        type_weight = {"preview": 1.0, "rpp": 0.3, "wav": 0.2}[file_type]
+        weights[(capsule_id, file_type)] = heat * type_weight
+
+        access_count = int(rng.expovariate(1.0) * heat * type_weight * 400)
+        # 热门条目更可能是最近访问的
+        age_days = rng.uniform(0, 90) * (1 - min(heat * 5, 0.9))
+        accessed = now - timedelta(days=age_days, seconds=rng.randint(0, 86400))
+        lo, hi = FILE_TYPES[file_type]
+        stamp = accessed.strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((capsule_id, file_type, f"/cache/{capsule_id}/{file_type}",
+                     rng.randint(lo, hi), stamp, access_count,
+                     1 if rng.random() < pinned_ratio else 0, stamp, stamp))
+
+    conn.executemany("""
+        INSERT INTO local_cache (capsule_id, file_type, file_path, file_size, last_accessed_at,
+                                 access_count, is_pinned, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+    return weights
+
+
+def run_legacy(db_path: str, bytes_to_free: int, protect_access_count: int = 0):
+    """旧实现：取最旧的 100 个未固定条目（smart 模式下跳过高频条目），逐个删除"""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    candidates = conn.execute("""
+        SELECT id, file_size, access_count FROM local_cache
+        WHERE is_pinned = 0
+        ORDER BY last_accessed_at ASC
+        LIMIT 100
+    """).fetchall()
+
+    freed = deleted = 0
+    for entry_id, size, access_count in candidates:
+        if freed >= bytes_to_free:
+            break
+        if protect_access_count and access_count >= protect_access_count:
+            continue
+        conn.execute("DELETE FROM local_cache WHERE id = ?", (entry_id,))
+        freed += size or 0
+        deleted += 1
+    conn.commit()
+    conn.close()
+    return {"space_freed": freed, "files_deleted": deleted, "target_met": freed >= bytes_to_free,
+            "duration_seconds": round(time.perf_counter() - started, 3)}
+
+
+def replay(db_path: str, weights, n_requests: int, seed: int = 11):
+    """按热度分布回放访问，返回 (对象命中率, 字节命中率)"""
+    conn = sqlite3.connect(db_path)
+    cached = set(conn.execute("SELECT capsule_id, file_type FROM local_cache"))
+    conn.close()
+
+    rng = random.Random(seed)
+    keys = list(weights)
+    sizes = {k: sum(FILE_TYPES[k[1]]) // 2 for k in keys}
+    trace = rng.choices(keys, weights=[weights[k] for k in keys], k=n_requests)
+
+    hits = sum(1 for k in trace if k in cached)
+    hit_bytes = sum(sizes[k] for k in trace if k in cached)
+    total_bytes = sum(sizes[k] for k in trace)
+    return hits / n_requests, hit_bytes / total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存淘汰评测")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--free-percent", type=float, default=30.0, help="需要释放的比例（占总缓存）")
+    parser.add_argument("--pinned-percent", type=float, default=2.0)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200_000, help="回放的访问次数")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp())
+    base_db = str(work / "base.db")
+    weights = build_cache(base_db, args.entries, args.pinned_percent / 100)
+
+    conn = sqlite3.connect(base_db)
+    total = conn.execute("SELECT SUM(file_size) FROM local_cache").fetchone()[0]
+    conn.close()
+    bytes_to_free = int(total * args.free_percent / 100)
+    print(f"🧪 {args.entries} 个缓存条目, 共 {total / 1024 ** 3:.1f} GB, "
+          f"目标释放 {bytes_to_free / 1024 ** 3:.1f} GB ({args.free_percent:.0f}%)")
+    print(f"{'策略':<14}{'达标':>4}{'释放(GB)':>10}{'删除数':>8}{'耗时(s)':>9}{'对象命中':>10}{'字节命中':>10}")
+
+    def show(label, result, db_path):
+        hit_ratio, byte_hit_ratio = replay(db_path, weights, args.requests)
+        print(f"{label:<14}{'✅' if result['target_met'] else '❌':>4}"
+              f"{result['space_freed'] / 1024 ** 3:>10.2f}{result['files_deleted']:>8}"
+              f"{result['duration_seconds']:>9.3f}{hit_ratio:>10.1%}{byte_hit_ratio:>10.1%}")
+
+    for label, protect in (("legacy", 0), ("legacy-smart", 3)):
+        db_path = str(work / f"{label}.db")
+        shutil.copy(base_db, db_path)
+        show(label, run_legacy(db_path, bytes_to_free, protect), db_path)
+
+    for policy in EVICTION_POLICIES:
+        db_path = str(work / f"{policy}.db")
+        shutil.copy(base_db, db_path)
+        engine = SimulatedEvictionEngine(db_path, policy=policy, page_size=args.page_size)
+        show(policy, engine.evict(bytes_to_free), db_path)
+
+    # 干运行报告示例
+    report = SimulatedEvictionEngine(base_db, policy="gdsf").evict(bytes_to_free, dry_run=True, report_limit=3)
+    print(f"\n📋 干运行 (gdsf): 将删除 {report['files_deleted']} 个文件, "
+          f"{report['space_freed'] / 1024 ** 3:.2f} GB, 扫描 {report['pages']} 页, "
+          f"{report['duration_seconds']:.3f}s")
+    for file_type, stats in sorted(report["by_type"].items()):
+        print(f"   {file_type}: {stats['count']} 个, {stats['size'] / 1024 ** 3:.2f} GB")
+    for entry in report["evicted"]:
+        print(f"   - 胶囊 {entry['capsule_id']} {entry['file_type']} "
+              f"{entry['file_size'] / 1024 ** 2:.1f} MB, 访问 {entry['access_count']} 次")
+
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+混合搜索评测：延迟与 recall@k
+
+对比三种排序方式：
+- lexical: 仅 FTS5 bm25
+- vector:  仅本地向量
+- hybrid:  RRF 融合
+
+用法:
+    # 合成数据（不需要模型，双语同义词映射到相同的概念向量来模拟多语言模型）
+    python benchmark_hybrid_search.py --capsules 5000
+
+    # 真实数据库（使用 HybridEmbeddingService，首次运行会为缺失的胶囊计算向量）
+    python benchmark_hybrid_search.py --db /path/to/capsules.db
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from hybrid_search import HybridSearchService
+
+HERE = Path(__file__).parent
+QUERIES_FILE = HERE / "search_eval_queries.json"
+SCHEMA_FILE = HERE / "database" / "capsule_schema.sql"
+
+# 合成数据词表（中文, 英文）
+VOCAB = [
+    ("故障", "glitch"), ("温暖", "warm"), ("黑暗", "dark"), ("氛围", "ambient"),
+    ("颗粒", "granular"), ("金属质感", "metallic"), ("打击乐", "percussion"),
+    ("明亮", "bright"), ("噪声", "noise"), ("人声", "vocal"), ("合成器", "synth"),
+    ("低沉", "deep"), ("清脆", "crisp"), ("空灵", "ethereal"), ("失真", "distorted"),
+    ("柔和", "soft"), ("紧张", "tense"), ("复古", "vintage"), ("水声", "water"),
+    ("风声", "wind"),
+]
+NAME_WORDS = ["kick", "pad", "drone", "riser", "loop", "hit", "texture", "bed"]
+DIM = 384
+
+
+def make_concept_embedder(seed: int = 7):
+    """
+    合成 embedding：同一概念的中英文得到相同的概念向量，其余文本用字符 trigram 哈希噪声
+
+    只用于评测流程本身，不代表真实模型的效果
+    """
+    rng = np.random.default_rng(seed)
+    concepts = {i: rng.standard_normal(DIM).astype(np.float32) for i in range(len(VOCAB))}
+
+    def embed(text: str):
+        vec = np.zeros(DIM, dtype=np.float32)
+        lowered = text.lower()
+        for i, (cn, en) in enumerate(VOCAB):
+            if cn in text or en in lowered:
+                vec += concepts[i]
+        for j in range(max(0, len(lowered) - 2)):
+            h = int(hashlib.md5(lowered[j:j + 3].encode("utf-8")).hexdigest()[:8], 16)
+            vec[h % DIM] += 0.05
+        if not vec.any():
+            return None
+        return vec.tolist()
+
+    return embed
+
+
+def build_synthetic_db(path: str, n_capsules: int, seed: int = 1):
+    """生成合成胶囊库：每个胶囊 1-3 个标签，标签随机取中文或英文"""
+    random.seed(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_FILE.read_text(encoding="utf-8"))
+
+    conn.executemany(
+        "INSERT INTO capsules (uuid, name, file_path) VALUES (?, ?, ?)",
+        [(f"bench-{i}", f"{random.choice(NAME_WORDS)}_{i}", f"bench_{i}") for i in range(n_capsules)]
+    )
+
+    tags = []
+    for capsule_id in range(1, n_capsules + 1):
+        for cn, en in random.sample(VOCAB, random.randint(1, 3)):
+            # 真实数据中经常只填了一种语言
+            word_cn, word_en = random.choice([(cn, None), (None, en), (cn, en)])
+            tags.append((capsule_id, "texture", f"{en}_{capsule_id}", word_cn, word_en,
+                         random.uniform(0, 100), random.uniform(0, 100)))
+    conn.executemany("""
+        INSERT INTO capsule_tags (capsule_id, lens, word_id, word_cn, word_en, x, y)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, tags)
+
+    conn.execute("""
+        UPDATE capsules SET keywords = (
+            SELECT group_concat(COALESCE(word_cn, word_en), ', ')
+            FROM capsule_tags WHERE capsule_id = capsules.id
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+
+def load_relevance(db_path: str, queries):
+    """根据 relevant_tags 计算每个查询的相关胶囊集合"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT capsule_id, word_cn, word_en FROM capsule_tags").fetchall()
+    conn.close()
+
+    relevance = []
+    for q in queries:
+        wanted = {t.lower() for t in q["relevant_tags"]}
+        relevance.append({
+            capsule_id for capsule_id, word_cn, word_en in rows
+            if (word_cn or "").lower() in wanted or (word_en or "").lower() in wanted
+        })
+    return relevance
+
+
+def recall_at_k(ranked_ids, relevant, k):
+    if not relevant:
+        return None
+    hits = len(set(ranked_ids[:k]) & relevant)
+    return hits / min(k, len(relevant))
+
+
+def run(service, queries, relevance, ks, repeats):
+    modes = {
+        "lexical": {"vector_weight": 0.0},
+        "vector": {"lexical_weight": 0.0},
+        "hybrid": {},
+    }
+    max_k = max(ks)
+
+    # 查询向量预先计算，延迟只统计检索与融合
+    query_embeddings = [service.vector_index.embed(q["query"]) for q in queries]
+
+    report = {}
+    for mode, overrides in modes.items():
+        latencies = []
+        recalls = {k: [] for k in ks}
+        for q, emb, relevant in zip(queries, query_embeddings, relevance):
+            for _ in range(repeats):
+                started = time.perf_counter()
+                result = service.search(q["query"], limit=max_k, config_overrides=overrides,
+                                        query_embedding=emb)
+                latencies.append((time.perf_counter() - started) * 1000)
+            ranked = [r["capsule_id"] for r in result["results"]]
+            for k in ks:
+                value = recall_at_k(ranked, relevant, k)
+                if value is not None:
+                    recalls[k].append(value)
+
+        latencies.sort()
+        report[mode] = {
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+            **{f"recall@{k}": statistics.mean(recalls[k]) if recalls[k] else 0.0 for k in ks},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="混合搜索评测（延迟 + recall@k）")
+    parser.add_argument("--db", help="真实数据库路径（不提供则生成合成数据）")
+    parser.add_argument("--capsules", type=int, default=5000, help="合成胶囊数量")
+    parser.add_argument("--repeats", type=int, default=5, help="每个查询重复次数")
+    args = parser.parse_args()
+
+    queries = json.loads(QUERIES_FILE.read_text(encoding="utf-8"))["queries"]
+    ks = [5, 10, 20]
+
+    if args.db:
+        db_path = args.db
+        service = HybridSearchService(db_path)
+        print(f"📂 使用数据库: {db_path}")
+    else:
+        db_path = str(Path(tempfile.mkdtemp()) / "bench.db")
+        print(f"🧪 生成合成数据: {args.capsules} 个胶囊")
+        build_synthetic_db(db_path, args.capsules)
+        service = HybridSearchService(db_path, embed_fn=make_concept_embedder())
+
+    started = time.perf_counter()
+    computed = service.vector_index.refresh()
+    print(f"   向量索引: 计算 {computed} 个 ({time.perf_counter() - started:.1f}s)")
+
+    relevance = load_relevance(db_path, queries)
+    report = run(service, queries, relevance, ks, args.repeats)
+
+    print()
+    header = f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} " + " ".join(f"{'R@' + str(k):>7}" for k in ks)
+    print(header)
+    print("-" * len(header))
+    for mode, m in report.items():
+        print(f"{mode:<8} {m['p50_ms']:>8.2f} {m['p95_ms']:>8.2f} "
+              + " ".join(f"{m[f'recall@{k}']:>7.3f}" for k in ks))
+
+
+if __name__ == "__main__":
+    main()
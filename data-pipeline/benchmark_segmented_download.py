@@ -0,0 +1,144 @@
+"""
+分段多连接下载评测：ResumableDownloader 单连接 vs N 段并行
+
+用本地支持 Range 的 HTTP 服务模拟高延迟链路：每个连接每发送一个数据块都等待一次
+往返延迟（单连接吞吐受延迟限制，而不是带宽），比较不同分段数的吞吐，
+并验证中断后按段续传与 SHA256 一致性。
+
+用法:
+    python benchmark_segmented_download.py --size-mb 64 --latency-ms 40 --segments 1 2 4 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from resumable_downloader import ResumableDownloader, SEGMENT_STATE_SUFFIX
+
+
+class RangeStandIn(BaseHTTPRequestHandler):
+    """HEAD / GET 单个文件，支持 Range: bytes=a-b，每个数据块后注入一次延迟"""
+
+    protocol_version = "HTTP/1.1"
+    payload: bytes = b""
+    latency: float = 0.0
+    block_size: int = 256 * 1024
+    fail_after: int = 0  # > 0 时每个响应发送这么多字节后断开（模拟中断）
+
+    def log_message(self, *args):
+        pass
+
+    def _range(self):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if not match:
+            return None
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(self.payload) - 1
+        return start, min(end, len(self.payload) - 1)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"bench"')
+        self.end_headers()
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        byte_range = self._range()
+        if byte_range:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.payload)}")
+        else:
+            start, end = 0, len(self.payload) - 1
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        sent = 0
+        try:
+            for offset in range(start, end + 1, self.block_size):
+                if self.fail_after and sent >= self.fail_after:
+                    self.close_connection = True
+                    return
+                block = self.payload[offset:min(offset + self.block_size, end + 1)]
+                self.wfile.write(block)
+                sent += len(block)
+                time.sleep(self.latency)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def download(url: str, target: Path, segments: int, expected_hash: str, chunk_kb: int):
+    downloader = ResumableDownloader(db_path=None, task_id=None, chunk_size=chunk_kb * 1024,
+                                     max_retries=0, segments=segments, min_segment_size=1024 * 1024)
+    started = time.perf_counter()
+    result = downloader.download_with_resume(remote_url=url, local_path=str(target),
+                                             expected_hash=expected_hash)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分段多连接下载评测")
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    RangeStandIn.payload = os.urandom(args.size_mb * 1024 * 1024)
+    RangeStandIn.latency = args.latency_ms / 1000
+    expected_hash = hashlib.sha256(RangeStandIn.payload).hexdigest()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/stem.wav"
+    work = Path(tempfile.mkdtemp())
+
+    print(f"🧪 {args.size_mb} MB 文件, 每块 {RangeStandIn.block_size // 1024} KB 注入 {args.latency_ms:.0f} ms 延迟")
+
+    rows = []
+    for segments in args.segments:
+        target = work / f"stem_{segments}.wav"
+        result, elapsed = download(url, target, segments, expected_hash, args.chunk_kb)
+        if not result.get("success"):
+            print(f"❌ {segments} 段: {result.get('error')}")
+            continue
+        throughput = args.size_mb / elapsed
+        rows.append((segments, elapsed, throughput))
+        target.unlink()
+
+    print(f"\n{'分段数':>6} {'耗时(s)':>9} {'吞吐(MB/s)':>11} {'加速比':>7}")
+    for segments, elapsed, throughput in rows:
+        print(f"{segments:>6} {elapsed:>9.2f} {throughput:>11.2f} {throughput / rows[0][2]:>7.2f}x")
+
+    # 中断后按段续传：每个响应只发送一部分后断开
+    segments = max(args.segments)
+    target = work / "resume.wav"
+    RangeStandIn.fail_after = RangeStandIn.block_size * 4
+    result, _ = download(url, target, segments, expected_hash, args.chunk_kb)
+    state_path = Path(f"{target}.part{SEGMENT_STATE_SUFFIX}")
+    saved = json.loads(state_path.read_text())["segments"] if state_path.exists() else []
+    print(f"\n中断: success={result.get('success')}  已保存 {sum(s['done'] for s in saved):,} bytes（{len(saved)} 段）")
+
+    RangeStandIn.fail_after = 0
+    result, elapsed = download(url, target, segments, expected_hash, args.chunk_kb)
+    print(f"续传: success={result.get('success')}  本次下载 {result.get('downloaded_bytes', 0):,} bytes  "
+          f"{elapsed:.2f}s  SHA256 {'一致' if result.get('file_hash') == expected_hash else '不一致'}")
+
+    server.shutdown()
+    shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
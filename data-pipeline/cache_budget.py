@@ -0,0 +1,322 @@
+"""
+缓存预算（写入时持续执行）
+
+local_cache 的总字节数由 SQLite 触发器维护在单行计数表 local_cache_usage 中
+（任何写入方——add_to_cache、清理、扫描脚本——都会自动更新），
+CacheBudget 在内存中保存最新用量，写入后在同一事务中读取这一行同步，从不重新 SUM(file_size)：
+- 固定缓存（is_pinned）不计入预算
+- 大于整个预算的未固定文件拒绝入缓存
+- 未固定字节数超过高水位时在后台线程按策略淘汰到低水位（见 cache_eviction.py），写入方不等待；
+  自动淘汰只删除云端有副本的文件，用户导出的原始 WAV 即使未固定也不会被删除
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# 一次淘汰没有可删除的条目（剩余都是固定缓存或本地原始文件）后，多久内不再尝试
+EVICTION_RETRY_SECONDS = 60.0
+
+# 默认参数（config.json -> cache_budget 覆盖）
+DEFAULT_BUDGET_CONFIG = {
+    'enabled': True,              # 是否在写入时执行预算
+    'max_cache_mb': 0,            # 缓存预算（0 表示使用 MAX_CACHE_SIZE，默认 5GB）
+    'high_water_percent': 95.0,   # 超过该比例时开始后台淘汰
+    'low_water_percent': 80.0,    # 淘汰到该比例为止
+    'policy': 'gdsf',             # 淘汰策略（lru / lfu / gdsf）
+}
+
+
+def get_budget_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取缓存预算参数：默认值 < config.json 的 cache_budget 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_BUDGET_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('cache_budget') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_BUDGET_CONFIG and value is not None:
+                config[key] = type(DEFAULT_BUDGET_CONFIG[key])(value)
+
+    return config
+
+
+class CacheBudget:
+    """内存中的缓存用量 + 高低水位后台淘汰"""
+
+    def __init__(self, db_path: str, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            config_overrides: 覆盖 DEFAULT_BUDGET_CONFIG
+        """
+        self.db_path = db_path
+        self.config = get_budget_config(config_overrides)
+
+        if self.config['max_cache_mb'] > 0:
+            self.max_bytes = self.config['max_cache_mb'] * 1024 * 1024
+        else:
+            self.max_bytes = int(os.getenv('MAX_CACHE_SIZE', 5 * 1024 * 1024 * 1024))
+        self.high_water = int(self.max_bytes * self.config['high_water_percent'] / 100.0)
+        self.low_water = int(self.max_bytes * min(self.config['low_water_percent'],
+                                                  self.config['high_water_percent']) / 100.0)
+
+        self._lock = threading.Lock()
+        self._usage = {'total_bytes': 0, 'pinned_bytes': 0, 'entries': 0}
+        self._evicting = False
+        self._idle_until = 0.0       # 上次淘汰无可删除条目时的重试时间
+        self._stats = {'admitted': 0, 'refused': 0, 'evictions': 0,
+                       'files_evicted': 0, 'bytes_evicted': 0, 'last_eviction': None}
+
+        self.ready = self._init_table()
+        if self.ready:
+            self.refresh()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self) -> bool:
+        """创建计数表和触发器；首次创建时统计一次现有用量。local_cache 不存在时返回 False"""
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'local_cache'").fetchone():
+                conn.rollback()
+                return False
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS local_cache_usage (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_bytes INTEGER NOT NULL DEFAULT 0,
+                    pinned_bytes INTEGER NOT NULL DEFAULT 0,
+                    entries INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_local_cache_usage_insert
+                AFTER INSERT ON local_cache
+                BEGIN
+                    UPDATE local_cache_usage SET
+                        total_bytes = total_bytes + COALESCE(NEW.file_size, 0),
+                        pinned_bytes = pinned_bytes + CASE WHEN NEW.is_pinned THEN COALESCE(NEW.file_size, 0) ELSE 0 END,
+                        entries = entries + 1
+                    WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_local_cache_usage_delete
+                AFTER DELETE ON local_cache
+                BEGIN
+                    UPDATE local_cache_usage SET
+                        total_bytes = total_bytes - COALESCE(OLD.file_size, 0),
+                        pinned_bytes = pinned_bytes - CASE WHEN OLD.is_pinned THEN COALESCE(OLD.file_size, 0) ELSE 0 END,
+                        entries = entries - 1
+                    WHERE id = 1;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_local_cache_usage_update
+                AFTER UPDATE OF file_size, is_pinned ON local_cache
+                BEGIN
+                    UPDATE local_cache_usage SET
+                        total_bytes = total_bytes - COALESCE(OLD.file_size, 0) + COALESCE(NEW.file_size, 0),
+                        pinned_bytes = pinned_bytes
+                            - CASE WHEN OLD.is_pinned THEN COALESCE(OLD.file_size, 0) ELSE 0 END
+                            + CASE WHEN NEW.is_pinned THEN COALESCE(NEW.file_size, 0) ELSE 0 END
+                    WHERE id = 1;
+                END
+            """)
+
+            if not conn.execute("SELECT 1 FROM local_cache_usage WHERE id = 1").fetchone():
+                # 只在首次创建时统计一次，之后由触发器维护
+                conn.execute("""
+                    INSERT INTO local_cache_usage (id, total_bytes, pinned_bytes, entries)
+                    SELECT 1,
+                           COALESCE(SUM(file_size), 0),
+                           COALESCE(SUM(CASE WHEN is_pinned THEN file_size ELSE 0 END), 0),
+                           COUNT(*)
+                    FROM local_cache
+                """)
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    @property
+    def unpinned_bytes(self) -> int:
+        with self._lock:
+            return self._usage['total_bytes'] - self._usage['pinned_bytes']
+
+    def sync(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        """
+        从计数表同步内存用量（写入方在提交前用同一连接调用，读到的就是本次写入后的用量）
+
+        Args:
+            conn: 数据库连接
+
+        Returns:
+            用量字典
+        """
+        row = conn.execute("SELECT total_bytes, pinned_bytes, entries FROM local_cache_usage WHERE id = 1").fetchone()
+        with self._lock:
+            if row:
+                self._usage = {'total_bytes': row[0], 'pinned_bytes': row[1], 'entries': row[2]}
+            return dict(self._usage)
+
+    def refresh(self) -> Dict[str, int]:
+        """用独立连接从计数表同步内存用量"""
+        conn = self._get_connection()
+        try:
+            return self.sync(conn)
+        finally:
+            conn.close()
+
+    def admit(self, file_size: int, is_pinned: bool = False) -> bool:
+        """
+        入缓存检查：大于整个预算的未固定文件拒绝（固定文件不计入预算）
+
+        Args:
+            file_size: 文件大小（字节）
+            is_pinned: 是否固定缓存
+
+        Returns:
+            是否允许写入
+        """
+        with self._lock:
+            if self.config['enabled'] and not is_pinned and (file_size or 0) > self.max_bytes:
+                self._stats['refused'] += 1
+                return False
+            self._stats['admitted'] += 1
+            return True
+
+    def enforce(self):
+        """写入后调用：未固定用量超过高水位时启动后台淘汰（已在淘汰中则由其继续处理）"""
+        if not self.config['enabled']:
+            return
+        with self._lock:
+            unpinned = self._usage['total_bytes'] - self._usage['pinned_bytes']
+            if unpinned <= self.high_water or self._evicting or time.monotonic() < self._idle_until:
+                return
+            self._evicting = True
+
+        threading.Thread(target=self._run_eviction, name='cache-budget-evict', daemon=True).start()
+
+    def _run_eviction(self):
+        from cache_eviction import CacheEvictionEngine
+
+        while True:
+            freed = 0
+            try:
+                usage = self.refresh()
+                to_free = usage['total_bytes'] - usage['pinned_bytes'] - self.low_water
+                if to_free > 0:
+                    logger.info(f"🧹 缓存超过高水位，后台淘汰 {to_free} 字节（策略: {self.config['policy']}）")
+                    result = CacheEvictionEngine(self.db_path, policy=self.config['policy']).evict(
+                        to_free, redownloadable_only=True
+                    )
+                    freed = result['space_freed']
+                    with self._lock:
+                        self._stats['evictions'] += 1
+                        self._stats['files_evicted'] += result['files_deleted']
+                        self._stats['bytes_evicted'] += freed
+                        self._stats['last_eviction'] = {
+                            'at': time.time(),
+                            'bytes_to_free': to_free,
+                            'space_freed': freed,
+                            'files_deleted': result['files_deleted'],
+                            'target_met': result['target_met'],
+                            'errors': len(result['errors']),
+                        }
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"缓存预算淘汰失败: {e}")
+
+            with self._lock:
+                unpinned = self._usage['total_bytes'] - self._usage['pinned_bytes']
+                # 淘汰期间又有写入越过高水位则继续；没有可淘汰的条目时停止，避免空转
+                if freed == 0 or unpinned <= self.high_water:
+                    if freed == 0 and unpinned > self.high_water:
+                        self._idle_until = time.monotonic() + EVICTION_RETRY_SECONDS
+                    self._evicting = False
+                    return
+
+    def wait_idle(self, timeout: float = 30.0) -> bool:
+        """等待后台淘汰结束（评测 / 脚本使用）"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._evicting:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            usage = dict(self._usage)
+            stats = dict(self._stats)
+            evicting = self._evicting
+        unpinned = usage['total_bytes'] - usage['pinned_bytes']
+        return {
+            **usage,
+            'unpinned_bytes': unpinned,
+            'max_bytes': self.max_bytes,
+            'high_water_bytes': self.high_water,
+            'low_water_bytes': self.low_water,
+            'usage_percent': unpinned * 100.0 / self.max_bytes if self.max_bytes else 0.0,
+            'policy': self.config['policy'],
+            'enabled': self.config['enabled'],
+            'evicting': evicting,
+            **stats,
+        }
+
+
+# 全局单例（按数据库路径）
+_budgets: Dict[str, CacheBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_cache_budget_manager(db_path: Optional[str] = None) -> Optional[CacheBudget]:
+    """
+    获取缓存预算单例
+
+    Args:
+        db_path: 数据库路径（可选，不提供则从 PathManager 获取）
+
+    Returns:
+        CacheBudget 实例；数据库还没有 local_cache 表时返回 None（下次调用重试）
+    """
+    if db_path is None:
+        from common import PathManager
+        db_path = PathManager.get_instance().db_path
+    db_path = str(db_path)
+
+    with _budgets_lock:
+        budget = _budgets.get(db_path)
+        if budget is None:
+            budget = CacheBudget(db_path)
+            if not budget.ready:
+                return None
+            _budgets[db_path] = budget
+        return budget
@@ -0,0 +1,319 @@
+"""
+缓存淘汰引擎
+
+按策略在 SQL 中为 local_cache 的每个条目计算淘汰分数（越小越先淘汰），
+一次排序写入临时表后按页流式读取，逐页删除，直到释放的字节数达到目标或候选耗尽：
+- 不受候选数量上限限制（旧实现只看最旧的 100 个文件，常常达不到目标）
+- 高频文件不再被永久保护，只是分数更高、更晚被淘汰
+- 删除时校验条目在生成计划后未被访问 / 替换，避免误删刚用过的文件
+- dry_run 只生成报告（将淘汰的条目、按类型汇总、是否能达到目标），不删除任何东西
+- redownloadable_only 只淘汰云端有副本的文件（自动淘汰使用，不删除用户导出的原始文件）
+- 淘汰 WAV 后清空胶囊的 local_wav_*，云端有副本的胶囊 asset_status 改回 cloud_only
+
+内置策略：
+- lru:  最久未访问优先
+- lfu:  访问次数最少优先（同次数按最久未访问）
+- gdsf: 大小感知（GreedyDual-Size-Frequency 的近似）：
+        分数 = 最后访问时间（天） + 访问次数 × unit_bytes / 文件大小，
+        以最后访问时间代替 GDSF 的膨胀时钟 L；默认 unit_bytes = 1MB，
+        即 1MB 文件每被访问一次相当于晚一天被淘汰，大文件的访问次数权重按大小折算
+
+可通过 register_eviction_policy() 注册自定义策略（一个 SQL 分数表达式）。
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EvictionPolicy:
+    """淘汰策略：对 local_cache（别名 lc）的 SQL 分数表达式，越小越先淘汰"""
+    name: str
+    score_sql: str
+    description: str = ''
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+EVICTION_POLICIES: Dict[str, EvictionPolicy] = {}
+
+
+def register_eviction_policy(policy: EvictionPolicy):
+    """
+    注册淘汰策略（同名覆盖）
+
+    Args:
+        policy: EvictionPolicy（score_sql 中可使用 :参数名，取值来自 policy.params）
+    """
+    EVICTION_POLICIES[policy.name] = policy
+
+
+register_eviction_policy(EvictionPolicy(
+    name='lru',
+    score_sql="julianday(COALESCE(lc.last_accessed_at, lc.created_at, '1970-01-01'))",
+    description='最久未访问优先'
+))
+register_eviction_policy(EvictionPolicy(
+    name='lfu',
+    score_sql=("COALESCE(lc.access_count, 0) * 100000.0 "
+               "+ julianday(COALESCE(lc.last_accessed_at, lc.created_at, '1970-01-01')) - 2440000"),
+    description='访问次数最少优先（同次数按最久未访问）'
+))
+register_eviction_policy(EvictionPolicy(
+    name='gdsf',
+    score_sql=("julianday(COALESCE(lc.last_accessed_at, lc.created_at, '1970-01-01')) "
+               "+ MAX(COALESCE(lc.access_count, 0), 1) * :unit_bytes / MAX(COALESCE(lc.file_size, 0), 1)"),
+    description='大小感知：小而常用的文件保留更久，大而少用的文件优先淘汰',
+    params={'unit_bytes': 1024 * 1024}
+))
+
+
+# 自动淘汰只考虑可以重新下载的胶囊：已上传到云端、不是本地原始导出、不在下载中
+_REDOWNLOADABLE_CAPSULES_SQL = """
+    SELECT id FROM capsules
+    WHERE cloud_id IS NOT NULL AND cloud_id != ''
+    AND COALESCE(asset_status, 'local') NOT IN ('local', 'downloading')
+"""
+
+# 对应胶囊 local_wav_path 的缓存类型（单个 WAV 或整个 Audio 文件夹）
+_WAV_FILE_TYPES = ('wav', 'audio_folder')
+
+
+def get_eviction_policy(name: str) -> EvictionPolicy:
+    """
+    获取淘汰策略
+
+    Raises:
+        ValueError: 未知策略
+    """
+    policy = EVICTION_POLICIES.get(name)
+    if policy is None:
+        raise ValueError(f"未知淘汰策略: {name}（可选: {', '.join(sorted(EVICTION_POLICIES))}）")
+    return policy
+
+
+class CacheEvictionEngine:
+    """按策略分页淘汰 local_cache 条目，直到释放足够空间"""
+
+    def __init__(self, db_path: str, policy: str = 'lru', page_size: int = 500):
+        """
+        Args:
+            db_path: 数据库路径
+            policy: 策略名（见 EVICTION_POLICIES）
+            page_size: 每页处理的条目数（每页一个删除事务）
+        """
+        self.db_path = db_path
+        self.policy = get_eviction_policy(policy)
+        self.page_size = max(1, int(page_size))
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _remove_file(self, file_path: str) -> bool:
+        """删除缓存文件，返回文件是否存在（不存在视为过期条目）"""
+        try:
+            os.remove(file_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                            (name,)).fetchone() is not None
+
+    def _redownloadable_filter(self, conn: sqlite3.Connection, alias: str = '') -> str:
+        """
+        只保留可重新下载的条目的 SQL 条件
+
+        scan_local_cache 登记的文件（local_file_scan）是用户自己的导出，即使胶囊状态
+        被同步自愈改写也不淘汰。没有 capsules 表时无法判断，返回恒假条件。
+        """
+        if not self._has_table(conn, 'capsules'):
+            return '0'
+        condition = f"{alias}capsule_id IN ({_REDOWNLOADABLE_CAPSULES_SQL})"
+        if self._has_table(conn, 'local_file_scan'):
+            condition += f" AND {alias}file_path NOT IN (SELECT file_path FROM local_file_scan)"
+        return condition
+
+    def _build_plan(self, conn: sqlite3.Connection, keep_pinned: bool, redownloadable_only: bool) -> int:
+        """计算分数并按分数排序写入临时表，返回候选数"""
+        conditions = []
+        if keep_pinned:
+            conditions.append('COALESCE(lc.is_pinned, 0) = 0')
+        if redownloadable_only:
+            conditions.append(self._redownloadable_filter(conn, 'lc.'))
+
+        conn.execute("DROP TABLE IF EXISTS temp.eviction_plan")
+        conn.execute(f"""
+            CREATE TEMP TABLE eviction_plan AS
+            SELECT lc.id, lc.capsule_id, lc.file_type, lc.file_path,
+                   COALESCE(lc.file_size, 0) AS file_size,
+                   lc.last_accessed_at, COALESCE(lc.access_count, 0) AS access_count,
+                   lc.updated_at,
+                   ({self.policy.score_sql}) AS score
+            FROM local_cache lc
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY score ASC, lc.id ASC
+        """, self.policy.params)
+        return conn.execute("SELECT COUNT(*) FROM temp.eviction_plan").fetchone()[0]
+
+    def evict(self, bytes_to_free: int, dry_run: bool = False, keep_pinned: bool = True,
+              report_limit: int = 50, redownloadable_only: bool = False) -> Dict[str, Any]:
+        """
+        淘汰缓存直到释放 bytes_to_free 字节（按 local_cache 记录的大小计）
+
+        Args:
+            bytes_to_free: 目标释放字节数
+            dry_run: 只生成报告，不删除文件和记录
+            keep_pinned: 跳过固定缓存
+            report_limit: 报告中列出的条目数上限
+            redownloadable_only: 只淘汰云端有副本的文件（跳过本地原始导出）
+
+        Returns:
+            {
+                'policy': str, 'dry_run': bool,
+                'bytes_to_free': int, 'space_freed': int, 'target_met': bool,
+                'files_deleted': int, 'stale_entries': int, 'files_skipped': int,
+                'candidates': int, 'candidates_scanned': int, 'pages': int,
+                'by_type': {file_type: {'count': int, 'size': int}},
+                'evicted': [{capsule_id, file_type, file_path, file_size, access_count, score}, ...],
+                'errors': [str], 'duration_seconds': float
+            }
+        """
+        started = time.perf_counter()
+        result = {
+            'policy': self.policy.name,
+            'dry_run': dry_run,
+            'bytes_to_free': max(0, int(bytes_to_free)),
+            'space_freed': 0,
+            'target_met': False,
+            'files_deleted': 0,
+            'stale_entries': 0,
+            'files_skipped': 0,
+            'candidates': 0,
+            'candidates_scanned': 0,
+            'pages': 0,
+            'by_type': {},
+            'evicted': [],
+            'errors': [],
+        }
+
+        if result['bytes_to_free'] == 0:
+            result['target_met'] = True
+            result['duration_seconds'] = round(time.perf_counter() - started, 3)
+            return result
+
+        conn = self._get_connection()
+        try:
+            result['candidates'] = self._build_plan(conn, keep_pinned, redownloadable_only)
+            conn.commit()
+
+            guards = ''
+            if keep_pinned:
+                guards += ' AND COALESCE(is_pinned, 0) = 0'
+            if redownloadable_only:
+                # 生成计划后胶囊可能开始下载或被改回本地状态
+                guards += f' AND {self._redownloadable_filter(conn)}'
+            has_capsules = self._has_table(conn, 'capsules')
+
+            last_rowid = 0
+            while result['space_freed'] < result['bytes_to_free']:
+                page = conn.execute("""
+                    SELECT rowid, * FROM temp.eviction_plan
+                    WHERE rowid > ?
+                    ORDER BY rowid
+                    LIMIT ?
+                """, (last_rowid, self.page_size)).fetchall()
+                if not page:
+                    break
+                last_rowid = page[-1]['rowid']
+                result['pages'] += 1
+
+                removed = []
+                wav_capsules = []
+                for entry in page:
+                    if result['space_freed'] >= result['bytes_to_free']:
+                        break
+                    result['candidates_scanned'] += 1
+
+                    if not dry_run:
+                        # 只删除生成计划后未被访问 / 替换 / 固定的条目
+                        cursor = conn.execute(f"""
+                            DELETE FROM local_cache
+                            WHERE id = ?
+                            AND last_accessed_at IS ?
+                            AND updated_at IS ?
+                            {guards}
+                        """, (entry['id'], entry['last_accessed_at'], entry['updated_at']))
+                        if cursor.rowcount == 0:
+                            result['files_skipped'] += 1
+                            continue
+                        removed.append(entry)
+                        if entry['file_type'] in _WAV_FILE_TYPES:
+                            wav_capsules.append(entry['capsule_id'])
+
+                    self._account(result, entry, report_limit)
+
+                if dry_run:
+                    continue
+                if wav_capsules and has_capsules:
+                    # 本地 WAV 已不存在：与删除记录在同一事务中更新胶囊状态
+                    conn.executemany("""
+                        UPDATE capsules
+                        SET local_wav_path = NULL,
+                            local_wav_size = NULL,
+                            local_wav_hash = NULL,
+                            asset_status = CASE WHEN cloud_id IS NOT NULL AND cloud_id != ''
+                                                THEN 'cloud_only' ELSE asset_status END
+                        WHERE id = ?
+                    """, [(capsule_id,) for capsule_id in wav_capsules])
+                conn.commit()
+
+                # 记录已提交后再删除文件（删除失败只留下孤立文件，不会留下指向不存在文件的记录）
+                for entry in removed:
+                    try:
+                        if not self._remove_file(entry['file_path']):
+                            result['stale_entries'] += 1
+                    except OSError as e:
+                        result['errors'].append(f"删除文件失败 {entry['file_path']}: {e}")
+
+            conn.execute("DROP TABLE IF EXISTS temp.eviction_plan")
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        result['target_met'] = result['space_freed'] >= result['bytes_to_free']
+        result['duration_seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+    @staticmethod
+    def _account(result: Dict[str, Any], entry: sqlite3.Row, report_limit: int):
+        """把一个淘汰（或计划淘汰）的条目计入结果"""
+        size = entry['file_size']
+        result['space_freed'] += size
+        result['files_deleted'] += 1
+
+        by_type = result['by_type'].setdefault(entry['file_type'], {'count': 0, 'size': 0})
+        by_type['count'] += 1
+        by_type['size'] += size
+
+        if len(result['evicted']) < report_limit:
+            result['evicted'].append({
+                'capsule_id': entry['capsule_id'],
+                'file_type': entry['file_type'],
+                'file_path': entry['file_path'],
+                'file_size': size,
+                'access_count': entry['access_count'],
+                'last_accessed_at': entry['last_accessed_at'],
+                'score': entry['score'],
+            })
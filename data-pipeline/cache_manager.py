@@ -2,10 +2,10 @@
 缓存管理器（Phase B）
 
 功能：
-1. LRU 缓存清理策略
+1. 可选淘汰策略（LRU / LFU / 大小感知 GDSF，见 cache_eviction.py）
 2. 最大缓存限制（默认5GB）
 3. 保护用户固定缓存
-4. 按优先级清理
+4. 分页淘汰直到达到目标大小，支持干运行报告
 
 使用示例：
     manager = CacheManager(
@@ -20,8 +20,6 @@
     print(f"释放了 {result['space_freed']} bytes")
 """
 
-import os
-from pathlib import Path
 from typing import Dict, Any, List, Optional
 
 
@@ -29,7 +27,7 @@ class CacheManager:
     """
     缓存管理器
 
-    实现 LRU（Least Recently Used）缓存清理策略
+    按策略（默认 LRU）清理缓存，淘汰由 CacheEvictionEngine 执行
     """
 
     def __init__(
@@ -82,23 +80,27 @@ class CacheManager:
         self,
         keep_pinned: bool = True,
         max_size_to_free: Optional[int] = None,
-        dry_run: bool = False
+        dry_run: bool = False,
+        policy: str = 'lru'
     ) -> Dict[str, Any]:
         """
-        清理旧缓存（LRU 策略）
+        清理旧缓存（默认 LRU 策略）
 
         Args:
             keep_pinned: 是否保留固定缓存
-            max_size_to_free: 最大释放空间（字节），如果为 None 则清理到低于 max_cache_size
-            dry_run: 干运行模式（不实际删除文件）
+            max_size_to_free: 最大释放空间（字节），如果为 None 则清理到低于 max_cache_size 的 90%
+            dry_run: 干运行模式（不实际删除文件，只返回淘汰报告）
+            policy: 淘汰策略（lru / lfu / gdsf，见 cache_eviction.py）
 
         Returns:
-            清理结果：
+            清理结果（CacheEvictionEngine.evict 的报告）：
             {
                 'files_deleted': int,
                 'space_freed': int,
                 'files_skipped': int,
-                'errors': List[str]
+                'target_met': bool,
+                'errors': List[str],
+                ...
             }
         """
         print("=" * 60)
@@ -107,14 +109,7 @@ class CacheManager:
 
         # 1. 获取当前缓存状态
         status = self.get_cache_status()
-
-        print(f"📊 当前缓存状态:")
-        print(f"   总文件数: {status['total_cached_files']}")
-        print(f"   总大小: {self._format_size(status['total_cache_size'])}")
-        print(f"   最大限制: {self._format_size(self.max_cache_size)}")
-        print(f"   使用率: {status['usage_percent']:.1f}%")
-        print(f"   固定文件: {status['pinned_files_count']} ({self._format_size(status['pinned_files_size'])})")
-        print()
+        self._print_status(status)
 
         # 2. 计算需要清理的空间
         if max_size_to_free is None:
@@ -122,114 +117,7 @@ class CacheManager:
             target_size = int(self.max_cache_size * 0.9)
             max_size_to_free = max(0, status['total_cache_size'] - target_size)
 
-        if max_size_to_free == 0:
-            print("✅ 缓存大小正常，无需清理")
-            return {
-                'files_deleted': 0,
-                'space_freed': 0,
-                'files_skipped': 0,
-                'errors': []
-            }
-
-        print(f"🎯 目标: 释放 {self._format_size(max_size_to_free)}")
-        if dry_run:
-            print("⚠️  干运行模式：不会实际删除文件")
-        print()
-
-        # 3. 获取 LRU 清理候选列表
-        candidates = self.db.get_lru_cache_candidates(limit=100)
-
-        if not candidates:
-            print("✅ 没有可清理的文件")
-            return {
-                'files_deleted': 0,
-                'space_freed': 0,
-                'files_skipped': 0,
-                'errors': []
-            }
-
-        print(f"📋 找到 {len(candidates)} 个清理候选")
-        print()
-
-        # 4. 按优先级清理
-        result = {
-            'files_deleted': 0,
-            'space_freed': 0,
-            'files_skipped': 0,
-            'errors': []
-        }
-
-        space_freed = 0
-
-        for candidate in candidates:
-            # 检查是否已释放足够空间
-            if space_freed >= max_size_to_free:
-                break
-
-            capsule_id = candidate['capsule_id']
-            file_type = candidate['file_type']
-            file_path = candidate['file_path']
-            file_size = candidate['file_size']
-            capsule_name = candidate['capsule_name']
-
-            # 检查是否是固定缓存
-            if keep_pinned and candidate.get('is_pinned'):
-                result['files_skipped'] += 1
-                print(f"⏭️  跳过固定缓存: {capsule_name}")
-                continue
-
-            # 检查文件是否存在
-            if not Path(file_path).exists():
-                print(f"⚠️  文件不存在，跳过: {file_path}")
-                result['files_skipped'] += 1
-                continue
-
-            # 删除文件
-            try:
-                if not dry_run:
-                    os.remove(file_path)
-                    print(f"🗑️  删除: {capsule_name} ({self._format_size(file_size)})")
-                else:
-                    print(f"[DRY RUN] 会删除: {capsule_name} ({self._format_size(file_size)})")
-
-                # 从数据库删除缓存记录
-                if not dry_run:
-                    self.db.delete_cache_entry(capsule_id, file_type)
-
-                result['files_deleted'] += 1
-                space_freed += file_size
-
-            except Exception as e:
-                error_msg = f"删除文件失败 {file_path}: {e}"
-                print(f"❌ {error_msg}")
-                result['errors'].append(error_msg)
-
-        result['space_freed'] = space_freed
-
-        # 5. 打印总结
-        print()
-        print("=" * 60)
-        print("📊 清理完成")
-        print("=" * 60)
-        print(f"删除文件: {result['files_deleted']}")
-        print(f"跳过文件: {result['files_skipped']}")
-        print(f"释放空间: {self._format_size(result['space_freed'])}")
-        if result['errors']:
-            print(f"错误数量: {len(result['errors'])}")
-        print()
-
-        # 更新后的状态
-        if not dry_run:
-            new_status = self.get_cache_status()
-            print(f"📊 新缓存状态:")
-            print(f"   总大小: {self._format_size(new_status['total_cache_size'])}")
-            print(f"   使用率: {new_status['usage_percent']:.1f}%")
-        else:
-            print("⚠️  干运行模式：数据库未更新")
-
-        print("=" * 60)
-
-        return result
+        return self._evict(max_size_to_free, policy, keep_pinned, dry_run)
 
     def pin_cache(self, capsule_id: int, file_type: str) -> bool:
         """
@@ -306,29 +194,35 @@ class CacheManager:
         self,
         target_usage_percent: float = 80.0,
         keep_frequent: bool = True,
-        min_access_count: int = 3
+        min_access_count: int = 3,
+        policy: str = 'gdsf',
+        dry_run: bool = False
     ) -> Dict[str, Any]:
         """
         智能缓存清理策略（Phase B.5）
 
-        综合考虑以下因素：
-        1. LRU（最后访问时间）
+        默认使用大小感知的 GDSF 策略，综合考虑：
+        1. 最后访问时间
         2. 访问频率（access_count）
-        3. 文件大小
-        4. 固定状态（is_pinned）
-        5. 文件类型（preview 优先于 wav）
+        3. 文件大小（大而少用的文件优先淘汰）
+        4. 固定状态（is_pinned，始终保留）
 
         Args:
             target_usage_percent: 目标使用率（默认 80%）
-            keep_frequent: 是否保留高频访问文件（默认 True）
-            min_access_count: 最小访问次数阈值（默认 3）
+            keep_frequent: 兼容旧参数。高频文件不再被永久保护（否则可能永远达不到目标），
+                           而是由策略分数排在后面淘汰
+            min_access_count: 兼容旧参数（同上）
+            policy: 淘汰策略（lru / lfu / gdsf）
+            dry_run: 干运行模式（只返回淘汰报告）
 
         Returns:
             清理结果：{
                 'files_deleted': int,
                 'space_freed': int,
                 'files_skipped': int,
-                'errors': List[str]
+                'target_met': bool,
+                'errors': List[str],
+                ...
             }
         """
         print("=" * 60)
@@ -337,151 +231,66 @@ class CacheManager:
 
         # 1. 获取当前缓存状态
         status = self.get_cache_status()
-
-        print(f"📊 当前缓存状态:")
-        print(f"   总大小: {self._format_size(status['total_cache_size'])}")
-        print(f"   使用率: {status['usage_percent']:.1f}%")
-        print(f"   固定文件: {status['pinned_files_count']} ({self._format_size(status['pinned_files_size'])})")
-        print()
+        self._print_status(status)
 
         # 2. 检查是否需要清理
         if status['usage_percent'] < target_usage_percent:
             print("✅ 缓存使用率正常，无需清理")
-            return {
-                'files_deleted': 0,
-                'space_freed': 0,
-                'files_skipped': 0,
-                'errors': []
-            }
+            return self._evict(0, policy, True, dry_run)
 
         # 3. 计算需要释放的空间
         target_size = int(self.max_cache_size * (target_usage_percent / 100.0))
         max_size_to_free = max(0, status['total_cache_size'] - target_size)
-
         print(f"🎯 目标使用率: {target_usage_percent}%")
-        print(f"🎯 释放空间: {self._format_size(max_size_to_free)}")
-        print()
-
-        # 4. 获取清理候选（智能排序）
-        candidates = self.db.get_lru_cache_candidates(limit=100)
-
-        if not candidates:
-            print("✅ 没有可清理的文件")
-            return {
-                'files_deleted': 0,
-                'space_freed': 0,
-                'files_skipped': 0,
-                'errors': []
-            }
-
-        # 5. 智能排序清理优先级
-        # 优先级分数 = (访问次数倒数) × (文件大小 / 1MB) × (类型权重)
-        # 类型权重: preview=1.0, wav=0.5, rpp=0.3
-        type_weights = {'preview': 1.0, 'wav': 0.5, 'rpp': 0.3, 'other': 0.7}
 
-        def calculate_priority(candidate):
-            """计算清理优先级（分数越高越应该清理）"""
-            access_count = max(1, candidate.get('access_count', 0))
-            file_size = candidate.get('file_size', 0)
-            file_type = candidate.get('file_type', 'other')
-            is_pinned = candidate.get('is_pinned', 0)
+        return self._evict(max_size_to_free, policy, True, dry_run)
 
-            # 固定缓存不清理
-            if is_pinned:
-                return -1
-
-            # 访问频率保护
-            if keep_frequent and access_count >= min_access_count:
-                return -1
-
-            # 计算分数
-            access_score = 1.0 / access_count  # 访问越少，分数越高
-            size_score = file_size / (1024 * 1024)  # 文件越大，分数越高
-            type_weight = type_weights.get(file_type, type_weights['other'])
-
-            return access_score * size_score * type_weight
-
-        # 按优先级排序
-        sorted_candidates = sorted(candidates, key=calculate_priority, reverse=True)
-
-        print(f"📋 清理候选（按优先级排序）: {len(sorted_candidates)} 个")
+    def _print_status(self, status: Dict[str, Any]):
+        print(f"📊 当前缓存状态:")
+        print(f"   总文件数: {status['total_cached_files']}")
+        print(f"   总大小: {self._format_size(status['total_cache_size'])}")
+        print(f"   最大限制: {self._format_size(self.max_cache_size)}")
+        print(f"   使用率: {status['usage_percent']:.1f}%")
+        print(f"   固定文件: {status['pinned_files_count']} ({self._format_size(status['pinned_files_size'])})")
         print()
 
-        # 6. 执行清理
-        result = {
-            'files_deleted': 0,
-            'space_freed': 0,
-            'files_skipped': 0,
-            'errors': []
-        }
-
-        space_freed = 0
-
-        for candidate in sorted_candidates:
-            # 检查是否已释放足够空间
-            if space_freed >= max_size_to_free:
-                break
-
-            capsule_id = candidate['capsule_id']
-            file_type = candidate['file_type']
-            file_path = candidate['file_path']
-            file_size = candidate['file_size']
-            capsule_name = candidate.get('capsule_name', 'Unknown')
-            access_count = candidate.get('access_count', 0)
-            priority_score = calculate_priority(candidate)
-
-            # 检查文件是否存在
-            if not Path(file_path).exists():
-                print(f"⚠️  文件不存在，跳过: {file_path}")
-                result['files_skipped'] += 1
-                continue
-
-            # 删除文件
-            try:
-                os.remove(file_path)
-                print(f"🗑️  删除: {capsule_name}")
-                print(f"   类型: {file_type}, 大小: {self._format_size(file_size)}, 访问: {access_count} 次, 优先级: {priority_score:.2f}")
+    def _evict(self, max_size_to_free: int, policy: str, keep_pinned: bool, dry_run: bool) -> Dict[str, Any]:
+        """按策略淘汰直到释放 max_size_to_free 字节，并打印总结"""
+        from cache_eviction import CacheEvictionEngine
 
-                # 从数据库删除缓存记录
-                self.db.delete_cache_entry(capsule_id, file_type)
+        engine = CacheEvictionEngine(self.db.db_path, policy=policy)
 
-                result['files_deleted'] += 1
-                space_freed += file_size
-
-                # 检查是否已释放足够空间
-                if space_freed >= max_size_to_free:
-                    print(f"\n✅ 已释放足够空间: {self._format_size(space_freed)}")
-                    break
+        if max_size_to_free <= 0:
+            print("✅ 缓存大小正常，无需清理")
+            return engine.evict(0, dry_run=dry_run)
 
-            except Exception as e:
-                error_msg = f"删除文件失败 {file_path}: {e}"
-                print(f"❌ {error_msg}")
-                result['errors'].append(error_msg)
+        print(f"🎯 目标: 释放 {self._format_size(max_size_to_free)}（策略: {policy}）")
+        if dry_run:
+            print("⚠️  干运行模式：不会实际删除文件")
+        print()
 
-        result['space_freed'] = space_freed
+        result = engine.evict(max_size_to_free, dry_run=dry_run, keep_pinned=keep_pinned)
 
-        # 7. 打印总结
-        print()
         print("=" * 60)
-        print("📊 清理完成")
+        print("📊 清理完成" if not dry_run else "📊 清理计划（干运行）")
         print("=" * 60)
-        print(f"删除文件: {result['files_deleted']}")
+        print(f"{'删除文件' if not dry_run else '将删除文件'}: {result['files_deleted']}"
+              f"（扫描 {result['candidates_scanned']}/{result['candidates']} 个候选，{result['pages']} 页）")
+        for file_type, type_stats in result['by_type'].items():
+            print(f"   {file_type}: {type_stats['count']} 个, {self._format_size(type_stats['size'])}")
         print(f"跳过文件: {result['files_skipped']}")
         print(f"释放空间: {self._format_size(result['space_freed'])}")
-
+        if not result['target_met']:
+            print(f"⚠️  未达到目标：可淘汰的缓存不足（固定缓存不会被清理）")
         if result['errors']:
             print(f"错误数量: {len(result['errors'])}")
 
-        print()
-
-        # 更新后的状态
-        new_status = self.get_cache_status()
-        print(f"📊 新缓存状态:")
-        print(f"   总大小: {self._format_size(new_status['total_cache_size'])}")
-        print(f"   使用率: {new_status['usage_percent']:.1f}%")
-
+        if not dry_run:
+            new_status = self.get_cache_status()
+            print(f"📊 新缓存状态:")
+            print(f"   总大小: {self._format_size(new_status['total_cache_size'])}")
+            print(f"   使用率: {new_status['usage_percent']:.1f}%")
         print("=" * 60)
-        print()
 
         return result
 
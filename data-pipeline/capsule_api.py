@@ -1052,9 +1052,17 @@ def stream_preview(capsule_id, filename=None):
                     print(f"  ✓ 找到文件: {preview_file}")
                     break
         
+        # 预览命中率统计（供预取服务评估）
+        from preview_prefetch import get_preview_prefetcher
+        prefetcher = get_preview_prefetcher(db.db_path)
+
         if not preview_file.exists():
+            prefetcher.metrics.record_request(hit=False, capsule_id=capsule_id)
             raise APIError(f"预览音频文件不存在: {preview_audio}", 404)
 
+        prefetcher.metrics.record_request(hit=True, prefetched=prefetcher.was_prefetched(capsule_id),
+                                          capsule_id=capsule_id)
+
         # 转换为绝对路径
         preview_file = preview_file.resolve()
 
@@ -1071,6 +1079,88 @@ def stream_preview(capsule_id, filename=None):
         raise APIError(f"获取预览失败: {e}", 500)
 
 
+@app.route('/api/previews/prefetch', methods=['GET', 'POST'])
+def prefetch_previews():
+    """
+    预览预取提示 / 状态
+
+    POST 请求体（每次提示替换之前尚未开始的预取）:
+        {
+            "visible": [1, 2, 3],        // 当前视口 / 棱镜区域中可见的胶囊
+            "searches": ["warm pad"],    // 最近的搜索
+            "nearby": [4, 5]             // 附近的胶囊（可选，最低优先级）
+        }
+
+    响应:
+        {
+            "success": true,
+            "hint": {"generation": 3, "queued": 12, "dropped": 5},   // 仅 POST
+            "status": {..., "metrics": {"hit_rate": 0.92, "ttfa_ms": {...}}}
+        }
+    """
+    try:
+        from preview_prefetch import get_preview_prefetcher
+        prefetcher = get_preview_prefetcher(get_database().db_path)
+
+        response = {'success': True}
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            visible = data.get('visible') or []
+            searches = data.get('searches') or []
+            nearby = data.get('nearby') or []
+            if not all(isinstance(v, list) for v in (visible, searches, nearby)):
+                raise APIError('visible / searches / nearby 必须是数组', 400)
+            response['hint'] = prefetcher.hint(visible=visible, searches=searches, nearby=nearby)
+
+        response['status'] = prefetcher.get_status()
+        return jsonify(response)
+
+    except APIError:
+        raise
+    except Exception as e:
+        logger.error(f"预览预取失败: {e}")
+        raise APIError(f"预览预取失败: {e}", 500)
+
+
+@app.route('/api/previews/playback', methods=['POST'])
+def report_preview_playback():
+    """
+    前端上报预览的首次出声时间（点击播放到第一帧音频）
+
+    请求体:
+        {
+            "capsule_id": 1,
+            "ttfa_ms": 85,
+            "cache_hit": true   // 可选，不提供时按该胶囊最近一次预览请求判断
+        }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            ttfa_ms = float(data['ttfa_ms'])
+        except (KeyError, TypeError, ValueError):
+            raise APIError('缺少必要参数: ttfa_ms', 400)
+        if ttfa_ms < 0:
+            raise APIError('ttfa_ms 不能为负数', 400)
+
+        from preview_prefetch import get_preview_prefetcher
+        metrics = get_preview_prefetcher(get_database().db_path).metrics
+        if data.get('cache_hit') is not None:
+            cache_hit = bool(data['cache_hit'])
+        else:
+            try:
+                cache_hit = metrics.last_hit(int(data.get('capsule_id')))
+            except (TypeError, ValueError):
+                cache_hit = None
+        metrics.record_ttfa(ttfa_ms, cache_hit)
+        return jsonify({'success': True})
+
+    except APIError:
+        raise
+    except Exception as e:
+        raise APIError(f"记录播放指标失败: {e}", 500)
+
+
 @app.route('/api/capsules/<int:capsule_id>/metadata', methods=['GET'])
 def get_capsule_metadata(capsule_id):
     """
@@ -3111,7 +3201,16 @@ def get_download_status(capsule_id):
             })
 
         # 获取最新的下载任务
-        task = tasks[0]
+        task = dict(tasks[0])
+
+        # 下载中的任务以内存中的实时进度为准（数据库按批量间隔更新）
+        if task['status'] == 'downloading':
+            from download_progress import get_download_progress_registry
+            live = get_download_progress_registry(db.db_path).get(task['id'])
+            if live and live.get('status') == 'downloading':
+                for key in ('progress', 'downloaded_bytes', 'speed', 'eta_seconds'):
+                    if live.get(key) is not None:
+                        task[key] = live[key]
 
         # 格式化响应
         response = {
@@ -3303,6 +3402,13 @@ def get_cache_stats():
             "by_type": {
                 "preview": {"count": 50, "size": 52428800},
                 "wav": {"count": 20, "size": 1024*1024*100}
+            },
+            "budget": {                     // 写入时执行的缓存预算（见 cache_budget.py）
+                "unpinned_bytes": 968884224,
+                "high_water_bytes": 5100273664,
+                "low_water_bytes": 4294967296,
+                "evicting": false,
+                ...
             }
         }
     """
@@ -3326,6 +3432,10 @@ def get_cache_stats():
         # 获取缓存状态
         status = manager.get_cache_status()
 
+        from cache_budget import get_cache_budget_manager
+        budget = get_cache_budget_manager(manager.db.db_path)
+        status['budget'] = budget.get_status() if budget else None
+
         return jsonify(status)
 
     except APIError:
@@ -3342,7 +3452,9 @@ def purge_cache():
     请求体:
         {
             "keep_pinned": true,
-            "max_size_to_free": 536870912  // 可选，释放的最大空间
+            "max_size_to_free": 536870912,  // 可选，释放的最大空间
+            "policy": "lru",                // 可选，淘汰策略（lru / lfu / gdsf）
+            "dry_run": false                // 可选，只返回淘汰报告
         }
 
     需要认证
@@ -3353,6 +3465,8 @@ def purge_cache():
             "files_deleted": 10,
             "space_freed": 104857600,
             "files_skipped": 5,
+            "target_met": true,
+            "evicted": [...],
             "errors": []
         }
     """
@@ -3367,6 +3481,8 @@ def purge_cache():
         data = request.get_json() or {}
         keep_pinned = data.get('keep_pinned', True)
         max_size_to_free = data.get('max_size_to_free')
+        policy = data.get('policy', 'lru')
+        dry_run = bool(data.get('dry_run', False))
 
         from cache_manager import create_cache_manager
 
@@ -3378,10 +3494,15 @@ def purge_cache():
         )
 
         # 执行清理
-        result = manager.purge_old_cache(
-            keep_pinned=keep_pinned,
-            max_size_to_free=max_size_to_free
-        )
+        try:
+            result = manager.purge_old_cache(
+                keep_pinned=keep_pinned,
+                max_size_to_free=max_size_to_free,
+                dry_run=dry_run,
+                policy=policy
+            )
+        except ValueError as e:
+            raise APIError(str(e), 400)
 
         return jsonify({
             'success': True,
@@ -3487,13 +3608,15 @@ def smart_cache_purge(current_user):
     """
     智能缓存清理（Phase B.5）
 
-    综合考虑 LRU、访问频率、文件大小、固定状态等因素
+    综合考虑 LRU、访问频率、文件大小、固定状态等因素（默认 GDSF 策略）
 
     请求体:
         {
             "target_usage_percent": 80.0,  // 目标使用率（默认 80%）
-            "keep_frequent": true,          // 是否保留高频访问文件
-            "min_access_count": 3            // 最小访问次数阈值
+            "keep_frequent": true,          // 兼容旧参数
+            "min_access_count": 3,           // 兼容旧参数
+            "policy": "gdsf",                // 淘汰策略（lru / lfu / gdsf）
+            "dry_run": false                 // 只返回淘汰报告
         }
 
     需要认证
@@ -3505,6 +3628,11 @@ def smart_cache_purge(current_user):
                 "files_deleted": 5,
                 "space_freed": 52428800,
                 "files_skipped": 2,
+                "target_met": true,
+                "dry_run": false,
+                "policy": "gdsf",
+                "by_type": {"wav": {"count": 3, "size": 41943040}},
+                "evicted": [...],
                 "errors": []
             }
         }
@@ -3514,6 +3642,8 @@ def smart_cache_purge(current_user):
         target_usage_percent = data.get('target_usage_percent', 80.0)
         keep_frequent = data.get('keep_frequent', True)
         min_access_count = data.get('min_access_count', 3)
+        policy = data.get('policy', 'gdsf')
+        dry_run = bool(data.get('dry_run', False))
 
         logger.info("\n" + "=" * 60)
         logger.info("🧠 智能缓存清理请求")
@@ -3522,20 +3652,29 @@ def smart_cache_purge(current_user):
         logger.info(f"目标使用率: {target_usage_percent}%")
         logger.info(f"保留高频文件: {keep_frequent}")
         logger.info(f"最小访问次数: {min_access_count}")
-        logger.info()
+        logger.info(f"淘汰策略: {policy}{'（干运行）' if dry_run else ''}")
 
         # 导入 CacheManager
         from cache_manager import create_cache_manager
 
         # 创建缓存管理器
-        cache_manager = create_cache_manager()
+        max_cache_size = int(os.getenv('MAX_CACHE_SIZE', 5 * 1024 * 1024 * 1024))  # 5GB
+        cache_manager = create_cache_manager(
+            db_path=get_database().db_path.replace('sqlite:///', ''),
+            max_cache_size=max_cache_size
+        )
 
         # 执行智能清理
-        result = cache_manager.smart_cache_cleanup(
-            target_usage_percent=target_usage_percent,
-            keep_frequent=keep_frequent,
-            min_access_count=min_access_count
-        )
+        try:
+            result = cache_manager.smart_cache_cleanup(
+                target_usage_percent=float(target_usage_percent),
+                keep_frequent=keep_frequent,
+                min_access_count=min_access_count,
+                policy=policy,
+                dry_run=dry_run
+            )
+        except ValueError as e:
+            raise APIError(str(e), 400)
 
         logger.info(f"✅ 智能清理完成: 删除 {result['files_deleted']} 个文件, 释放 {cache_manager._format_size(result['space_freed'])}")
 
@@ -3545,6 +3684,11 @@ def smart_cache_purge(current_user):
                 'files_deleted': result['files_deleted'],
                 'space_freed': result['space_freed'],
                 'files_skipped': result['files_skipped'],
+                'target_met': result['target_met'],
+                'dry_run': result['dry_run'],
+                'policy': result['policy'],
+                'by_type': result['by_type'],
+                'evicted': result['evicted'],
                 'errors': result['errors']
             }
         })
@@ -4291,6 +4435,69 @@ def save_config():
         raise APIError(f"保存配置失败: {e}", 500)
 
 
+@app.route('/api/config/network', methods=['GET', 'POST'])
+def download_network_config():
+    """
+    查看 / 调整下载连接池和带宽限制（无需认证）
+
+    请求体（POST，字段均可选，KB/s，0 表示不限）:
+        {
+            "max_kbps": 0,
+            "bulk_kbps": 0,
+            "bulk_kbps_when_interactive": 256,
+            "burst_kb": 1024,
+            "pool_connections": 8,
+            "pool_maxsize": 16
+        }
+
+    响应:
+        {
+            "success": true,
+            "config": {...},
+            "stats": {"interactive": {...}, "normal": {...}, "bulk": {...}}
+        }
+    """
+    from http_pool import configure_http_pool, get_http_pool_status
+
+    try:
+        if request.method == 'POST':
+            data = request.get_json()
+            if not isinstance(data, dict) or not data:
+                raise APIError('请求体不能为空', 400)
+
+            try:
+                config = configure_http_pool(data)
+            except (TypeError, ValueError) as e:
+                raise APIError(f"参数无效: {e}", 400)
+
+            # 写入 config.json，重启后仍然生效
+            from common import PathManager
+            config_file = PathManager.get_instance().get_config_file('config.json')
+            existing_config = {}
+            if config_file.exists():
+                with open(config_file, 'r', encoding='utf-8') as f:
+                    existing_config = json.load(f)
+            existing_config['http_pool'] = config
+            config_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump(existing_config, f, indent=2, ensure_ascii=False)
+
+            logger.info(f"[CONFIG] 下载网络参数已保存: {config}")
+
+        status = get_http_pool_status()
+        return jsonify({
+            'success': True,
+            'config': status['config'],
+            'stats': status['stats']
+        })
+
+    except APIError:
+        raise
+    except Exception as e:
+        logger.error(f"下载网络配置失败: {e}")
+        raise APIError(f"下载网络配置失败: {e}", 500)
+
+
 @app.route('/api/config/reset-local-db', methods=['POST'])
 def reset_local_db():
     """
@@ -4509,6 +4716,13 @@ if __name__ == '__main__':
         conn.close()
         print(f"棱镜表记录数: {total_prisms}（首次安装为 0，同步后从云端拉取）")
 
+    # 启动同步任务队列（恢复上次中断的同步任务）
+    try:
+        from sync_job_queue import get_sync_job_queue
+        get_sync_job_queue(str(db_path))
+    except Exception as e:
+        print(f"⚠️  同步任务队列启动失败: {e}")
+
     # 启动服务器（使用命令行参数中的端口）
     port = ARGS.port
     host = os.getenv('API_HOST', 'localhost')
@@ -11,10 +11,147 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import json
+import hashlib
+import time
 
 
 logger = logging.getLogger(__name__)
 
+# SQLite 默认 SQLITE_MAX_VARIABLE_NUMBER（旧版本为 999），IN (...) 查询按此分块
+_SQLITE_MAX_PARAMS = 900
+
+# 已确认存在列表排序索引的数据库路径
+_LIST_INDEX_ENSURED = set()
+
+# 全文搜索：db_path -> (FTS5 是否可用, 探测时间)
+_FTS_AVAILABLE: Dict[str, tuple] = {}
+
+# FTS5 不可用时多久后重新探测（秒）
+_FTS_RETRY_SECONDS = 300.0
+
+# bm25 列权重：name, description, keywords, tags
+_FTS_BM25_WEIGHTS = (10.0, 2.0, 5.0, 5.0)
+
+# trigram 分词器最短可索引的词长，更短的词回退到 LIKE
+_FTS_MIN_TERM_LENGTH = 3
+
+# FTS5 全文索引（trigram 分词，支持中文），rowid 与 capsules.id 一致，由触发器维护
+_FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS capsules_fts USING fts5(
+    name,
+    description,
+    keywords,
+    tags,
+    tokenize = 'trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS capsules_fts_ai
+AFTER INSERT ON capsules
+BEGIN
+    INSERT INTO capsules_fts (rowid, name, description, keywords, tags)
+    VALUES (
+        NEW.id, NEW.name, NEW.description, NEW.keywords,
+        (SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+         FROM capsule_tags WHERE capsule_id = NEW.id)
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS capsules_fts_au
+AFTER UPDATE OF name, description, keywords ON capsules
+BEGIN
+    DELETE FROM capsules_fts WHERE rowid = OLD.id;
+    INSERT INTO capsules_fts (rowid, name, description, keywords, tags)
+    VALUES (
+        NEW.id, NEW.name, NEW.description, NEW.keywords,
+        (SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+         FROM capsule_tags WHERE capsule_id = NEW.id)
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS capsules_fts_ad
+AFTER DELETE ON capsules
+BEGIN
+    DELETE FROM capsules_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS capsule_tags_fts_ai
+AFTER INSERT ON capsule_tags
+BEGIN
+    UPDATE capsules_fts SET tags = (
+        SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+        FROM capsule_tags WHERE capsule_id = NEW.capsule_id
+    ) WHERE rowid = NEW.capsule_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS capsule_tags_fts_ad
+AFTER DELETE ON capsule_tags
+BEGIN
+    UPDATE capsules_fts SET tags = (
+        SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+        FROM capsule_tags WHERE capsule_id = OLD.capsule_id
+    ) WHERE rowid = OLD.capsule_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS capsule_tags_fts_au
+AFTER UPDATE OF word_cn, word_en, capsule_id ON capsule_tags
+BEGIN
+    UPDATE capsules_fts SET tags = (
+        SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+        FROM capsule_tags WHERE capsule_id = OLD.capsule_id
+    ) WHERE rowid = OLD.capsule_id;
+    UPDATE capsules_fts SET tags = (
+        SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+        FROM capsule_tags WHERE capsule_id = NEW.capsule_id
+    ) WHERE rowid = NEW.capsule_id;
+END;
+"""
+
+
+def _chunked(items: List[Any], size: int):
+    """按固定大小切分列表"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _normalize_tag_rows(capsule_id: int, tags: List[Dict[str, Any]]) -> List[tuple]:
+    """
+    将标签字典规范化为 (lens, word_id, word_cn, word_en, x, y) 元组
+
+    word_id 为空时的默认值规则与 add_capsule_tags 保持一致
+    """
+    rows = []
+    for idx, tag in enumerate(tags):
+        word_id = tag.get('word_id')
+        word_cn = tag.get('word_cn')
+        word_en = tag.get('word_en')
+        lens = tag.get('lens')
+
+        if not word_id:
+            if word_cn:
+                word_id = f"custom_{word_cn}_{idx}"
+            elif word_en:
+                word_id = f"custom_{word_en}_{idx}"
+            else:
+                word_id = f"custom_tag_{capsule_id}_{lens}_{idx}"
+
+        rows.append((lens, word_id, word_cn, word_en, tag.get('x'), tag.get('y')))
+    return rows
+
+
+def _tag_set_hash(rows: List[tuple]) -> str:
+    """
+    计算一组 (lens, word_id, word_cn, word_en, x, y) 标签的内容哈希（与顺序无关）
+
+    坐标保留 4 位小数，避免云端 REAL 往返带来的浮点误差
+    """
+    canonical = sorted(
+        repr((lens, word_id, word_cn, word_en,
+              None if x is None else round(float(x), 4),
+              None if y is None else round(float(y), 4)))
+        for lens, word_id, word_cn, word_en, x, y in rows
+    )
+    return hashlib.sha1("\n".join(canonical).encode("utf-8")).hexdigest()
+
 
 class CapsuleDatabase:
     """胶囊数据库管理类"""
@@ -528,6 +665,216 @@ class CapsuleDatabase:
         finally:
             self.close()
 
+    def bulk_update_capsule_tags(
+        self,
+        capsule_tags: Dict[int, List[Dict[str, Any]]],
+        mark_sync: bool = True
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        批量替换多个胶囊的标签（单事务）
+
+        与 delete_capsule_tags + add_capsule_tags + aggregate_and_update_keywords
+        + mark_for_sync 的组合等价，但全部在一个连接、一次提交内完成：
+        1. 按 (lens, word_id, word_cn, word_en, x, y) 做差异比对，未变化的行保留
+        2. executemany 删除多余的行、插入新增的行
+        3. 用 SQL group_concat 聚合 capsules.keywords
+        4. 按标签均值刷新 capsule_coordinates
+        5. 已上传到云端（有 cloud_id）的胶囊标记 capsule_tags 待同步
+
+        Args:
+            capsule_tags: {capsule_id: [标签字典, ...]}，空列表表示清空标签
+            mark_sync: 是否标记待同步（默认 True）
+
+        Returns:
+            {capsule_id: {'tags_count', 'inserted', 'deleted', 'pending_sync'}}
+        """
+        if not capsule_tags:
+            return {}
+
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            capsule_ids = list(capsule_tags.keys())
+            results = {}
+            delete_rows = []
+            insert_rows = []
+
+            # 一次性读取所有相关胶囊的现有标签
+            existing_by_capsule = {cid: [] for cid in capsule_ids}
+            for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS):
+                placeholders = ",".join(["?"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT id, capsule_id, lens, word_id, word_cn, word_en, x, y
+                    FROM capsule_tags
+                    WHERE capsule_id IN ({placeholders})
+                    ORDER BY id
+                """, chunk)
+                for row in cursor.fetchall():
+                    existing_by_capsule[row['capsule_id']].append(row)
+
+            for capsule_id in capsule_ids:
+                new_tags = _normalize_tag_rows(capsule_id, capsule_tags[capsule_id] or [])
+
+                # 多重集合差异：相同 key 的行按数量保留，其余删除
+                wanted = {}
+                for tag in new_tags:
+                    wanted[tag] = wanted.get(tag, 0) + 1
+
+                deleted = 0
+                for row in existing_by_capsule[capsule_id]:
+                    key = (row['lens'], row['word_id'], row['word_cn'], row['word_en'], row['x'], row['y'])
+                    if wanted.get(key, 0) > 0:
+                        wanted[key] -= 1
+                    else:
+                        delete_rows.append((row['id'],))
+                        deleted += 1
+
+                inserted = 0
+                for key, count in wanted.items():
+                    for _ in range(count):
+                        insert_rows.append((capsule_id,) + key)
+                        inserted += 1
+
+                results[capsule_id] = {
+                    'tags_count': len(new_tags),
+                    'inserted': inserted,
+                    'deleted': deleted,
+                    'pending_sync': False
+                }
+
+            if delete_rows:
+                cursor.executemany("DELETE FROM capsule_tags WHERE id = ?", delete_rows)
+            if insert_rows:
+                cursor.executemany("""
+                    INSERT INTO capsule_tags (
+                        capsule_id, lens, word_id, word_cn, word_en, x, y
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, insert_rows)
+
+            # 只对真正有变化的胶囊做聚合和同步标记
+            changed_ids = [
+                cid for cid, r in results.items() if r['inserted'] or r['deleted']
+            ]
+
+            if changed_ids:
+                self._aggregate_keywords(cursor, changed_ids)
+                self._refresh_coordinates_from_tags(cursor, changed_ids)
+
+                if mark_sync:
+                    for cid in self._mark_tags_pending(cursor, changed_ids):
+                        results[cid]['pending_sync'] = True
+
+            self.conn.commit()
+            print(f"[DB] 批量更新标签: {len(capsule_ids)} 个胶囊, 插入 {len(insert_rows)}, 删除 {len(delete_rows)}")
+            return results
+
+        except Exception as e:
+            self.conn.rollback()
+            print(f"[DB] 批量更新标签失败: {e}")
+            raise
+        finally:
+            self.close()
+
+    def _aggregate_keywords(self, cursor, capsule_ids: List[int]) -> None:
+        """
+        用 group_concat 聚合 capsules.keywords（优先 word_cn，其次 word_en）
+
+        调用方负责提交事务
+        """
+        for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS):
+            placeholders = ",".join(["?"] * len(chunk))
+            cursor.execute(f"""
+                UPDATE capsules
+                SET keywords = (
+                    SELECT group_concat(kw, ', ')
+                    FROM (
+                        SELECT COALESCE(NULLIF(TRIM(word_cn), ''), NULLIF(TRIM(word_en), '')) AS kw
+                        FROM capsule_tags
+                        WHERE capsule_id = capsules.id
+                        ORDER BY id
+                    )
+                    WHERE kw IS NOT NULL
+                )
+                WHERE id IN ({placeholders})
+            """, chunk)
+
+    def _refresh_coordinates_from_tags(self, cursor, capsule_ids: List[int]) -> None:
+        """
+        按各棱镜标签坐标的均值刷新 capsule_coordinates
+
+        棱镜列从表结构中读取（<lens>_x / <lens>_y），不硬编码棱镜 ID。
+        只更新仍有带坐标标签的棱镜（UPSERT），没有这类标签的棱镜坐标保持不变
+        （清空标签不会删除坐标行，非标签来源的棱镜坐标也不会被覆盖）。
+        调用方负责提交事务
+        """
+        cursor.execute("PRAGMA table_info(capsule_coordinates)")
+        columns = {row[1] for row in cursor.fetchall()}
+        lenses = sorted(
+            col[:-2] for col in columns
+            if col.endswith('_x') and f"{col[:-2]}_y" in columns
+        )
+        if not lenses:
+            return
+
+        for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS - 1):
+            placeholders = ",".join(["?"] * len(chunk))
+            for lens in lenses:
+                cursor.execute(f"""
+                    INSERT INTO capsule_coordinates (capsule_id, {lens}_x, {lens}_y)
+                    SELECT capsule_id, AVG(x), AVG(y)
+                    FROM capsule_tags
+                    WHERE lens = ? AND capsule_id IN ({placeholders})
+                    AND x IS NOT NULL AND y IS NOT NULL
+                    GROUP BY capsule_id
+                    ON CONFLICT(capsule_id) DO UPDATE SET
+                        {lens}_x = excluded.{lens}_x,
+                        {lens}_y = excluded.{lens}_y
+                """, [lens] + list(chunk))
+
+    def _mark_tags_pending(self, cursor, capsule_ids: List[int]) -> List[int]:
+        """
+        将已上传到云端的胶囊标记为 capsule_tags 待同步（与 SyncService.mark_for_sync 一致）
+
+        新胶囊（无 cloud_id）的关键词会随整个胶囊一起上传，不需要单独同步。
+        调用方负责提交事务
+
+        Returns:
+            被标记的胶囊 ID 列表
+        """
+        marked = []
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+        for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS):
+            placeholders = ",".join(["?"] * len(chunk))
+            cursor.execute(f"""
+                SELECT id FROM capsules
+                WHERE id IN ({placeholders})
+                AND cloud_id IS NOT NULL AND cloud_id != ''
+            """, chunk)
+            marked += [row[0] for row in cursor.fetchall()]
+
+        if not marked:
+            return marked
+
+        cursor.executemany("""
+            INSERT INTO sync_status (table_name, record_id, sync_state)
+            VALUES ('capsule_tags', ?, 'pending')
+            ON CONFLICT(table_name, record_id) DO UPDATE SET
+                sync_state = 'pending',
+                updated_at = ?
+        """, [(cid, now) for cid in marked])
+
+        try:
+            cursor.executemany("""
+                INSERT INTO sync_log (table_name, operation, record_id, direction, status)
+                VALUES ('capsule_tags', 'update', ?, 'to_cloud', 'pending')
+            """, [(cid,) for cid in marked])
+        except sqlite3.OperationalError:
+            pass  # sync_log 表可能不存在
+
+        return marked
+
     def update_capsule_coordinates(self, capsule_id: int, coordinates: Dict[str, Dict[str, float]]) -> bool:
         """
         更新胶囊坐标
@@ -618,36 +965,11 @@ class CapsuleDatabase:
         try:
             cursor = self.conn.cursor()
 
-            # 查询该胶囊的所有标签
-            cursor.execute("""
-                SELECT word_cn, word_en
-                FROM capsule_tags
-                WHERE capsule_id = ?
-                AND (word_cn IS NOT NULL AND word_cn != ''
-                     OR word_en IS NOT NULL AND word_en != '')
-            """, (capsule_id,))
-
-            tags = cursor.fetchall()
-
-            # 聚合关键词：优先使用 word_cn，如果没有则使用 word_en
-            keywords_list = []
-            for word_cn, word_en in tags:
-                if word_cn and word_cn.strip():
-                    keywords_list.append(word_cn.strip())
-                elif word_en and word_en.strip():
-                    keywords_list.append(word_en.strip())
+            self._aggregate_keywords(cursor, [capsule_id])
 
-            # 用逗号连接成字符串
-            keywords_str = ', '.join(keywords_list) if keywords_list else None
-
-            print(f"[DB] 胶囊 {capsule_id} 聚合关键词: {keywords_str}")
-
-            # 更新 capsules 表
-            cursor.execute("""
-                UPDATE capsules
-                SET keywords = ?
-                WHERE id = ?
-            """, (keywords_str, capsule_id))
+            cursor.execute("SELECT keywords FROM capsules WHERE id = ?", (capsule_id,))
+            row = cursor.fetchone()
+            print(f"[DB] 胶囊 {capsule_id} 聚合关键词: {row[0] if row else None}")
 
             self.conn.commit()
             return True
@@ -736,6 +1058,88 @@ class CapsuleDatabase:
         finally:
             self.close()
 
+    def get_capsule_tag_hashes(self, capsule_ids: List[int]) -> Dict[int, str]:
+        """
+        批量计算胶囊当前标签集合的内容哈希（见 _tag_set_hash）
+
+        Args:
+            capsule_ids: 胶囊 ID 列表
+
+        Returns:
+            {capsule_id: tag_hash}，没有标签的胶囊返回空集合的哈希
+        """
+        rows_by_capsule = {cid: [] for cid in capsule_ids}
+        if not capsule_ids:
+            return {}
+
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            for chunk in _chunked(list(capsule_ids), _SQLITE_MAX_PARAMS):
+                placeholders = ",".join(["?"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT capsule_id, lens, word_id, word_cn, word_en, x, y
+                    FROM capsule_tags
+                    WHERE capsule_id IN ({placeholders})
+                """, chunk)
+                for row in cursor.fetchall():
+                    rows_by_capsule[row['capsule_id']].append(tuple(row)[1:])
+
+            return {cid: _tag_set_hash(rows) for cid, rows in rows_by_capsule.items()}
+
+        finally:
+            self.close()
+
+    def get_capsules_with_tags(self, capsule_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        批量获取胶囊基本信息及其标签（两次查询，用于批量打标签）
+
+        Args:
+            capsule_ids: 胶囊 ID 列表
+
+        Returns:
+            {capsule_id: {'id', 'name', 'keywords', 'description', 'cloud_id',
+                          'owner_supabase_user_id', 'tags': [...]}}，
+            不存在的胶囊不出现在结果中
+        """
+        if not capsule_ids:
+            return {}
+
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            result = {}
+
+            for chunk in _chunked(list(capsule_ids), _SQLITE_MAX_PARAMS):
+                placeholders = ",".join(["?"] * len(chunk))
+                cursor.execute(f"""
+                    SELECT id, name, keywords, description, cloud_id, owner_supabase_user_id
+                    FROM capsules
+                    WHERE id IN ({placeholders})
+                """, chunk)
+                for row in cursor.fetchall():
+                    result[row['id']] = dict(row)
+                    result[row['id']]['tags'] = []
+
+                cursor.execute(f"""
+                    SELECT capsule_id, lens, word_id, word_cn, word_en, x, y
+                    FROM capsule_tags
+                    WHERE capsule_id IN ({placeholders})
+                    ORDER BY id
+                """, chunk)
+                for row in cursor.fetchall():
+                    tag = dict(row)
+                    capsule_id = tag.pop('capsule_id')
+                    if capsule_id in result:
+                        result[capsule_id]['tags'].append(tag)
+
+            return result
+
+        finally:
+            self.close()
+
     def get_capsule_tags(self, capsule_id: int) -> Dict[str, List[Dict[str, Any]]]:
         """
         获取胶囊的所有标签（按棱镜分组）
@@ -802,17 +1206,31 @@ class CapsuleDatabase:
         y: Optional[float] = None,
         radius: float = 20,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[tuple] = None,
+        owner_id: Optional[str] = None,
+        downloaded_only: bool = False,
+        columns: Optional[List[str]] = None,
+        include_tags: bool = True,
+        include_metadata: bool = True
     ) -> List[Dict[str, Any]]:
         """
-        获取胶囊列表（支持空间筛选）
+        获取胶囊列表（支持空间筛选、游标分页和字段投影）
+
+        排序固定为 (created_at DESC, id DESC)，由 idx_capsules_created_at_id 覆盖。
 
         Args:
             lens: 语义棱镜类型（任意有效棱镜ID，如 texture/source/materiality/temperament/mechanics 等）
             x, y: 中心点坐标
             radius: 搜索半径
             limit: 返回数量限制
-            offset: 偏移量（分页）
+            offset: 偏移量（分页，仅在未提供 cursor 时生效）
+            cursor: 上一页最后一条的 (created_at, id)，返回严格排在其后的记录
+            owner_id: 只返回该用户拥有的胶囊（filter=mine）
+            downloaded_only: 只返回文件已下载的胶囊（filter=downloaded）
+            columns: 只返回 capsules 表的这些列（None 表示全部）；id / created_at 总会返回
+            include_tags: 是否附带标签列表
+            include_metadata: 是否附带 metadata
 
         Returns:
             胶囊列表
@@ -820,100 +1238,377 @@ class CapsuleDatabase:
         self.connect()
 
         try:
-            cursor = self.conn.cursor()
+            db_cursor = self.conn.cursor()
             
             # 🔥 执行 WAL checkpoint，确保读取到最新数据
             # 解决上传成功后刷新列表时 metadata 可能不可见的问题
             try:
-                cursor.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                db_cursor.execute("PRAGMA wal_checkpoint(PASSIVE)")
             except Exception:
                 pass  # 忽略 checkpoint 错误
 
-            if lens and x is not None and y is not None:
+            self._ensure_list_index(db_cursor)
+
+            spatial = bool(lens and x is not None and y is not None)
+
+            if columns is not None:
+                db_cursor.execute("PRAGMA table_info(capsules)")
+                valid_columns = {row[1] for row in db_cursor.fetchall()}
+                selected = ['id', 'created_at'] + [
+                    col for col in columns
+                    if col in valid_columns and col not in ('id', 'created_at')
+                ]
+                select_list = [f"c.{col}" for col in selected]
+            elif spatial:
+                select_list = [
+                    "c.id", "c.uuid", "c.name", "c.project_name",
+                    "c.theme_name", "c.preview_audio", "c.created_at"
+                ]
+            else:
+                select_list = ["c.*"]
+
+            if columns is None and not spatial:
+                # 相关子查询走 idx_capsule_tags_capsule_id，避免 GROUP BY 破坏排序索引
+                select_list.append(
+                    "(SELECT COUNT(*) FROM capsule_tags ct WHERE ct.capsule_id = c.id) AS tag_count"
+                )
+
+            joins = ""
+            where = []
+            params = []
+
+            if spatial:
                 # 空间查询
                 x_col = f"{lens}_x"
                 y_col = f"{lens}_y"
+                select_list += [f"cc.{x_col}", f"cc.{y_col}"]
+                joins = "JOIN capsule_coordinates cc ON c.id = cc.capsule_id"
+                where.append(f"SQRT(POW(cc.{x_col} - ?, 2) + POW(cc.{y_col} - ?, 2)) <= ?")
+                params += [x, y, radius]
+
+            if owner_id is not None:
+                where.append("c.owner_supabase_user_id = ?")
+                params.append(owner_id)
+
+            if downloaded_only:
+                where.append("COALESCE(c.files_downloaded, 0) != 0")
+
+            if cursor is not None:
+                cursor_created_at, cursor_id = cursor
+                # 行值比较：SQLite 可以直接在 (created_at, id) 索引上定位范围（OR 形式会扫描索引）
+                where.append("(c.created_at, c.id) < (?, ?)")
+                params += [cursor_created_at, cursor_id]
+
+            query = f"""
+                SELECT {', '.join(select_list)}
+                FROM capsules c
+                {joins}
+                {('WHERE ' + ' AND '.join(where)) if where else ''}
+                ORDER BY c.created_at DESC, c.id DESC
+                LIMIT ?
+            """
+            params.append(limit)
+
+            if cursor is None and offset:
+                query += " OFFSET ?"
+                params.append(offset)
+
+            db_cursor.execute(query, params)
+
+            rows = db_cursor.fetchall()
+            capsules = [dict(row) for row in rows]
+            capsule_ids = [capsule['id'] for capsule in capsules]
+
+            if include_metadata:
+                metadata_by_id = self._get_metadata_for_capsules(db_cursor, capsule_ids)
+                for capsule in capsules:
+                    if capsule['id'] in metadata_by_id:
+                        capsule['metadata'] = metadata_by_id[capsule['id']]
+
+            if include_tags:
+                tags_by_id = {capsule_id: [] for capsule_id in capsule_ids}
+                for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS):
+                    placeholders = ",".join(["?"] * len(chunk))
+                    db_cursor.execute(f"""
+                        SELECT capsule_id, lens, word_id, word_cn, word_en, x, y
+                        FROM capsule_tags WHERE capsule_id IN ({placeholders})
+                        ORDER BY id
+                    """, chunk)
+                    for row in db_cursor.fetchall():
+                        tag = dict(row)
+                        tags_by_id[tag.pop('capsule_id')].append(tag)
+                for capsule in capsules:
+                    capsule['tags'] = tags_by_id[capsule['id']]
+
+            return capsules
+
+
+        finally:
+            self.close()
+
+    def _ensure_list_index(self, cursor) -> None:
+        """
+        确保列表默认排序的覆盖索引存在（旧数据库不会重新执行 schema）
+        """
+        if self.db_path in _LIST_INDEX_ENSURED:
+            return
+        try:
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_capsules_created_at_id
+                ON capsules(created_at DESC, id DESC)
+            """)
+            self.conn.commit()
+            _LIST_INDEX_ENSURED.add(self.db_path)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"创建列表排序索引失败: {e}")
+
+    def _get_metadata_for_capsules(self, cursor, capsule_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        批量读取 capsule_metadata 并构建前端期望的 metadata 格式
+
+        Returns:
+            {capsule_id: metadata}
+        """
+        result = {}
+        for chunk in _chunked(capsule_ids, _SQLITE_MAX_PARAMS):
+            placeholders = ",".join(["?"] * len(chunk))
+            cursor.execute(f"""
+                SELECT capsule_id, bpm, duration, sample_rate, plugin_count, plugin_list,
+                       has_sends, has_folder_bus, tracks_included
+                FROM capsule_metadata WHERE capsule_id IN ({placeholders})
+            """, chunk)
+
+            for row in cursor.fetchall():
+                # 解析 plugin_list JSON 字符串
+                plugin_list = row['plugin_list']
+                if plugin_list:
+                    try:
+                        plugin_list = json.loads(plugin_list)
+                    except:
+                        plugin_list = []
+                else:
+                    plugin_list = []
+
+                result[row['capsule_id']] = {
+                    'bpm': row['bpm'],
+                    'duration': row['duration'],
+                    'sample_rate': row['sample_rate'],
+                    'plugins': {
+                        'count': row['plugin_count'],
+                        'list': plugin_list
+                    },
+                    'has_sends': row['has_sends'],
+                    'has_folder_bus': row['has_folder_bus'],
+                    'tracks_included': row['tracks_included']
+                }
+        return result
+
+    def ensure_fts_index(self) -> bool:
+        """
+        确保全文搜索索引（capsules_fts + 触发器）存在，首次创建时回填现有胶囊
+
+        按数据库路径缓存结果：可用时每次只确认 capsules_fts 仍存在（被删除则重新创建并回填），
+        不可用时 _FTS_RETRY_SECONDS 后重新探测；数据库被锁等临时错误不缓存。
+
+        Returns:
+            FTS5 是否可用（SQLite 未编译 FTS5 / trigram 时返回 False）
+        """
+        cached = _FTS_AVAILABLE.get(self.db_path)
+        if cached and not cached[0] and time.monotonic() - cached[1] < _FTS_RETRY_SECONDS:
+            return False
+
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'capsules_fts'"
+            )
+            existed = cursor.fetchone() is not None
+            if existed and cached and cached[0]:
+                return True
+
+            cursor.executescript(_FTS_SCHEMA_SQL)
 
-                query = f"""
+            if not existed:
+                cursor.execute("""
+                    INSERT INTO capsules_fts (rowid, name, description, keywords, tags)
                     SELECT
-                        c.id, c.uuid, c.name, c.project_name,
-                        c.theme_name, c.preview_audio, c.created_at,
-                        cc.{x_col}, cc.{y_col}
+                        c.id, c.name, c.description, c.keywords,
+                        (SELECT group_concat(COALESCE(word_cn, '') || ' ' || COALESCE(word_en, ''), ' ')
+                         FROM capsule_tags WHERE capsule_id = c.id)
                     FROM capsules c
-                    JOIN capsule_coordinates cc ON c.id = cc.capsule_id
-                    WHERE SQRT(POW(cc.{x_col} - ?, 2) + POW(cc.{y_col} - ?, 2)) <= ?
-                    ORDER BY c.created_at DESC
-                    LIMIT ? OFFSET ?
-                """
+                """)
+                print(f"✓ 全文索引已创建，回填 {cursor.rowcount} 个胶囊")
 
-                cursor.execute(query, (x, y, radius, limit, offset))
+            self.conn.commit()
+            _FTS_AVAILABLE[self.db_path] = (True, time.monotonic())
+            return True
 
+        except sqlite3.OperationalError as e:
+            self.conn.rollback()
+            logger.warning(f"FTS5 全文索引不可用，文本搜索将回退到 LIKE: {e}")
+            message = str(e).lower()
+            if 'locked' in message or 'busy' in message:
+                _FTS_AVAILABLE.pop(self.db_path, None)
             else:
-                # 普通查询 - 添加标签计数
-                query = """
-                    SELECT
-                        c.*,
-                        COUNT(ct.id) as tag_count
-                    FROM capsules c
-                    LEFT JOIN capsule_tags ct ON c.id = ct.capsule_id
-                    GROUP BY c.id
-                    ORDER BY c.created_at DESC
-                    LIMIT ? OFFSET ?
-                """
+                _FTS_AVAILABLE[self.db_path] = (False, time.monotonic())
+            return False
+        finally:
+            self.close()
 
-                cursor.execute(query, (limit, offset))
+    def search_capsules_text(
+        self,
+        query: str,
+        lens: Optional[str] = None,
+        x: Optional[float] = None,
+        y: Optional[float] = None,
+        radius: float = 20,
+        owner_id: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        本地全文搜索（名称 / 描述 / 关键词 / 标签中英文），按 bm25 排序
 
-            rows = cursor.fetchall()
-            capsules = [dict(row) for row in rows]
+        空格分隔的多个词为 AND 关系。长度 >= 3 的词走 FTS5 trigram 索引，
+        更短的词（如两字中文词）在同一查询中用 LIKE 过滤。
+        可与棱镜空间筛选、所有者筛选组合，在一条 SQL 中完成。
 
-            # 为每个胶囊添加 metadata
-            for capsule in capsules:
-                cursor.execute("""
-                    SELECT bpm, duration, sample_rate, plugin_count, plugin_list,
-                           has_sends, has_folder_bus, tracks_included
-                    FROM capsule_metadata WHERE capsule_id = ?
-                """, (capsule['id'],))
-                metadata_row = cursor.fetchone()
+        Args:
+            query: 搜索文本
+            lens, x, y, radius: 空间筛选（同 get_capsules）
+            owner_id: 只搜索该用户拥有的胶囊
+            limit: 返回数量
 
-                if metadata_row:
-                    # 解析 plugin_list JSON 字符串
-                    plugin_list = metadata_row[4]  # plugin_list
-                    if plugin_list:
-                        try:
-                            plugin_list = json.loads(plugin_list)
-                        except:
-                            plugin_list = []
-                    else:
-                        plugin_list = []
+        Returns:
+            胶囊列表（含 tags 和 text_score，分数越大越相关）
+        """
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return []
 
-                    # 构建前端期望的 metadata 格式
-                    capsule['metadata'] = {
-                        'bpm': metadata_row[0],
-                        'duration': metadata_row[1],
-                        'sample_rate': metadata_row[2],
-                        'plugins': {
-                            'count': metadata_row[3],
-                            'list': plugin_list
-                        },
-                        'has_sends': metadata_row[5],
-                        'has_folder_bus': metadata_row[6],
-                        'tracks_included': metadata_row[7]
-                    }
+        fts_available = self.ensure_fts_index()
 
-                # 获取标签
-                cursor.execute("""
-                    SELECT lens, word_id, word_cn, word_en, x, y
-                    FROM capsule_tags WHERE capsule_id = ?
-                """, (capsule['id'],))
-                tag_rows = cursor.fetchall()
+        self.connect()
 
-                if tag_rows:
-                    capsule['tags'] = [dict(row) for row in tag_rows]
+        try:
+            cursor = self.conn.cursor()
+
+            joins = []
+            where = []
+            params = []
+
+            if fts_available:
+                long_terms = [t for t in terms if len(t) >= _FTS_MIN_TERM_LENGTH]
+                short_terms = [t for t in terms if len(t) < _FTS_MIN_TERM_LENGTH]
+
+                joins.append("JOIN capsules_fts f ON f.rowid = c.id")
+                if long_terms:
+                    # 每个词加双引号作为短语，避免 FTS5 查询语法注入
+                    match_expr = " AND ".join(
+                        '"' + t.replace('"', '""') + '"' for t in long_terms
+                    )
+                    where.append("capsules_fts MATCH ?")
+                    params.append(match_expr)
+                    weights = ", ".join(str(w) for w in _FTS_BM25_WEIGHTS)
+                    score_expr = f"-bm25(capsules_fts, {weights})"
                 else:
-                    capsule['tags'] = []
+                    score_expr = "0"
+
+                for term in short_terms:
+                    like = f"%{term}%"
+                    where.append(
+                        "(f.name LIKE ? OR f.description LIKE ? OR f.keywords LIKE ? OR f.tags LIKE ?)"
+                    )
+                    params += [like] * 4
+            else:
+                score_expr = "0"
+                for term in terms:
+                    like = f"%{term}%"
+                    where.append("(c.name LIKE ? OR c.description LIKE ? OR c.keywords LIKE ?)")
+                    params += [like] * 3
+
+            if lens and x is not None and y is not None:
+                x_col = f"{lens}_x"
+                y_col = f"{lens}_y"
+                joins.append("JOIN capsule_coordinates cc ON c.id = cc.capsule_id")
+                where.append(f"SQRT(POW(cc.{x_col} - ?, 2) + POW(cc.{y_col} - ?, 2)) <= ?")
+                params += [x, y, radius]
+
+            if owner_id is not None:
+                where.append("c.owner_supabase_user_id = ?")
+                params.append(owner_id)
+
+            cursor.execute(f"""
+                SELECT c.*, {score_expr} AS text_score
+                FROM capsules c
+                {' '.join(joins)}
+                WHERE {' AND '.join(where)}
+                ORDER BY text_score DESC, c.created_at DESC, c.id DESC
+                LIMIT ?
+            """, params + [limit])
+
+            capsules = [dict(row) for row in cursor.fetchall()]
+            capsule_ids = [capsule['id'] for capsule in capsules]
+
+            tags_by_id = {capsule_id: [] for capsule_id in capsule_ids}
+            if capsule_ids:
+                placeholders = ",".join(["?"] * len(capsule_ids))
+                cursor.execute(f"""
+                    SELECT capsule_id, lens, word_id, word_cn, word_en, x, y
+                    FROM capsule_tags WHERE capsule_id IN ({placeholders})
+                    ORDER BY id
+                """, capsule_ids)
+                for row in cursor.fetchall():
+                    tag = dict(row)
+                    tags_by_id[tag.pop('capsule_id')].append(tag)
+
+            for capsule in capsules:
+                capsule['tags'] = tags_by_id[capsule['id']]
 
             return capsules
 
+        finally:
+            self.close()
+
+    def get_capsule_ids(
+        self,
+        lens: Optional[str] = None,
+        x: Optional[float] = None,
+        y: Optional[float] = None,
+        radius: float = 20,
+        owner_id: Optional[str] = None
+    ) -> set:
+        """
+        获取满足空间 / 所有者筛选的胶囊 ID 集合（用于向量搜索的组合筛选）
+
+        Returns:
+            胶囊 ID 集合
+        """
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            joins = ""
+            where = []
+            params = []
+
+            if lens and x is not None and y is not None:
+                x_col = f"{lens}_x"
+                y_col = f"{lens}_y"
+                joins = "JOIN capsule_coordinates cc ON c.id = cc.capsule_id"
+                where.append(f"SQRT(POW(cc.{x_col} - ?, 2) + POW(cc.{y_col} - ?, 2)) <= ?")
+                params += [x, y, radius]
+
+            if owner_id is not None:
+                where.append("c.owner_supabase_user_id = ?")
+                params.append(owner_id)
+
+            cursor.execute(f"""
+                SELECT c.id FROM capsules c {joins}
+                {('WHERE ' + ' AND '.join(where)) if where else ''}
+            """, params)
+            return {row[0] for row in cursor.fetchall()}
 
         finally:
             self.close()
@@ -1446,9 +2141,20 @@ class CapsuleDatabase:
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             """, (1 if pinned else 0, capsule_id))
+            updated = cursor.rowcount > 0
+
+            # 同步到缓存条目：清理和缓存预算按 local_cache.is_pinned 判断
+            if updated and cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'local_cache'"
+            ).fetchone():
+                cursor.execute("""
+                    UPDATE local_cache
+                    SET is_pinned = ?
+                    WHERE capsule_id = ?
+                """, (1 if pinned else 0, capsule_id))
 
             self.conn.commit()
-            return cursor.rowcount > 0
+            return updated
 
         except Exception as e:
             self.conn.rollback()
@@ -1608,12 +2314,13 @@ class CapsuleDatabase:
         finally:
             self.close()
 
-    def get_pending_download_tasks(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def get_pending_download_tasks(self, limit: int = 10, include_paused: bool = True) -> List[Dict[str, Any]]:
         """
         获取待处理的下载任务（按优先级排序）（Phase B）
 
         Args:
             limit: 返回数量限制
+            include_paused: 是否包含已暂停的任务（默认 True）
 
         Returns:
             下载任务列表
@@ -1623,12 +2330,13 @@ class CapsuleDatabase:
         try:
             cursor = self.conn.cursor()
 
-            cursor.execute("""
+            statuses = ('pending', 'paused') if include_paused else ('pending',)
+            cursor.execute(f"""
                 SELECT * FROM download_tasks
-                WHERE status IN ('pending', 'paused')
+                WHERE status IN ({",".join(["?"] * len(statuses))})
                 ORDER BY priority DESC, created_at ASC
                 LIMIT ?
-            """, (limit,))
+            """, (*statuses, limit))
 
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
@@ -1716,6 +2424,88 @@ class CapsuleDatabase:
         finally:
             self.close()
 
+    def claim_download_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """
+        原子领取下载任务：pending -> downloading
+
+        只有一个调用方能领取成功，已被领取、暂停或取消的任务返回 None
+
+        Args:
+            task_id: 任务 ID
+
+        Returns:
+            领取后的任务数据字典或 None
+        """
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+
+            if sqlite3.sqlite_version_info >= (3, 35, 0):
+                cursor.execute("""
+                    UPDATE download_tasks
+                    SET status = 'downloading',
+                        progress = 0,
+                        started_at = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'pending'
+                    RETURNING *
+                """, (task_id,))
+                row = cursor.fetchone()
+            else:
+                # 旧版 SQLite 不支持 RETURNING：同一事务内更新后读取
+                cursor.execute("""
+                    UPDATE download_tasks
+                    SET status = 'downloading',
+                        progress = 0,
+                        started_at = CURRENT_TIMESTAMP,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'pending'
+                """, (task_id,))
+                row = None
+                if cursor.rowcount == 1:
+                    cursor.execute("SELECT * FROM download_tasks WHERE id = ?", (task_id,))
+                    row = cursor.fetchone()
+
+            self.conn.commit()
+            return dict(row) if row else None
+
+        except Exception as e:
+            self.conn.rollback()
+            print(f"领取下载任务失败: {e}")
+            return None
+
+        finally:
+            self.close()
+
+    def reset_interrupted_download_tasks(self) -> int:
+        """
+        将上次进程中断时仍处于 downloading 的任务重置为 pending
+
+        Returns:
+            重置的任务数
+        """
+        self.connect()
+
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                UPDATE download_tasks
+                SET status = 'pending',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'downloading'
+            """)
+            self.conn.commit()
+            return cursor.rowcount
+
+        except Exception as e:
+            self.conn.rollback()
+            print(f"重置中断的下载任务失败: {e}")
+            return 0
+
+        finally:
+            self.close()
+
     def add_to_cache(
         self,
         capsule_id: int,
@@ -1739,23 +2529,47 @@ class CapsuleDatabase:
             cache_priority: 缓存优先级（0-10）
 
         Returns:
-            是否成功
+            是否成功（未固定且大于整个缓存预算的文件会被拒绝，返回 False）
         """
+        from cache_budget import get_cache_budget_manager
+
+        budget = get_cache_budget_manager(self.db_path)
+        if budget and not budget.admit(file_size, is_pinned):
+            print(f"⚠️  文件超过缓存预算，拒绝缓存: {file_path} ({file_size} 字节 > {budget.max_bytes} 字节)")
+            return False
+
         self.connect()
 
         try:
             cursor = self.conn.cursor()
 
+            # UPSERT 而不是 INSERT OR REPLACE：REPLACE 的隐式删除不会触发用量计数触发器
             cursor.execute("""
-                INSERT OR REPLACE INTO local_cache
+                INSERT INTO local_cache
                 (capsule_id, file_type, file_path, file_size, file_hash,
                  last_accessed_at, access_count, is_pinned, cache_priority,
                  created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, 1, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT(capsule_id, file_type) DO UPDATE SET
+                    file_path = excluded.file_path,
+                    file_size = excluded.file_size,
+                    file_hash = excluded.file_hash,
+                    last_accessed_at = CURRENT_TIMESTAMP,
+                    access_count = 1,
+                    is_pinned = excluded.is_pinned,
+                    cache_priority = excluded.cache_priority,
+                    created_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
             """, (capsule_id, file_type, file_path, file_size, file_hash,
                   1 if is_pinned else 0, cache_priority))
 
+            if budget:
+                budget.sync(self.conn)
             self.conn.commit()
+
+            if budget:
+                # 超过高水位时后台淘汰，不阻塞写入
+                budget.enforce()
             return True
 
         except Exception as e:
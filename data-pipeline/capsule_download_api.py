@@ -1,15 +1,16 @@
 """
 胶囊下载 API (JIT 决策流)
 
-简化实现，直接使用 Supabase 客户端下载
+直接使用 Supabase 客户端下载；下载任务由 JitDownloadManager 执行
+（有界并发、按胶囊去重、可暂停 / 恢复 / 取消）
 """
 
 from flask import request, jsonify
 from auth import get_auth_manager
 from capsule_db import get_database
 from supabase_client import get_supabase_client
+from jit_downloads import get_jit_download_manager
 import logging
-import threading
 import time
 from typing import Dict, Any, Optional
 from pathlib import Path
@@ -47,10 +48,10 @@ def register_download_routes(app):
         响应:
             {
                 "success": true,
-                "task_id": 123,
-                "status": "pending",  // pending, downloading, completed
+                "task_id": "9f0c...",
+                "status": "queued",  // queued, downloading（重复请求返回已有任务）
                 "progress": 0,
-                "file_size": 104857600
+                "deduplicated": false
             }
         """
         try:
@@ -184,50 +185,60 @@ def register_download_routes(app):
             logger.info(f"[DOWNLOAD] PathManager 导出目录: {export_dir}")
             logger.info(f"[DOWNLOAD] 本地胶囊路径: {local_capsule_path}")
             
-            # 使用 threading 在后台下载，避免阻塞 API
-            def download_in_thread():
-                try:
-                    logger.info(f"[DOWNLOAD] 开始下载 Audio 文件夹: 胶囊 {capsule_id}")
-                    logger.info(f"[DOWNLOAD] 云端文件夹: {target_user_id}/{capsule_dir_name}")
-                    logger.info(f"[DOWNLOAD] 本地目标: {local_capsule_path}")
-                    
-                    # 下载 Audio 文件夹 - 使用胶囊所有者的 Supabase User ID
-                    success = supabase.download_file(
-                        user_id=target_user_id,  # ✅ 关键修复：使用胶囊所有者的 ID
-                        capsule_folder_name=capsule_dir_name,
-                        file_type='audio_folder',
-                        local_path=str(local_capsule_path)  # 使用完整路径
+            # 交给 JIT 下载管理器在后台执行（同一胶囊已有进行中的任务时直接复用）
+            def download_assets(task):
+                logger.info(f"[DOWNLOAD] 开始下载 Audio 文件夹: 胶囊 {capsule_id} (任务 {task.task_id})")
+                logger.info(f"[DOWNLOAD] 云端文件夹: {target_user_id}/{capsule_dir_name}")
+                logger.info(f"[DOWNLOAD] 本地目标: {local_capsule_path}")
+
+                # 下载 Audio 文件夹 - 使用胶囊所有者的 Supabase User ID
+                success = supabase.download_file(
+                    user_id=target_user_id,  # ✅ 关键修复：使用胶囊所有者的 ID
+                    capsule_folder_name=capsule_dir_name,
+                    file_type='audio_folder',
+                    local_path=str(local_capsule_path),  # 使用完整路径
+                    cancel_event=task.cancel_event,
+                    progress_callback=task.report,
+                    bytes_callback=task.report_bytes
+                )
+
+                if task.cancel_event.is_set():
+                    if task.stop_status == 'cancelled':
+                        # 取消：清理未完成的临时文件（暂停则保留以便续传）
+                        for part_file in (local_capsule_path / 'Audio').glob('*.part*'):
+                            try:
+                                part_file.unlink()
+                            except OSError:
+                                pass
+                    logger.info(f"[DOWNLOAD] ⏹️ 胶囊 {capsule_id} 下载已停止 ({task.stop_status})")
+                    return False
+
+                if success:
+                    logger.info(f"[DOWNLOAD] ✅ Audio 文件夹下载成功")
+
+                    # 更新胶囊状态
+                    db.update_asset_status(
+                        capsule_id=capsule_id,
+                        asset_status='synced'
                     )
-                    
-                    if success:
-                        logger.info(f"[DOWNLOAD] ✅ Audio 文件夹下载成功")
-                        
-                        # 更新胶囊状态
-                        db.update_asset_status(
-                            capsule_id=capsule_id,
-                            asset_status='synced'
-                        )
-                        
-                        logger.info(f"[DOWNLOAD] ✅ 胶囊 {capsule_id} 资产状态更新为 synced")
-                    else:
-                        logger.error(f"[DOWNLOAD] ❌ Audio 文件夹下载失败 (supabase.download_file 返回 False)")
-                        logger.error(f"[DOWNLOAD] ❌ 请检查: 1) 云端是否有文件 2) 网络连接 3) 权限")
-                        # 不抛出异常，让线程正常结束
-                        return
-                        
-                except Exception as e:
-                    logger.error(f"[DOWNLOAD] 下载异常: {e}")
-                    raise Exception(str(e))
-            
-            # 启动后台线程
-            thread = threading.Thread(target=download_in_thread)
-            thread.start()
-            
+
+                    logger.info(f"[DOWNLOAD] ✅ 胶囊 {capsule_id} 资产状态更新为 synced")
+                else:
+                    logger.error(f"[DOWNLOAD] ❌ Audio 文件夹下载失败 (supabase.download_file 返回 False)")
+                    logger.error(f"[DOWNLOAD] ❌ 请检查: 1) 云端是否有文件 2) 网络连接 3) 权限")
+                return success
+
+            task, created = get_jit_download_manager().submit(capsule_id, download_assets)
+            if not created:
+                logger.info(f"[DOWNLOAD] 胶囊 {capsule_id} 已有进行中的下载任务 {task.task_id}，复用")
+
             return jsonify({
                 'success': True,
-                'task_id': None,  # 简化版本，不追踪任务 ID
-                'status': 'downloading',
-                'message': '开始下载'
+                'task_id': task.task_id,
+                'status': task.status,
+                'progress': task.progress,
+                'deduplicated': not created,
+                'message': '开始下载' if created else '下载已在进行中'
             })
             
         except APIError:
@@ -243,12 +254,16 @@ def register_download_routes(app):
         
         响应:
             {
-                "status": "downloading" | "completed" | "not_started",
+                "status": "queued" | "downloading" | "completed" | "failed" | "paused" | "cancelled" | "not_started",
                 "progress": 0-100,
                 "downloaded_bytes": 0,
                 "total_bytes": 0,
                 "speed": 0,
-                "eta_seconds": null
+                "eta_seconds": null,
+                "task_id": "9f0c...",   // 有 JIT 任务时
+                "files_done": 3,
+                "files_total": 12,
+                "error_message": null   // 失败时的错误信息
             }
         """
         try:
@@ -258,9 +273,14 @@ def register_download_routes(app):
             if not capsule:
                 raise APIError('胶囊不存在', 404)
             
+            # JIT 下载任务（进行中或最近结束）
+            task = get_jit_download_manager().get_by_capsule(capsule_id)
+            if task:
+                return jsonify(task.to_dict())
+
             asset_status = capsule.get('asset_status', 'local')
             
-            # 简化实现：基于 asset_status 返回状态
+            # 没有 JIT 任务：基于 asset_status 返回状态
             if asset_status == 'synced':
                 return jsonify({
                     'status': 'completed',
@@ -271,13 +291,16 @@ def register_download_routes(app):
                     'eta_seconds': None
                 })
             elif asset_status == 'downloading':
+                # 实时进度来自下载进度注册表（内存），数据库只按批量间隔更新
+                from download_progress import get_download_progress_registry
+                live = get_download_progress_registry(db.db_path).get_by_capsule(capsule_id) or {}
                 return jsonify({
                     'status': 'downloading',
-                    'progress': 50,  # 简化：假设进度 50%
-                    'downloaded_bytes': 0,
-                    'total_bytes': 0,
-                    'speed': 0,
-                    'eta_seconds': None
+                    'progress': live.get('progress') or 0,
+                    'downloaded_bytes': live.get('downloaded_bytes') or 0,
+                    'total_bytes': live.get('total_bytes') or 0,
+                    'speed': live.get('speed') or 0,
+                    'eta_seconds': live.get('eta_seconds')
                 })
             else:
                 return jsonify({
@@ -297,24 +320,47 @@ def register_download_routes(app):
     
     @app.route('/api/capsules/<int:capsule_id>/pause-download', methods=['POST'])
     def pause_download(capsule_id):
-        """暂停下载（简化版：暂不支持）"""
+        """暂停下载（停止进行中的文件下载，保留 .part 以便恢复时续传）"""
+        task = get_jit_download_manager().stop(capsule_id, status='paused')
+        if not task:
+            return jsonify({
+                'success': False,
+                'error': '没有进行中的下载任务'
+            }), 404
         return jsonify({
-            'success': False,
-            'error': '简化版本暂不支持暂停下载'
-        }), 501
+            'success': True,
+            'task_id': task.task_id,
+            'message': '下载暂停中'
+        })
     
     @app.route('/api/capsules/<int:capsule_id>/resume-download', methods=['POST'])
     def resume_download(capsule_id):
-        """恢复下载（简化版：暂不支持）"""
+        """恢复已暂停的下载"""
+        resumed = get_jit_download_manager().resume(capsule_id)
+        if not resumed:
+            return jsonify({
+                'success': False,
+                'error': '没有可恢复的下载任务'
+            }), 404
+        task, created = resumed
         return jsonify({
-            'success': False,
-            'error': '简化版本暂不支持恢复下载'
-        }), 501
+            'success': True,
+            'task_id': task.task_id,
+            'status': task.status,
+            'message': '下载已恢复' if created else '下载已在进行中'
+        })
     
     @app.route('/api/capsules/<int:capsule_id>/cancel-download', methods=['POST'])
     def cancel_download(capsule_id):
-        """取消下载（简化版：暂不支持）"""
+        """取消下载（停止进行中的文件下载并清理临时文件）"""
+        task = get_jit_download_manager().stop(capsule_id, status='cancelled')
+        if not task:
+            return jsonify({
+                'success': False,
+                'error': '没有进行中的下载任务'
+            }), 404
         return jsonify({
-            'success': False,
-            'error': '简化版本暂不支持取消下载'
-        }), 501
+            'success': True,
+            'task_id': task.task_id,
+            'message': '下载取消中'
+        })
@@ -215,6 +215,10 @@ ON capsules(cloud_id);
 CREATE INDEX IF NOT EXISTS idx_capsules_owner_id 
 ON capsules(owner_supabase_user_id);
 
+-- 列表默认排序（游标分页 created_at DESC, id DESC）
+CREATE INDEX IF NOT EXISTS idx_capsules_created_at_id
+ON capsules(created_at DESC, id DESC);
+
 -- 坐标查询索引（空间查询优化）
 CREATE INDEX IF NOT EXISTS idx_coordinates_texture
 ON capsule_coordinates(texture_x, texture_y);
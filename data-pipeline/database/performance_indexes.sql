@@ -88,17 +88,17 @@ ON sync_status(table_name, sync_state);
 CREATE INDEX IF NOT EXISTS idx_capsules_created_at
 ON capsules(created_at DESC);
 
+-- 胶囊列表默认排序 + 游标分页（created_at, id 相同时间戳下保证顺序稳定）
+CREATE INDEX IF NOT EXISTS idx_capsules_created_at_id
+ON capsules(created_at DESC, id DESC);
+
 -- 加速按类型筛选（用于类型过滤）
 CREATE INDEX IF NOT EXISTS idx_capsules_type
 ON capsules(capsule_type);
 
 -- 全文搜索支持（SQLite FTS5）
--- 为名称和关键词创建全文搜索虚拟表
--- CREATE VIRTUAL TABLE IF NOT EXISTS capsules_fts USING fts5(
---     name,
---     keywords,
---     content='capsules'
--- );
+-- capsules_fts（name / description / keywords / tags，trigram 分词）及其触发器
+-- 由 CapsuleDatabase.ensure_fts_index() 在首次搜索时创建并回填
 
 -- ============================================================
 -- 7. 下载任务历史清理
@@ -0,0 +1,46 @@
+-- ============================================
+-- 011: 标签删除墓碑 (cloud_capsule_tag_deletions)
+-- 增量标签同步只能看到新插入 / 更新的标签行，云端删除的标签不会出现在
+-- updated_at 增量里。删除标签时记录所属胶囊，客户端按 (deleted_at, capsule_id)
+-- 游标拉取，重新下载这些胶囊的完整标签集合。
+-- ============================================
+
+-- 1. 墓碑表：每个胶囊一行，记录最近一次删除标签的时间
+CREATE TABLE IF NOT EXISTS cloud_capsule_tag_deletions (
+  capsule_id UUID PRIMARY KEY,
+  user_id UUID,
+  deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_cloud_capsule_tag_deletions_deleted_at
+ON cloud_capsule_tag_deletions (deleted_at, capsule_id);
+
+-- 2. 删除标签时写入墓碑（SECURITY DEFINER：客户端对墓碑表只有读权限）
+CREATE OR REPLACE FUNCTION record_cloud_capsule_tag_deletion()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO cloud_capsule_tag_deletions (capsule_id, user_id, deleted_at)
+  VALUES (OLD.capsule_id, OLD.user_id, NOW())
+  ON CONFLICT (capsule_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at;
+  RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS record_cloud_capsule_tag_deletion ON cloud_capsule_tags;
+CREATE TRIGGER record_cloud_capsule_tag_deletion
+  AFTER DELETE ON cloud_capsule_tags
+  FOR EACH ROW
+  EXECUTE FUNCTION record_cloud_capsule_tag_deletion();
+
+-- 3. 与 cloud_capsule_tags 一致：所有认证用户可读
+ALTER TABLE cloud_capsule_tag_deletions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Enable read access for all authenticated users" ON cloud_capsule_tag_deletions;
+CREATE POLICY "Enable read access for all authenticated users"
+ON cloud_capsule_tag_deletions
+FOR SELECT
+USING (auth.role() = 'authenticated');
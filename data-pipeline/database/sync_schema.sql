@@ -60,6 +60,79 @@ CREATE TABLE IF NOT EXISTS sync_conflicts (
 CREATE INDEX IF NOT EXISTS idx_sync_conflicts_unresolved ON sync_conflicts(resolved);
 CREATE INDEX IF NOT EXISTS idx_sync_conflicts_table ON sync_conflicts(table_name);
 
+-- 增量同步高水位线表（每个用户 / 范围一行）
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    user_id TEXT NOT NULL,
+    scope TEXT NOT NULL,          -- 'capsules', 'capsules_deleted', 'capsule_tags'
+    high_water_at TEXT,           -- 已处理到的云端 updated_at / deleted_at
+    high_water_id TEXT,           -- 同一时间戳下最后处理的云端 ID
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, scope)
+);
+
+-- 轻量资产存储路径缓存（预览音频有多种历史路径，解析一次后记住）
+CREATE TABLE IF NOT EXISTS storage_path_cache (
+    owner_id TEXT NOT NULL,
+    folder TEXT NOT NULL,         -- 云端胶囊文件夹名
+    file_type TEXT NOT NULL,      -- 'preview', 'rpp', 'metadata'
+    storage_path TEXT,            -- NULL 表示已确认云端不存在
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (owner_id, folder, file_type)
+);
+
+-- 上传内容哈希（每个胶囊按子资源记录当前哈希和上次成功上传的哈希）
+CREATE TABLE IF NOT EXISTS sync_content_hashes (
+    capsule_id INTEGER NOT NULL,
+    resource TEXT NOT NULL,       -- 'metadata', 'files', 'tags', 'coordinates', 'audio'
+    current_hash TEXT,
+    uploaded_hash TEXT,           -- 与 current_hash 相同表示无需上传
+    size_bytes INTEGER DEFAULT 0, -- 上传该子资源的大致字节数
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    uploaded_at TIMESTAMP,
+    PRIMARY KEY (capsule_id, resource)
+);
+
+-- 大文件断点续传状态（TUS 上传会话 + 最后确认的偏移量）
+CREATE TABLE IF NOT EXISTS resumable_uploads (
+    storage_path TEXT PRIMARY KEY,
+    local_path TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime_ns INTEGER NOT NULL,   -- 本地文件变化后旧会话作废
+    upload_url TEXT NOT NULL,
+    confirmed_offset INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 持久化同步任务队列（轻量同步 / 仅下载 / Audio 上传 / 关键词同步 / 表上传）
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_type TEXT NOT NULL,
+    user_id TEXT,
+    payload TEXT DEFAULT '{}',        -- JSON 格式任务参数
+    dedup_key TEXT NOT NULL,          -- 类型 + 用户 + 参数的哈希
+    priority INTEGER DEFAULT 0,       -- 10 用户触发，0 后台
+    status TEXT DEFAULT 'queued',     -- 'queued', 'running', 'completed', 'failed', 'cancelled'
+    progress INTEGER DEFAULT 0,
+    stage TEXT,
+    message TEXT,
+    progress_data TEXT,               -- JSON 格式（含每个胶囊的进度）
+    result TEXT,                      -- JSON 格式
+    error TEXT,
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    not_before TIMESTAMP,             -- 失败重试的退避时间
+    worker_id TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 同步任务索引（排队中的相同任务只保留一条）
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_dedup_queued ON sync_jobs(dedup_key) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_claim ON sync_jobs(status, priority DESC, id);
+
 -- 触发器：自动更新 updated_at
 CREATE TRIGGER IF NOT EXISTS update_sync_status_timestamp
 AFTER UPDATE ON sync_status
@@ -6,6 +6,9 @@
 2. 并发下载控制（最多3个）
 3. 自动重试失败任务
 4. 下载状态实时更新
+5. 事件驱动调度：add_task / wake 立即唤醒工作线程，内存集合跟踪排队中和下载中的任务 ID，
+   同一任务不会重复入队；工作线程在 SQLite 中原子领取任务（pending -> downloading），
+   数据库轮询仅作为兜底扫描（崩溃恢复 / 其他入口直接写入的任务）
 
 使用示例：
     queue = DownloadQueue(
@@ -32,13 +35,25 @@
 import threading
 import time
 import queue
-from typing import Dict, Any, List, Optional
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
 from dataclasses import dataclass, field
 
 from capsule_db import CapsuleDatabase
+from download_progress import get_download_progress_registry
+from http_pool import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK
 from resumable_downloader import ResumableDownloader, DownloadProgress
 
 
+def bandwidth_priority(file_type: str) -> int:
+    """下载任务的带宽优先级：预览优先，其次 RPP / 元数据，WAV 等大文件最后"""
+    if file_type == 'preview':
+        return PRIORITY_INTERACTIVE
+    if file_type in ('rpp', 'metadata'):
+        return PRIORITY_NORMAL
+    return PRIORITY_BULK
+
+
 @dataclass(order=True)
 class DownloadTask:
     """下载任务数据类"""
@@ -54,6 +69,34 @@ class DownloadTask:
     retry_count: int = field(default=0, compare=False)
     max_retries: int = field(default=3, compare=False)
 
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'DownloadTask':
+        """从 download_tasks 行构造任务"""
+        created_at = row.get('created_at')
+        if isinstance(created_at, datetime):
+            created_at = created_at.timestamp()
+        elif isinstance(created_at, str):
+            try:
+                created_at = datetime.fromisoformat(created_at).timestamp()
+            except ValueError:
+                created_at = time.time()
+        elif created_at is None:
+            created_at = time.time()
+
+        return cls(
+            priority=row.get('priority') or 0,
+            created_at=float(created_at),
+            task_id=row['id'],
+            capsule_id=row['capsule_id'],
+            file_type=row['file_type'],
+            remote_url=row['remote_url'],
+            local_path=row['local_path'],
+            remote_size=row.get('remote_size'),
+            remote_hash=row.get('remote_hash'),
+            retry_count=row.get('retry_count') or 0,
+            max_retries=row.get('max_retries') or 3
+        )
+
 
 class DownloadWorker(threading.Thread):
     """
@@ -91,46 +134,58 @@ class DownloadWorker(threading.Thread):
 
         while not self._stopped:
             try:
-                # 从队列获取任务（超时 1 秒）
-                task = self.task_queue.get(timeout=1)
-
-                # 执行下载
-                self._download_task(task)
-
-                # 标记任务完成
-                self.task_queue.task_done()
-
+                # 从队列获取任务（超时 1 秒，仅用于检查停止标志；入队会立即唤醒）
+                _, _, _, task = self.task_queue.get(timeout=1)
             except queue.Empty:
                 # 队列为空，继续等待
                 continue
 
+            retrying = False
+            try:
+                # 执行下载
+                retrying = self._download_task(task)
+
             except Exception as e:
                 print(f"❌ 工作线程 {self.worker_id} 错误: {e}")
                 import traceback
                 traceback.print_exc()
 
+            finally:
+                if not retrying:
+                    self.manager.release_task(task.task_id)
+                # 标记任务完成
+                self.task_queue.task_done()
+
         print(f"🔧 工作线程 {self.worker_id} 停止")
 
     def stop(self):
         """停止工作线程"""
         self._stopped = True
 
-    def _download_task(self, task: DownloadTask):
-        """执行下载任务"""
-        print(f"📥 [Worker-{self.worker_id}] 下载任务 {task.task_id}: {task.remote_url}")
+    def _download_task(self, task: DownloadTask) -> bool:
+        """
+        执行下载任务
 
-        # 更新任务状态为下载中
+        Returns:
+            是否已重新排队重试
+        """
+        # 原子领取：已被领取、暂停或取消的任务直接跳过
         db = CapsuleDatabase(self.db_path)
-        db.update_download_task_status(
-            task_id=task.task_id,
-            status='downloading',
-            progress=0
-        )
+        if not db.claim_download_task(task.task_id):
+            print(f"⏭️  [Worker-{self.worker_id}] 任务 {task.task_id} 已被领取或不再待处理，跳过")
+            return False
+
+        print(f"📥 [Worker-{self.worker_id}] 下载任务 {task.task_id}: {task.remote_url}")
+
+        # 进度保存在内存注册表中，由其后台线程批量落库
+        progress_registry = get_download_progress_registry(self.db_path)
+        progress_registry.start(task.task_id, capsule_id=task.capsule_id, total_bytes=task.remote_size)
 
         # 创建下载器
         downloader = ResumableDownloader(
             db_path=self.db_path,
-            task_id=task.task_id
+            task_id=task.task_id,
+            priority=bandwidth_priority(task.file_type)
         )
 
         # 设置进度回调
@@ -148,12 +203,15 @@ class DownloadWorker(threading.Thread):
         if result['success']:
             print(f"✅ [Worker-{self.worker_id}] 任务 {task.task_id} 完成")
 
-            # 更新任务状态为完成
-            db.update_download_task_status(
-                task_id=task.task_id,
-                status='completed',
+            # 更新任务状态为完成（等待落库，触发器随后更新胶囊状态）
+            progress_registry.transition(
+                task.task_id,
+                'completed',
                 progress=100,
-                downloaded_bytes=result['file_size']
+                downloaded_bytes=result['file_size'],
+                speed=0,
+                eta_seconds=None,
+                wait=True
             )
 
             # 通知管理器
@@ -171,18 +229,24 @@ class DownloadWorker(threading.Thread):
 
                 # 重新加入队列
                 self.manager.retry_task(task)
+                return True
 
             else:
                 # 达到最大重试次数，标记为失败
-                db.update_download_task_status(
-                    task_id=task.task_id,
-                    status='failed',
-                    error_message=result['error']
+                progress_registry.transition(
+                    task.task_id,
+                    'failed',
+                    error_message=result['error'],
+                    speed=0,
+                    eta_seconds=None,
+                    wait=True
                 )
 
                 # 通知管理器
                 self.manager.on_task_failed(task.task_id, result['error'])
 
+        return False
+
     def _on_progress(self, task_id: int, progress: DownloadProgress):
         """进度回调"""
         # 可以在这里添加额外的进度处理逻辑
@@ -200,7 +264,7 @@ class DownloadQueue:
         self,
         db_path: str,
         max_concurrent: int = 3,
-        poll_interval: float = 5.0
+        poll_interval: float = 30.0
     ):
         """
         初始化下载队列管理器
@@ -208,15 +272,20 @@ class DownloadQueue:
         Args:
             db_path: 数据库路径
             max_concurrent: 最大并发下载数
-            poll_interval: 轮询数据库新任务的间隔（秒）
+            poll_interval: 兜底扫描数据库的间隔（秒）；新任务通过 add_task / wake 立即调度
         """
         self.db_path = db_path
         self.max_concurrent = max_concurrent
         self.poll_interval = poll_interval
 
-        # 任务队列（优先级队列）
+        # 任务队列（优先级队列，元素为 (-priority, created_at, task_id, task)，优先级高的先出队）
         self.task_queue = queue.PriorityQueue()
 
+        # 排队中 + 下载中的任务 ID（防止同一任务被重复入队 / 并发下载）
+        self._tracked: Set[int] = set()
+        self._tracked_lock = threading.Lock()
+        self._sweep_event = threading.Event()
+
         # 工作线程
         self.workers: List[DownloadWorker] = []
 
@@ -238,6 +307,11 @@ class DownloadQueue:
         print(f"🚀 启动下载队列（最大并发: {self.max_concurrent}）")
         self._running = True
 
+        # 上次进程中断时正在下载的任务重新变为待处理（由兜底扫描重新入队）
+        reset = CapsuleDatabase(self.db_path).reset_interrupted_download_tasks()
+        if reset:
+            print(f"🔁 恢复 {reset} 个中断的下载任务")
+
         # 创建并启动工作线程
         for i in range(self.max_concurrent):
             worker = DownloadWorker(
@@ -272,6 +346,7 @@ class DownloadQueue:
         self.workers.clear()
 
         # 等待轮询线程结束
+        self._sweep_event.set()
         if self._poll_thread:
             self._poll_thread.join(timeout=5)
 
@@ -303,7 +378,7 @@ class DownloadQueue:
 
         print(f"✅ 任务已创建: ID={task_id}, 优先级={task_data.get('priority', 0)}")
 
-        # 添加到内存队列
+        # 添加到内存队列（立即唤醒空闲的工作线程）
         task = DownloadTask(
             priority=task_data.get('priority', 0),
             created_at=time.time(),
@@ -316,13 +391,46 @@ class DownloadQueue:
             remote_hash=task_data.get('remote_hash')
         )
 
-        self.task_queue.put(task)
+        self._enqueue(task)
 
         return task_id
 
+    def _enqueue(self, task: DownloadTask) -> bool:
+        """
+        任务入队（已在排队或下载中的任务跳过）
+
+        Returns:
+            是否入队
+        """
+        with self._tracked_lock:
+            if task.task_id in self._tracked:
+                return False
+            self._tracked.add(task.task_id)
+        self.task_queue.put((-task.priority, task.created_at, task.task_id, task))
+        return True
+
+    def release_task(self, task_id: int):
+        """任务处理结束（完成 / 失败 / 跳过），不再跟踪"""
+        with self._tracked_lock:
+            self._tracked.discard(task_id)
+            idle = not self._tracked
+        if idle:
+            # 队列空闲：立即扫描一次，接上其他入口写入的任务并检查是否全部完成
+            self._sweep_event.set()
+
+    def is_tracked(self, task_id: int) -> bool:
+        """任务是否在排队或下载中"""
+        with self._tracked_lock:
+            return task_id in self._tracked
+
+    def wake(self):
+        """立即扫描数据库中的待处理任务（其他入口直接写入 download_tasks 后调用）"""
+        self._sweep_event.set()
+
     def retry_task(self, task: DownloadTask):
-        """重试任务"""
-        self.task_queue.put(task)
+        """重试任务（仍在跟踪中，状态重置为 pending 以便重新领取）"""
+        get_download_progress_registry(self.db_path).transition(task.task_id, 'pending', wait=True)
+        self.task_queue.put((-task.priority, task.created_at, task.task_id, task))
 
     def pause_task(self, task_id: int) -> bool:
         """
@@ -356,25 +464,12 @@ class DownloadQueue:
         if not task:
             return False
 
-        # 重新加入队列
-        download_task = DownloadTask(
-            priority=task['priority'],
-            created_at=task['created_at'],
-            task_id=task['id'],
-            capsule_id=task['capsule_id'],
-            file_type=task['file_type'],
-            remote_url=task['remote_url'],
-            local_path=task['local_path'],
-            remote_size=task['remote_size'],
-            remote_hash=task['remote_hash'],
-            retry_count=task['retry_count'],
-            max_retries=task['max_retries']
-        )
-
-        self.task_queue.put(download_task)
+        # 先更新状态为 pending，再重新加入队列（工作线程按 pending 状态领取）
+        if not db.update_download_task_status(task_id, 'pending'):
+            return False
 
-        # 更新状态为 pending
-        return db.update_download_task_status(task_id, 'pending')
+        self._enqueue(DownloadTask.from_row(task))
+        return True
 
     def cancel_task(self, task_id: int) -> bool:
         """
@@ -409,45 +504,39 @@ class DownloadQueue:
         return db.get_download_queue_status()
 
     def _poll_database(self):
-        """轮询数据库获取新任务"""
+        """
+        兜底扫描：把数据库中未被跟踪的待处理任务入队
+
+        新任务由 add_task / resume_task 直接入队，这里只处理崩溃恢复和其他入口写入的任务；
+        add_task 之外的入口可调用 wake() 立即触发扫描
+        """
         while self._running:
+            self._sweep_event.clear()
             try:
-                # 从数据库获取待处理任务
                 db = CapsuleDatabase(self.db_path)
-                tasks = db.get_pending_download_tasks(limit=10)
+                tasks = db.get_pending_download_tasks(limit=50, include_paused=False)
 
-                # 添加到队列
+                queued = 0
                 for task in tasks:
-                    # 检查是否已在队列中（简单检查）
-                    download_task = DownloadTask(
-                        priority=task['priority'],
-                        created_at=task['created_at'].timestamp(),
-                        task_id=task['id'],
-                        capsule_id=task['capsule_id'],
-                        file_type=task['file_type'],
-                        remote_url=task['remote_url'],
-                        local_path=task['local_path'],
-                        remote_size=task['remote_size'],
-                        remote_hash=task['remote_hash'],
-                        retry_count=task['retry_count'],
-                        max_retries=task['max_retries']
-                    )
-
-                    self.task_queue.put(download_task)
+                    if self._enqueue(DownloadTask.from_row(task)):
+                        queued += 1
+                if queued:
+                    print(f"🔎 兜底扫描: 入队 {queued} 个待处理任务")
 
                 # 检查是否所有任务完成
-                if self.task_queue.empty():
+                with self._tracked_lock:
+                    idle = not self._tracked
+                if idle:
                     status = self.get_queue_status()
                     if status.get('pending_count', 0) == 0 and status.get('downloading_count', 0) == 0:
                         if self.on_all_tasks_completed_callback:
                             self.on_all_tasks_completed_callback()
 
-                # 等待下次轮询
-                time.sleep(self.poll_interval)
-
             except Exception as e:
                 print(f"⚠️  轮询数据库错误: {e}")
-                time.sleep(self.poll_interval)
+
+            # 等待下次扫描（wake / 队列空闲时提前唤醒）
+            self._sweep_event.wait(timeout=self.poll_interval)
 
     def on_task_completed(self, task_id: int, result: Dict[str, Any]):
         """任务完成回调"""
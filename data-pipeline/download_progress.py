@@ -0,0 +1,317 @@
+"""
+下载进度注册表
+
+下载线程只更新内存中的进度（每个任务一条），状态接口直接读取内存中的实时进度；
+SQLite 由唯一的后台写线程批量更新：
+- 按 flush_interval 把所有有变化的任务在一个事务中写入 download_tasks
+- 状态转换（completed / failed / paused / cancelled ...）立即唤醒写线程，调用方可等待写入完成
+- 已结束的任务在内存中保留 retain_seconds 后移除（之后由数据库提供状态）
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, List
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> download_progress 覆盖）
+DEFAULT_PROGRESS_CONFIG = {
+    'flush_interval': 2.0,        # 批量写入间隔（秒）
+    'retain_seconds': 60.0,       # 已结束任务在内存中的保留时间
+}
+
+# 进度字段（内存 -> download_tasks 列）
+_PROGRESS_FIELDS = ('progress', 'downloaded_bytes', 'speed', 'eta_seconds')
+
+# 任务结束状态
+_FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def get_progress_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取进度注册表参数：默认值 < config.json 的 download_progress 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_PROGRESS_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('download_progress') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_PROGRESS_CONFIG and value is not None:
+                config[key] = type(DEFAULT_PROGRESS_CONFIG[key])(value)
+
+    return config
+
+
+class DownloadProgressRegistry:
+    """内存中的下载进度 + 单一批量写线程"""
+
+    def __init__(self, db_path: str, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            config_overrides: 覆盖 DEFAULT_PROGRESS_CONFIG
+        """
+        self.db_path = db_path
+        self.config = get_progress_config(config_overrides)
+
+        self._cond = threading.Condition()
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._dirty: Dict[int, bool] = {}          # task_id -> 是否包含状态转换
+        self._flush_seq = 0                        # 已提交的刷新轮次
+        self._requested_seq = 0                    # 请求的刷新轮次
+        self._stats = {'updates': 0, 'flushes': 0, 'rows_written': 0}
+
+        self._thread = threading.Thread(target=self._run, name='download-progress', daemon=True)
+        self._thread.start()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self, task_id: int, capsule_id: Optional[int] = None, total_bytes: Optional[int] = None):
+        """
+        任务开始下载（数据库状态已由领取操作写入，这里只重置内存进度）
+
+        Args:
+            task_id: 下载任务 ID
+            capsule_id: 胶囊 ID（可选）
+            total_bytes: 文件总大小（可选）
+        """
+        with self._cond:
+            self._entries[task_id] = {
+                'task_id': task_id,
+                'capsule_id': capsule_id,
+                'status': 'downloading',
+                'progress': 0,
+                'downloaded_bytes': 0,
+                'total_bytes': total_bytes,
+                'speed': 0,
+                'eta_seconds': None,
+                'updated_at': time.time(),
+            }
+            self._dirty.pop(task_id, None)
+
+    def update(self, task_id: int, capsule_id: Optional[int] = None, **fields):
+        """
+        更新任务进度（仅内存，由写线程定期落库）
+
+        Args:
+            task_id: 下载任务 ID
+            capsule_id: 胶囊 ID（可选，用于按胶囊查询）
+            **fields: progress / downloaded_bytes / total_bytes / speed / eta_seconds
+        """
+        with self._cond:
+            entry = self._entries.setdefault(task_id, {'task_id': task_id, 'status': 'downloading'})
+            if capsule_id is not None:
+                entry['capsule_id'] = capsule_id
+            entry.update(fields)
+            entry['updated_at'] = time.time()
+            self._dirty.setdefault(task_id, False)
+            self._stats['updates'] += 1
+
+    def transition(self, task_id: int, status: str, capsule_id: Optional[int] = None,
+                   error_message: Optional[str] = None, wait: bool = False,
+                   timeout: float = 10.0, **fields) -> bool:
+        """
+        状态转换：立即唤醒写线程落库
+
+        Args:
+            task_id: 下载任务 ID
+            status: 新状态
+            capsule_id: 胶囊 ID（可选）
+            error_message: 错误信息（失败时）
+            wait: 是否等待写入完成
+            timeout: 等待超时（秒）
+            **fields: 同 update
+
+        Returns:
+            wait=True 时是否在超时前写入完成；否则 True
+        """
+        with self._cond:
+            entry = self._entries.setdefault(task_id, {'task_id': task_id})
+            if capsule_id is not None:
+                entry['capsule_id'] = capsule_id
+            entry.update(fields)
+            entry['status'] = status
+            if error_message is not None:
+                entry['error_message'] = error_message
+            now = time.time()
+            entry['updated_at'] = now
+            if status in _FINISHED_STATUSES:
+                entry['finished_at'] = now
+            self._dirty[task_id] = True
+            self._requested_seq += 1
+            target = self._requested_seq
+            self._cond.notify_all()
+
+            if not wait:
+                return True
+            deadline = time.monotonic() + timeout
+            while self._flush_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+            return True
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """任务的实时进度（不在内存中时返回 None）"""
+        with self._cond:
+            entry = self._entries.get(task_id)
+            return dict(entry) if entry else None
+
+    def get_by_capsule(self, capsule_id: int) -> Optional[Dict[str, Any]]:
+        """胶囊最近更新的任务进度"""
+        with self._cond:
+            entries = [e for e in self._entries.values() if e.get('capsule_id') == capsule_id]
+            if not entries:
+                return None
+            return dict(max(entries, key=lambda e: e.get('updated_at', 0)))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """所有内存中的任务进度"""
+        with self._cond:
+            return [dict(e) for e in self._entries.values()]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return dict(self._stats, active=len(self._entries))
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """请求立即落库并等待完成"""
+        with self._cond:
+            self._requested_seq += 1
+            target = self._requested_seq
+            self._cond.notify_all()
+            deadline = time.monotonic() + timeout
+            while self._flush_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+            return True
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """一个事务写入所有有变化的任务"""
+        progress_rows = []
+        transition_rows = []
+        for row in rows:
+            values = [row.get(field) for field in _PROGRESS_FIELDS]
+            if row.pop('_transition'):
+                transition_rows.append((row.get('status'), row.get('error_message'), row.get('status'),
+                                        *values, row['task_id']))
+            else:
+                progress_rows.append((*values, row['task_id']))
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            if progress_rows:
+                cursor.executemany("""
+                    UPDATE download_tasks
+                    SET progress = COALESCE(?, progress),
+                        downloaded_bytes = COALESCE(?, downloaded_bytes),
+                        speed = COALESCE(?, speed),
+                        eta_seconds = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, progress_rows)
+            if transition_rows:
+                cursor.executemany("""
+                    UPDATE download_tasks
+                    SET status = ?,
+                        error_message = COALESCE(?, error_message),
+                        completed_at = CASE WHEN ? = 'completed' THEN CURRENT_TIMESTAMP ELSE completed_at END,
+                        progress = COALESCE(?, progress),
+                        downloaded_bytes = COALESCE(?, downloaded_bytes),
+                        speed = COALESCE(?, speed),
+                        eta_seconds = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, transition_rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._requested_seq == self._flush_seq:
+                    self._cond.wait(timeout=self.config['flush_interval'])
+                target = self._requested_seq
+                rows = [dict(self._entries[task_id], _transition=is_transition)
+                        for task_id, is_transition in self._dirty.items()
+                        if task_id in self._entries]
+                self._dirty = {}
+
+            written = False
+            transitions = {row['task_id']: row['_transition'] for row in rows}
+            if rows:
+                try:
+                    self._write(rows)
+                    written = True
+                except Exception as e:
+                    logger.warning(f"写入下载进度失败: {e}")
+                    with self._cond:
+                        # 放回待写（保留状态转换标记），下一轮重试
+                        for task_id, is_transition in transitions.items():
+                            self._dirty[task_id] = self._dirty.get(task_id, False) or is_transition
+                    time.sleep(0.5)
+
+            with self._cond:
+                if written or not rows:
+                    self._flush_seq = max(self._flush_seq, target)
+                if written:
+                    self._stats['flushes'] += 1
+                    self._stats['rows_written'] += len(rows)
+                # 已结束的任务保留一段时间供状态接口读取
+                cutoff = time.time() - self.config['retain_seconds']
+                for task_id in [t for t, e in self._entries.items()
+                                if e.get('finished_at') and e['finished_at'] < cutoff and t not in self._dirty]:
+                    del self._entries[task_id]
+                self._cond.notify_all()
+
+
+# 全局单例（按数据库路径）
+_registries: Dict[str, DownloadProgressRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_download_progress_registry(db_path: Optional[str] = None) -> DownloadProgressRegistry:
+    """
+    获取下载进度注册表单例
+
+    Args:
+        db_path: 数据库路径（可选，不提供则从 PathManager 获取）
+
+    Returns:
+        DownloadProgressRegistry 实例
+    """
+    if db_path is None:
+        from common import PathManager
+        db_path = PathManager.get_instance().db_path
+    db_path = str(db_path)
+
+    with _registries_lock:
+        registry = _registries.get(db_path)
+        if registry is None:
+            registry = DownloadProgressRegistry(db_path)
+            _registries[db_path] = registry
+        return registry
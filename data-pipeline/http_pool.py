@@ -0,0 +1,314 @@
+"""
+下载共享 HTTP 连接池 + 带宽限制
+
+- 进程内所有下载共用一个 requests.Session（keep-alive 连接池），
+  重试和连续下载同一主机的多个文件不再每次重新建立 TCP / TLS 连接
+- 令牌桶限速，按优先级分类：
+  PRIORITY_INTERACTIVE（试听预览） > PRIORITY_NORMAL（元数据 / RPP） > PRIORITY_BULK（后台 WAV）
+  令牌不足时高优先级的等待者先拿到令牌；有交互下载进行时，批量下载额外限制在
+  bulk_kbps_when_interactive 以内，把带宽让给预览
+- 参数可通过 config.json -> http_pool 设置，运行中通过 configure_http_pool() 调整
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越优先）
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: 'interactive',
+    PRIORITY_NORMAL: 'normal',
+    PRIORITY_BULK: 'bulk',
+}
+
+# 默认参数（config.json -> http_pool 覆盖）
+DEFAULT_HTTP_POOL_CONFIG = {
+    'pool_connections': 8,               # 连接池缓存的主机数
+    'pool_maxsize': 16,                  # 每个主机保持的最大连接数
+    'max_kbps': 0,                       # 所有下载的总带宽上限（KB/s，0 不限）
+    'bulk_kbps': 0,                      # 批量下载的带宽上限（KB/s，0 不限）
+    'bulk_kbps_when_interactive': 256,   # 有交互下载进行时批量下载的上限（KB/s，0 不限）
+    'burst_kb': 1024,                    # 令牌桶容量（允许的突发量）
+}
+
+
+def get_http_pool_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取连接池参数：默认值 < config.json 的 http_pool 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_HTTP_POOL_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('http_pool') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_HTTP_POOL_CONFIG and value is not None:
+                config[key] = type(DEFAULT_HTTP_POOL_CONFIG[key])(value)
+
+    return config
+
+
+class TokenBucket:
+    """
+    令牌桶（单位：字节），不加锁，由 BandwidthLimiter 持锁调用
+
+    允许欠账：令牌数达到 min(请求量, 容量) 即可放行并扣除全部请求量，
+    大块数据不会因为超过桶容量而永远等待。
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = 0.0
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.configure(rate, burst)
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def configure(self, rate: float, burst: float):
+        self._refill()
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, nbytes: int) -> float:
+        """放行 nbytes 还需等待的秒数（0 表示可以立即放行）"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        needed = min(float(nbytes), self.burst)
+        if self._tokens >= needed:
+            return 0.0
+        return (needed - self._tokens) / self.rate
+
+    def consume(self, nbytes: int):
+        if not self.unlimited:
+            self._tokens -= nbytes
+
+
+class BandwidthLimiter:
+    """按优先级分配带宽的限速器"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: get_http_pool_config() 的返回值
+        """
+        self._cond = threading.Condition()
+        self._total = TokenBucket(0, 1)
+        self._bulk = TokenBucket(0, 1)
+        self._bulk_busy = TokenBucket(0, 1)
+        self._waiting = {priority: 0 for priority in PRIORITY_NAMES}
+        self._active = {priority: 0 for priority in PRIORITY_NAMES}
+        self._stats = {
+            name: {'bytes': 0, 'wait_seconds': 0.0} for name in PRIORITY_NAMES.values()
+        }
+        self.configure(config)
+
+    def configure(self, config: Dict[str, Any]):
+        """更新限速参数（立即生效）"""
+        burst = config['burst_kb'] * 1024
+        with self._cond:
+            self._total.configure(config['max_kbps'] * 1024, burst)
+            self._bulk.configure(config['bulk_kbps'] * 1024, burst)
+            self._bulk_busy.configure(config['bulk_kbps_when_interactive'] * 1024, burst)
+            self._cond.notify_all()
+
+    def _buckets(self, priority: int):
+        """该优先级需要经过的令牌桶（需持有 _cond）"""
+        buckets = [self._total]
+        if priority >= PRIORITY_BULK:
+            buckets.append(self._bulk)
+            if self._active[PRIORITY_INTERACTIVE]:
+                buckets.append(self._bulk_busy)
+        return buckets
+
+    @contextmanager
+    def transfer(self, priority: int = PRIORITY_BULK):
+        """标记一个下载在进行中（交互下载进行时批量下载让出带宽）"""
+        with self._cond:
+            self._active[priority] += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._active[priority] -= 1
+                self._cond.notify_all()
+
+    def acquire(self, nbytes: int, priority: int = PRIORITY_BULK):
+        """
+        申请传输 nbytes 的带宽，必要时阻塞
+
+        Args:
+            nbytes: 字节数
+            priority: 优先级
+        """
+        if nbytes <= 0:
+            return
+
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    if any(self._waiting[p] for p in PRIORITY_NAMES if p < priority):
+                        # 更高优先级的请求在等待令牌，让它先拿
+                        self._cond.wait(timeout=0.1)
+                        continue
+                    buckets = self._buckets(priority)
+                    delay = max(bucket.delay(nbytes) for bucket in buckets)
+                    if delay <= 0:
+                        for bucket in buckets:
+                            bucket.consume(nbytes)
+                        break
+                    self._cond.wait(timeout=min(delay, 0.5))
+            finally:
+                self._waiting[priority] -= 1
+                stats = self._stats[PRIORITY_NAMES[priority]]
+                stats['bytes'] += nbytes
+                stats['wait_seconds'] += time.monotonic() - started
+                self._cond.notify_all()
+
+    def iter_content(self, response, chunk_size: int, priority: int = PRIORITY_BULK) -> Iterator[bytes]:
+        """按限速读取响应体（每块读取后申请带宽，TCP 背压让服务端同步减速）"""
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                self.acquire(len(chunk), priority)
+            yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                name: dict(self._stats[name], active=self._active[priority], waiting=self._waiting[priority])
+                for priority, name in PRIORITY_NAMES.items()
+            }
+
+
+# 全局单例
+_lock = threading.Lock()
+_config: Optional[Dict[str, Any]] = None
+_session = None
+_limiter: Optional[BandwidthLimiter] = None
+
+
+def _current_config() -> Dict[str, Any]:
+    global _config
+    if _config is None:
+        _config = get_http_pool_config()
+    return _config
+
+
+def _mount_adapters(session, config: Dict[str, Any]):
+    from requests.adapters import HTTPAdapter
+
+    # 重试由下载器自己处理（断点续传），连接池只负责复用连接
+    adapter = HTTPAdapter(
+        pool_connections=config['pool_connections'],
+        pool_maxsize=config['pool_maxsize'],
+        max_retries=0
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+def get_http_session():
+    """
+    获取下载共用的 requests.Session（首次调用时创建）
+
+    Returns:
+        requests.Session 实例
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+            _mount_adapters(_session, _current_config())
+        return _session
+
+
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    """获取全局带宽限制器"""
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = BandwidthLimiter(_current_config())
+        return _limiter
+
+
+def get_http_pool_status() -> Dict[str, Any]:
+    """当前参数 + 各优先级的流量统计"""
+    with _lock:
+        config = dict(_current_config())
+        limiter = _limiter
+    return {
+        'config': config,
+        'stats': limiter.get_stats() if limiter else None,
+    }
+
+
+def configure_http_pool(updates: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    运行中调整参数（不写入 config.json）
+
+    Args:
+        updates: DEFAULT_HTTP_POOL_CONFIG 中的字段
+
+    Returns:
+        生效后的参数
+
+    Raises:
+        ValueError: 未知字段或取值无效
+    """
+    global _config
+    unknown = set(updates) - set(DEFAULT_HTTP_POOL_CONFIG)
+    if unknown:
+        raise ValueError(f"未知参数: {', '.join(sorted(unknown))}")
+
+    with _lock:
+        config = dict(_current_config())
+        for key, value in updates.items():
+            if value is None:
+                continue
+            value = type(DEFAULT_HTTP_POOL_CONFIG[key])(value)
+            if value < 0:
+                raise ValueError(f"{key} 不能为负数")
+            config[key] = value
+        if config['pool_connections'] < 1 or config['pool_maxsize'] < 1 or config['burst_kb'] < 1:
+            raise ValueError("pool_connections / pool_maxsize / burst_kb 必须大于 0")
+
+        pool_changed = any(config[key] != _config[key] for key in ('pool_connections', 'pool_maxsize'))
+        _config = config
+        if _session is not None and pool_changed:
+            _mount_adapters(_session, config)
+        if _limiter is not None:
+            _limiter.configure(config)
+
+    logger.info(f"下载网络参数已更新: {config}")
+    return dict(config)
@@ -0,0 +1,542 @@
+"""
+混合搜索：本地全文索引 + 本地向量索引，倒数排名融合（RRF）
+
+- 词法：capsules_fts（FTS5 trigram，bm25 排序），精确标签名（如 "glitch"）稳定排在前面
+- 向量：capsule_embeddings 表（name + description + keywords + tags 的 384 维向量），
+  查询时整体载入内存做余弦相似度
+- 融合：score = Σ weight / (rrf_k + rank)，不再使用固定的相似度阈值硬截断
+
+融合参数可在 config.json 的 "search" 字段中配置（见 DEFAULT_SEARCH_CONFIG）。
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+from capsule_embedding_service import EMBEDDING_DIM
+
+logger = logging.getLogger(__name__)
+
+# 默认融合参数（config.json -> search 覆盖）
+DEFAULT_SEARCH_CONFIG = {
+    'lexical_weight': 1.0,         # 词法排名权重
+    'vector_weight': 1.0,          # 向量排名权重
+    'rrf_k': 60,                   # RRF 平滑常数，越大排名差异的影响越小
+    'candidate_k': 100,            # 每一路参与融合的候选数量
+    'min_vector_similarity': 0.2,  # 向量候选的最低相似度（只过滤明显无关结果）
+}
+
+# 搜索时检查缺失向量的最小间隔（秒）
+MISSING_REFRESH_INTERVAL = 300.0
+
+# 向量计算失败的胶囊多久后重试（文本为空的胶囊在文本变化前不再重试）
+FAILED_RETRY_HOURS = 24
+
+
+def get_search_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取搜索融合参数：默认值 < config.json 的 search 字段 < 调用方覆盖
+
+    Args:
+        overrides: 单次请求的覆盖值（None 值忽略）
+
+    Returns:
+        融合参数字典
+    """
+    config = dict(DEFAULT_SEARCH_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_search = load_user_config().get('search') or {}
+    except Exception:
+        user_search = {}
+
+    for source in (user_search, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_SEARCH_CONFIG and value is not None:
+                config[key] = type(DEFAULT_SEARCH_CONFIG[key])(value)
+
+    return config
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[Tuple[List[int], float]],
+    rrf_k: int = 60
+) -> Dict[int, float]:
+    """
+    倒数排名融合
+
+    Args:
+        ranked_lists: [(按相关度排好序的 ID 列表, 权重), ...]
+        rrf_k: 平滑常数
+
+    Returns:
+        {id: 融合分数}
+    """
+    scores: Dict[int, float] = {}
+    for ids, weight in ranked_lists:
+        if weight <= 0:
+            continue
+        for rank, item_id in enumerate(ids, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (rrf_k + rank)
+    return scores
+
+
+class LocalVectorIndex:
+    """
+    本地胶囊向量索引
+
+    向量存储在 capsule_embeddings 表中（float32 BLOB），text_hash 用于判断是否需要重算。
+    文本为空或向量计算失败的胶囊记录在 capsule_embedding_skips 中，不再算作缺失
+    （失败的在 FAILED_RETRY_HOURS 后或文本变化时重试）。
+    查询时把全部向量（只取 EMBEDDING_DIM 维的）载入一个归一化矩阵；
+    capsule_embeddings 的任何写入都由触发器递增 capsule_embeddings_generation，
+    版本号变化后重新载入。
+    """
+
+    def __init__(self, db_path: str, embed_fn: Optional[Callable[[str], Optional[List[float]]]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            embed_fn: 文本 -> 向量函数（默认使用 HybridEmbeddingService）
+        """
+        self.db_path = db_path
+        self._embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        self._signature = None
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._last_missing_check: Optional[float] = None
+        self._init_table()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self):
+        """创建向量表（如果不存在）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS capsule_embeddings (
+                    capsule_id INTEGER PRIMARY KEY,
+                    text_hash TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    embedding BLOB NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            # 向量表版本号（触发器维护，判断内存矩阵是否过期）
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS capsule_embeddings_generation (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    generation INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO capsule_embeddings_generation (id, generation) VALUES (1, 0)")
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_capsule_embeddings_{event.lower()}_generation
+                    AFTER {event} ON capsule_embeddings
+                    BEGIN
+                        UPDATE capsule_embeddings_generation SET generation = generation + 1 WHERE id = 1;
+                    END
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS capsule_embedding_skips (
+                    capsule_id INTEGER PRIMARY KEY,
+                    text_hash TEXT NOT NULL,
+                    reason TEXT NOT NULL,  -- empty, failed
+                    attempted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def embed(self, text: str) -> Optional[List[float]]:
+        """计算文本向量"""
+        if self._embed_fn is not None:
+            return self._embed_fn(text)
+        from capsule_embedding_service import _get_embedding
+        return _get_embedding(text)
+
+    def _load_search_texts(self, conn, capsule_ids: Optional[List[int]] = None) -> Dict[int, str]:
+        """读取胶囊的搜索文本（与云端主体 + 标签向量使用相同的拼接规则）"""
+        from capsule_embedding_service import build_search_text
+
+        cursor = conn.cursor()
+        if capsule_ids:
+            placeholders = ",".join(["?"] * len(capsule_ids))
+            where = f"WHERE id IN ({placeholders})"
+            params = list(capsule_ids)
+        else:
+            where = ""
+            params = []
+
+        cursor.execute(f"SELECT id, name, description, keywords FROM capsules {where}", params)
+        capsules = {row['id']: dict(row) for row in cursor.fetchall()}
+
+        tags_by_id: Dict[int, List[Dict[str, Any]]] = {cid: [] for cid in capsules}
+        cursor.execute(f"""
+            SELECT capsule_id, word_cn, word_en FROM capsule_tags
+            {where.replace('id IN', 'capsule_id IN')}
+            ORDER BY id
+        """, params)
+        for row in cursor.fetchall():
+            if row['capsule_id'] in tags_by_id:
+                tags_by_id[row['capsule_id']].append(dict(row))
+
+        return {
+            cid: build_search_text(
+                name=c.get('name') or "",
+                description=c.get('description') or "",
+                keywords=c.get('keywords') or "",
+                tags=tags_by_id[cid],
+            )
+            for cid, c in capsules.items()
+        }
+
+    def refresh(self, capsule_ids: Optional[List[int]] = None, max_items: Optional[int] = None) -> int:
+        """
+        重新计算文本有变化（或尚无向量）的胶囊的向量
+
+        Args:
+            capsule_ids: 只处理这些胶囊（None 表示全部）
+            max_items: 本次最多计算的数量
+
+        Returns:
+            计算的向量数量
+        """
+        conn = self._get_connection()
+        try:
+            texts = self._load_search_texts(conn, capsule_ids)
+
+            cursor = conn.cursor()
+            cursor.execute("SELECT capsule_id, text_hash FROM capsule_embeddings")
+            existing = {row['capsule_id']: row['text_hash'] for row in cursor.fetchall()}
+            cursor.execute(f"""
+                SELECT capsule_id, text_hash FROM capsule_embedding_skips
+                WHERE reason = 'empty' OR attempted_at > datetime('now', '-{int(FAILED_RETRY_HOURS)} hours')
+            """)
+            skipped = {row['capsule_id']: row['text_hash'] for row in cursor.fetchall()}
+
+            rows = []
+            skips = []
+            for capsule_id, text in texts.items():
+                text_hash = hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+                if existing.get(capsule_id) == text_hash or skipped.get(capsule_id) == text_hash:
+                    continue
+                if not text:
+                    skips.append((capsule_id, text_hash, 'empty'))
+                    continue
+                if max_items is not None and len(rows) >= max_items:
+                    break
+
+                embedding = self.embed(text)
+                if not embedding or len(embedding) != EMBEDDING_DIM:
+                    skips.append((capsule_id, text_hash, 'failed'))
+                    continue
+                vector = np.asarray(embedding, dtype=np.float32)
+                rows.append((capsule_id, text_hash, int(vector.shape[0]), vector.tobytes()))
+
+            if rows:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO capsule_embeddings
+                    (capsule_id, text_hash, dim, embedding, updated_at)
+                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, rows)
+                cursor.executemany("DELETE FROM capsule_embedding_skips WHERE capsule_id = ?",
+                                   [(row[0],) for row in rows])
+                logger.info(f"✓ 本地向量索引已更新 {len(rows)} 个胶囊")
+            if skips:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO capsule_embedding_skips
+                    (capsule_id, text_hash, reason, attempted_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, skips)
+            if rows or skips:
+                conn.commit()
+
+            return len(rows)
+        finally:
+            conn.close()
+
+    def refresh_in_background(self, capsule_ids: Optional[List[int]] = None):
+        """在后台线程中刷新向量（同一时间只运行一个刷新线程）"""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._safe_refresh, args=(capsule_ids,), daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _safe_refresh(self, capsule_ids: Optional[List[int]]):
+        try:
+            self.refresh(capsule_ids)
+        except Exception as e:
+            logger.warning(f"本地向量索引刷新失败: {e}")
+
+    def missing_count(self) -> int:
+        """尚未建立向量的胶囊数量（不含文本为空、或近期计算失败的胶囊）"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM capsules c
+                LEFT JOIN capsule_embeddings e ON e.capsule_id = c.id
+                LEFT JOIN capsule_embedding_skips s ON s.capsule_id = c.id
+                    AND (s.reason = 'empty' OR s.attempted_at > datetime('now', '-{int(FAILED_RETRY_HOURS)} hours'))
+                WHERE e.capsule_id IS NULL AND s.capsule_id IS NULL
+            """)
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def refresh_missing_in_background(self, min_interval: float = MISSING_REFRESH_INTERVAL) -> bool:
+        """
+        有缺失向量时在后台补齐（搜索路径调用，每 min_interval 秒最多检查一次）
+
+        Returns:
+            是否启动了刷新
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_missing_check is not None and now - self._last_missing_check < min_interval:
+                return False
+            self._last_missing_check = now
+
+        if not self.missing_count():
+            return False
+        self.refresh_in_background()
+        return True
+
+    def _load_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """载入（或复用）归一化后的向量矩阵"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT generation FROM capsule_embeddings_generation WHERE id = 1")
+            row = cursor.fetchone()
+            signature = row[0] if row else None
+
+            with self._lock:
+                if self._matrix is not None and signature == self._signature:
+                    return self._ids, self._matrix
+
+            cursor.execute("""
+                SELECT e.capsule_id, e.embedding
+                FROM capsule_embeddings e
+                JOIN capsules c ON c.id = e.capsule_id
+                WHERE e.dim = ? AND LENGTH(e.embedding) = ?
+                ORDER BY e.capsule_id
+            """, (EMBEDDING_DIM, EMBEDDING_DIM * 4))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        if rows:
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        else:
+            ids = np.zeros(0, dtype=np.int64)
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        with self._lock:
+            self._ids, self._matrix, self._signature = ids, matrix, signature
+        return ids, matrix
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int = 100,
+        min_similarity: float = 0.0,
+        allowed_ids: Optional[set] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        余弦相似度搜索
+
+        Args:
+            query_embedding: 查询向量
+            k: 返回数量
+            min_similarity: 最低相似度
+            allowed_ids: 只在这些胶囊中搜索（用于组合筛选）
+
+        Returns:
+            [(capsule_id, similarity), ...]，相似度降序
+        """
+        ids, matrix = self._load_matrix()
+        if not len(ids):
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != matrix.shape[1]:
+            logger.warning(f"查询向量维度不匹配: {query.shape[0]} != {matrix.shape[1]}")
+            return []
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        sims = matrix @ (query / norm)
+
+        if allowed_ids is not None:
+            mask = np.isin(ids, np.fromiter(allowed_ids, dtype=np.int64, count=len(allowed_ids)))
+            sims = np.where(mask, sims, -1.0)
+
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+
+        return [
+            (int(ids[i]), float(sims[i]))
+            for i in top
+            if sims[i] >= min_similarity
+        ]
+
+
+class HybridSearchService:
+    """混合搜索服务（词法 + 向量，RRF 融合）"""
+
+    def __init__(self, db_path: str, embed_fn: Optional[Callable[[str], Optional[List[float]]]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            embed_fn: 文本 -> 向量函数（默认使用 HybridEmbeddingService）
+        """
+        self.db_path = db_path
+        self.vector_index = LocalVectorIndex(db_path, embed_fn=embed_fn)
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        lens: Optional[str] = None,
+        x: Optional[float] = None,
+        y: Optional[float] = None,
+        radius: float = 20,
+        owner_id: Optional[str] = None,
+        config_overrides: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        混合搜索
+
+        Args:
+            query: 搜索文本
+            limit: 返回数量
+            lens, x, y, radius, owner_id: 筛选条件（同 CapsuleDatabase.search_capsules_text）
+            config_overrides: 融合参数覆盖
+            query_embedding: 预先计算好的查询向量（None 时自动计算）
+
+        Returns:
+            {
+                'results': [{'capsule_id', 'score', 'lexical_rank', 'vector_rank', 'similarity'}, ...],
+                'timings_ms': {'lexical', 'vector', 'total'},
+                'config': 实际使用的融合参数
+            }
+        """
+        from capsule_db import CapsuleDatabase
+
+        config = get_search_config(config_overrides)
+        candidate_k = max(limit, config['candidate_k'])
+        started = time.perf_counter()
+
+        db = CapsuleDatabase(self.db_path)
+
+        # 1. 词法
+        lexical_ids = []
+        if config['lexical_weight'] > 0:
+            lexical = db.search_capsules_text(
+                query, lens=lens, x=x, y=y, radius=radius,
+                owner_id=owner_id, limit=candidate_k
+            )
+            lexical_ids = [c['id'] for c in lexical]
+        lexical_done = time.perf_counter()
+
+        # 2. 向量
+        vector_hits = []
+        if config['vector_weight'] > 0:
+            if query_embedding is None:
+                query_embedding = self.vector_index.embed(query)
+            if query_embedding:
+                allowed_ids = None
+                if owner_id is not None or (lens and x is not None and y is not None):
+                    allowed_ids = db.get_capsule_ids(
+                        lens=lens, x=x, y=y, radius=radius, owner_id=owner_id
+                    )
+                vector_hits = self.vector_index.search(
+                    query_embedding,
+                    k=candidate_k,
+                    min_similarity=config['min_vector_similarity'],
+                    allowed_ids=allowed_ids
+                )
+        vector_done = time.perf_counter()
+
+        # 3. 融合
+        vector_ids = [cid for cid, _ in vector_hits]
+        scores = reciprocal_rank_fusion(
+            [(lexical_ids, config['lexical_weight']), (vector_ids, config['vector_weight'])],
+            rrf_k=config['rrf_k']
+        )
+        lexical_rank = {cid: i for i, cid in enumerate(lexical_ids, start=1)}
+        vector_rank = {cid: i for i, (cid, _) in enumerate(vector_hits, start=1)}
+        similarity = dict(vector_hits)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        results = [
+            {
+                'capsule_id': cid,
+                'score': score,
+                'lexical_rank': lexical_rank.get(cid),
+                'vector_rank': vector_rank.get(cid),
+                'similarity': similarity.get(cid),
+            }
+            for cid, score in ranked
+        ]
+
+        return {
+            'results': results,
+            'timings_ms': {
+                'lexical': round((lexical_done - started) * 1000, 2),
+                'vector': round((vector_done - lexical_done) * 1000, 2),
+                'total': round((time.perf_counter() - started) * 1000, 2),
+            },
+            'config': config,
+        }
+
+
+# ==========================================
+# 全局实例
+# ==========================================
+
+_hybrid_search_services: Dict[str, HybridSearchService] = {}
+
+
+def get_hybrid_search_service(db_path: Optional[str] = None) -> HybridSearchService:
+    """
+    获取混合搜索服务实例（按数据库路径单例，复用内存中的向量矩阵）
+
+    Args:
+        db_path: 数据库路径（None 时使用 PathManager 的数据库）
+
+    Returns:
+        HybridSearchService 实例
+    """
+    if db_path is None:
+        from common import PathManager
+        db_path = str(PathManager.get_instance().db_path)
+
+    if db_path not in _hybrid_search_services:
+        _hybrid_search_services[db_path] = HybridSearchService(db_path)
+    return _hybrid_search_services[db_path]
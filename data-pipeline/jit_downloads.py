@@ -0,0 +1,286 @@
+"""
+JIT 资产下载任务管理
+
+/api/capsules/<id>/download-assets 的按需下载（整个 Audio 文件夹）：
+- 有界线程池执行，限制同时下载的胶囊数
+- 每个胶囊同一时间只有一个进行中的任务，重复请求返回已有任务（single-flight）
+- 每个任务有任务 ID 和取消令牌：暂停 / 取消会停止进行中的文件下载
+  （暂停保留 .part 以便恢复时续传）
+- 任务状态保存在内存中，已结束的任务保留 retain_seconds 供状态接口查询
+- 进度按文件数和字节数记录（字节进度来自 ResumableDownloader 的回调），速度按本次运行的平均值计算
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable, Tuple, List
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> jit_download 覆盖）
+DEFAULT_JIT_CONFIG = {
+    'max_concurrent': 2,          # 同时下载的胶囊数
+    'retain_seconds': 600.0,      # 已结束任务的保留时间
+}
+
+# 进行中的状态
+ACTIVE_STATUSES = ('queued', 'downloading')
+
+
+def get_jit_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取 JIT 下载参数：默认值 < config.json 的 jit_download 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_JIT_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('jit_download') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_JIT_CONFIG and value is not None:
+                config[key] = type(DEFAULT_JIT_CONFIG[key])(value)
+
+    return config
+
+
+@dataclass
+class JitDownloadTask:
+    """JIT 下载任务"""
+    task_id: str
+    capsule_id: int
+    run: Callable[['JitDownloadTask'], bool] = field(repr=False)
+    status: str = 'queued'        # queued, downloading, completed, failed, paused, cancelled
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    files_done: int = 0
+    files_total: int = 0
+    downloaded_bytes: int = 0
+    total_bytes: int = 0
+    bytes_base: Optional[int] = None  # 本次运行首次上报的字节数（续传已有的部分不计入速度）
+    bytes_started_at: Optional[float] = None
+    error: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    stop_status: str = 'cancelled'  # 取消令牌触发后的最终状态（paused / cancelled）
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def progress(self) -> int:
+        if self.status == 'completed':
+            return 100
+        if self.total_bytes:
+            return min(99, int(self.downloaded_bytes * 100 / self.total_bytes))
+        if not self.files_total:
+            return 0
+        return int(self.files_done * 100 / self.files_total)
+
+    @property
+    def speed(self) -> float:
+        """本次运行的平均速度（bytes/second）"""
+        if self.status != 'downloading' or self.bytes_base is None:
+            return 0
+        elapsed = time.time() - self.bytes_started_at
+        return (self.downloaded_bytes - self.bytes_base) / elapsed if elapsed > 0 else 0
+
+    @property
+    def eta_seconds(self) -> Optional[int]:
+        speed = self.speed
+        if speed <= 0 or not self.total_bytes:
+            return None
+        return int(max(0, self.total_bytes - self.downloaded_bytes) / speed)
+
+    def report(self, files_done: int, files_total: int, filename: Optional[str] = None):
+        """下载进度回调（与 AudioFolderDownloader 的 progress_callback 签名一致）"""
+        self.files_done = files_done
+        self.files_total = files_total
+
+    def report_bytes(self, downloaded_bytes: int, total_bytes: int):
+        """字节进度回调（与 AudioFolderDownloader 的 bytes_callback 签名一致）"""
+        if self.bytes_base is None:
+            self.bytes_base = downloaded_bytes
+            self.bytes_started_at = time.time()
+        self.downloaded_bytes = downloaded_bytes
+        self.total_bytes = total_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'task_id': self.task_id,
+            'capsule_id': self.capsule_id,
+            'status': self.status,
+            'progress': self.progress,
+            'files_done': self.files_done,
+            'files_total': self.files_total,
+            'downloaded_bytes': self.downloaded_bytes,
+            'total_bytes': self.total_bytes,
+            'speed': int(self.speed),
+            'eta_seconds': self.eta_seconds,
+            'error': self.error,
+            'error_message': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JitDownloadManager:
+    """按胶囊去重的有界下载执行器"""
+
+    def __init__(self, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            config_overrides: 覆盖 DEFAULT_JIT_CONFIG
+        """
+        self.config = get_jit_config(config_overrides)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, self.config['max_concurrent']),
+            thread_name_prefix='jit-download'
+        )
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, JitDownloadTask] = {}
+        self._active: Dict[int, str] = {}  # capsule_id -> 进行中的 task_id
+
+    def submit(self, capsule_id: int, run: Callable[[JitDownloadTask], bool]) -> Tuple[JitDownloadTask, bool]:
+        """
+        提交下载（该胶囊已有进行中的任务时直接返回该任务）
+
+        Args:
+            capsule_id: 胶囊 ID
+            run: 下载函数，接收任务对象（取消令牌 / 进度回调），返回是否成功
+
+        Returns:
+            (任务, 是否新建)
+        """
+        with self._lock:
+            self._expire()
+            task_id = self._active.get(capsule_id)
+            if task_id:
+                return self._tasks[task_id], False
+
+            task = JitDownloadTask(task_id=uuid.uuid4().hex, capsule_id=capsule_id, run=run)
+            self._tasks[task.task_id] = task
+            self._active[capsule_id] = task.task_id
+            task.future = self._executor.submit(self._execute, task)
+            return task, True
+
+    def get(self, task_id: str) -> Optional[JitDownloadTask]:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def get_by_capsule(self, capsule_id: int) -> Optional[JitDownloadTask]:
+        """胶囊进行中的任务，没有时返回最近的任务"""
+        with self._lock:
+            task_id = self._active.get(capsule_id)
+            if task_id:
+                return self._tasks[task_id]
+            tasks = [t for t in self._tasks.values() if t.capsule_id == capsule_id]
+            return max(tasks, key=lambda t: t.created_at) if tasks else None
+
+    def list_tasks(self) -> List[JitDownloadTask]:
+        with self._lock:
+            return sorted(self._tasks.values(), key=lambda t: t.created_at, reverse=True)
+
+    def stop(self, capsule_id: int, status: str = 'cancelled') -> Optional[JitDownloadTask]:
+        """
+        暂停 / 取消胶囊进行中的任务
+
+        Args:
+            capsule_id: 胶囊 ID
+            status: 'paused'（保留 .part）或 'cancelled'
+
+        Returns:
+            被停止的任务；没有进行中的任务时返回 None
+        """
+        with self._lock:
+            task_id = self._active.get(capsule_id)
+            if not task_id:
+                return None
+            task = self._tasks[task_id]
+            task.stop_status = status
+            task.cancel_event.set()
+            if task.future and task.future.cancel():
+                # 尚未开始执行，直接结束
+                self._finish(task, status)
+            return task
+
+    def resume(self, capsule_id: int) -> Optional[Tuple[JitDownloadTask, bool]]:
+        """
+        恢复已暂停的下载（用原下载函数重新提交，已下载的文件跳过、.part 续传）
+
+        Returns:
+            (任务, 是否新建)；没有可恢复的任务时返回 None
+        """
+        task = self.get_by_capsule(capsule_id)
+        if task is None:
+            return None
+        if task.status in ACTIVE_STATUSES:
+            return task, False
+        if task.status != 'paused':
+            return None
+        return self.submit(capsule_id, task.run)
+
+    def _finish(self, task: JitDownloadTask, status: str, error: Optional[str] = None):
+        """结束任务（需持有 _lock）"""
+        task.status = status
+        task.error = error
+        task.finished_at = time.time()
+        if self._active.get(task.capsule_id) == task.task_id:
+            del self._active[task.capsule_id]
+
+    def _expire(self):
+        """移除超过保留时间的已结束任务（需持有 _lock）"""
+        cutoff = time.time() - self.config['retain_seconds']
+        for task_id in [t.task_id for t in self._tasks.values()
+                        if t.finished_at and t.finished_at < cutoff]:
+            del self._tasks[task_id]
+
+    def _execute(self, task: JitDownloadTask):
+        with self._lock:
+            if task.cancel_event.is_set():
+                self._finish(task, task.stop_status)
+                return
+            task.status = 'downloading'
+            task.started_at = time.time()
+
+        try:
+            success = task.run(task)
+            error = None if success else '下载失败'
+        except Exception as e:
+            logger.error(f"[DOWNLOAD] 胶囊 {task.capsule_id} 下载异常: {e}")
+            success, error = False, str(e)
+
+        with self._lock:
+            if task.cancel_event.is_set():
+                self._finish(task, task.stop_status)
+            elif success:
+                self._finish(task, 'completed')
+            else:
+                self._finish(task, 'failed', error)
+
+        logger.info(f"[DOWNLOAD] 胶囊 {task.capsule_id} 任务 {task.task_id} 结束: {task.status}")
+
+
+# 全局单例
+_manager: Optional[JitDownloadManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_jit_download_manager() -> JitDownloadManager:
+    """获取 JIT 下载管理器单例"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JitDownloadManager()
+        return _manager
@@ -0,0 +1,399 @@
+"""
+预览音频预取
+
+前端把当前可见的胶囊（视口 / 棱镜区域）和最近的搜索作为提示发给后端，
+预取服务在后台以批量（低）带宽优先级下载这些胶囊缺失的 OGG 预览，并登记到 local_cache：
+- 优先级：可见胶囊 > 最近搜索的结果 > 附近（棱镜区域）胶囊
+- 每次提示替换整个待取队列：视口移走后尚未开始的预取直接丢弃
+  （进行中的一批很小，允许完成）
+- 只使用缓存预算内的剩余空间，预取从不触发清理
+- 统计 stream_preview 的命中率和前端上报的首次出声时间（time-to-first-audio）
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable
+
+from http_pool import PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> preview_prefetch 覆盖）
+DEFAULT_PREFETCH_CONFIG = {
+    'batch_size': 8,                # 每批预取的胶囊数
+    'max_workers': 2,               # 每批的并发下载数
+    'max_hinted': 200,              # 单次提示最多处理的胶囊数
+    'search_results': 10,           # 每个最近搜索取前 N 个结果
+    'cache_budget_mb': 0,           # 缓存预算（0 表示使用 MAX_CACHE_SIZE，默认 5GB）
+    'default_preview_kb': 512,      # 还没有预览缓存时估算的单个预览大小
+    'boot_sync_previews': True,     # 启动同步是否下载全部预览（关闭后只按提示预取）
+}
+
+# 首次出声时间样本数
+_TTFA_SAMPLES = 500
+
+# 记住的胶囊数上限（预取过的胶囊、最近一次预览请求是否命中）
+_TRACKED_CAPSULES = 2000
+
+
+def get_prefetch_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取预取参数：默认值 < config.json 的 preview_prefetch 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_PREFETCH_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('preview_prefetch') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_PREFETCH_CONFIG and value is not None:
+                config[key] = type(DEFAULT_PREFETCH_CONFIG[key])(value)
+
+    return config
+
+
+def get_cache_budget(config: Dict[str, Any]) -> int:
+    """缓存预算（字节）：cache_budget_mb，未设置时与 /api/cache/* 一致使用 MAX_CACHE_SIZE"""
+    if config['cache_budget_mb'] > 0:
+        return config['cache_budget_mb'] * 1024 * 1024
+    return int(os.getenv('MAX_CACHE_SIZE', 5 * 1024 * 1024 * 1024))
+
+
+def _percentile(samples: List[float], percent: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class PreviewMetrics:
+    """预览命中率和首次出声时间（内存统计）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'hits': 0, 'misses': 0, 'prefetched_hits': 0}
+        self._ttfa_ms = {'hit': deque(maxlen=_TTFA_SAMPLES), 'miss': deque(maxlen=_TTFA_SAMPLES),
+                         'unknown': deque(maxlen=_TTFA_SAMPLES)}
+        self._last_hit: OrderedDict = OrderedDict()   # 胶囊 ID -> 最近一次请求是否命中
+
+    def record_request(self, hit: bool, prefetched: bool = False, capsule_id: Optional[int] = None):
+        """stream_preview 的一次请求：本地是否已有预览文件"""
+        with self._lock:
+            self._counts['requests'] += 1
+            self._counts['hits' if hit else 'misses'] += 1
+            if hit and prefetched:
+                self._counts['prefetched_hits'] += 1
+            if capsule_id is not None:
+                self._last_hit[capsule_id] = hit
+                self._last_hit.move_to_end(capsule_id)
+                while len(self._last_hit) > _TRACKED_CAPSULES:
+                    self._last_hit.popitem(last=False)
+
+    def last_hit(self, capsule_id: int) -> Optional[bool]:
+        """该胶囊最近一次预览请求是否命中（没有记录时返回 None）"""
+        with self._lock:
+            return self._last_hit.get(capsule_id)
+
+    def record_ttfa(self, ttfa_ms: float, cache_hit: Optional[bool]):
+        """前端上报的首次出声时间（点击播放到第一帧音频）；cache_hit 未知时只计入总体"""
+        key = 'unknown' if cache_hit is None else ('hit' if cache_hit else 'miss')
+        with self._lock:
+            self._ttfa_ms[key].append(float(ttfa_ms))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            samples = {key: list(values) for key, values in self._ttfa_ms.items()}
+
+        all_samples = samples['hit'] + samples['miss'] + samples['unknown']
+        return {
+            **counts,
+            'hit_rate': counts['hits'] / counts['requests'] if counts['requests'] else None,
+            'ttfa_ms': {
+                'samples': len(all_samples),
+                'p50': _percentile(all_samples, 50),
+                'p95': _percentile(all_samples, 95),
+                'hit_p50': _percentile(samples['hit'], 50),
+                'miss_p50': _percentile(samples['miss'], 50),
+            },
+        }
+
+
+class PreviewPrefetcher:
+    """按前端提示在后台预取预览音频"""
+
+    def __init__(self, db_path: str, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            config_overrides: 覆盖 DEFAULT_PREFETCH_CONFIG
+        """
+        self.db_path = db_path
+        self.config = get_prefetch_config(config_overrides)
+        self.metrics = PreviewMetrics()
+
+        self._cond = threading.Condition()
+        self._pending: List[int] = []        # 待预取的胶囊（按优先级排序）
+        self._generation = 0                 # 提示版本（每次提示 +1）
+        self._inflight: List[int] = []
+        self._prefetched: OrderedDict = OrderedDict()   # 最近预取过的胶囊（统计预取命中，最多 _TRACKED_CAPSULES 个）
+        self._preview_bytes = {'count': 0, 'size': 0}    # 本进程登记过的预览大小（估算单个预览大小）
+        self._stats = {'hints': 0, 'dropped': 0, 'prefetched': 0,
+                       'already_local': 0, 'budget_skipped': 0, 'errors': 0}
+
+        self._thread = threading.Thread(target=self._run, name='preview-prefetch', daemon=True)
+        self._thread.start()
+
+    # ---------- 提示 ----------
+
+    def hint(self, visible: Iterable[int] = (), searches: Iterable[str] = (),
+             nearby: Iterable[int] = ()) -> Dict[str, Any]:
+        """
+        提交新的提示（替换之前尚未开始的预取）
+
+        Args:
+            visible: 当前可见的胶囊 ID（最优先）
+            searches: 最近的搜索文本（取前 search_results 个结果）
+            nearby: 棱镜区域中附近的胶囊 ID
+
+        Returns:
+            {'generation': int, 'queued': int, 'dropped': int}
+        """
+        ordered: List[int] = []
+        seen = set()
+
+        def add(capsule_ids):
+            for capsule_id in capsule_ids:
+                try:
+                    capsule_id = int(capsule_id)
+                except (TypeError, ValueError):
+                    continue
+                if capsule_id not in seen and len(ordered) < self.config['max_hinted']:
+                    seen.add(capsule_id)
+                    ordered.append(capsule_id)
+
+        add(visible)
+        add(self._search_capsule_ids(searches))
+        add(nearby)
+
+        with self._cond:
+            dropped = len([c for c in self._pending if c not in seen])
+            self._pending = [c for c in ordered if c not in self._inflight]
+            self._generation += 1
+            self._stats['hints'] += 1
+            self._stats['dropped'] += dropped
+            self._cond.notify()
+            return {'generation': self._generation, 'queued': len(self._pending), 'dropped': dropped}
+
+    def _search_capsule_ids(self, searches: Iterable[str]) -> List[int]:
+        """最近搜索的前几个结果"""
+        queries = [q for q in searches if isinstance(q, str) and q.strip()]
+        if not queries:
+            return []
+
+        from capsule_db import CapsuleDatabase
+        db = CapsuleDatabase(self.db_path)
+        capsule_ids = []
+        for query in queries:
+            try:
+                results = db.search_capsules_text(query, limit=self.config['search_results'])
+                capsule_ids.extend(r['id'] for r in results)
+            except Exception as e:
+                logger.debug(f"预取搜索失败 ({query}): {e}")
+        return capsule_ids
+
+    def was_prefetched(self, capsule_id: int) -> bool:
+        with self._cond:
+            return capsule_id in self._prefetched
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._cond:
+            status = dict(self._stats, pending=len(self._pending), inflight=len(self._inflight),
+                          generation=self._generation)
+        status['metrics'] = self.metrics.snapshot()
+        return status
+
+    # ---------- 后台预取 ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch = self._pending[:self.config['batch_size']]
+                self._pending = self._pending[len(batch):]
+                self._inflight = batch
+
+            try:
+                self._prefetch_batch(batch)
+            except Exception as e:
+                logger.warning(f"预取预览失败: {e}")
+                with self._cond:
+                    self._stats['errors'] += 1
+                time.sleep(1.0)
+            finally:
+                with self._cond:
+                    self._inflight = []
+
+    def _load_capsules(self, capsule_ids: List[int]) -> List[Dict[str, Any]]:
+        from capsule_db import CapsuleDatabase
+        db = CapsuleDatabase(self.db_path)
+        db.connect()
+        try:
+            placeholders = ','.join('?' * len(capsule_ids))
+            rows = db.conn.execute(f"""
+                SELECT id, name, preview_audio, owner_supabase_user_id, file_path
+                FROM capsules
+                WHERE id IN ({placeholders}) AND preview_audio IS NOT NULL AND preview_audio != ''
+            """, capsule_ids).fetchall()
+        finally:
+            db.close()
+        order = {capsule_id: i for i, capsule_id in enumerate(capsule_ids)}
+        return sorted((dict(r) for r in rows), key=lambda r: order[r['id']])
+
+    def _register(self, capsule_id: int, preview_path: Path):
+        """登记到 local_cache（预览很小，直接计算哈希）"""
+        from capsule_db import CapsuleDatabase
+
+        sha256 = hashlib.sha256()
+        with open(preview_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+        file_size = preview_path.stat().st_size
+        CapsuleDatabase(self.db_path).add_to_cache(
+            capsule_id, 'preview', str(preview_path), file_size, sha256.hexdigest()
+        )
+        with self._cond:
+            self._preview_bytes['count'] += 1
+            self._preview_bytes['size'] += file_size
+
+    def _available_slots(self, wanted: int) -> int:
+        """缓存预算的剩余空间还能放下几个预览（用量取自缓存预算的内存计数，不扫描 local_cache）"""
+        from cache_budget import get_cache_budget_manager
+
+        limit = get_cache_budget(self.config)
+        budget = get_cache_budget_manager(self.db_path)
+        if budget is not None:
+            # 预取不应把缓存推过高水位，否则刚下载的预览会被后台淘汰
+            limit = min(limit, budget.high_water)
+            used = budget.unpinned_bytes
+        else:
+            used = 0
+
+        with self._cond:
+            registered = dict(self._preview_bytes)
+        if registered['count']:
+            average = registered['size'] / registered['count']
+        else:
+            average = self.config['default_preview_kb'] * 1024
+        return min(wanted, int(max(0, limit - used) // max(1, average)))
+
+    def _prefetch_batch(self, capsule_ids: List[int]):
+        from common import PathManager
+        export_dir = Path(PathManager.get_instance().export_dir)
+
+        jobs = []
+        for capsule in self._load_capsules(capsule_ids):
+            local_dir = export_dir / (capsule['file_path'] or capsule['name'])
+            preview_path = local_dir / capsule['preview_audio']
+            if preview_path.exists():
+                with self._cond:
+                    self._stats['already_local'] += 1
+                continue
+            if not capsule['owner_supabase_user_id']:
+                continue
+            jobs.append({
+                'capsule_id': capsule['id'],
+                'owner_id': capsule['owner_supabase_user_id'],
+                'folder': capsule['name'],
+                'local_dir': local_dir,
+                'files': [('preview', capsule['preview_audio'])],
+                'priority': PRIORITY_BULK,
+            })
+
+        if not jobs:
+            return
+
+        slots = self._available_slots(len(jobs))
+        if slots < len(jobs):
+            with self._cond:
+                self._stats['budget_skipped'] += len(jobs) - slots
+                if slots == 0:
+                    # 预算用完：本轮提示的其余预取也放不下
+                    self._stats['budget_skipped'] += len(self._pending)
+                    self._pending = []
+            jobs = jobs[:slots]
+            if not jobs:
+                logger.info("⏸️  缓存预算已满，暂停预览预取")
+                return
+
+        from asset_fetcher import get_asset_fetcher
+        from supabase_client import get_supabase_client
+        supabase = get_supabase_client()
+        if not supabase:
+            return
+
+        fetched = get_asset_fetcher(
+            supabase, self.db_path, config_overrides={'max_workers': self.config['max_workers']}
+        ).fetch_all(jobs)
+
+        prefetched = []
+        for job in jobs:
+            if 'preview' not in fetched['downloaded'].get(job['capsule_id'], []):
+                continue
+            try:
+                self._register(job['capsule_id'], Path(job['local_dir']) / job['files'][0][1])
+                prefetched.append(job['capsule_id'])
+            except Exception as e:
+                logger.warning(f"登记预览缓存失败 ({job['capsule_id']}): {e}")
+
+        with self._cond:
+            for capsule_id in prefetched:
+                self._prefetched[capsule_id] = True
+                self._prefetched.move_to_end(capsule_id)
+            while len(self._prefetched) > _TRACKED_CAPSULES:
+                self._prefetched.popitem(last=False)
+            self._stats['prefetched'] += len(prefetched)
+            self._stats['errors'] += len(fetched['errors'])
+        logger.info(f"🎧 预取预览: {len(prefetched)}/{len(jobs)} 个")
+
+
+# 全局单例
+_prefetcher: Optional[PreviewPrefetcher] = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_preview_prefetcher(db_path: Optional[str] = None) -> PreviewPrefetcher:
+    """
+    获取预览预取服务单例
+
+    Args:
+        db_path: 数据库路径（可选，不提供则从 PathManager 获取）
+
+    Returns:
+        PreviewPrefetcher 实例
+    """
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            if db_path is None:
+                from common import PathManager
+                db_path = PathManager.get_instance().db_path
+            _prefetcher = PreviewPrefetcher(str(db_path))
+        return _prefetcher
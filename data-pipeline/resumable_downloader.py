@@ -8,6 +8,15 @@
 4. SHA256 完整性校验
 5. 自动重试（最多3次）
 6. 实时进度更新
+7. 原子写入：先写 <local_path>.part，完成并校验后再重命名
+8. 分段多连接下载（可选，segments > 1）：按字节范围拆成 N 段并行请求，
+   写入预分配的稀疏 .part 文件（按偏移写入），每段进度保存在 <local_path>.part.segments，
+   中断后按段续传；服务端不支持 Range 时回退到单连接
+9. 流式 SHA256：写入的同时更新哈希，下载完成时校验几乎不增加耗时；
+   分段乱序到达的数据由后台线程按连续前缀从文件追赶哈希（大块读取，与网络传输重叠）。
+   分段下载另外按 4MB 块记录每块的 SHA256（保存在 .part.segments 中，续传时直接复用）；
+   续传时只有调用方要求校验整文件哈希（expected_hash）才会重新读取已下载的前缀
+10. 共用进程内的 HTTP 连接池（keep-alive），按优先级经过全局带宽限制（见 http_pool.py）
 
 使用示例：
     downloader = ResumableDownloader(
@@ -25,14 +34,21 @@
 """
 
 import os
+import json
 import hashlib
+import logging
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, Optional, Callable, List
 from dataclasses import dataclass
 
-from capsule_db import CapsuleDatabase
+from download_progress import get_download_progress_registry
+from http_pool import get_http_session, get_bandwidth_limiter, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -45,6 +61,138 @@ class DownloadProgress:
     eta_seconds: Optional[int]
 
 
+# 分段下载状态文件后缀（<local_path>.part.segments）
+SEGMENT_STATE_SUFFIX = '.segments'
+
+# 从文件计算哈希时的读取块大小
+HASH_READ_SIZE = 4 * 1024 * 1024  # 4MB
+
+# 分段下载按块记录 SHA256 的块大小（块摘要保存在分段状态文件中，续传时复用）
+HASH_BLOCK_SIZE = 4 * 1024 * 1024  # 4MB
+
+
+class RangeNotSupported(Exception):
+    """服务端对 Range 请求返回了完整内容"""
+
+
+def _positioned_write(f, data: bytes, offset: int):
+    """按偏移写入（POSIX 使用 pwrite，不移动文件指针）"""
+    if hasattr(os, 'pwrite'):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(f.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+    else:
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+
+
+class StreamingHasher:
+    """
+    按文件顺序增量计算 SHA256
+
+    写入方每写一块调用 feed()：哈希已追上写入位置时直接用内存中的数据更新（不再读文件）；
+    否则（续传时已有的前缀、分段乱序到达的数据）只推进可哈希的连续前缀，
+    由后台线程从文件大块读取追赶。hashlib 的中间状态无法序列化，
+    所以只在需要整文件哈希时（新下载，或续传时调用方要求校验）才使用。
+    """
+
+    def __init__(self, file_path: str, available: int = 0, read_size: int = HASH_READ_SIZE):
+        """
+        Args:
+            file_path: 正在写入的文件
+            available: 文件中已写入、可直接哈希的连续前缀长度
+            read_size: 追赶时的读取块大小
+        """
+        self.file_path = file_path
+        self.read_size = read_size
+        self._sha256 = hashlib.sha256()
+        self._hashed = 0
+        self._available = available
+        self._closed = False
+        self._error: Optional[Exception] = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._catch_up, name='download-hash', daemon=True)
+        self._thread.start()
+
+    @property
+    def hashed_bytes(self) -> int:
+        with self._cond:
+            return self._hashed
+
+    def feed(self, offset: int, data: bytes, available: Optional[int] = None):
+        """
+        通知一块数据已写入文件
+
+        Args:
+            offset: 数据在文件中的偏移
+            data: 写入的数据
+            available: 写入后文件的连续前缀长度（默认 offset + len(data)，即顺序写入）
+        """
+        end = offset + len(data)
+        with self._cond:
+            if offset == self._hashed == self._available:
+                # 已追上写入位置：直接哈希内存中的数据
+                self._sha256.update(data)
+                self._hashed = end
+            self._available = max(self._available, end if available is None else available)
+            self._cond.notify_all()
+
+    def hexdigest(self, total_bytes: int) -> str:
+        """等待哈希追上 total_bytes 后返回十六进制摘要"""
+        with self._cond:
+            self._available = max(self._available, total_bytes)
+            self._cond.notify_all()
+            while self._hashed < total_bytes and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            return self._sha256.hexdigest()
+
+    def close(self):
+        """停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+    def _catch_up(self):
+        f = None
+        try:
+            while True:
+                with self._cond:
+                    while not self._closed and self._hashed >= self._available:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    start = self._hashed
+                    length = min(self.read_size, self._available - start)
+
+                if f is None:
+                    f = open(self.file_path, 'rb')
+                if hasattr(os, 'pread'):
+                    block = os.pread(f.fileno(), length, start)
+                else:
+                    f.seek(start)
+                    block = f.read(length)
+                if len(block) != length:
+                    raise IOError(f"哈希读取不完整: {self.file_path} @ {start}")
+
+                with self._cond:
+                    self._sha256.update(block)
+                    self._hashed = start + length
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+        finally:
+            if f is not None:
+                f.close()
+
+
 class ResumableDownloader:
     """
     断点续传下载器
@@ -54,33 +202,51 @@ class ResumableDownloader:
 
     def __init__(
         self,
-        db_path: str,
-        task_id: int,
+        db_path: Optional[str],
+        task_id: Optional[int],
         chunk_size: int = 1024 * 1024,  # 1MB
         max_retries: int = 3,
-        timeout: int = 30
+        timeout: int = 30,
+        segments: int = 1,
+        min_segment_size: int = 8 * 1024 * 1024,  # 8MB
+        priority: int = PRIORITY_BULK,
+        cancel_event: Optional[threading.Event] = None
     ):
         """
         初始化下载器
 
         Args:
-            db_path: 数据库路径
-            task_id: 下载任务 ID
+            db_path: 数据库路径（None 表示不写数据库进度）
+            task_id: 下载任务 ID（None 表示不关联 download_tasks）
             chunk_size: 分块大小（默认 1MB）
             max_retries: 最大重试次数
             timeout: 请求超时时间（秒）
+            segments: 并行分段数（默认 1，即单连接）
+            min_segment_size: 每段最小字节数（文件较小时减少段数）
+            priority: 带宽优先级（http_pool.PRIORITY_*，默认批量）
+            cancel_event: 取消令牌（可选，多个下载器可共用一个，set() 后全部停止）
         """
-        self.db = CapsuleDatabase(db_path)
+        # 进度写入共享的内存注册表，由其后台线程批量落库
+        self.progress_registry = (
+            get_download_progress_registry(db_path) if db_path and task_id is not None else None
+        )
         self.task_id = task_id
         self.chunk_size = chunk_size
         self.max_retries = max_retries
         self.timeout = timeout
+        self.segments = max(1, int(segments))
+        self.min_segment_size = max(1, int(min_segment_size))
+        self.priority = priority
+
+        # 共用的连接池和带宽限制
+        self.session = get_http_session()
+        self.limiter = get_bandwidth_limiter()
 
         # 进度回调函数（可选）
         self.progress_callback: Optional[Callable[[DownloadProgress], None]] = None
 
-        # 取消标志
-        self._cancelled = False
+        # 取消令牌
+        self._cancel_event = cancel_event or threading.Event()
 
     def download_with_resume(
         self,
@@ -104,18 +270,33 @@ class ResumableDownloader:
                 'success': bool,
                 'local_path': str,
                 'file_size': int,
-                'file_hash': str,
+                'file_hash': str or None,  # 续传且未提供 expected_hash 时为 None
                 'downloaded_bytes': int,
                 'error': str or None
             }
         """
+        with self.limiter.transfer(self.priority):
+            return self._download(remote_url, local_path, expected_hash, expected_size)
+
+    def _download(
+        self,
+        remote_url: str,
+        local_path: str,
+        expected_hash: Optional[str],
+        expected_size: Optional[int]
+    ) -> Dict[str, Any]:
+        """download_with_resume 的实现（在带宽限制的 transfer 上下文中执行）"""
         print(f"🔶 开始下载: {remote_url}")
         print(f"   保存到: {local_path}")
 
-        # 1. 检查本地文件是否存在（断点）
+        part_path = f"{local_path}.part"
+        Path(local_path).parent.mkdir(parents=True, exist_ok=True)
+
+        # 1. 检查本地文件是否已完成，以及临时文件中的断点
+        existing_bytes = os.path.getsize(local_path) if Path(local_path).exists() else 0
         downloaded_bytes = 0
-        if Path(local_path).exists():
-            downloaded_bytes = os.path.getsize(local_path)
+        if Path(part_path).exists() and not Path(f"{part_path}{SEGMENT_STATE_SUFFIX}").exists():
+            downloaded_bytes = os.path.getsize(part_path)
             print(f"📦 发现断点: {downloaded_bytes:,} bytes")
 
         # 2. 获取远程文件信息
@@ -135,7 +316,7 @@ class ResumableDownloader:
                 print(f"⚠️  文件大小不匹配: 预期 {expected_size}, 实际 {total_bytes}")
 
             # 如果已经下载完成，直接校验
-            if downloaded_bytes > 0 and downloaded_bytes == total_bytes:
+            if existing_bytes > 0 and existing_bytes == total_bytes:
                 print("✅ 文件已完整下载，校验中...")
 
                 if expected_hash:
@@ -147,21 +328,24 @@ class ResumableDownloader:
                             'local_path': local_path,
                             'file_size': total_bytes,
                             'file_hash': actual_hash,
-                            'downloaded_bytes': downloaded_bytes
+                            'downloaded_bytes': 0
                         }
                     else:
                         print("❌ 校验失败，重新下载")
-                        os.remove(local_path)
-                        downloaded_bytes = 0
                 else:
                     return {
                         'success': True,
                         'local_path': local_path,
                         'file_size': total_bytes,
                         'file_hash': None,
-                        'downloaded_bytes': downloaded_bytes
+                        'downloaded_bytes': 0
                     }
 
+            # 断点比远程文件还大（远程文件已变化），从头下载
+            if downloaded_bytes > total_bytes:
+                os.remove(part_path)
+                downloaded_bytes = 0
+
         except Exception as e:
             print(f"❌ 获取远程文件信息失败: {e}")
             return {
@@ -169,144 +353,500 @@ class ResumableDownloader:
                 'error': str(e)
             }
 
+        # 分段模式：多连接并行下载
+        state_path = f"{part_path}{SEGMENT_STATE_SUFFIX}"
+        segment_count = self._plan_segment_count(total_bytes, remote_info)
+        if segment_count > 1:
+            try:
+                return self._download_segmented(
+                    remote_url, local_path, part_path, state_path,
+                    total_bytes, remote_info, segment_count, expected_hash
+                )
+            except RangeNotSupported:
+                print("⚠️  服务端不支持分段 Range 请求，回退到单连接下载")
+
+        if Path(state_path).exists():
+            # 上次以分段模式下载：.part 是预分配的稀疏文件，不能按文件大小续传
+            self._remove_files(state_path, part_path)
+            downloaded_bytes = 0
+
         # 3. 开始下载（支持断点续传）
         print(f"📥 开始下载: {total_bytes:,} bytes ({total_bytes / 1024 / 1024:.2f} MB)")
 
         retry_count = 0
         last_progress_update = time.time()
+        # 写入时同步计算 SHA256；续传时只有需要校验才由后台线程重新读取已有前缀
+        hasher = StreamingHasher(part_path, available=downloaded_bytes) \
+            if expected_hash or downloaded_bytes == 0 else None
 
-        while retry_count <= self.max_retries:
-            if self._cancelled:
-                print("⚠️  下载已取消")
-                return {
-                    'success': False,
-                    'error': '下载已取消',
-                    'downloaded_bytes': downloaded_bytes
-                }
+        try:
+            while retry_count <= self.max_retries:
+                if self._cancelled:
+                    print("⚠️  下载已取消")
+                    return {
+                        'success': False,
+                        'error': '下载已取消',
+                        'downloaded_bytes': downloaded_bytes
+                    }
 
-            try:
-                # 设置 Range 请求头
-                headers = {}
-                if downloaded_bytes > 0:
-                    headers['Range'] = f'bytes={downloaded_bytes}-'
-                    print(f"🔄 断点续传: from {downloaded_bytes:,}")
-
-                # 发起请求
-                response = requests.get(
-                    remote_url,
-                    headers=headers,
-                    stream=True,
-                    timeout=self.timeout
-                )
+                try:
+                    # 设置 Range 请求头
+                    headers = {}
+                    if downloaded_bytes > 0:
+                        headers['Range'] = f'bytes={downloaded_bytes}-'
+                        print(f"🔄 断点续传: from {downloaded_bytes:,}")
+
+                    # 发起请求
+                    response = self.session.get(
+                        remote_url,
+                        headers=headers,
+                        stream=True,
+                        timeout=self.timeout
+                    )
+
+                    # 检查响应状态
+                    if response.status_code not in [200, 206]:
+                        raise Exception(f"HTTP {response.status_code}: {response.reason}")
+
+                    # 服务端忽略了 Range，返回完整内容：从头写
+                    if downloaded_bytes > 0 and response.status_code == 200:
+                        print("⚠️  服务端不支持 Range，从头下载")
+                        downloaded_bytes = 0
+                        if hasher:
+                            hasher.close()
+                        hasher = StreamingHasher(part_path)
+
+                    # 打开临时文件（追加模式）
+                    mode = 'ab' if downloaded_bytes > 0 else 'wb'
+                    start_time = time.time()
+
+                    with open(part_path, mode) as f:
+                        for chunk in self.limiter.iter_content(response, self.chunk_size, self.priority):
+                            if self._cancelled:
+                                break
+
+                            if chunk:
+                                f.write(chunk)
+                                f.flush()  # 后台哈希线程可能需要从文件读取
+                                if hasher:
+                                    hasher.feed(downloaded_bytes, chunk)
+                                downloaded_bytes += len(chunk)
+
+                                # 更新进度（每秒一次）
+                                current_time = time.time()
+                                if current_time - last_progress_update >= 1.0:
+                                    progress = DownloadProgress(
+                                        downloaded_bytes=downloaded_bytes,
+                                        total_bytes=total_bytes,
+                                        progress_percent=(downloaded_bytes / total_bytes) * 100,
+                                        speed=downloaded_bytes / (current_time - start_time),
+                                        eta_seconds=int((total_bytes - downloaded_bytes) / (downloaded_bytes / (current_time - start_time))) if downloaded_bytes > 0 else None
+                                    )
+
+                                    self._update_progress(progress)
+                                    last_progress_update = current_time
+                    response.close()  # 连接归还连接池（未读完时断开）
+
+                    # 下载完成
+                    if not self._cancelled and downloaded_bytes == total_bytes:
+                        print(f"✅ 下载完成: {downloaded_bytes:,} bytes")
+
+                        # SHA256 校验（写入时已增量计算；续传且无需校验时不计算）
+                        file_hash = hasher.hexdigest(total_bytes) if hasher else None
+                        if hasher:
+                            hasher.close()  # 释放文件句柄后再移动 / 删除临时文件
+                        if expected_hash:
+                            if file_hash != expected_hash:
+                                print(f"❌ SHA256 校验失败:")
+                                print(f"   预期: {expected_hash}")
+                                print(f"   实际: {file_hash}")
+                                os.remove(part_path)
+
+                                return {
+                                    'success': False,
+                                    'error': 'SHA256 校验失败'
+                                }
+
+                            print("✅ SHA256 校验通过")
+
+                        # 校验通过后原子替换
+                        os.replace(part_path, local_path)
 
-                # 检查响应状态
-                if response.status_code not in [200, 206]:
-                    raise Exception(f"HTTP {response.status_code}: {response.reason}")
+                        return {
+                            'success': True,
+                            'local_path': local_path,
+                            'file_size': total_bytes,
+                            'file_hash': file_hash,
+                            'downloaded_bytes': downloaded_bytes
+                        }
 
-                # 打开文件（追加模式）
-                mode = 'ab' if downloaded_bytes > 0 else 'wb'
-                start_time = time.time()
+                    # 如果被取消，返回部分下载
+                    if self._cancelled:
+                        return {
+                            'success': False,
+                            'error': '下载已取消',
+                            'downloaded_bytes': downloaded_bytes
+                        }
 
-                with open(local_path, mode) as f:
-                    for chunk in response.iter_content(chunk_size=self.chunk_size):
-                        if self._cancelled:
-                            break
+                    # 下载未完成，继续重试
+                    retry_count += 1
+                    print(f"⚠️  下载未完成，重试 {retry_count}/{self.max_retries}")
 
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_bytes += len(chunk)
-
-                            # 更新进度（每秒一次）
-                            current_time = time.time()
-                            if current_time - last_progress_update >= 1.0:
-                                progress = DownloadProgress(
-                                    downloaded_bytes=downloaded_bytes,
-                                    total_bytes=total_bytes,
-                                    progress_percent=(downloaded_bytes / total_bytes) * 100,
-                                    speed=downloaded_bytes / (current_time - start_time),
-                                    eta_seconds=int((total_bytes - downloaded_bytes) / (downloaded_bytes / (current_time - start_time))) if downloaded_bytes > 0 else None
-                                )
-
-                                self._update_progress(progress)
-                                last_progress_update = current_time
-
-                # 下载完成
-                if not self._cancelled and downloaded_bytes == total_bytes:
-                    print(f"✅ 下载完成: {downloaded_bytes:,} bytes")
-
-                    # SHA256 校验
-                    file_hash = None
-                    if expected_hash:
-                        print("🔐 计算 SHA256...")
-                        file_hash = self._calculate_hash(local_path)
-
-                        if file_hash != expected_hash:
-                            print(f"❌ SHA256 校验失败:")
-                            print(f"   预期: {expected_hash}")
-                            print(f"   实际: {file_hash}")
-                            os.remove(local_path)
-
-                            return {
-                                'success': False,
-                                'error': 'SHA256 校验失败'
-                            }
-
-                        print("✅ SHA256 校验通过")
-                    else:
-                        # 如果没有提供预期哈希，仍然计算用于记录
-                        file_hash = self._calculate_hash(local_path)
+                except requests.exceptions.RequestException as e:
+                    retry_count += 1
+                    print(f"❌ 网络错误: {e}")
+                    print(f"   重试 {retry_count}/{self.max_retries}")
 
-                    return {
-                        'success': True,
-                        'local_path': local_path,
-                        'file_size': total_bytes,
-                        'file_hash': file_hash,
-                        'downloaded_bytes': downloaded_bytes
-                    }
+                    if retry_count > self.max_retries:
+                        return {
+                            'success': False,
+                            'error': f'网络错误（已重试 {self.max_retries} 次）: {e}',
+                            'downloaded_bytes': downloaded_bytes
+                        }
 
-                # 如果被取消，返回部分下载
-                if self._cancelled:
+                    time.sleep(2 ** retry_count)  # 指数退避
+
+                except Exception as e:
+                    print(f"❌ 下载失败: {e}")
                     return {
                         'success': False,
-                        'error': '下载已取消',
+                        'error': str(e),
                         'downloaded_bytes': downloaded_bytes
                     }
 
-                # 下载未完成，继续重试
-                retry_count += 1
-                print(f"⚠️  下载未完成，重试 {retry_count}/{self.max_retries}")
+            return {
+                'success': False,
+                'error': '达到最大重试次数',
+                'downloaded_bytes': downloaded_bytes
+            }
+        finally:
+            if hasher:
+                hasher.close()
+
+    def _plan_segment_count(self, total_bytes: int, remote_info: Dict[str, Any]) -> int:
+        """分段数：未启用、不支持 Range 或文件太小时为 1"""
+        if self.segments <= 1 or not remote_info.get('accept_ranges'):
+            return 1
+        return max(1, min(self.segments, total_bytes // self.min_segment_size))
+
+    @staticmethod
+    def _remove_files(*paths: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
-            except requests.exceptions.RequestException as e:
-                retry_count += 1
-                print(f"❌ 网络错误: {e}")
-                print(f"   重试 {retry_count}/{self.max_retries}")
+    def _load_segment_state(self, state_path: str, part_path: str, total_bytes: int,
+                            remote_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        读取分段断点；远程文件变化或临时文件不完整时返回 None
 
-                if retry_count > self.max_retries:
-                    return {
-                        'success': False,
-                        'error': f'网络错误（已重试 {self.max_retries} 次）: {e}',
-                        'downloaded_bytes': downloaded_bytes
-                    }
+        每段的进度回退到最后一个已记录摘要的块边界（最多重新下载不足一块的数据），
+        不需要从文件重新读取已下载的部分。
+        """
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            segments = state['segments']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
 
-                time.sleep(2 ** retry_count)  # 指数退避
+        if state.get('total_bytes') != total_bytes:
+            return None
+        if state.get('etag') and remote_info.get('etag') and state['etag'] != remote_info['etag']:
+            return None
+        if not Path(part_path).exists() or os.path.getsize(part_path) != total_bytes:
+            return None
 
-            except Exception as e:
-                print(f"❌ 下载失败: {e}")
-                return {
-                    'success': False,
-                    'error': str(e),
-                    'downloaded_bytes': downloaded_bytes
-                }
+        expected_start = 0
+        for seg in segments:
+            if seg.get('start') != expected_start or not (0 <= seg.get('done', -1) <= seg['end'] - seg['start'] + 1):
+                return None
+            expected_start = seg['end'] + 1
+        if expected_start != total_bytes:
+            return None
+
+        # 块摘要：旧版本状态没有摘要，按 0 块处理（该段重新下载）
+        same_blocks = state.get('block_size') == HASH_BLOCK_SIZE
+        state['block_size'] = HASH_BLOCK_SIZE
+        for seg in segments:
+            seg_length = seg['end'] - seg['start'] + 1
+            hashes = seg.get('hashes') if same_blocks and isinstance(seg.get('hashes'), list) else []
+            if seg['done'] == seg_length:
+                blocks = -(-seg_length // HASH_BLOCK_SIZE)
+            else:
+                blocks = seg['done'] // HASH_BLOCK_SIZE
+            hashes = hashes[:blocks]
+            seg['hashes'] = hashes
+            seg['done'] = min(seg['done'], len(hashes) * HASH_BLOCK_SIZE)
+
+        return state
+
+    @staticmethod
+    def _save_segment_state(state_path: str, state: Dict[str, Any]):
+        """原子写入分段状态"""
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    def _download_segmented(
+        self,
+        remote_url: str,
+        local_path: str,
+        part_path: str,
+        state_path: str,
+        total_bytes: int,
+        remote_info: Dict[str, Any],
+        segment_count: int,
+        expected_hash: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        分段多连接下载
+
+        Raises:
+            RangeNotSupported: 服务端忽略 Range（调用方回退到单连接）
+
+        Returns:
+            与 download_with_resume 相同的结果字典（额外包含 'segments' 和按 HASH_BLOCK_SIZE
+            分块的 'block_hashes'）；续传且未提供 expected_hash 时 file_hash 为 None
+        """
+        state = self._load_segment_state(state_path, part_path, total_bytes, remote_info)
+        if state is None:
+            # 段大小取块大小的整数倍，块摘要在整个文件上对齐
+            segment_size = -(-total_bytes // segment_count)
+            segment_size = -(-segment_size // HASH_BLOCK_SIZE) * HASH_BLOCK_SIZE
+            state = {
+                'total_bytes': total_bytes,
+                'etag': remote_info.get('etag'),
+                'block_size': HASH_BLOCK_SIZE,
+                'segments': [
+                    {'start': start, 'end': min(start + segment_size, total_bytes) - 1, 'done': 0, 'hashes': []}
+                    for start in range(0, total_bytes, segment_size)
+                ]
+            }
+            # 预分配（稀疏文件），各段按偏移写入
+            with open(part_path, 'wb') as f:
+                f.truncate(total_bytes)
+            self._save_segment_state(state_path, state)
+        else:
+            resumed = sum(seg['done'] for seg in state['segments'])
+            print(f"📦 发现分段断点: {resumed:,} bytes（{len(state['segments'])} 段）")
+
+        segments: List[Dict[str, Any]] = state['segments']
+        pending = [seg for seg in segments if seg['done'] < seg['end'] - seg['start'] + 1]
+        print(f"📥 分段下载: {total_bytes:,} bytes，{len(segments)} 段（待下载 {len(pending)} 段）")
+
+        lock = threading.Lock()
+        stop = threading.Event()
+        started = time.time()
+        initial_bytes = sum(seg['done'] for seg in segments)
+        marks = {'progress': started, 'saved': started}
+
+        def contiguous_prefix() -> int:
+            prefix = 0
+            for seg in segments:
+                prefix = seg['start'] + seg['done']
+                if seg['done'] < seg['end'] - seg['start'] + 1:
+                    break
+            return prefix
+
+        # 整文件 SHA256：新下载时与下载并行计算；续传时只有需要校验才重新读取已下载的前缀
+        hasher = StreamingHasher(part_path, available=contiguous_prefix()) \
+            if expected_hash or initial_bytes == 0 else None
+
+        # 每段当前未满一块的摘要（续传时各段都从块边界开始）
+        block_hashers = {seg['start']: hashlib.sha256() for seg in pending}
+
+        def on_chunk(seg: Dict[str, Any], offset: int, data: bytes):
+            # 只有该段的下载线程会修改 seg['done']，块摘要在锁外计算
+            seg_length = seg['end'] - seg['start'] + 1
+            position = seg['done']
+            block_hasher = block_hashers[seg['start']]
+            digests = []
+            view = memoryview(data)
+            while view:
+                take = min(len(view), HASH_BLOCK_SIZE - position % HASH_BLOCK_SIZE)
+                block_hasher.update(view[:take])
+                position += take
+                view = view[take:]
+                if position % HASH_BLOCK_SIZE == 0 or position == seg_length:
+                    digests.append(block_hasher.hexdigest())
+                    block_hasher = hashlib.sha256()
+            block_hashers[seg['start']] = block_hasher
+
+            with lock:
+                seg['done'] += len(data)
+                seg['hashes'].extend(digests)
+                prefix = contiguous_prefix()
+                now = time.time()
+                report = now - marks['progress'] >= 1.0
+                save = now - marks['saved'] >= 1.0
+                if report:
+                    marks['progress'] = now
+                if save:
+                    marks['saved'] = now
+                    snapshot = json.loads(json.dumps(state))
+                downloaded = sum(s['done'] for s in segments)
+
+            if hasher:
+                hasher.feed(offset, data, prefix)
+            if save:
+                self._save_segment_state(state_path, snapshot)
+            if report:
+                elapsed = max(now - started, 1e-6)
+                speed = (downloaded - initial_bytes) / elapsed
+                self._update_progress(DownloadProgress(
+                    downloaded_bytes=downloaded,
+                    total_bytes=total_bytes,
+                    progress_percent=(downloaded / total_bytes) * 100,
+                    speed=speed,
+                    eta_seconds=int((total_bytes - downloaded) / speed) if speed > 0 else None
+                ))
+
+        errors = []
+        range_unsupported = False
+        file_hash = None
+        try:
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='download-segment') as executor:
+                    futures = [
+                        executor.submit(self._download_segment, remote_url, part_path, seg, on_chunk, stop)
+                        for seg in pending
+                    ]
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except RangeNotSupported:
+                            range_unsupported = True
+                            stop.set()
+                        except Exception as e:
+                            errors.append(str(e))
+                            stop.set()
+
+            downloaded_bytes = sum(seg['done'] for seg in segments)
+            if hasher and not (range_unsupported or errors or self._cancelled) and downloaded_bytes == total_bytes:
+                file_hash = hasher.hexdigest(total_bytes)
+        finally:
+            # 先停止哈希线程（释放文件句柄）再移动 / 删除临时文件
+            if hasher:
+                hasher.close()
+            with lock:
+                snapshot = json.loads(json.dumps(state))
+            self._save_segment_state(state_path, snapshot)
+
+        if range_unsupported:
+            self._remove_files(state_path, part_path)
+            raise RangeNotSupported()
+
+        if self._cancelled:
+            print("⚠️  下载已取消")
+            return {
+                'success': False,
+                'error': '下载已取消',
+                'downloaded_bytes': downloaded_bytes
+            }
+
+        if errors or downloaded_bytes != total_bytes:
+            error = errors[0] if errors else '分段下载未完成'
+            print(f"❌ 分段下载失败: {error}")
+            return {
+                'success': False,
+                'error': error,
+                'downloaded_bytes': downloaded_bytes
+            }
+
+        print(f"✅ 下载完成: {downloaded_bytes:,} bytes（{len(segments)} 段）")
+
+        if expected_hash and file_hash != expected_hash:
+            print(f"❌ SHA256 校验失败:")
+            print(f"   预期: {expected_hash}")
+            print(f"   实际: {file_hash}")
+            self._remove_files(state_path, part_path)
+            return {
+                'success': False,
+                'error': 'SHA256 校验失败'
+            }
+
+        # 校验通过后原子替换
+        os.replace(part_path, local_path)
+        self._remove_files(state_path)
 
         return {
-            'success': False,
-            'error': '达到最大重试次数',
-            'downloaded_bytes': downloaded_bytes
+            'success': True,
+            'local_path': local_path,
+            'file_size': total_bytes,
+            'file_hash': file_hash,
+            'downloaded_bytes': downloaded_bytes - initial_bytes,
+            'segments': len(segments),
+            'block_hashes': [digest for seg in segments for digest in seg['hashes']]
         }
 
+    def _download_segment(
+        self,
+        remote_url: str,
+        part_path: str,
+        seg: Dict[str, Any],
+        on_chunk: Callable[[Dict[str, Any], int, bytes], None],
+        stop: threading.Event
+    ):
+        """下载单个分段（从该段已完成的位置续传，失败按指数退避重试）"""
+        retry_count = 0
+        seg_length = seg['end'] - seg['start'] + 1
+
+        while seg['done'] < seg_length:
+            if self._cancelled or stop.is_set():
+                return
+
+            offset = seg['start'] + seg['done']
+            try:
+                response = self.session.get(
+                    remote_url,
+                    headers={'Range': f"bytes={offset}-{seg['end']}"},
+                    stream=True,
+                    timeout=self.timeout
+                )
+                if response.status_code == 200:
+                    response.close()
+                    raise RangeNotSupported()
+                if response.status_code != 206:
+                    raise Exception(f"HTTP {response.status_code}: {response.reason}")
+
+                with open(part_path, 'r+b') as f:
+                    for chunk in self.limiter.iter_content(response, self.chunk_size, self.priority):
+                        if self._cancelled or stop.is_set():
+                            break
+                        if not chunk:
+                            continue
+                        chunk = chunk[:seg_length - seg['done']]
+                        _positioned_write(f, chunk, offset)
+                        on_chunk(seg, offset, chunk)
+                        offset += len(chunk)
+                        if seg['done'] >= seg_length:
+                            break
+                response.close()
+
+                if seg['done'] < seg_length and not (self._cancelled or stop.is_set()):
+                    # 连接提前结束，按断点重试
+                    retry_count += 1
+                    if retry_count > self.max_retries:
+                        raise Exception(f"分段 {seg['start']}-{seg['end']} 未完成（已重试 {self.max_retries} 次）")
+
+            except requests.exceptions.RequestException as e:
+                retry_count += 1
+                print(f"❌ 分段 {seg['start']}-{seg['end']} 网络错误: {e}")
+                if retry_count > self.max_retries:
+                    raise Exception(f'网络错误（已重试 {self.max_retries} 次）: {e}')
+                time.sleep(2 ** retry_count)  # 指数退避
+
+    @property
+    def _cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
     def cancel(self):
         """取消下载"""
-        self._cancelled = True
+        self._cancel_event.set()
         print("⚠️  正在取消下载...")
 
     def _get_remote_info(self, url: str) -> Optional[Dict[str, Any]]:
@@ -321,23 +861,37 @@ class ResumableDownloader:
             {
                 'size': int,
                 'etag': str or None,
-                'last_modified': str or None
+                'last_modified': str or None,
+                'accept_ranges': bool
             }
         """
         try:
-            response = requests.head(url, timeout=self.timeout)
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=True)
 
-            if response.status_code != 200:
-                return None
+            if response.status_code == 200:
+                size = int(response.headers.get('Content-Length', 0))
+            else:
+                # 部分签名 URL 不支持 HEAD：请求第一个字节，从 Content-Range 取总大小
+                response = self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout)
+                response.close()
+                content_range = response.headers.get('Content-Range', '')
+                if response.status_code != 206 or '/' not in content_range:
+                    return None
+                size = int(content_range.rsplit('/', 1)[1])
 
-            size = int(response.headers.get('Content-Length', 0))
             etag = response.headers.get('ETag')
             last_modified = response.headers.get('Last-Modified')
+            # HEAD 声明 Accept-Ranges，或 Range 探测返回了 206
+            accept_ranges = (
+                response.status_code == 206
+                or (response.headers.get('Accept-Ranges') or '').lower() == 'bytes'
+            )
 
             return {
                 'size': size,
                 'etag': etag,
-                'last_modified': last_modified
+                'last_modified': last_modified,
+                'accept_ranges': accept_ranges
             }
 
         except Exception as e:
@@ -357,42 +911,40 @@ class ResumableDownloader:
         sha256_hash = hashlib.sha256()
 
         with open(file_path, 'rb') as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
+            for byte_block in iter(lambda: f.read(HASH_READ_SIZE), b""):
                 sha256_hash.update(byte_block)
 
         return sha256_hash.hexdigest()
 
     def _update_progress(self, progress: DownloadProgress):
         """
-        更新下载进度到数据库
+        更新下载进度（内存注册表，不直接写数据库）
 
         Args:
             progress: 下载进度对象
         """
         try:
-            # 更新数据库
-            self.db.update_download_task_status(
-                task_id=self.task_id,
-                status='downloading',
-                progress=int(progress.progress_percent),
-                downloaded_bytes=progress.downloaded_bytes,
-                speed=int(progress.speed),
-                eta_seconds=progress.eta_seconds
-            )
+            # 独立下载没有关联任务
+            if self.progress_registry is not None:
+                self.progress_registry.update(
+                    self.task_id,
+                    progress=int(progress.progress_percent),
+                    downloaded_bytes=progress.downloaded_bytes,
+                    total_bytes=progress.total_bytes,
+                    speed=int(progress.speed),
+                    eta_seconds=progress.eta_seconds
+                )
 
             # 调用回调函数（如果有）
             if self.progress_callback:
                 self.progress_callback(progress)
 
-            # 打印进度
-            print(f"   进度: {progress.progress_percent:.1f}% "
-                  f"({progress.downloaded_bytes:,} / {progress.total_bytes:,} bytes) "
-                  f"速度: {progress.speed / 1024 / 1024:.2f} MB/s", end='')
-
-            if progress.eta_seconds:
-                print(f" ETA: {progress.eta_seconds}s")
-            else:
-                print()
+            logger.debug(
+                f"进度: {progress.progress_percent:.1f}% "
+                f"({progress.downloaded_bytes:,} / {progress.total_bytes:,} bytes) "
+                f"速度: {progress.speed / 1024 / 1024:.2f} MB/s"
+                + (f" ETA: {progress.eta_seconds}s" if progress.eta_seconds else "")
+            )
 
         except Exception as e:
             print(f"⚠️  更新进度失败: {e}")
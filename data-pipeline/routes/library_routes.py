@@ -11,8 +11,11 @@ Core Routes:
 - DELETE /api/capsules/:id - Delete capsule
 - GET /api/capsules/:id/tags - Get capsule tags
 - POST /api/capsules/:id/tags - Update capsule tags
+- POST /api/capsules/tags/batch - Update tags of many capsules
 """
 
+import base64
+import json
 import logging
 from flask import Blueprint, request, jsonify
 from pathlib import Path
@@ -34,6 +37,28 @@ library_bp = Blueprint('library_bp', __name__)
 # Core Capsule CRUD Routes
 # ============================================================
 
+# fields= 中的非列名字段（控制是否附带标签/metadata）
+LIST_EXTRA_FIELDS = {'tags', 'metadata'}
+
+# 计算 is_mine / local_rpp_path 需要的列，字段投影时自动带上
+LIST_REQUIRED_COLUMNS = ['owner_supabase_user_id', 'file_path', 'rpp_file']
+
+
+def _encode_list_cursor(capsule):
+    """将胶囊的 (created_at, id) 编码为不透明的分页游标"""
+    raw = json.dumps([capsule.get('created_at'), capsule['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_list_cursor(value):
+    """解析分页游标，返回 (created_at, id)"""
+    try:
+        created_at, capsule_id = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+        return created_at, int(capsule_id)
+    except Exception:
+        raise APIError('cursor 参数无效', 400)
+
+
 @library_bp.route('/', methods=['GET'])
 def get_capsules():
     """
@@ -42,12 +67,15 @@ def get_capsules():
     Phase G: 添加用户所有权支持（is_mine 字段）和过滤器
 
     Query Parameters:
-        - filter: 过滤器类型 (all, mine, downloaded) - 默认 all
+        - filter: 过滤器类型 (all, mine, downloaded) - 默认 all，在 SQL 中过滤
         - lens: 语义棱镜类型（可选）
         - x, y: 中心点坐标（可选）
         - radius: 搜索半径（默认 20）
         - limit: 返回数量限制（默认 50）
-        - offset: 偏移量（默认 0）
+        - cursor: 上一页返回的 next_cursor（游标分页，按 created_at DESC, id DESC）
+        - offset: 偏移量（默认 0，仅在未提供 cursor 时生效，保留用于兼容）
+        - fields: 逗号分隔的返回字段，可包含 capsules 列名以及 tags / metadata；
+                  不传则返回全部列 + tags + metadata
     """
     try:
         filter_type = request.args.get('filter', 'all')  # Phase G: 新增
@@ -57,39 +85,45 @@ def get_capsules():
         radius = request.args.get('radius', 20, type=float)
         limit = request.args.get('limit', 50, type=int)
         offset = request.args.get('offset', 0, type=int)
-
-        db = get_database()
-        capsules = db.get_capsules(
-            lens=lens,
-            x=x,
-            y=y,
-            radius=radius,
-            limit=limit,
-            offset=offset
-        )
+        cursor_param = request.args.get('cursor')
+        fields_param = request.args.get('fields')
+
+        cursor = _decode_list_cursor(cursor_param) if cursor_param else None
+
+        columns = None
+        include_tags = True
+        include_metadata = True
+        if fields_param:
+            fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+            include_tags = 'tags' in fields
+            include_metadata = 'metadata' in fields
+            requested_columns = [f for f in fields if f not in LIST_EXTRA_FIELDS]
+            if requested_columns:
+                columns = requested_columns + LIST_REQUIRED_COLUMNS
 
         # Phase G: 获取当前用户 ID 以判断所有权
-        current_user_id = None
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                from auth import get_auth_manager
-                auth_manager = get_auth_manager()
-                token = auth_header.split(' ')[1]
-                payload = auth_manager.verify_access_token(token)
-                if payload:
-                    # 优先使用 payload 中的 supabase_user_id
-                    if 'supabase_user_id' in payload:
-                        current_user_id = payload['supabase_user_id']
-                    elif 'user_id' in payload:
-                        # 如果是本地用户，尝试从 auth_manager 获取
-                        user = auth_manager.get_user_by_id(payload['user_id'])
-                        if user:
-                            current_user_id = user.get('supabase_user_id') or str(user.get('id'))
-                    logger.info(f"[CAPSULES] 当前用户 ID: {current_user_id}")
-            except Exception as e:
-                logger.warning(f"[CAPSULES] Token 验证失败: {e}")
-                pass  # 允许匿名访问
+        current_user_id = _get_current_supabase_user_id()
+        logger.info(f"[CAPSULES] 当前用户 ID: {current_user_id}")
+
+        # Phase G: 应用过滤器（未登录时 mine 为空列表）
+        if filter_type == 'mine' and not current_user_id:
+            capsules = []
+        else:
+            db = get_database()
+            capsules = db.get_capsules(
+                lens=lens,
+                x=x,
+                y=y,
+                radius=radius,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                owner_id=current_user_id if filter_type == 'mine' else None,
+                downloaded_only=(filter_type == 'downloaded'),
+                columns=columns,
+                include_tags=include_tags,
+                include_metadata=include_metadata
+            )
 
         # 为每个胶囊添加完整的 RPP 路径（绝对路径）
         # 使用 PathManager 获取导出目录
@@ -103,24 +137,24 @@ def get_capsules():
                 capsule['local_rpp_path'] = str(rpp_path.resolve())
 
             # Phase G: 添加所有权标识
-            capsule['is_mine'] = (
+            capsule['is_mine'] = bool(
                 current_user_id and
                 capsule.get('owner_supabase_user_id') == current_user_id
             )
 
-        # Phase G: 应用过滤器
-        if filter_type == 'mine':
-            capsules = [c for c in capsules if c.get('is_mine', False)]
-        elif filter_type == 'downloaded':
-            capsules = [c for c in capsules if c.get('files_downloaded', False)]
+        # 满页时返回下一页游标
+        next_cursor = _encode_list_cursor(capsules[-1]) if capsules and len(capsules) >= limit else None
 
         return jsonify({
             'success': True,
             'capsules': capsules,
             'count': len(capsules),
-            'filter': filter_type  # Phase G: 返回当前过滤器
+            'filter': filter_type,  # Phase G: 返回当前过滤器
+            'next_cursor': next_cursor
         })
 
+    except APIError:
+        raise
     except Exception as e:
         import traceback
         logger.error(f"❌ 获取胶囊列表失败: {e}")
@@ -136,11 +170,26 @@ def semantic_search_capsules():
     Query Parameters:
         - q: 搜索词（必填）
         - limit: 返回数量（默认 20）
+        - mode: hybrid（默认，本地全文 + 本地向量 RRF 融合；numpy 未安装时使用 semantic）
+                / lexical（本地 FTS5 全文搜索，bm25 排序）
+                / semantic（云端向量搜索）
+        - lens, x, y, radius: 仅 hybrid / lexical 模式，与 GET /api/capsules 含义相同
+        - filter: 仅 lexical 模式（hybrid 与 semantic 一样只搜索当前用户的胶囊）
+        - lexical_weight, vector_weight, rrf_k: 仅 hybrid 模式，覆盖 config.json 中的融合参数
     """
     try:
         q = request.args.get('q', '').strip()
         limit = request.args.get('limit', 20, type=int)
         limit = min(max(1, limit), 50)
+        mode = request.args.get('mode', 'hybrid')
+
+        if mode == 'lexical':
+            return _lexical_search_capsules(q, limit)
+        if mode == 'hybrid':
+            if _hybrid_search_available():
+                return _hybrid_search_capsules(q, limit)
+            # numpy 未安装（可选依赖）时保持原来的默认行为：云端语义搜索
+            mode = 'semantic'
 
         if not q:
             return jsonify({
@@ -249,6 +298,171 @@ def semantic_search_capsules():
         raise APIError(f"语义搜索失败: {e}", 500)
 
 
+def _lexical_search_capsules(q, limit):
+    """
+    本地全文搜索（GET /api/capsules/search?mode=lexical）
+
+    在 capsules_fts 上按 bm25 排序，并在同一条 SQL 中应用棱镜空间筛选和 mine 过滤
+    """
+    lens = request.args.get('lens')
+    x = request.args.get('x', type=float)
+    y = request.args.get('y', type=float)
+    radius = request.args.get('radius', 20, type=float)
+    filter_type = request.args.get('filter', 'all')
+
+    if not q:
+        return jsonify({
+            'success': True,
+            'capsules': [],
+            'count': 0,
+            'mode': 'lexical',
+            'message': 'missing query'
+        })
+
+    current_user_id = _get_current_supabase_user_id()
+    if filter_type == 'mine' and not current_user_id:
+        capsules = []
+    else:
+        db = get_database()
+        capsules = db.search_capsules_text(
+            q,
+            lens=lens,
+            x=x,
+            y=y,
+            radius=radius,
+            owner_id=current_user_id if filter_type == 'mine' else None,
+            limit=limit
+        )
+
+    for capsule in capsules:
+        capsule['is_mine'] = bool(
+            current_user_id and
+            capsule.get('owner_supabase_user_id') == current_user_id
+        )
+        capsule['text_score'] = round(capsule.get('text_score') or 0, 4)
+
+    return jsonify({
+        'success': True,
+        'capsules': capsules,
+        'count': len(capsules),
+        'mode': 'lexical'
+    })
+
+
+_hybrid_available = None
+
+
+def _hybrid_search_available():
+    """本地混合搜索是否可用（依赖可选的 numpy）"""
+    global _hybrid_available
+    if _hybrid_available is None:
+        try:
+            import hybrid_search  # noqa: F401
+            _hybrid_available = True
+        except ImportError as e:
+            logger.warning(f"混合搜索不可用，使用云端语义搜索: {e}")
+            _hybrid_available = False
+    return _hybrid_available
+
+
+def _hybrid_search_capsules(q, limit):
+    """
+    本地混合搜索（GET /api/capsules/search?mode=hybrid）
+
+    词法（FTS5 bm25）与向量（本地 capsule_embeddings）两路排名按 RRF 融合，
+    精确命中的标签名不会再因为向量相似度低于阈值而被过滤掉。
+    返回格式与 semantic 模式兼容（id / cloud_id / local_id / similarity），
+    范围也相同：只搜索当前用户拥有的胶囊，未登录时返回空。
+    """
+    lens = request.args.get('lens')
+    x = request.args.get('x', type=float)
+    y = request.args.get('y', type=float)
+    radius = request.args.get('radius', 20, type=float)
+
+    if not q:
+        return jsonify({
+            'success': True,
+            'capsules': [],
+            'count': 0,
+            'mode': 'hybrid',
+            'message': 'missing query'
+        })
+
+    # 与云端语义搜索 RPC（match_user_id）一致：只搜索当前用户的胶囊
+    current_user_id = _get_current_supabase_user_id()
+    if not current_user_id:
+        return jsonify({'success': True, 'capsules': [], 'count': 0, 'mode': 'hybrid'})
+
+    from hybrid_search import get_hybrid_search_service
+    service = get_hybrid_search_service()
+
+    # 查询向量不可用时（云端和本地模型都失败）退化为纯词法排序
+    query_embedding = None
+    try:
+        from hybrid_embedding_service import get_hybrid_service
+        query_embedding = get_hybrid_service().get_embedding(q)
+    except Exception as e:
+        logger.warning(f"混合搜索 embedding 失败，仅使用全文索引: {e}")
+
+    overrides = {
+        'lexical_weight': request.args.get('lexical_weight', type=float),
+        'vector_weight': request.args.get('vector_weight', type=float),
+        'rrf_k': request.args.get('rrf_k', type=int),
+    }
+    if not query_embedding:
+        overrides['vector_weight'] = 0.0
+
+    result = service.search(
+        q,
+        limit=limit,
+        lens=lens,
+        x=x,
+        y=y,
+        radius=radius,
+        owner_id=current_user_id,
+        config_overrides=overrides,
+        query_embedding=query_embedding
+    )
+
+    # 补齐尚未建立向量的胶囊（后台执行、限频，不阻塞本次搜索）
+    try:
+        service.vector_index.refresh_missing_in_background()
+    except Exception as e:
+        logger.warning(f"本地向量索引刷新失败: {e}")
+
+    db = get_database()
+    capsule_rows = db.get_capsules_with_tags([r['capsule_id'] for r in result['results']])
+
+    capsules = []
+    for r in result['results']:
+        row = capsule_rows.get(r['capsule_id'])
+        if not row:
+            continue
+        capsules.append({
+            'id': row.get('cloud_id') or row['id'],
+            'cloud_id': row.get('cloud_id'),
+            'local_id': row['id'],
+            'user_id': row.get('owner_supabase_user_id'),
+            'name': row.get('name'),
+            'description': row.get('description'),
+            'similarity': round(r['similarity'], 4) if r['similarity'] is not None else None,
+            'score': round(r['score'], 6),
+            'lexical_rank': r['lexical_rank'],
+            'vector_rank': r['vector_rank'],
+        })
+
+    logger.info(f"[SEARCH] hybrid '{q}': {len(capsules)} 个结果, 耗时 {result['timings_ms']}")
+
+    return jsonify({
+        'success': True,
+        'capsules': capsules,
+        'count': len(capsules),
+        'mode': 'hybrid',
+        'timings_ms': result['timings_ms'],
+        'error': None if query_embedding else 'embedding_unavailable'
+    })
+
+
 @library_bp.route('/<int:capsule_id>', methods=['GET'])
 def get_capsule(capsule_id):
     """获取单个胶囊详情"""
@@ -333,6 +547,95 @@ def get_capsule_tags_api(capsule_id):
         raise APIError(f"获取标签失败: {e}", 500)
 
 
+def _get_current_supabase_user_id():
+    """
+    从 Authorization 头解析当前用户的 Supabase 用户 ID
+
+    Returns:
+        用户 ID，未登录或 Token 无效时返回 None
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+
+    current_user_id = None
+    try:
+        from auth import get_auth_manager
+        auth_manager = get_auth_manager()
+        token = auth_header.split(' ')[1]
+        payload = auth_manager.verify_access_token(token)
+        if payload:
+            # 优先使用 payload 中的 supabase_user_id
+            if 'supabase_user_id' in payload:
+                current_user_id = payload['supabase_user_id']
+            elif 'user_id' in payload:
+                # 如果是本地用户，尝试从 auth_manager 获取
+                user = auth_manager.get_user_by_id(payload['user_id'])
+                if user:
+                    current_user_id = user.get('supabase_user_id') or str(user.get('id'))
+            logger.info(f"[AUTH] ✓ Token 验证成功: 用户 {current_user_id}")
+    except Exception as e:
+        logger.warning(f"[AUTH] Token 验证失败: {e}")
+
+    return current_user_id
+
+
+def _check_tag_edit_permission(capsule, current_user_id):
+    """
+    检查当前用户是否可以编辑胶囊标签
+
+    1. 如果胶囊有所有者，必须是所有者才能编辑
+    2. 如果胶囊没有所有者（旧数据），允许任何已认证用户编辑
+
+    Raises:
+        APIError: 未登录（401）或不是所有者（403）
+    """
+    owner_id = capsule.get('owner_supabase_user_id')
+
+    if owner_id:
+        if not current_user_id:
+            raise APIError('需要登录才能编辑此胶囊', 401)
+        if current_user_id != owner_id:
+            raise APIError('无权编辑此胶囊：您不是胶囊所有者', 403)
+        logger.info(f"[TAGS] ✓ 所有权验证通过: 用户 {current_user_id} 编辑胶囊 {capsule['id']}")
+    else:
+        # 旧胶囊（没有 owner），记录日志但允许编辑
+        logger.info(f"[TAGS] ℹ️ 胶囊 {capsule['id']} 没有所有者（旧数据），允许编辑")
+
+
+def _collect_lens_tags(tags):
+    """
+    将 {lens: [tag, ...]} 展开为标签列表
+
+    🔥 移除硬编码白名单，允许所有棱镜（包括 mechanics、force_field_test 等）
+    遵循架构规范：严禁硬编码棱镜 ID
+
+    Args:
+        tags: 按棱镜分组的标签字典
+
+    Returns:
+        [{lens, word_id, word_cn, word_en, x, y}, ...]
+    """
+    all_tags = []
+
+    for lens, tag_list in tags.items():
+        if not tag_list:
+            continue
+
+        for tag in tag_list:
+            # 🔥 字段兼容：支持多种字段名称
+            all_tags.append({
+                'lens': lens,
+                'word_id': tag.get('word_id') or tag.get('id') or tag.get('word'),
+                'word_cn': tag.get('word_cn') or tag.get('zh'),
+                'word_en': tag.get('word_en') or tag.get('en') or tag.get('word'),
+                'x': tag.get('x'),
+                'y': tag.get('y')
+            })
+
+    return all_tags
+
+
 @library_bp.route('/<int:capsule_id>/tags', methods=['POST'])
 def update_capsule_tags_api(capsule_id):
     """
@@ -373,121 +676,40 @@ def update_capsule_tags_api(capsule_id):
             raise APIError(f"胶囊不存在: {capsule_id}", 404)
 
         # 🔐 所有权检查：只有胶囊所有者才能编辑标签
-        current_user_id = None
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                from auth import get_auth_manager
-                auth_manager = get_auth_manager()
-                token = auth_header.split(' ')[1]
-                payload = auth_manager.verify_access_token(token)
-                if payload:
-                    # 优先使用 payload 中的 supabase_user_id
-                    if 'supabase_user_id' in payload:
-                        current_user_id = payload['supabase_user_id']
-                    elif 'user_id' in payload:
-                        # 如果是本地用户，尝试从 auth_manager 获取
-                        user = auth_manager.get_user_by_id(payload['user_id'])
-                        if user:
-                            current_user_id = user.get('supabase_user_id') or str(user.get('id'))
-                    logger.info(f"[TAGS] ✓ Token 验证成功: 用户 {current_user_id}")
-            except Exception as e:
-                logger.warning(f"[TAGS] Token 验证失败: {e}")
-                pass
-
-        owner_id = capsule.get('owner_supabase_user_id')
-        
-        # 检查权限：
-        # 1. 如果胶囊有所有者，必须是所有者才能编辑
-        # 2. 如果胶囊没有所有者（旧数据），允许任何已认证用户编辑
-        if owner_id:
-            if not current_user_id:
-                raise APIError('需要登录才能编辑此胶囊', 401)
-            if current_user_id != owner_id:
-                raise APIError('无权编辑此胶囊：您不是胶囊所有者', 403)
-            logger.info(f"[TAGS] ✓ 所有权验证通过: 用户 {current_user_id} 编辑胶囊 {capsule_id}")
-        else:
-            # 旧胶囊（没有 owner），记录日志但允许编辑
-            logger.info(f"[TAGS] ℹ️ 胶囊 {capsule_id} 没有所有者（旧数据），允许编辑")
+        current_user_id = _get_current_supabase_user_id()
+        _check_tag_edit_permission(capsule, current_user_id)
 
         print(f"[DEBUG] 胶囊存在: {capsule['name']}")
 
-        # 删除旧标签
-        db.delete_capsule_tags(capsule_id)
-        print(f"[DEBUG] 已删除旧标签")
-
         # 收集所有标签到一个列表
-        all_tags = []
         logger.info(f"[TAGS] 接收到的原始 tags 数据: {tags}")
-        logger.info(f"[TAGS] tags.keys(): {list(tags.keys())}")
-
-        for lens, tag_list in tags.items():
-            logger.info(f"[TAGS] 处理棱镜 {lens}, 标签数量: {len(tag_list) if tag_list else 0}")
-            # 🔥 移除硬编码白名单，允许所有棱镜（包括 mechanics、force_field_test 等）
-            # 遵循架构规范：严禁硬编码棱镜 ID
+        all_tags = _collect_lens_tags(tags)
 
-            if not tag_list or len(tag_list) == 0:
-                continue
+        logger.info(f"[TAGS] 收集到的 all_tags 数量: {len(all_tags)}")
 
-            for tag in tag_list:
-                # 🔥 字段兼容：支持多种字段名称
-                word_id = tag.get('word_id') or tag.get('id') or tag.get('word')
-                word_cn = tag.get('word_cn') or tag.get('zh') or tag.get('word_cn')
-                word_en = tag.get('word_en') or tag.get('en') or tag.get('word')
-                x = tag.get('x')
-                y = tag.get('y')
-
-                all_tags.append({
-                    'lens': lens,
-                    'word_id': word_id,
-                    'word_cn': word_cn,
-                    'word_en': word_en,
-                    'x': x,
-                    'y': y
-                })
+        # 🔥 单事务写入：差异插入/删除 + 关键词聚合 + 坐标 + 待同步标记
+        # 只有已上传到云端的胶囊（有 cloud_id）才标记关键词待同步
+        result = db.bulk_update_capsule_tags({capsule_id: all_tags})[capsule_id]
+        pending_sync = result['pending_sync']
+        logger.info(
+            f"✓ 胶囊 {capsule_id} 标签已更新: {result['tags_count']} 个 "
+            f"(+{result['inserted']} / -{result['deleted']}, pending_sync={pending_sync})"
+        )
 
-        logger.info(f"[TAGS] 收集到的 all_tags 数量: {len(all_tags)}")
-        print(f"[DEBUG] 收集到的 all_tags 数量: {len(all_tags)}")
-        print(f"[DEBUG] all_tags 内容: {all_tags[:3] if all_tags else []}")
-
-        # 批量插入所有标签
-        pending_sync = False  # 默认不需要同步
-        
-        if all_tags:
-            print(f"[DEBUG] 开始插入 {len(all_tags)} 个标签...")
-            db.add_capsule_tags(capsule_id, all_tags)
-            print(f"[DEBUG] 插入完成")
-            logger.info(f"✓ 插入 {len(all_tags)} 个标签到胶囊 {capsule_id}")
-
-            # 🔥 关键：聚合关键词到 capsules.keywords 字段
-            print(f"[DEBUG] 开始聚合关键词...")
-            db.aggregate_and_update_keywords(capsule_id)
-            print(f"[DEBUG] 关键词聚合完成")
-            
-            # 🌐 只有已上传到云端的胶囊（有 cloud_id）才标记关键词待同步
-            # 新胶囊的关键词会随整个胶囊一起上传，不需要单独同步
-            try:
-                capsule = db.get_capsule(capsule_id)
-                if capsule and capsule.get('cloud_id'):
-                    from sync_service import get_sync_service
-                    sync_service = get_sync_service()
-                    sync_service.mark_for_sync('capsule_tags', capsule_id, 'update')
-                    pending_sync = True
-                    logger.info(f"[TAGS] ✓ 已标记关键词待同步: 胶囊 {capsule_id} (cloud_id: {capsule.get('cloud_id')})")
-                else:
-                    logger.info(f"[TAGS] 胶囊 {capsule_id} 未上传到云端，跳过标记同步")
-            except Exception as e:
-                logger.warning(f"[TAGS] 标记待同步失败: {e}")
-            
-            # 🔑 关键修复：执行 WAL checkpoint，确保标签数据立即对其他连接可见
-            # 这解决了编辑关键词后数据不更新的问题
+        # 🔑 关键修复：执行 WAL checkpoint，确保标签数据立即对其他连接可见
+        # 这解决了编辑关键词后数据不更新的问题
+        if result['inserted'] or result['deleted']:
             try:
                 db.wal_checkpoint()
                 logger.info(f"[TAGS] ✓ WAL checkpoint 完成，标签数据已同步")
             except Exception as e:
                 logger.warning(f"[TAGS] WAL checkpoint 失败: {e}")
-        else:
-            logger.warning(f"⚠️ 胶囊 {capsule_id} 没有标签需要插入")
+
+            try:
+                from tags_service import get_tags_service
+                get_tags_service().queue_followups([capsule_id])
+            except Exception as e:
+                logger.warning(f"[TAGS] 排队 embedding 刷新失败: {e}")
 
         return jsonify({
             'success': True,
@@ -503,6 +725,216 @@ def update_capsule_tags_api(capsule_id):
         raise APIError(f"更新标签失败: {e}", 500)
 
 
+# 批量打标签：每个事务处理的胶囊数量 / 单次请求上限
+TAG_BATCH_CHUNK_SIZE = 100
+TAG_BATCH_MAX_ITEMS = 2000
+
+
+def _validate_tag_ops(item):
+    """
+    校验单个胶囊的标签操作结构（在应用任何操作之前调用）
+
+    - tags / add: {lens: [tag 对象, ...]}
+    - remove:     {lens: [word_id 或 word_cn 字符串, ...]}
+
+    Raises:
+        APIError: 结构不合法（400）
+    """
+    for key in ('tags', 'add', 'remove'):
+        groups = item.get(key)
+        if groups is None:
+            continue
+        if not isinstance(groups, dict):
+            raise APIError(f'{key} 必须是按棱镜分组的对象', 400)
+        for lens, values in groups.items():
+            if values is None:
+                continue
+            if not isinstance(values, list):
+                raise APIError(f'{key}.{lens} 必须是列表', 400)
+            if key == 'remove':
+                if not all(isinstance(v, (str, int)) and not isinstance(v, bool) for v in values):
+                    raise APIError(f'remove.{lens} 只能包含 word_id 或 word_cn 字符串', 400)
+            elif not all(isinstance(v, dict) for v in values):
+                raise APIError(f'{key}.{lens} 只能包含标签对象', 400)
+
+
+def _apply_tag_ops(current_tags, item):
+    """
+    将单个胶囊的标签操作应用到现有标签上
+
+    支持的操作（可组合，顺序为 tags → remove → add）：
+    - tags:   {lens: [tag, ...]}，整体替换
+    - remove: {lens: [word_id 或 word_cn, ...]}，删除匹配的标签
+    - add:    {lens: [tag, ...]}，追加（同棱镜同 word_id 的标签不重复添加）
+
+    结构需先经 _validate_tag_ops 校验。
+
+    Returns:
+        最终的标签列表
+    """
+    if 'tags' in item:
+        result = _collect_lens_tags(item.get('tags') or {})
+    else:
+        result = [dict(t) for t in current_tags]
+
+    for lens, words in (item.get('remove') or {}).items():
+        words = set(words or [])
+        result = [
+            t for t in result
+            if not (t['lens'] == lens and (t.get('word_id') in words or t.get('word_cn') in words))
+        ]
+
+    add = item.get('add') or {}
+    existing = {(t['lens'], t.get('word_id')) for t in result if t.get('word_id')}
+    for tag in _collect_lens_tags(add):
+        key = (tag['lens'], tag['word_id'])
+        if tag['word_id'] and key in existing:
+            continue
+        existing.add(key)
+        result.append(tag)
+
+    return result
+
+
+@library_bp.route('/tags/batch', methods=['POST'])
+def batch_update_capsule_tags_api():
+    """
+    批量修改多个胶囊的标签
+
+    按 TAG_BATCH_CHUNK_SIZE 分块，每块一个事务（差异写入 + 关键词聚合 + 待同步标记），
+    云端 embedding 刷新按胶囊去重后交给后台队列，不在请求内执行。
+    所有条目的操作结构先整体校验，任何一条不合法时整个请求返回 400、不写入任何内容；
+    单个胶囊失败（capsule_id 无效 / 不存在 / 无权限）不影响其他胶囊。
+
+    请求体:
+        {
+            "items": [
+                {"capsule_id": 1, "tags": {"texture": [...], ...}},
+                {"capsule_id": 2, "add": {"source": [...]}, "remove": {"texture": ["word_id"]}}
+            ]
+        }
+
+    Returns:
+        {
+            "success": true,
+            "results": [{"capsule_id": 1, "success": true, "tags_count": 3, ...}, ...],
+                       // 同一胶囊的多个条目合并为一条结果；capsule_id 无效的条目按序号各一条（带 index）
+            "updated": 2,
+            "failed": 0
+        }
+    """
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('items'), list):
+            raise APIError('请求体必须包含 items 列表', 400)
+
+        items = data['items']
+        if len(items) > TAG_BATCH_MAX_ITEMS:
+            raise APIError(f'单次最多修改 {TAG_BATCH_MAX_ITEMS} 个胶囊', 400)
+
+        # 先校验全部条目，避免同一胶囊的后续条目失败时丢弃已应用的操作
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise APIError(f'items[{index}] 必须是对象', 400)
+            try:
+                _validate_tag_ops(item)
+            except APIError as e:
+                raise APIError(f'items[{index}]: {e.message}', 400)
+
+        db = get_database()
+        current_user_id = _get_current_supabase_user_id()
+
+        # 同一胶囊多次出现时合并为最后一次的结果
+        def valid_id(capsule_id):
+            return isinstance(capsule_id, int) and not isinstance(capsule_id, bool)
+
+        capsule_ids = []
+        for item in items:
+            capsule_id = item.get('capsule_id')
+            if valid_id(capsule_id) and capsule_id not in capsule_ids:
+                capsule_ids.append(capsule_id)
+
+        capsules = db.get_capsules_with_tags(capsule_ids)
+
+        results = {}
+        new_tags = {}
+
+        for index, item in enumerate(items):
+            capsule_id = item.get('capsule_id')
+            if not valid_id(capsule_id):
+                # 无效 ID 按条目序号记录，不同的无效输入不会合并
+                results[('item', index)] = {
+                    'index': index, 'capsule_id': capsule_id, 'success': False, 'error': 'capsule_id 无效'
+                }
+                continue
+
+            capsule = capsules.get(capsule_id)
+            if not capsule:
+                results[capsule_id] = {
+                    'capsule_id': capsule_id, 'success': False, 'error': f'胶囊不存在: {capsule_id}'
+                }
+                continue
+
+            try:
+                _check_tag_edit_permission(capsule, current_user_id)
+            except APIError as e:
+                results[capsule_id] = {
+                    'capsule_id': capsule_id, 'success': False, 'error': e.message
+                }
+                continue
+
+            base_tags = new_tags.get(capsule_id, capsule['tags'])
+            new_tags[capsule_id] = _apply_tag_ops(base_tags, item)
+
+        # 分块事务写入
+        changed_ids = []
+        pending_ids = list(new_tags.keys())
+        for i in range(0, len(pending_ids), TAG_BATCH_CHUNK_SIZE):
+            chunk = {cid: new_tags[cid] for cid in pending_ids[i:i + TAG_BATCH_CHUNK_SIZE]}
+            try:
+                chunk_results = db.bulk_update_capsule_tags(chunk)
+            except Exception as e:
+                logger.error(f"[TAGS] 批量写入失败（{len(chunk)} 个胶囊）: {e}")
+                for cid in chunk:
+                    results[cid] = {'capsule_id': cid, 'success': False, 'error': str(e)}
+                continue
+
+            for cid, r in chunk_results.items():
+                results[cid] = {'capsule_id': cid, 'success': True, **r}
+                if r['inserted'] or r['deleted']:
+                    changed_ids.append(cid)
+
+        if changed_ids:
+            # 🔑 整批只做一次 WAL checkpoint
+            try:
+                db.wal_checkpoint()
+            except Exception as e:
+                logger.warning(f"[TAGS] WAL checkpoint 失败: {e}")
+
+            # 后续任务：每个胶囊只排队一次
+            try:
+                from tags_service import get_tags_service
+                get_tags_service().queue_followups(changed_ids)
+            except Exception as e:
+                logger.warning(f"[TAGS] 排队 embedding 刷新失败: {e}")
+
+        result_list = list(results.values())
+        updated = sum(1 for r in result_list if r['success'])
+        logger.info(f"[TAGS] 批量修改标签: 成功 {updated}, 失败 {len(result_list) - updated}, 有变化 {len(changed_ids)}")
+
+        return jsonify({
+            'success': True,
+            'results': result_list,
+            'updated': updated,
+            'failed': len(result_list) - updated
+        })
+
+    except APIError:
+        raise
+    except Exception as e:
+        raise APIError(f"批量更新标签失败: {e}", 500)
+
+
 @library_bp.route('/<int:capsule_id>/tags', methods=['PUT'])
 def replace_capsule_tags_api(capsule_id):
     """
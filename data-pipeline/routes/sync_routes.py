@@ -13,11 +13,19 @@ Routes:
 - GET  /api/sync/conflicts - Get unresolved conflicts
 - POST /api/sync/resolve-conflict - Resolve a conflict
 - POST /api/sync/lightweight - Lightweight metadata sync
+- GET  /api/sync/jobs - List sync jobs of current user
+- GET  /api/sync/jobs/<id> - Get sync job status / progress / result
+- POST /api/sync/jobs/<id>/cancel - Cancel a queued sync job
+
+Long-running sync work runs as persistent jobs (sync_job_queue). By default the
+routes wait for the job and respond as before; with "async": true in the body they
+return 202 with a job_id immediately, "background": true enqueues at low priority.
 """
 
 import sqlite3
 import os
 import logging
+from typing import List, Dict, Any, Tuple
 from flask import Blueprint, request, jsonify
 from functools import wraps
 
@@ -29,6 +37,10 @@ from sync_service import get_sync_service
 from capsule_db import get_database
 from auth import get_auth_manager
 from common import APIError, PathManager
+from sync_job_queue import (
+    get_sync_job_queue, register_sync_job_handler,
+    PRIORITY_USER, PRIORITY_BACKGROUND, STATUS_QUEUED
+)
 
 logger = logging.getLogger(__name__)
 
@@ -121,6 +133,195 @@ def token_required(f):
     return decorated
 
 
+# ============================================================
+# Sync Jobs
+# ============================================================
+
+def _submit_sync_job(job_type: str, user_id: str, payload: Dict[str, Any],
+                     body: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    提交同步任务
+
+    Args:
+        job_type: 任务类型
+        user_id: 用户 ID
+        payload: 任务参数
+        body: 请求体（async: 立即返回任务 ID；background: 后台优先级）
+
+    Returns:
+        (任务字典, 是否已结束)
+    """
+    queue = get_sync_job_queue()
+    priority = PRIORITY_BACKGROUND if body.get('background') else PRIORITY_USER
+    job_id, _ = queue.enqueue(job_type, user_id, payload, priority)
+
+    if body.get('async'):
+        return queue.get(job_id), False
+
+    job = queue.wait(job_id)
+    if job['status'] == STATUS_QUEUED:
+        # 执行失败，等待退避重试：按失败返回，任务仍会在后台重试
+        job = {**job, 'status': 'retrying'}
+    return job, True
+
+
+def _job_accepted(job: Dict[str, Any]):
+    """异步提交的响应（202）"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'job_id': job['id'],
+            'status': job['status']
+        }
+    }), 202
+
+
+def _sync_job_lightweight(job, reporter):
+    payload = job['payload']
+    capsule_ids = payload.get('capsule_ids')
+    wanted = set(capsule_ids) if capsule_ids else None
+
+    def on_progress(capsule_id, entry):
+        if wanted is None or capsule_id in wanted:
+            reporter.update_capsule(capsule_id, entry)
+
+    from sync_service import add_upload_progress_listener, remove_upload_progress_listener
+    sync_service = get_sync_service()
+    upload_only = payload.get('upload_only', False)
+    reporter.update(percent=0, stage='自动上传' if upload_only else '轻量级同步')
+    add_upload_progress_listener(on_progress)
+    try:
+        result = sync_service.sync_metadata_lightweight(
+            user_id=job['user_id'],
+            include_previews=payload.get('include_previews', True),
+            capsule_ids=capsule_ids,
+            force_upload=payload.get('force', False),
+            upload_only=upload_only
+        )
+    finally:
+        remove_upload_progress_listener(on_progress)
+
+    # 同时也同步棱镜配置 (Phase C)，胶囊客户端只下载棱镜，不上传（仅上传任务不需要）
+    if not upload_only:
+        try:
+            sync_service.sync_prisms(job['user_id'], upload=False)
+        except Exception as e:
+            logger.warning(f"棱镜同步失败 (非阻断): {e}")
+
+    reporter.update(percent=100, stage='完成')
+    return result
+
+
+def _sync_job_download_only(job, reporter):
+    payload = job['payload']
+    sync_service = get_sync_service()
+    reporter.update(percent=0, stage='仅下载')
+    result = sync_service.download_only(
+        user_id=job['user_id'],
+        include_previews=payload.get('include_previews', True),
+        full=payload.get('full', False)
+    )
+
+    # 同时也同步棱镜配置 (Phase C)，胶囊客户端只下载棱镜，不上传
+    try:
+        sync_service.sync_prisms(job['user_id'], upload=False)
+    except Exception as e:
+        logger.warning(f"棱镜同步失败 (非阻断): {e}")
+
+    reporter.update(percent=100, stage='完成')
+    return result
+
+
+def _sync_job_upload_audio(job, reporter):
+    capsule_ids = job['payload'].get('capsule_ids') or []
+    wanted = set(capsule_ids)
+
+    def on_progress(capsule_id, entry):
+        if capsule_id in wanted:
+            reporter.update_capsule(capsule_id, entry)
+
+    from sync_service import add_upload_progress_listener, remove_upload_progress_listener
+    reporter.update(percent=0, stage='上传 Audio')
+    add_upload_progress_listener(on_progress)
+    try:
+        return get_sync_service().upload_audio_folders(user_id=job['user_id'], capsule_ids=capsule_ids)
+    finally:
+        remove_upload_progress_listener(on_progress)
+
+
+def _sync_job_sync_tags(job, reporter):
+    reporter.update(percent=0, stage='关键词同步')
+    return get_sync_service().sync_tags_only(user_id=job['user_id'])
+
+
+def _sync_job_upload(job, reporter):
+    payload = job['payload']
+    return _upload_records(job['user_id'], payload['table'], payload.get('records') or [], reporter)
+
+
+register_sync_job_handler('lightweight', _sync_job_lightweight)
+register_sync_job_handler('download_only', _sync_job_download_only)
+register_sync_job_handler('upload_audio', _sync_job_upload_audio)
+register_sync_job_handler('sync_tags', _sync_job_sync_tags)
+register_sync_job_handler('upload', _sync_job_upload)
+
+
+@sync_bp.route('/jobs', methods=['GET'])
+@token_required
+def list_sync_jobs(current_user):
+    """
+    列出当前用户的同步任务
+
+    Query 参数:
+        status: 按状态过滤（可选）
+        limit: 数量上限（默认 50）
+    """
+    try:
+        user_id = current_user.get('supabase_user_id') or str(current_user.get('id', ''))
+        jobs = get_sync_job_queue().store.list(
+            user_id=user_id,
+            status=request.args.get('status'),
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify({'success': True, 'data': jobs})
+    except Exception as e:
+        logger.error(f"获取同步任务失败: {e}")
+        raise APIError(f"获取同步任务失败: {e}", 500)
+
+
+@sync_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """
+    获取同步任务状态、进度和结果
+
+    响应:
+        {
+            "success": true,
+            "data": {
+                "id": 12, "job_type": "lightweight", "status": "running",
+                "progress": 40, "stage": "...", "progress_data": {...},
+                "result": null, "error": null, "attempts": 1
+            }
+        }
+    """
+    job = get_sync_job_queue().get(job_id)
+    if not job:
+        raise APIError('任务不存在', 404)
+    return jsonify({'success': True, 'data': job})
+
+
+@sync_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@token_required
+def cancel_sync_job(current_user, job_id):
+    """取消排队中的同步任务（执行中的任务无法取消）"""
+    queue = get_sync_job_queue()
+    if not queue.get(job_id):
+        raise APIError('任务不存在', 404)
+    if not queue.cancel(job_id):
+        raise APIError('任务已开始执行或已结束，无法取消', 409)
+    return jsonify({'success': True, 'data': {'job_id': job_id, 'status': 'cancelled'}})
+
+
 # ============================================================
 # Sync Status Routes
 # ============================================================
@@ -228,7 +429,10 @@ def mark_record_for_sync(current_user):
             raise APIError('缺少必要参数: table, record_id', 400)
 
         sync_service = get_sync_service()
-        success = sync_service.mark_for_sync(table_name, record_id, operation)
+        success = sync_service.mark_for_sync(
+            table_name, record_id, operation,
+            user_id=current_user.get('supabase_user_id') or str(current_user.get('id', ''))
+        )
 
         if success:
             return jsonify({
@@ -248,6 +452,245 @@ def mark_record_for_sync(current_user):
 # Cloud Sync Routes
 # ============================================================
 
+def _upload_capsule_files(supabase, user_id, capsule_data):
+    """
+    上传胶囊的预览音频 / RPP / metadata.json / Audio 文件夹（仅缺失部分）
+
+    Args:
+        supabase: SupabaseClient 实例
+        user_id: Supabase 用户 ID
+        capsule_data: 胶囊数据（需要 file_path / preview_audio / rpp_file）
+    """
+    capsule_dir = capsule_data.get('file_path', '')
+    if capsule_dir:
+        # 从路径管理器获取导出目录
+        pm = PathManager.get_instance()
+        full_capsule_dir = pm.export_dir / capsule_dir
+
+        logger.info(f"[SYNC] 🔍 查找胶囊目录: {full_capsule_dir}")
+
+        if not full_capsule_dir.exists():
+            logger.warning(f"[SYNC] ⚠ 胶囊目录不存在: {full_capsule_dir}")
+            full_capsule_dir = None
+
+        if full_capsule_dir:
+            # 🎵 上传预览音频文件（仅缺失）
+            preview_audio = capsule_data.get('preview_audio')
+            if preview_audio:
+                preview_path = full_capsule_dir / preview_audio
+                if preview_path.exists():
+                    if supabase.storage_file_exists(user_id, capsule_dir, preview_audio):
+                        logger.info(f"[SYNC]   ✓ 预览音频已存在，跳过")
+                    else:
+                        logger.info(f"[SYNC] → 上传预览音频: {preview_audio}")
+                        preview_result = supabase.upload_file(
+                            user_id=user_id,
+                            capsule_folder_name=capsule_dir,
+                            file_type='preview',
+                            file_path=str(preview_path)
+                        )
+                        if preview_result:
+                            logger.info(f"[SYNC]   ✓ 预览音频上传成功")
+                            logger.info(f"[SYNC]     - 大小: {preview_result.get('size', 0):,} bytes")
+                            logger.info(f"[SYNC]     - 路径: {preview_result.get('storage_path', 'N/A')}")
+                        else:
+                            _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
+                            logger.warning(f"[SYNC]   ⚠ 预览音频上传失败" + (f": {_err}" if _err else ""))
+                else:
+                    logger.warning(f"[SYNC]   ⚠ 预览音频文件不存在: {preview_path}")
+
+            # 📄 上传 RPP 项目文件（仅缺失）
+            rpp_file = capsule_data.get('rpp_file')
+            if rpp_file:
+                rpp_path = full_capsule_dir / rpp_file
+                if rpp_path.exists():
+                    if supabase.storage_file_exists(user_id, capsule_dir, rpp_file):
+                        logger.info(f"[SYNC]   ✓ RPP 已存在，跳过")
+                    else:
+                        logger.info(f"[SYNC] → 上传 RPP 文件: {rpp_file}")
+                        rpp_result = supabase.upload_file(
+                            user_id=user_id,
+                            capsule_folder_name=capsule_dir,
+                            file_type='rpp',
+                            file_path=str(rpp_path)
+                        )
+                        if rpp_result:
+                            logger.info(f"[SYNC]   ✓ RPP 文件上传成功")
+                            logger.info(f"[SYNC]     - 大小: {rpp_result.get('size', 0):,} bytes")
+                            logger.info(f"[SYNC]     - 路径: {rpp_result.get('storage_path', 'N/A')}")
+                        else:
+                            _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
+                            logger.warning(f"[SYNC]   ⚠ RPP 文件上传失败" + (f": {_err}" if _err else ""))
+                else:
+                    logger.warning(f"[SYNC]   ⚠ RPP 文件不存在: {rpp_path}")
+
+            # 📋 上传 metadata.json 文件（仅缺失）
+            metadata_file = full_capsule_dir / "metadata.json"
+            if metadata_file.exists():
+                if supabase.storage_file_exists(user_id, capsule_dir, "metadata.json"):
+                    logger.info(f"[SYNC]   ✓ metadata.json 已存在，跳过")
+                else:
+                    logger.info(f"[SYNC] → 上传 metadata.json...")
+                    metadata_result = supabase.upload_file(
+                        user_id=user_id,
+                        capsule_folder_name=capsule_dir,
+                        file_type='metadata',
+                        file_path=str(metadata_file)
+                    )
+                    if metadata_result:
+                        logger.info(f"[SYNC]   ✓ metadata.json 上传成功")
+                        logger.info(f"[SYNC]     - 大小: {metadata_result.get('size', 0):,} bytes")
+                        logger.info(f"[SYNC]     - 路径: {metadata_result.get('storage_path', 'N/A')}")
+                    else:
+                        _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
+                        logger.warning(f"[SYNC]   ⚠ metadata.json 上传失败" + (f": {_err}" if _err else ""))
+            else:
+                logger.warning(f"[SYNC]   ⚠ metadata.json 文件不存在: {metadata_file}")
+
+            # 🎧 上传 Audio 文件夹（仅缺失）
+            audio_folder = full_capsule_dir / "Audio"
+            if audio_folder.exists():
+                local_files = [
+                    entry for entry in audio_folder.iterdir()
+                    if entry.is_file() and not entry.name.startswith('.')
+                    and entry.suffix.lower() in ['.wav', '.mp3', '.ogg', '.flac', '.aiff']
+                ]
+                remote_files = set(supabase.list_audio_files(user_id, capsule_dir))
+                missing_files = [f for f in local_files if f.name not in remote_files]
+                if not missing_files:
+                    logger.info(f"[SYNC]   ✓ Audio 已完整存在，跳过")
+                else:
+                    logger.info(f"[SYNC] → 上传 Audio 文件夹（缺失 {len(missing_files)} 个）...")
+                    audio_result = supabase.upload_audio_files(
+                        user_id=user_id,
+                        capsule_folder_name=capsule_dir,
+                        audio_files=missing_files
+                    )
+                    if audio_result and audio_result.get('success', False):
+                        logger.info(f"[SYNC]   ✓ Audio 文件夹上传成功")
+                        logger.info(f"[SYNC]     - 文件数: {audio_result.get('files_uploaded', 0)}")
+                        logger.info(f"[SYNC]     - 总大小: {audio_result.get('total_size', 0):,} bytes ({audio_result.get('total_size', 0) / 1024 / 1024:.2f} MB)")
+                        if audio_result.get('errors'):
+                            logger.warning(f"[SYNC]     - 失败: {len(audio_result.get('errors', []))} 个文件")
+                    else:
+                        _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
+                        logger.warning(f"[SYNC]   ⚠ Audio 文件夹上传失败" + (f": {_err}" if _err else ""))
+            else:
+                logger.info(f"[SYNC]   ℹ 无 Audio 文件夹，跳过")
+        else:
+            logger.warning(f"[SYNC] ⚠ 无法找到胶囊目录: {capsule_dir}")
+
+
+def _upload_records(user_id: str, table_name: str, records: List[Dict[str, Any]], reporter=None) -> Dict[str, Any]:
+    """
+    上传待同步记录到云端（/upload 任务的执行体）
+
+    Args:
+        user_id: Supabase 用户 ID
+        table_name: 表名
+        records: 待同步记录（含 record_id）
+        reporter: 任务进度上报（可选）
+
+    Returns:
+        {'uploaded': int, 'failed': int, 'synced_count': int}
+    """
+    from supabase_client import get_supabase_client
+
+    supabase = get_supabase_client()
+    if not supabase:
+        raise Exception("Supabase 客户端未初始化")
+
+    uploaded = 0
+    failed = 0
+    cloud_id_mapping = {}  # 本地 ID -> 云端 ID 映射
+    cloud_versions = {}  # 本地 ID -> 云端版本（文件也已上传，可标记为已同步）
+
+    # 根据不同的表名处理
+    if table_name == 'capsules':
+        from sync_batch_writer import BatchSyncWriter
+
+        writer = BatchSyncWriter(supabase, user_id, get_database().db_path)
+
+        # 1. 批量载入本地胶囊（行 + 技术元数据 + 标签 + 坐标）
+        record_ids = [r.get('record_id') for r in records]
+        capsules = writer.load_capsules(record_ids)
+        loaded_ids = {c['id'] for c in capsules}
+        for record_id in record_ids:
+            if record_id not in loaded_ids:
+                logger.warning(f"[SYNC]   ✗ 警告: 胶囊 ID {record_id} 不存在，跳过")
+                failed += 1
+
+        # 2. 批量 upsert 胶囊（已存在的仅更新 keywords），一个事务内回写 cloud_id
+        logger.info(f"[SYNC] → 批量上传 {len(capsules)} 个胶囊到 Supabase...")
+        results = writer.upload_capsules(capsules, keywords_only=True)
+
+        # 3. 逐个胶囊上传缺失的文件
+        for idx, capsule_data in enumerate(capsules, 1):
+            record_id = capsule_data['id']
+            result = results.get(record_id)
+            if not result:
+                failed += 1
+                logger.error(f"[SYNC]   ✗ 上传失败: 胶囊 ID {record_id} 未写入云端")
+                continue
+
+            uploaded += 1
+            cloud_id_mapping[record_id] = result['id']
+            logger.info(f"\n[SYNC] 处理第 {idx}/{len(capsules)} 个胶囊: {capsule_data.get('name')}")
+            logger.info(f"[SYNC]     - 本地ID: {record_id}")
+            logger.info(f"[SYNC]     - 云端ID: {result['id']}")
+            logger.info(f"[SYNC]     - 版本: {result.get('version')}")
+            if reporter:
+                reporter.update(
+                    percent=int(idx / len(capsules) * 90),
+                    stage='上传文件',
+                    message=f"{idx}/{len(capsules)} {capsule_data.get('name')}"
+                )
+            try:
+                _upload_capsule_files(supabase, user_id, capsule_data)
+                cloud_versions[record_id] = result.get('version', 1)
+            except Exception as e:
+                failed += 1
+                logger.error(f"[SYNC]   ✗ 异常: {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+
+        # 4. 批量上传标签和坐标
+        if cloud_id_mapping:
+            logger.info(f"[SYNC] 📝 批量上传 {len(cloud_id_mapping)} 个胶囊的标签和坐标")
+            tag_result = writer.upload_tags_and_coordinates(cloud_id_mapping)
+            # 标签 / 坐标上传失败的胶囊不标记为已同步，计入失败
+            for record_id in tag_result['failed_ids']:
+                if record_id in cloud_versions:
+                    del cloud_versions[record_id]
+                    uploaded -= 1
+                    failed += 1
+            if tag_result['failed_ids']:
+                logger.error(f"[SYNC]   ✗ 标签/坐标上传失败: {len(tag_result['failed_ids'])} 个胶囊")
+
+    elif table_name == 'capsule_tags':
+        # 标签会随着胶囊一起上传
+        uploaded = len(records)
+    elif table_name == 'capsule_coordinates':
+        # 坐标会随着胶囊一起上传
+        uploaded = len(records)
+    else:
+        raise Exception(f"不支持的表名: {table_name}")
+
+    # 标记为已同步（只标记成功上传的记录，单事务）
+    synced_count = 0
+    if cloud_versions:
+        synced_count = writer.mark_synced(cloud_versions)
+        logger.info(f"[SYNC] 标记为已同步: {table_name} {synced_count} 条")
+
+    logger.info(f"[SYNC] 同步完成: 成功 {uploaded}, 失败 {failed}, 标记 {synced_count}")
+
+    return {
+        'uploaded': uploaded,
+        'failed': failed,
+        'synced_count': synced_count
+    }
+
+
 @sync_bp.route('/upload', methods=['POST'])
 @token_required
 def upload_to_cloud(current_user):
@@ -288,344 +731,29 @@ def upload_to_cloud(current_user):
         logger.info(f"[SYNC] 开始上传到云端")
         logger.info(f"[SYNC] 表名: {table_name}")
         logger.info(f"[SYNC] 记录数: {len(records)}")
-        logger.info(f"[SYNC] 完整请求体: {data}")
-        if records:
-            logger.info(f"[SYNC] 第一条记录: {records[0]}")
         logger.info(f"{'='*60}\n")
 
-        # 真实的云端上传逻辑
-        try:
-            from supabase_client import get_supabase_client
-            from common import load_user_config  # Import helper function
-
-            supabase = get_supabase_client()
-            if not supabase:
-                raise Exception("Supabase 客户端未初始化")
-
-            # 获取用户 ID（优先使用 supabase_user_id，如果没有则使用本地 ID）
-            user_id = current_user.get('supabase_user_id') or str(current_user.get('id', ''))
-
-            uploaded = 0
-            failed = 0
-            cloud_id_mapping = {}  # 本地 ID -> 云端 ID 映射
-
-            # 根据不同的表名处理
-            if table_name == 'capsules':
-                # 获取本地数据库连接
-                db = get_database()
-                db.connect()
-                cursor = db.conn.cursor()
-
-                try:
-                    # 上传胶囊数据
-                    for idx, pending_record in enumerate(records, 1):
-                        logger.info(f"\n[SYNC] 处理第 {idx}/{len(records)} 条记录...")
-                        try:
-                            # 从 pending_record 中获取实际的 record_id
-                            record_id = pending_record.get('record_id')
-                            logger.info(f"[SYNC]   record_id: {record_id}")
-
-                            # 从数据库获取完整的胶囊数据
-                            cursor.execute("SELECT * FROM capsules WHERE id = ?", (record_id,))
-                            row = cursor.fetchone()
-
-                            if not row:
-                                logger.warning(f"[SYNC]   ✗ 警告: 胶囊 ID {record_id} 不存在，跳过")
-                                failed += 1
-                                continue
-
-                            # 将行数据转换为字典
-                            columns = [desc[0] for desc in cursor.description]
-                            capsule_data = dict(zip(columns, row))
-
-                            # 获取技术元数据
-                            cursor.execute("""SELECT bpm, duration, sample_rate, plugin_count, plugin_list,
-                                                   has_sends, has_folder_bus, tracks_included
-                                            FROM capsule_metadata WHERE capsule_id = ?""", (record_id,))
-                            metadata_row = cursor.fetchone()
-                            if metadata_row:
-                                capsule_data['bpm'] = metadata_row[0]
-                                capsule_data['duration'] = metadata_row[1]
-                                capsule_data['sample_rate'] = metadata_row[2]
-                                capsule_data['plugin_count'] = metadata_row[3]
-                                capsule_data['plugin_list'] = metadata_row[4]
-                                capsule_data['has_sends'] = metadata_row[5]
-                                capsule_data['has_folder_bus'] = metadata_row[6]
-                                capsule_data['tracks_included'] = metadata_row[7]
-
-                            logger.info(f"[SYNC]   ✓ 胶囊名称: {capsule_data.get('name')}")
-
-                            # 上传到云端（仅 keywords 更新）
-                            logger.info(f"[SYNC]   → 正在上传到 Supabase...")
-                            existing_cloud = supabase.get_cloud_capsule_by_local_id(user_id, record_id)
-                            result = None
-                            if existing_cloud:
-                                remote_meta = existing_cloud.get('metadata') or {}
-                                remote_keywords = remote_meta.get('keywords') if isinstance(remote_meta, dict) else None
-                                local_keywords = capsule_data.get('keywords')
-                                if local_keywords != remote_keywords:
-                                    result = supabase.update_capsule_keywords(user_id, record_id, local_keywords)
-                                else:
-                                    result = existing_cloud
-                            else:
-                                result = supabase.upload_capsule(user_id, capsule_data)
-
-                            if result:
-                                uploaded += 1
-                                cloud_id = result.get('id')
-                                cloud_id_mapping[record_id] = cloud_id
-                                logger.info(f"[SYNC]   ✓ 上传成功!")
-                                logger.info(f"[SYNC]     - 本地ID: {record_id}")
-                                logger.info(f"[SYNC]     - 云端ID: {cloud_id}")
-                                logger.info(f"[SYNC]     - 版本: {result.get('version')}")
-                                
-                                # 🔧 立即更新 cloud_id（防止后续文件上传失败导致数据不一致）
-                                cursor.execute("""
-                                    UPDATE capsules
-                                    SET cloud_id = ?,
-                                        cloud_version = ?
-                                    WHERE id = ?
-                                """, (cloud_id, result.get('version', 1), record_id))
-                                db.conn.commit()
-                                logger.info(f"[SYNC]   ✓ 已设置 cloud_id")
-
-                                # 🎯 上传 Audio 文件夹（仅缺失部分）
-                                import os
-                                capsule_dir = capsule_data.get('file_path', '')
-                                if capsule_dir:
-                                    from pathlib import Path
-                                    import glob
-
-                                    # 从路径管理器获取导出目录
-                                    pm = PathManager.get_instance()
-                                    full_capsule_dir = pm.export_dir / capsule_dir
-                                    
-                                    logger.info(f"[SYNC] 🔍 查找胶囊目录: {full_capsule_dir}")
-                                    
-                                    if not full_capsule_dir.exists():
-                                        logger.warning(f"[SYNC] ⚠ 胶囊目录不存在: {full_capsule_dir}")
-                                        full_capsule_dir = None
-
-                                    if full_capsule_dir:
-                                        # 🎵 上传预览音频文件（仅缺失）
-                                        preview_audio = capsule_data.get('preview_audio')
-                                        if preview_audio:
-                                            preview_path = full_capsule_dir / preview_audio
-                                            if preview_path.exists():
-                                                if supabase.storage_file_exists(user_id, capsule_dir, preview_audio):
-                                                    logger.info(f"[SYNC]   ✓ 预览音频已存在，跳过")
-                                                else:
-                                                    logger.info(f"[SYNC] → 上传预览音频: {preview_audio}")
-                                                    preview_result = supabase.upload_file(
-                                                        user_id=user_id,
-                                                        capsule_folder_name=capsule_dir,
-                                                        file_type='preview',
-                                                        file_path=str(preview_path)
-                                                    )
-                                                    if preview_result:
-                                                        logger.info(f"[SYNC]   ✓ 预览音频上传成功")
-                                                        logger.info(f"[SYNC]     - 大小: {preview_result.get('size', 0):,} bytes")
-                                                        logger.info(f"[SYNC]     - 路径: {preview_result.get('storage_path', 'N/A')}")
-                                                    else:
-                                                        _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
-                                                        logger.warning(f"[SYNC]   ⚠ 预览音频上传失败" + (f": {_err}" if _err else ""))
-                                            else:
-                                                logger.warning(f"[SYNC]   ⚠ 预览音频文件不存在: {preview_path}")
-
-                                        # 📄 上传 RPP 项目文件（仅缺失）
-                                        rpp_file = capsule_data.get('rpp_file')
-                                        if rpp_file:
-                                            rpp_path = full_capsule_dir / rpp_file
-                                            if rpp_path.exists():
-                                                if supabase.storage_file_exists(user_id, capsule_dir, rpp_file):
-                                                    logger.info(f"[SYNC]   ✓ RPP 已存在，跳过")
-                                                else:
-                                                    logger.info(f"[SYNC] → 上传 RPP 文件: {rpp_file}")
-                                                    rpp_result = supabase.upload_file(
-                                                        user_id=user_id,
-                                                        capsule_folder_name=capsule_dir,
-                                                        file_type='rpp',
-                                                        file_path=str(rpp_path)
-                                                    )
-                                                    if rpp_result:
-                                                        logger.info(f"[SYNC]   ✓ RPP 文件上传成功")
-                                                        logger.info(f"[SYNC]     - 大小: {rpp_result.get('size', 0):,} bytes")
-                                                        logger.info(f"[SYNC]     - 路径: {rpp_result.get('storage_path', 'N/A')}")
-                                                    else:
-                                                        _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
-                                                        logger.warning(f"[SYNC]   ⚠ RPP 文件上传失败" + (f": {_err}" if _err else ""))
-                                            else:
-                                                logger.warning(f"[SYNC]   ⚠ RPP 文件不存在: {rpp_path}")
-
-                                        # 📋 上传 metadata.json 文件（仅缺失）
-                                        metadata_file = full_capsule_dir / "metadata.json"
-                                        if metadata_file.exists():
-                                            if supabase.storage_file_exists(user_id, capsule_dir, "metadata.json"):
-                                                logger.info(f"[SYNC]   ✓ metadata.json 已存在，跳过")
-                                            else:
-                                                logger.info(f"[SYNC] → 上传 metadata.json...")
-                                                metadata_result = supabase.upload_file(
-                                                    user_id=user_id,
-                                                    capsule_folder_name=capsule_dir,
-                                                    file_type='metadata',
-                                                    file_path=str(metadata_file)
-                                                )
-                                                if metadata_result:
-                                                    logger.info(f"[SYNC]   ✓ metadata.json 上传成功")
-                                                    logger.info(f"[SYNC]     - 大小: {metadata_result.get('size', 0):,} bytes")
-                                                    logger.info(f"[SYNC]     - 路径: {metadata_result.get('storage_path', 'N/A')}")
-                                                else:
-                                                    _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
-                                                    logger.warning(f"[SYNC]   ⚠ metadata.json 上传失败" + (f": {_err}" if _err else ""))
-                                        else:
-                                            logger.warning(f"[SYNC]   ⚠ metadata.json 文件不存在: {metadata_file}")
-
-                                        # 🎧 上传 Audio 文件夹（仅缺失）
-                                        audio_folder = full_capsule_dir / "Audio"
-                                        if audio_folder.exists():
-                                            local_files = [
-                                                entry for entry in audio_folder.iterdir()
-                                                if entry.is_file() and not entry.name.startswith('.')
-                                                and entry.suffix.lower() in ['.wav', '.mp3', '.ogg', '.flac', '.aiff']
-                                            ]
-                                            remote_files = set(supabase.list_audio_files(user_id, capsule_dir))
-                                            missing_files = [f for f in local_files if f.name not in remote_files]
-                                            if not missing_files:
-                                                logger.info(f"[SYNC]   ✓ Audio 已完整存在，跳过")
-                                            else:
-                                                logger.info(f"[SYNC] → 上传 Audio 文件夹（缺失 {len(missing_files)} 个）...")
-                                                audio_result = supabase.upload_audio_files(
-                                                    user_id=user_id,
-                                                    capsule_folder_name=capsule_dir,
-                                                    audio_files=missing_files
-                                                )
-                                                if audio_result and audio_result.get('success', False):
-                                                    logger.info(f"[SYNC]   ✓ Audio 文件夹上传成功")
-                                                    logger.info(f"[SYNC]     - 文件数: {audio_result.get('files_uploaded', 0)}")
-                                                    logger.info(f"[SYNC]     - 总大小: {audio_result.get('total_size', 0):,} bytes ({audio_result.get('total_size', 0) / 1024 / 1024:.2f} MB)")
-                                                    if audio_result.get('errors'):
-                                                        logger.warning(f"[SYNC]     - 失败: {len(audio_result.get('errors', []))} 个文件")
-                                                else:
-                                                    _err = getattr(supabase, 'get_last_storage_error', lambda: '')()
-                                                    logger.warning(f"[SYNC]   ⚠ Audio 文件夹上传失败" + (f": {_err}" if _err else ""))
-                                        else:
-                                            logger.info(f"[SYNC]   ℹ 无 Audio 文件夹，跳过")
-                                    else:
-                                        logger.warning(f"[SYNC] ⚠ 无法找到胶囊目录: {capsule_dir}")
-
-                                # 更新本地数据库的云同步状态（cloud_id 已在上传成功后立即设置）
-                                cursor.execute("""
-                                    UPDATE capsules
-                                    SET cloud_status = 'synced',
-                                        last_synced_at = CURRENT_TIMESTAMP
-                                    WHERE id = ?
-                                """, (record_id,))
-                                db.conn.commit()
-                                logger.info(f"[SYNC]   ✓ 已更新本地同步状态为 'synced'")
-                            else:
-                                failed += 1
-                                logger.error(f"[SYNC]   ✗ 上传失败: result is None")
-                        except Exception as e:
-                            failed += 1
-                            logger.error(f"[SYNC]   ✗ 异常: {e}")
-                            import traceback
-                            logger.error(traceback.format_exc())
-
-                    # 上传胶囊的标签和坐标（使用已有的 db 和 cursor）
-                    if cloud_id_mapping:
-                        logger.info(f"[SYNC] 📝 准备上传标签，cloud_id_mapping: {cloud_id_mapping}")
-                        for local_id, cloud_id in cloud_id_mapping.items():
-                            # 上传标签
-                            cursor.execute("SELECT * FROM capsule_tags WHERE capsule_id = ?", (local_id,))
-                            tags = []
-                            for row in cursor.fetchall():
-                                tags.append({
-                                    'lens': row[2],         # 使用统一的 lens 命名
-                                    'word_id': row[3],      # word_id
-                                    'word_cn': row[4],      # word_cn
-                                    'word_en': row[5],      # word_en
-                                    'x': row[6],            # x
-                                    'y': row[7],            # y
-                                })
-                            logger.info(f"[SYNC] 📝 本地胶囊 {local_id} 有 {len(tags)} 个标签")
-                            tag_embeddings = []
-                            try:
-                                cursor.execute(
-                                    "SELECT name, keywords, description FROM capsules WHERE id = ?",
-                                    (local_id,),
-                                )
-                                cap_row = cursor.fetchone()
-                                if cap_row:
-                                    from capsule_embedding_service import update_embedding_for_cloud_capsule
-                                    ok, tag_embeddings = update_embedding_for_cloud_capsule(
-                                        supabase,
-                                        cloud_id,
-                                        name=cap_row[0] or "",
-                                        keywords=(cap_row[1] or ""),
-                                        description=(cap_row[2] or ""),
-                                        tags=tags,
-                                    )
-                                    if ok:
-                                        logger.info(f"[SYNC]   ✓ 已更新胶囊主体 embedding (cloud_id={cloud_id})")
-                            except Exception as emb_ex:
-                                logger.warning(f"[SYNC] 更新胶囊 embedding 失败: {emb_ex}")
-
-                            if tags:
-                                logger.info(f"[SYNC] → 上传标签到云端 (capsule_id={cloud_id})...")
-                                supabase.upload_tags(user_id, cloud_id, tags, tag_embeddings=tag_embeddings or [])
-                            else:
-                                logger.warning(f"[SYNC] ⚠ 本地胶囊 {local_id} 没有标签")
-
-                            # 上传坐标
-                            cursor.execute("SELECT * FROM capsule_coordinates WHERE capsule_id = ?", (local_id,))
-                            coords = []
-                            for row in cursor.fetchall():
-                                coords.append({
-                                    'lens': row[2],
-                                    'dimension': row[3],
-                                    'value': row[4],
-                                })
-                            if coords:
-                                supabase.upload_coordinates(user_id, cloud_id, coords)
-                finally:
-                    # 确保关闭数据库连接
-                    db.close()
-
-            elif table_name == 'capsule_tags':
-                # 标签会随着胶囊一起上传
-                uploaded = len(records)
-            elif table_name == 'capsule_coordinates':
-                # 坐标会随着胶囊一起上传
-                uploaded = len(records)
-            else:
-                raise Exception(f"不支持的表名: {table_name}")
-
-            # 标记为已同步（只标记成功上传的记录）
-            sync_service = get_sync_service()
-            synced_count = 0
+        if table_name not in ('capsules', 'capsule_tags', 'capsule_coordinates'):
+            raise APIError(f"不支持的表名: {table_name}", 400)
 
-            for pending_record in records:
-                record_id = pending_record.get('record_id')
-                if record_id and record_id in cloud_id_mapping:
-                    # 只有成功上传到云端的记录才标记为已同步
-                    sync_service.mark_as_synced(table_name, record_id, 1)
-                    synced_count += 1
-                    logger.info(f"[SYNC] 标记为已同步: {table_name} ID {record_id}")
-
-            logger.info(f"[SYNC] 同步完成: 成功 {uploaded}, 失败 {failed}, 标记 {synced_count}")
+        # 获取用户 ID（优先使用 supabase_user_id，如果没有则使用本地 ID）
+        user_id = current_user.get('supabase_user_id') or str(current_user.get('id', ''))
 
-            return jsonify({
-                'success': True,
-                'data': {
-                    'uploaded': uploaded,
-                    'failed': failed
-                }
-            })
+        job, finished = _submit_sync_job('upload', user_id, {'table': table_name, 'records': records}, data)
+        if not finished:
+            return _job_accepted(job)
+        if job['status'] != 'completed':
+            raise APIError(f"云端上传失败: {job.get('error')}", 500)
 
-        except ImportError:
-            raise Exception("Supabase SDK 未安装")
-        except Exception as e:
-            raise Exception(f"云端上传失败: {str(e)}")
+        result = job['result']
+        return jsonify({
+            'success': True,
+            'data': {
+                'uploaded': result['uploaded'],
+                'failed': result['failed'],
+                'job_id': job['id']
+            }
+        })
 
     except APIError:
         raise
@@ -1042,28 +1170,27 @@ def sync_metadata_lightweight(current_user):
         if not user_id:
             raise APIError('用户 ID 不存在', 400)
 
-        # 获取同步服务实例
-        sync_service = get_sync_service()
-
-        # 执行轻量级同步
-        result = sync_service.sync_metadata_lightweight(
-            user_id=user_id,
-            include_previews=include_previews,
-            capsule_ids=capsule_ids  # 传递指定的胶囊 ID 列表
-        )
-
-        # 同时也同步棱镜配置 (Phase C)，胶囊客户端只下载棱镜，不上传
-        try:
-            sync_service.sync_prisms(user_id, upload=False)
-        except Exception as e:
-            logger.warning(f"棱镜同步失败 (非阻断): {e}")
-
+        job, finished = _submit_sync_job('lightweight', user_id, {
+            'include_previews': include_previews,
+            'capsule_ids': capsule_ids,  # 指定的胶囊 ID 列表
+            'force': force  # 忽略内容哈希，重新上传全部子资源
+        }, data)
+        if not finished:
+            return _job_accepted(job)
+        if job['status'] != 'completed':
+            raise APIError(f"轻量级同步失败: {job.get('error')}", 500)
+
+        result = job['result']
         if result['success']:
             logger.info(f"✅ 轻量级同步成功: {result['synced_count']} 个胶囊")
             return jsonify({
                 'success': True,
                 'data': {
+                    'job_id': job['id'],
                     'synced_count': result['synced_count'],
+                    'unchanged_count': result.get('unchanged_count', 0),
+                    'avoided_requests': result.get('avoided_requests', 0),
+                    'avoided_bytes': result.get('avoided_bytes', 0),
                     'preview_downloaded': result['preview_downloaded'],
                     'duration_seconds': result['duration_seconds'],
                     'errors': result['errors']
@@ -1075,6 +1202,7 @@ def sync_metadata_lightweight(current_user):
                 'success': False,
                 'error': '同步过程中出现错误',
                 'data': {
+                    'job_id': job['id'],
                     'synced_count': result['synced_count'],
                     'preview_downloaded': result['preview_downloaded'],
                     'duration_seconds': result['duration_seconds'],
@@ -1107,12 +1235,13 @@ def upload_audio_folders(current_user):
         if not user_id:
             raise APIError('用户 ID 不存在', 400)
 
-        sync_service = get_sync_service()
-        result = sync_service.upload_audio_folders(
-            user_id=user_id,
-            capsule_ids=capsule_ids
-        )
+        job, finished = _submit_sync_job('upload_audio', user_id, {'capsule_ids': capsule_ids}, data)
+        if not finished:
+            return _job_accepted(job)
+        if job['status'] != 'completed':
+            raise APIError(f"上传 Audio 文件夹失败: {job.get('error')}", 500)
 
+        result = {**job['result'], 'job_id': job['id']}
         if result['success']:
             return jsonify({'success': True, 'data': result})
         return jsonify({'success': False, 'error': '音频上传失败', 'data': result}), 207
@@ -1136,12 +1265,17 @@ def sync_tags_only(current_user):
     只同步有变化的数据，通过 updated_at 比对
     """
     try:
-        sync_service = get_sync_service()
         user_id = current_user.get('supabase_user_id') or str(current_user.get('id', ''))
         if not user_id:
             raise APIError('用户 ID 不存在', 400)
 
-        result = sync_service.sync_tags_only(user_id=user_id)
+        job, finished = _submit_sync_job('sync_tags', user_id, {}, request.get_json(silent=True) or {})
+        if not finished:
+            return _job_accepted(job)
+        if job['status'] != 'completed':
+            raise APIError(f"关键词同步失败: {job.get('error')}", 500)
+
+        result = {**job['result'], 'job_id': job['id']}
 
         if result['success']:
             logger.info(f"✅ 关键词同步成功: 上传 {result.get('uploaded', 0)}, 下载 {result.get('downloaded', 0)}")
@@ -1170,6 +1304,10 @@ def get_upload_progress():
 
         from sync_service import _get_upload_progress
         progress = _get_upload_progress(capsule_id)
+        if progress is None:
+            # 进程重启后内存中的进度丢失：从同步任务表读取
+            from sync_job_queue import get_sync_job_queue
+            progress = get_sync_job_queue().store.find_capsule_progress(capsule_id)
         return jsonify({
             'success': True,
             'data': progress
@@ -1189,7 +1327,8 @@ def download_only(current_user):
 
     请求体:
         {
-            "include_previews": true  // 是否自动下载预览音频
+            "include_previews": true,  // 是否自动下载预览音频
+            "full": false              // 忽略高水位线，全量下载
         }
 
     需要认证
@@ -1199,6 +1338,7 @@ def download_only(current_user):
             "success": true,
             "data": {
                 "downloaded_count": 10,
+                "deleted_count": 0,
                 "preview_downloaded": 5,
                 "duration_seconds": 2.5,
                 "errors": []
@@ -1208,6 +1348,7 @@ def download_only(current_user):
     try:
         data = request.get_json() or {}
         include_previews = data.get('include_previews', True)
+        full = bool(data.get('full', False))
 
         logger.info("\n" + "=" * 60)
         logger.info("🔄 仅下载模式（启动同步）")
@@ -1222,27 +1363,24 @@ def download_only(current_user):
         if not user_id:
             raise APIError('用户 ID 不存在', 400)
 
-        # 获取同步服务实例
-        sync_service = get_sync_service()
-
-        # 执行仅下载同步
-        result = sync_service.download_only(
-            user_id=user_id,
-            include_previews=include_previews
-        )
-
-        # 同时也同步棱镜配置 (Phase C)，胶囊客户端只下载棱镜，不上传
-        try:
-            sync_service.sync_prisms(user_id, upload=False)
-        except Exception as e:
-            logger.warning(f"棱镜同步失败 (非阻断): {e}")
+        job, finished = _submit_sync_job('download_only', user_id, {
+            'include_previews': include_previews,
+            'full': full
+        }, data)
+        if not finished:
+            return _job_accepted(job)
+        if job['status'] != 'completed':
+            raise APIError(f"仅下载失败: {job.get('error')}", 500)
 
+        result = job['result']
         if result['success']:
             logger.info(f"✅ 仅下载成功: {result['downloaded_count']} 个胶囊")
             return jsonify({
                 'success': True,
                 'data': {
+                    'job_id': job['id'],
                     'downloaded_count': result['downloaded_count'],
+                    'deleted_count': result.get('deleted_count', 0),
                     'preview_downloaded': result['preview_downloaded'],
                     'duration_seconds': result['duration_seconds'],
                     'errors': result['errors']
@@ -1254,7 +1392,9 @@ def download_only(current_user):
                 'success': False,
                 'error': '下载过程中出现错误',
                 'data': {
+                    'job_id': job['id'],
                     'downloaded_count': result['downloaded_count'],
+                    'deleted_count': result.get('deleted_count', 0),
                     'preview_downloaded': result['preview_downloaded'],
                     'duration_seconds': result['duration_seconds'],
                     'errors': result['errors']
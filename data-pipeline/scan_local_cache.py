@@ -8,24 +8,40 @@
 3. 填充 local_cache 表
 4. 更新 capsules 表的 local_wav_* 字段
 
+增量扫描：
+- 每个文件的 (size, mtime_ns, inode, sha256) 记录在 local_file_scan 表中，
+  重新运行时未变化的文件直接复用记录的哈希，只对新增或变化的文件计算哈希
+- 哈希在进程池中并行计算（大块读取），结果按批在一个事务中写入
+- 扫描过程中输出进度和吞吐量
+
 使用方法：
     python scan_local_cache.py
     python scan_local_cache.py --export-dir /path/to/exports
     python scan_local_cache.py --dry-run  # 仅扫描，不写入数据库
+    python scan_local_cache.py --full     # 忽略扫描记录，重新计算所有哈希
 """
 
 import os
 import sys
+import time
 import hashlib
 import argparse
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 # 添加父目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent))
 
 from capsule_db import CapsuleDatabase
 
+# 哈希读取块大小
+HASH_BUFFER_SIZE = 8 * 1024 * 1024
+
+# 进度输出间隔（秒）
+PROGRESS_INTERVAL = 2.0
+
 
 def calculate_sha256(file_path: str) -> Optional[str]:
     """
@@ -39,11 +55,16 @@ def calculate_sha256(file_path: str) -> Optional[str]:
     """
     try:
         sha256_hash = hashlib.sha256()
+        buffer = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
 
-        with open(file_path, 'rb') as f:
-            # 分块读取文件（适用于大文件）
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
+        with open(file_path, 'rb', buffering=0) as f:
+            # 大块读取到复用的缓冲区（适用于大文件）
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                sha256_hash.update(view[:size])
 
         return sha256_hash.hexdigest()
 
@@ -87,18 +108,131 @@ def find_wav_file(capsule_file_path: str, export_dir: str) -> Optional[str]:
     return str(wav_files[0].absolute())
 
 
+def _file_signature(file_path: str) -> Tuple[int, int, int]:
+    """文件签名 (size, mtime_ns, inode)：三者都未变化视为文件未变化"""
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _init_scan_table(conn: sqlite3.Connection):
+    """创建扫描记录表（如果不存在）"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS local_file_scan (
+            file_path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            file_hash TEXT NOT NULL,
+            scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def _load_scan_state(conn: sqlite3.Connection) -> Dict[str, Tuple[Tuple[int, int, int], str]]:
+    """一次载入全部扫描记录：{file_path: ((size, mtime_ns, inode), sha256)}"""
+    if not _table_exists(conn, 'local_file_scan'):
+        return {}
+    rows = conn.execute("SELECT file_path, file_size, mtime_ns, inode, file_hash FROM local_file_scan")
+    return {row[0]: ((row[1], row[2], row[3]), row[4]) for row in rows}
+
+
+def _load_wav_cache_entries(conn: sqlite3.Connection) -> Dict[int, Tuple[str, int, str]]:
+    """一次载入全部 WAV 缓存记录：{capsule_id: (file_path, file_size, file_hash)}"""
+    rows = conn.execute("""
+        SELECT capsule_id, file_path, file_size, file_hash
+        FROM local_cache
+        WHERE file_type = 'wav'
+    """)
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+def _write_batch(conn: sqlite3.Connection, records: List[Dict[str, Any]]):
+    """
+    在一个事务中写入一批扫描结果
+
+    Args:
+        conn: 数据库连接
+        records: [{capsule_id, file_path, file_size, file_hash, mtime_ns, inode}, ...]
+    """
+    try:
+        # 1. 更新 capsules 表
+        conn.executemany("""
+            UPDATE capsules
+            SET local_wav_path = :file_path,
+                local_wav_size = :file_size,
+                local_wav_hash = :file_hash
+            WHERE id = :capsule_id
+        """, records)
+
+        # 2. 插入 / 更新 local_cache 表（已有记录保留访问统计和固定状态）
+        conn.executemany("""
+            INSERT INTO local_cache
+            (capsule_id, file_type, file_path, file_size, file_hash,
+             last_accessed_at, access_count, is_pinned, cache_priority,
+             created_at, updated_at)
+            VALUES (:capsule_id, 'wav', :file_path, :file_size, :file_hash,
+                    CURRENT_TIMESTAMP, 1, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ON CONFLICT(capsule_id, file_type) DO UPDATE SET
+                file_path = excluded.file_path,
+                file_size = excluded.file_size,
+                file_hash = excluded.file_hash,
+                updated_at = CURRENT_TIMESTAMP
+        """, records)
+
+        # 3. 记录文件签名
+        conn.executemany("""
+            INSERT INTO local_file_scan (file_path, file_size, mtime_ns, inode, file_hash, scanned_at)
+            VALUES (:file_path, :file_size, :mtime_ns, :inode, :file_hash, CURRENT_TIMESTAMP)
+            ON CONFLICT(file_path) DO UPDATE SET
+                file_size = excluded.file_size,
+                mtime_ns = excluded.mtime_ns,
+                inode = excluded.inode,
+                file_hash = excluded.file_hash,
+                scanned_at = CURRENT_TIMESTAMP
+        """, records)
+
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
 def scan_local_cache(
     db_path: str,
     export_dir: str,
-    dry_run: bool = False
+    dry_run: bool = False,
+    workers: Optional[int] = None,
+    batch_size: int = 200,
+    full: bool = False,
+    progress_callback: Optional[Callable[[int, int, int, int], None]] = None
 ) -> Dict[str, Any]:
     """
-    扫描本地文件并填充缓存表
+    扫描本地文件并填充缓存表（增量）
 
     Args:
         db_path: 数据库文件路径
         export_dir: 导出目录路径
-        dry_run: 是否仅测试（不写入数据库）
+        dry_run: 是否仅测试（不写入数据库，也不计算哈希，只报告需要计算的文件）
+        workers: 计算哈希的进程数（默认 CPU 核数，最多 8）
+        batch_size: 每个写入事务包含的文件数
+        full: 忽略扫描记录，重新计算所有文件的哈希
+        progress_callback: 进度回调 (已完成文件, 需计算文件, 已读取字节, 需读取字节)
 
     Returns:
         扫描结果统计：
@@ -107,7 +241,12 @@ def scan_local_cache(
             'scanned_capsules': int,
             'found_wav_files': int,
             'failed_wav_files': int,
-            'cache_entries': int
+            'cache_entries': int,         # 创建或更新的缓存记录
+            'unchanged_files': int,       # 签名未变化、跳过哈希的文件
+            'hashed_files': int,
+            'bytes_hashed': int,
+            'duration_seconds': float,
+            'hash_throughput_mb_s': float
         }
     """
     print("=" * 60)
@@ -117,134 +256,183 @@ def scan_local_cache(
     print(f"导出目录: {export_dir}")
     if dry_run:
         print("⚠️  干运行模式：不会写入数据库")
+    if full:
+        print("⚠️  完整模式：忽略扫描记录，重新计算所有哈希")
     print()
 
-    # 初始化数据库
-    db = CapsuleDatabase(db_path)
-    db.connect()
-
-    # 获取所有 asset_status = 'local' 的胶囊
-    cursor = db.conn.cursor()
-    cursor.execute("""
-        SELECT id, name, file_path, asset_status
-        FROM capsules
-        WHERE asset_status = 'local'
-        ORDER BY created_at DESC
-    """)
-
-    capsules = cursor.fetchall()
-
-    if not capsules:
-        print("⚠️  没有找到本地胶囊（asset_status = 'local'）")
-        return {
-            'total_capsules': 0,
-            'scanned_capsules': 0,
-            'found_wav_files': 0,
-            'failed_wav_files': 0,
-            'cache_entries': 0
-        }
-
-    print(f"📦 找到 {len(capsules)} 个本地胶囊")
-    print()
+    started = time.perf_counter()
+    workers = workers or min(8, os.cpu_count() or 1)
 
     stats = {
-        'total_capsules': len(capsules),
+        'total_capsules': 0,
         'scanned_capsules': 0,
         'found_wav_files': 0,
         'failed_wav_files': 0,
-        'cache_entries': 0
+        'cache_entries': 0,
+        'unchanged_files': 0,
+        'hashed_files': 0,
+        'bytes_hashed': 0,
+        'duration_seconds': 0.0,
+        'hash_throughput_mb_s': 0.0
     }
 
-    # 遍历每个胶囊
-    for capsule in capsules:
-        capsule_id = capsule[0]
-        capsule_name = capsule[1]
-        capsule_file_path = capsule[2]
-
-        stats['scanned_capsules'] += 1
-
-        print(f"[{stats['scanned_capsules']}/{len(capsules)}] 扫描: {capsule_name}")
-
-        # 查找 WAV 文件
-        wav_path = find_wav_file(capsule_file_path, export_dir)
-
-        if not wav_path:
-            print(f"  ⚠️  未找到 WAV 文件")
-            stats['failed_wav_files'] += 1
-            continue
-
-        # 获取文件信息
-        try:
-            file_size = os.path.getsize(wav_path)
-        except Exception as e:
-            print(f"  ✗ 获取文件大小失败: {e}")
-            stats['failed_wav_files'] += 1
-            continue
-
-        # 计算 SHA256
-        print(f"  📄 文件: {Path(wav_path).name}")
-        print(f"  📦 大小: {file_size:,} bytes ({file_size / 1024 / 1024:.2f} MB)", end="")
-
-        file_hash = calculate_sha256(wav_path)
-
-        if not file_hash:
-            stats['failed_wav_files'] += 1
-            continue
-
-        print(f" ✓")
-
-        # 检查缓存表是否已有记录
-        cursor.execute("""
-            SELECT id FROM local_cache
-            WHERE capsule_id = ? AND file_type = 'wav'
-        """, (capsule_id,))
-
-        existing = cursor.fetchone()
+    # 初始化数据库
+    db = CapsuleDatabase(db_path)
+    db.connect()
 
-        if existing:
-            print(f"  ℹ️  缓存记录已存在，跳过")
-            continue
+    try:
+        conn = db.conn
+        if not dry_run:
+            _init_scan_table(conn)
+
+        # 获取所有 asset_status = 'local' 的胶囊
+        capsules = conn.execute("""
+            SELECT id, name, file_path, asset_status
+            FROM capsules
+            WHERE asset_status = 'local'
+            ORDER BY created_at DESC
+        """).fetchall()
+
+        if not capsules:
+            print("⚠️  没有找到本地胶囊（asset_status = 'local'）")
+            return stats
+
+        stats['total_capsules'] = len(capsules)
+        print(f"📦 找到 {len(capsules)} 个本地胶囊")
+
+        scan_state = {} if full else _load_scan_state(conn)
+        cache_entries = _load_wav_cache_entries(conn)
+
+        # 1. 查找文件并按签名分类（只 stat，不读取内容）
+        to_hash: List[Dict[str, Any]] = []     # 新增或变化的文件
+        to_write: List[Dict[str, Any]] = []    # 未变化但缓存记录缺失 / 过期（复用记录的哈希）
+
+        for capsule in capsules:
+            capsule_id = capsule[0]
+            capsule_name = capsule[1]
+            stats['scanned_capsules'] += 1
+
+            wav_path = find_wav_file(capsule[2], export_dir)
+            if not wav_path:
+                print(f"  ⚠️  未找到 WAV 文件: {capsule_name}")
+                stats['failed_wav_files'] += 1
+                continue
+
+            try:
+                signature = _file_signature(wav_path)
+            except OSError as e:
+                print(f"  ✗ 获取文件信息失败 ({capsule_name}): {e}")
+                stats['failed_wav_files'] += 1
+                continue
 
-        if dry_run:
-            print(f"  [DRY RUN] 将创建缓存记录")
-            stats['cache_entries'] += 1
-            stats['found_wav_files'] += 1
-            continue
-
-        # 写入数据库
-        try:
-            # 1. 更新 capsules 表
-            cursor.execute("""
-                UPDATE capsules
-                SET local_wav_path = ?,
-                    local_wav_size = ?,
-                    local_wav_hash = ?
-                WHERE id = ?
-            """, (wav_path, file_size, file_hash, capsule_id))
-
-            # 2. 插入 local_cache 表
-            cursor.execute("""
-                INSERT INTO local_cache
-                (capsule_id, file_type, file_path, file_size, file_hash,
-                 last_accessed_at, access_count, is_pinned, cache_priority,
-                 created_at, updated_at)
-                VALUES (?, 'wav', ?, ?, ?, CURRENT_TIMESTAMP, 1, 0, 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            """, (capsule_id, wav_path, file_size, file_hash))
-
-            db.conn.commit()
-
-            print(f"  ✅ 缓存记录已创建")
             stats['found_wav_files'] += 1
-            stats['cache_entries'] += 1
-
-        except Exception as e:
-            db.conn.rollback()
-            print(f"  ✗ 写入数据库失败: {e}")
-            stats['failed_wav_files'] += 1
-
+            record = {
+                'capsule_id': capsule_id,
+                'file_path': wav_path,
+                'file_size': signature[0],
+                'mtime_ns': signature[1],
+                'inode': signature[2],
+            }
+
+            known = scan_state.get(wav_path)
+            if known and known[0] == signature:
+                stats['unchanged_files'] += 1
+                record['file_hash'] = known[1]
+                if cache_entries.get(capsule_id) != (wav_path, signature[0], known[1]):
+                    to_write.append(record)
+                continue
+
+            to_hash.append(record)
+
+        bytes_to_hash = sum(r['file_size'] for r in to_hash)
+        print(f"📄 WAV 文件: {stats['found_wav_files']}（未变化 {stats['unchanged_files']}，"
+              f"需计算哈希 {len(to_hash)}，共 {_format_bytes(bytes_to_hash)}）")
         print()
 
-    db.close()
+        if dry_run:
+            stats['cache_entries'] = len(to_hash) + len(to_write)
+            print(f"  [DRY RUN] 将计算 {len(to_hash)} 个文件的哈希，创建 / 更新 {stats['cache_entries']} 条缓存记录")
+            return stats
+
+        # 2. 未变化的文件直接写入（不读取内容）
+        for i in range(0, len(to_write), batch_size):
+            batch = to_write[i:i + batch_size]
+            try:
+                _write_batch(conn, batch)
+                stats['cache_entries'] += len(batch)
+            except Exception as e:
+                print(f"  ✗ 写入数据库失败: {e}")
+                stats['failed_wav_files'] += len(batch)
+
+        # 3. 并行计算哈希，按批写入
+        pending: List[Dict[str, Any]] = []
+        hash_started = time.perf_counter()
+        last_report = hash_started
+
+        def flush():
+            if not pending:
+                return
+            try:
+                _write_batch(conn, pending)
+                stats['cache_entries'] += len(pending)
+            except Exception as e:
+                print(f"  ✗ 写入数据库失败: {e}")
+                stats['failed_wav_files'] += len(pending)
+            pending.clear()
+
+        def completed(record: Dict[str, Any], file_hash: Optional[str]):
+            nonlocal last_report
+            stats['hashed_files'] += 1
+            stats['bytes_hashed'] += record['file_size']
+
+            if not file_hash:
+                stats['failed_wav_files'] += 1
+            else:
+                # 计算期间文件被修改则不记录（下次扫描重新计算）
+                try:
+                    unchanged = _file_signature(record['file_path']) == (
+                        record['file_size'], record['mtime_ns'], record['inode'])
+                except OSError:
+                    unchanged = False
+                if unchanged:
+                    record['file_hash'] = file_hash
+                    pending.append(record)
+                    if len(pending) >= batch_size:
+                        flush()
+                else:
+                    print(f"  ⚠️  文件在扫描期间被修改，跳过: {record['file_path']}")
+                    stats['failed_wav_files'] += 1
+
+            if progress_callback:
+                progress_callback(stats['hashed_files'], len(to_hash), stats['bytes_hashed'], bytes_to_hash)
+
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL or stats['hashed_files'] == len(to_hash):
+                last_report = now
+                rate = stats['bytes_hashed'] / max(now - hash_started, 1e-6)
+                print(f"  ⏳ [{stats['hashed_files']}/{len(to_hash)}] "
+                      f"{_format_bytes(stats['bytes_hashed'])} / {_format_bytes(bytes_to_hash)}  "
+                      f"{rate / 1024 / 1024:.1f} MB/s")
+
+        if to_hash:
+            processes = min(workers, len(to_hash))
+            print(f"🔐 计算哈希（{processes} 个进程）...")
+            if processes > 1:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    futures = {executor.submit(calculate_sha256, r['file_path']): r for r in to_hash}
+                    for future in as_completed(futures):
+                        completed(futures[future], future.result())
+            else:
+                for record in to_hash:
+                    completed(record, calculate_sha256(record['file_path']))
+            flush()
+
+            hash_seconds = time.perf_counter() - hash_started
+            stats['hash_throughput_mb_s'] = round(stats['bytes_hashed'] / 1024 / 1024 / max(hash_seconds, 1e-6), 1)
+
+    finally:
+        db.close()
+        stats['duration_seconds'] = round(time.perf_counter() - started, 2)
 
     return stats
 
@@ -275,6 +463,26 @@ def main():
         help='干运行模式：仅扫描，不写入数据库'
     )
 
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='计算哈希的进程数（默认: CPU 核数，最多 8）'
+    )
+
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=200,
+        help='每个写入事务包含的文件数（默认: 200）'
+    )
+
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='完整模式：忽略扫描记录，重新计算所有哈希'
+    )
+
     args = parser.parse_args()
 
     # 默认路径
@@ -299,7 +507,10 @@ def main():
         stats = scan_local_cache(
             db_path=args.db_path,
             export_dir=args.export_dir,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            workers=args.workers,
+            batch_size=max(1, args.batch_size),
+            full=args.full
         )
 
         # 打印统计
@@ -310,8 +521,12 @@ def main():
         print(f"总胶囊数:       {stats['total_capsules']}")
         print(f"已扫描胶囊:     {stats['scanned_capsules']}")
         print(f"找到 WAV 文件:  {stats['found_wav_files']}")
+        print(f"未变化文件:     {stats['unchanged_files']}")
+        print(f"计算哈希:       {stats['hashed_files']} ({_format_bytes(stats['bytes_hashed'])}, "
+              f"{stats['hash_throughput_mb_s']} MB/s)")
         print(f"失败文件:       {stats['failed_wav_files']}")
-        print(f"创建缓存记录:   {stats['cache_entries']}")
+        print(f"创建/更新缓存记录: {stats['cache_entries']}")
+        print(f"耗时:           {stats['duration_seconds']}s")
         print()
 
         if args.dry_run:
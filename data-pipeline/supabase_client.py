@@ -310,6 +310,35 @@ class SupabaseClient:
             print(f"✗ 更新 keywords 失败: {e}")
             return None
 
+    @staticmethod
+    def build_cloud_capsule_record(user_id: str, capsule_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将本地胶囊数据转换为 cloud_capsules 记录
+
+        Args:
+            user_id: 用户 ID
+            capsule_data: 胶囊数据（capsules 行 + 技术元数据）
+
+        Returns:
+            云端记录字典
+        """
+        # 计算数据哈希
+        data_json = json.dumps(capsule_data, sort_keys=True)
+        data_hash = hashlib.sha256(data_json.encode()).hexdigest()
+
+        return {
+            'user_id': user_id,
+            'local_id': capsule_data.get('id'),
+            'name': capsule_data.get('name'),
+            'description': capsule_data.get('description'),
+            'capsule_type_id': capsule_data.get('capsule_type_id'),
+            'reaper_project_path': capsule_data.get('reaper_project_path'),
+            'version': capsule_data.get('version', 1),
+            'data_hash': data_hash,
+            'metadata': capsule_data,
+            'last_write_at': capsule_data.get('last_write_at', datetime.utcnow().isoformat()),
+        }
+
     def upload_capsule(self, user_id: str, capsule_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         上传胶囊到云端
@@ -322,23 +351,8 @@ class SupabaseClient:
             上传的记录，失败返回 None
         """
         try:
-            # 计算数据哈希
-            data_json = json.dumps(capsule_data, sort_keys=True)
-            data_hash = hashlib.sha256(data_json.encode()).hexdigest()
-
             # 准备云端记录
-            cloud_record = {
-                'user_id': user_id,
-                'local_id': capsule_data.get('id'),
-                'name': capsule_data.get('name'),
-                'description': capsule_data.get('description'),
-                'capsule_type_id': capsule_data.get('capsule_type_id'),
-                'reaper_project_path': capsule_data.get('reaper_project_path'),
-                'version': capsule_data.get('version', 1),
-                'data_hash': data_hash,
-                'metadata': capsule_data,
-                'last_write_at': capsule_data.get('last_write_at', datetime.utcnow().isoformat()),
-            }
+            cloud_record = self.build_cloud_capsule_record(user_id, capsule_data)
 
             # 检查是否已存在（使用多级匹配：local_id -> name）
             capsule_name = capsule_data.get('name')
@@ -374,6 +388,223 @@ class SupabaseClient:
             print(f"✗ 上传胶囊失败: {e}")
             return None
 
+    # ==========================================
+    # 批量写入
+    # ==========================================
+
+    # 批量 upsert 每个请求的行数
+    BULK_CHUNK_SIZE = 200
+
+    def bulk_upsert(self, table_name: str, records: List[Dict[str, Any]], on_conflict: str,
+                    chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        分块批量 upsert（每个请求 chunk_size 行）
+
+        PostgREST 要求同一请求中的记录字段一致，所以先按字段集合分组再分块。
+        某一块失败时逐行重试这一块，已写入的块不受影响，只有逐行仍失败的记录算作失败。
+
+        Args:
+            table_name: 表名
+            records: 记录列表
+            on_conflict: 冲突列（逗号分隔，如 'user_id,local_id'）
+            chunk_size: 每个请求的行数（默认 BULK_CHUNK_SIZE）
+
+        Returns:
+            {
+                'written': [写入后的记录],
+                'failed': [写入失败的原始记录],
+                'chunks': 请求的块数,
+                'failed_chunks': 整块失败（改为逐行重试）的块数
+            }
+        """
+        chunk_size = chunk_size or self.BULK_CHUNK_SIZE
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for record in records:
+            groups.setdefault(tuple(sorted(record.keys())), []).append(record)
+
+        result = {'written': [], 'failed': [], 'chunks': 0, 'failed_chunks': 0}
+        for group in groups.values():
+            for i in range(0, len(group), chunk_size):
+                chunk = group[i:i + chunk_size]
+                result['chunks'] += 1
+                try:
+                    response = self.client.table(table_name).upsert(chunk, on_conflict=on_conflict).execute()
+                    result['written'].extend(response.data or [])
+                    continue
+                except Exception as e:
+                    result['failed_chunks'] += 1
+                    print(f"✗ 批量写入 {table_name} 失败（{len(chunk)} 行，改为逐行重试）: {e}")
+
+                for record in chunk:
+                    try:
+                        response = self.client.table(table_name).upsert(record, on_conflict=on_conflict).execute()
+                        result['written'].extend(response.data or [])
+                    except Exception as e:
+                        result['failed'].append(record)
+                        print(f"✗ 写入 {table_name} 记录失败: {e}")
+
+        return result
+
+    def find_cloud_capsules(self, user_id: str, local_ids: List[int],
+                            names: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        批量查找用户已有的云端胶囊（local_id 或 name 匹配）
+
+        Args:
+            user_id: 用户 ID
+            local_ids: 本地胶囊 ID 列表
+            names: 胶囊名称列表
+
+        Returns:
+            [{'id', 'version', 'metadata', 'local_id', 'name'}, ...]；请求失败返回 None
+        """
+        try:
+            found = {}
+            for column, values in (('local_id', local_ids), ('name', names)):
+                values = [v for v in values if v is not None]
+                for i in range(0, len(values), 100):
+                    result = self.client.table('cloud_capsules').select(
+                        'id, version, metadata, local_id, name'
+                    ).eq('user_id', user_id).in_(column, values[i:i + 100]).execute()
+                    for row in result.data or []:
+                        found[row['id']] = row
+            return list(found.values())
+
+        except Exception as e:
+            print(f"✗ 批量查找云端胶囊失败: {e}")
+            return None
+
+    def bulk_replace_tags(self, user_id: str, tags_by_capsule: Dict[str, List[Dict[str, Any]]],
+                          embeddings_by_capsule: Optional[Dict[str, List[Optional[List[float]]]]] = None) -> List[str]:
+        """
+        批量替换多个胶囊的云端标签（与 upload_tags 语义一致：替换整个标签集合）
+
+        标签没有稳定的唯一键，所以先插入新标签、再按 id 删除旧标签：
+        1. 分块查询这些胶囊现有标签的 id
+        2. 按胶囊打包批量插入（一个胶囊的标签不会跨请求），某个请求失败时逐个胶囊重试
+        3. 只对插入成功的胶囊按 id 删除旧标签
+
+        插入失败的胶囊保留原有的云端标签，不会出现先删光、再插入失败的情况。
+
+        Args:
+            user_id: 用户 ID
+            tags_by_capsule: {云端胶囊 ID: [标签, ...]}
+            embeddings_by_capsule: {云端胶囊 ID: [标签 embedding, ...]}（可选）
+
+        Returns:
+            替换失败的云端胶囊 ID 列表（空列表表示全部成功）
+        """
+        if not tags_by_capsule:
+            return []
+
+        embeddings_by_capsule = embeddings_by_capsule or {}
+        records_by_capsule: Dict[str, List[Dict[str, Any]]] = {}
+        for capsule_cloud_id, tags in tags_by_capsule.items():
+            emb_list = embeddings_by_capsule.get(capsule_cloud_id) or []
+            records = []
+            for i, tag in enumerate(tags):
+                rec = {
+                    'user_id': user_id,
+                    'capsule_id': capsule_cloud_id,
+                    'lens_id': tag.get('lens') or tag.get('lens_id'),
+                    'word_id': tag.get('word_id'),
+                    'word_cn': tag.get('word_cn'),
+                    'word_en': tag.get('word_en'),
+                    'x': tag.get('x'),
+                    'y': tag.get('y'),
+                    'embedding': None,
+                }
+                if i < len(emb_list) and emb_list[i] and len(emb_list[i]) == 384:
+                    rec['embedding'] = "[" + ",".join(str(float(x)) for x in emb_list[i]) + "]"
+                records.append(rec)
+            records_by_capsule[capsule_cloud_id] = records
+
+        capsule_ids = list(tags_by_capsule.keys())
+
+        # 1. 现有标签 id（插入新标签之前读取）
+        existing = self.download_tags_for_capsules(capsule_ids)
+        if existing is None:
+            print(f"✗ 批量上传标签失败: 无法读取 {len(capsule_ids)} 个胶囊的现有标签")
+            return capsule_ids
+        old_ids_by_capsule: Dict[str, List[str]] = {}
+        for tag in existing:
+            old_ids_by_capsule.setdefault(tag['capsule_id'], []).append(tag['id'])
+
+        # 2. 按胶囊打包插入，一个请求失败时逐个胶囊重试
+        batches, batch, batch_rows = [], [], 0
+        for capsule_cloud_id in capsule_ids:
+            rows = len(records_by_capsule[capsule_cloud_id])
+            if batch and batch_rows + rows > self.BULK_CHUNK_SIZE:
+                batches.append(batch)
+                batch, batch_rows = [], 0
+            batch.append(capsule_cloud_id)
+            batch_rows += rows
+        if batch:
+            batches.append(batch)
+
+        def insert(ids: List[str]):
+            records = [rec for cid in ids for rec in records_by_capsule[cid]]
+            if records:
+                self.client.table('cloud_capsule_tags').insert(records).execute()
+
+        inserted, failed = [], []
+        for batch in batches:
+            try:
+                insert(batch)
+                inserted.extend(batch)
+                continue
+            except Exception as e:
+                print(f"✗ 批量插入标签失败（{len(batch)} 个胶囊，改为逐个重试）: {e}")
+            for capsule_cloud_id in batch:
+                try:
+                    insert([capsule_cloud_id])
+                    inserted.append(capsule_cloud_id)
+                except Exception as e:
+                    failed.append(capsule_cloud_id)
+                    print(f"✗ 上传胶囊 {capsule_cloud_id} 的标签失败: {e}")
+
+        # 3. 删除插入成功的胶囊的旧标签
+        for i in range(0, len(inserted), 100):
+            chunk = inserted[i:i + 100]
+            stale = [tag_id for cid in chunk for tag_id in old_ids_by_capsule.get(cid, [])]
+            try:
+                for j in range(0, len(stale), 100):
+                    self.client.table('cloud_capsule_tags').delete().in_('id', stale[j:j + 100]).execute()
+            except Exception as e:
+                # 新旧标签并存，标记失败以便下次同步重新替换（届时旧标签会一并删除）
+                failed.extend(chunk)
+                print(f"✗ 删除旧标签失败（{len(chunk)} 个胶囊）: {e}")
+
+        total = sum(len(records_by_capsule[cid]) for cid in inserted)
+        print(f"✓ 批量上传 {total} 个标签（{len(capsule_ids) - len(failed)}/{len(capsule_ids)} 个胶囊）")
+        return failed
+
+    def bulk_upsert_coordinates(self, user_id: str,
+                                coords_by_capsule: Dict[str, List[Dict[str, Any]]]) -> bool:
+        """
+        批量 upsert 多个胶囊的坐标（on_conflict = user_id, capsule_id, lens_id, dimension）
+
+        Args:
+            user_id: 用户 ID
+            coords_by_capsule: {云端胶囊 ID: [{'lens', 'dimension', 'value'}, ...]}
+
+        Returns:
+            写入失败的云端胶囊 ID 列表（空列表表示全部成功）
+        """
+        records = [{
+            'user_id': user_id,
+            'capsule_id': capsule_cloud_id,
+            'lens_id': coord.get('lens') or coord.get('lens_id'),
+            'dimension': coord.get('dimension'),
+            'value': coord.get('value'),
+        } for capsule_cloud_id, coords in coords_by_capsule.items() for coord in coords]
+
+        if not records:
+            return []
+        result = self.bulk_upsert('cloud_capsule_coordinates', records,
+                                  on_conflict='user_id,capsule_id,lens_id,dimension')
+        return sorted({record['capsule_id'] for record in result['failed']})
+
     def update_capsule_embedding(self, cloud_capsule_id: str, embedding: List[float]) -> bool:
         """
         更新云端胶囊的语义 embedding 向量（用于语义搜索）
@@ -434,40 +665,54 @@ class SupabaseClient:
         except Exception:
             return []
 
+    def create_signed_urls(self, storage_paths: List[str], expires_in: int = 3600) -> Dict[str, str]:
+        """
+        批量生成签名下载 URL（一次请求）
+
+        Args:
+            storage_paths: 存储路径列表
+            expires_in: 有效期（秒）
+
+        Returns:
+            {storage_path: 签名 URL}，失败的路径不在结果中
+        """
+        if not storage_paths:
+            return {}
+        items = self.client.storage.from_('capsule-files').create_signed_urls(storage_paths, expires_in)
+        urls = {}
+        for item in items or []:
+            url = item.get('signedURL') or item.get('signedUrl')
+            if not url or item.get('error'):
+                continue
+            if url.startswith('/'):
+                url = f"{self.url.rstrip('/')}/storage/v1{url}"
+            urls[item.get('path')] = url
+        return urls
+
     def upload_audio_files(self, user_id: str, capsule_folder_name: str, audio_files: List[Path], progress_callback=None) -> Dict[str, Any]:
-        """仅上传指定的音频文件列表"""
-        try:
-            bucket_name = 'capsule-files'
-            files_uploaded = 0
-            total_size = 0
-            errors = []
-            total_files = len(audio_files)
+        """
+        仅上传指定的音频文件列表（并发流式上传，大文件断点续传）
 
-            for audio_file in audio_files:
-                try:
-                    with open(audio_file, 'rb') as f:
-                        file_content = f.read()
-                    storage_path = f"{user_id}/{capsule_folder_name}/Audio/{audio_file.name}"
-                    self.client.storage.from_(bucket_name).upload(
-                        path=storage_path,
-                        file=file_content,
-                        file_options={"upsert": "true"}
-                    )
-                    file_size = len(file_content)
-                    total_size += file_size
-                    files_uploaded += 1
-                    if progress_callback:
-                        progress_callback(files_uploaded, total_files, audio_file.name)
-                except Exception as e:
-                    self._last_storage_error = str(e)
-                    errors.append(f"{audio_file.name}: {e}")
+        Args:
+            user_id: 用户 ID (Supabase UUID)
+            capsule_folder_name: 胶囊文件夹名
+            audio_files: 本地音频文件列表
+            progress_callback: (files_done, total_files, filename, bytes_sent, total_bytes)
 
-            return {
-                'success': len(errors) == 0,
-                'files_uploaded': files_uploaded,
-                'total_size': total_size,
-                'errors': errors
-            }
+        Returns:
+            上传结果统计
+        """
+        try:
+            from audio_uploader import get_audio_uploader
+
+            result = get_audio_uploader(self).upload_files(
+                f"{user_id}/{capsule_folder_name}/Audio",
+                audio_files,
+                progress_callback=progress_callback
+            )
+            if result['errors']:
+                self._last_storage_error = result['errors'][0]
+            return result
         except Exception as e:
             self._last_storage_error = str(e)
             print(f"✗ 上传音频文件失败: {e}")
@@ -504,6 +749,89 @@ class SupabaseClient:
             print(f"✗ 下载胶囊失败: {e}")
             return []
 
+    def download_capsules_page(
+        self,
+        user_id: str,
+        after_updated_at: Optional[str] = None,
+        after_id: Optional[str] = None,
+        page_size: int = 500
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        按 (updated_at, id) 游标分页下载云端胶囊（增量同步）
+
+        返回严格排在 (after_updated_at, after_id) 之后的记录，按 updated_at, id 升序。
+
+        Args:
+            user_id: 用户 ID
+            after_updated_at: 上一页最后一条的 updated_at（None 表示从头开始）
+            after_id: 上一页最后一条的 id
+            page_size: 每页数量
+
+        Returns:
+            胶囊列表；请求失败返回 None（与“没有更多数据”的空列表区分）
+        """
+        try:
+            # 与 download_capsules 一致：获取所有用户的胶囊 (Shared/Public Mode)
+            query = self.client.table('cloud_capsules').select('*').is_('deleted_at', None)
+
+            if after_updated_at:
+                # 时间戳含 + 和 :，在 PostgREST 过滤表达式中需要加双引号
+                ts = f'"{after_updated_at}"'
+                if after_id:
+                    query = query.or_(
+                        f'updated_at.gt.{ts},and(updated_at.eq.{ts},id.gt.{after_id})'
+                    )
+                else:
+                    query = query.gt('updated_at', after_updated_at)
+
+            result = query.order('updated_at').order('id').limit(page_size).execute()
+            return result.data or []
+
+        except Exception as e:
+            print(f"✗ 分页下载胶囊失败: {e}")
+            return None
+
+    def download_deleted_capsules_page(
+        self,
+        user_id: str,
+        after_deleted_at: Optional[str] = None,
+        after_id: Optional[str] = None,
+        page_size: int = 500
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        按 (deleted_at, id) 游标分页查询云端已软删除的胶囊（墓碑），用于增量同步检测删除
+
+        返回严格排在 (after_deleted_at, after_id) 之后的记录，按 deleted_at, id 升序
+        （同一时间戳删除的多条记录不会因为 gt 过滤而丢失）。
+
+        Args:
+            user_id: 用户 ID
+            after_deleted_at: 上一页最后一条的 deleted_at（None 表示从头开始）
+            after_id: 上一页最后一条的 id
+            page_size: 每页数量（需小于 PostgREST 的单次返回上限）
+
+        Returns:
+            [{'id', 'name', 'deleted_at'}, ...]；请求失败返回 None
+        """
+        try:
+            query = self.client.table('cloud_capsules').select('id, name, deleted_at')
+            query = query.not_.is_('deleted_at', None)
+            if after_deleted_at:
+                ts = f'"{after_deleted_at}"'
+                if after_id:
+                    query = query.or_(
+                        f'deleted_at.gt.{ts},and(deleted_at.eq.{ts},id.gt.{after_id})'
+                    )
+                else:
+                    query = query.gt('deleted_at', after_deleted_at)
+
+            result = query.order('deleted_at').order('id').limit(page_size).execute()
+            return result.data or []
+
+        except Exception as e:
+            print(f"✗ 查询已删除胶囊失败: {e}")
+            return None
+
     def delete_capsule(self, user_id: str, local_id: int) -> bool:
         """
         软删除胶囊（标记为已删除）
@@ -625,6 +953,124 @@ class SupabaseClient:
             print(f"✗ 下载标签失败: {e}")
             return []
 
+    def download_tags_page(
+        self,
+        after_updated_at: Optional[str] = None,
+        after_id: Optional[str] = None,
+        page_size: int = 1000
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        按 (updated_at, id) 游标分页下载云端标签（批量标签同步）
+
+        只用来找出标签有变化的胶囊：一页里某个胶囊的标签不一定是它的完整标签集合，
+        被删除的标签也不会出现在这里（见 download_tag_deletions_page）。
+
+        Args:
+            after_updated_at: 上一页最后一条的 updated_at（None 表示从头开始）
+            after_id: 上一页最后一条的 id
+            page_size: 每页数量
+
+        Returns:
+            标签列表；请求失败返回 None
+        """
+        try:
+            query = self.client.table('cloud_capsule_tags').select(
+                'id, capsule_id, lens_id, word_id, word_cn, word_en, x, y, updated_at'
+            )
+
+            if after_updated_at:
+                ts = f'"{after_updated_at}"'
+                if after_id:
+                    query = query.or_(
+                        f'updated_at.gt.{ts},and(updated_at.eq.{ts},id.gt.{after_id})'
+                    )
+                else:
+                    query = query.gt('updated_at', after_updated_at)
+
+            result = query.order('updated_at').order('id').limit(page_size).execute()
+            return result.data or []
+
+        except Exception as e:
+            print(f"✗ 分页下载标签失败: {e}")
+            return None
+
+    def download_tag_deletions_page(
+        self,
+        after_deleted_at: Optional[str] = None,
+        after_capsule_id: Optional[str] = None,
+        page_size: int = 1000
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        按 (deleted_at, capsule_id) 游标分页下载标签删除墓碑
+
+        云端每删除一个胶囊的标签，cloud_capsule_tag_deletions 中该胶囊的 deleted_at
+        就会更新（见 supabase_migrations/011），调用方据此重新下载这些胶囊的完整标签集合。
+
+        Args:
+            after_deleted_at: 上一页最后一条的 deleted_at（None 表示从头开始）
+            after_capsule_id: 上一页最后一条的 capsule_id
+            page_size: 每页数量
+
+        Returns:
+            [{'capsule_id', 'deleted_at'}, ...]；请求失败返回 None
+        """
+        try:
+            query = self.client.table('cloud_capsule_tag_deletions').select('capsule_id, deleted_at')
+
+            if after_deleted_at:
+                ts = f'"{after_deleted_at}"'
+                if after_capsule_id:
+                    query = query.or_(
+                        f'deleted_at.gt.{ts},and(deleted_at.eq.{ts},capsule_id.gt.{after_capsule_id})'
+                    )
+                else:
+                    query = query.gt('deleted_at', after_deleted_at)
+
+            result = query.order('deleted_at').order('capsule_id').limit(page_size).execute()
+            return result.data or []
+
+        except Exception as e:
+            print(f"✗ 分页下载标签删除记录失败: {e}")
+            return None
+
+    def download_tags_for_capsules(self, capsule_cloud_ids: List[str],
+                                   chunk_size: int = 100,
+                                   page_size: int = 1000) -> Optional[List[Dict[str, Any]]]:
+        """
+        批量下载多个胶囊的完整标签集合（按 capsule_id IN (...) 分块查询）
+
+        每块再按 id 游标分页，不会被 PostgREST 的单次返回行数上限截断。
+
+        Args:
+            capsule_cloud_ids: 胶囊云端 ID 列表
+            chunk_size: 每次查询的胶囊数量（受 URL 长度限制）
+            page_size: 每页行数
+
+        Returns:
+            标签列表；请求失败返回 None
+        """
+        try:
+            tags = []
+            for i in range(0, len(capsule_cloud_ids), chunk_size):
+                chunk = capsule_cloud_ids[i:i + chunk_size]
+                last_id = None
+                while True:
+                    query = self.client.table('cloud_capsule_tags').select(
+                        'id, capsule_id, lens_id, word_id, word_cn, word_en, x, y, updated_at'
+                    ).in_('capsule_id', chunk)
+                    if last_id:
+                        query = query.gt('id', last_id)
+                    page = query.order('id').limit(page_size).execute().data or []
+                    tags.extend(page)
+                    if len(page) < page_size:
+                        break
+                    last_id = page[-1]['id']
+            return tags
+
+        except Exception as e:
+            print(f"✗ 批量下载胶囊标签失败: {e}")
+            return None
+
     def download_capsule_tags(self, capsule_cloud_id: str) -> List[Dict[str, Any]]:
         """
         下载指定胶囊的标签
@@ -865,62 +1311,27 @@ class SupabaseClient:
             上传结果统计
         """
         try:
-            from pathlib import Path
-            import os
-
             audio_folder = Path(audio_folder_path)
             if not audio_folder.exists() or not audio_folder.is_dir():
                 print(f"✗ Audio 文件夹不存在: {audio_folder_path}")
                 return {'success': False, 'files_uploaded': 0}
 
-            bucket_name = 'capsule-files'
-            files_uploaded = 0
-            total_size = 0
-            errors = []
-
             audio_files = [
                 audio_file for audio_file in audio_folder.iterdir()
                 if audio_file.is_file()
                 and audio_file.suffix.lower() in ['.wav', '.mp3', '.ogg', '.flac', '.aiff']
             ]
-            total_files = len(audio_files)
-
-            # 遍历 Audio 文件夹中的所有音频文件
-            for audio_file in audio_files:
-
-                try:
-                    # 读取文件
-                    with open(audio_file, 'rb') as f:
-                        file_content = f.read()
-
-                    # 云端路径: {user_id}/{capsule_folder_name}/Audio/{filename}
-                    storage_path = f"{user_id}/{capsule_folder_name}/Audio/{audio_file.name}"
-
-                    # 先删除已存在的文件（避免 400 错误）
-                    try:
-                        self.client.storage.from_(bucket_name).remove(storage_path)
-                    except:
-                        pass  # 文件不存在，继续上传
 
-                    # 上传
-                    self.client.storage.from_(bucket_name).upload(
-                        path=storage_path,
-                        file=file_content
-                    )
-
-                    file_size = len(file_content)
-                    total_size += file_size
-                    files_uploaded += 1
-
-                    if progress_callback:
-                        progress_callback(files_uploaded, total_files, audio_file.name)
-
-                    print(f"  ✓ {audio_file.name} ({file_size:,} bytes)")
-
-                except Exception as e:
-                    error_msg = f"{audio_file.name}: {str(e)}"
-                    errors.append(error_msg)
-                    print(f"  ✗ {error_msg}")
+            # 并发流式上传（upsert 覆盖已存在的文件），大文件断点续传
+            from audio_uploader import get_audio_uploader
+            result = get_audio_uploader(self).upload_files(
+                f"{user_id}/{capsule_folder_name}/Audio",
+                audio_files,
+                progress_callback=progress_callback
+            )
+            files_uploaded = result['files_uploaded']
+            total_size = result['total_size']
+            errors = result['errors']
 
             print(f"\n✓ Audio 文件夹上传完成:")
             print(f"  成功: {files_uploaded} 个文件")
@@ -944,8 +1355,38 @@ class SupabaseClient:
             traceback.print_exc()
             return {'success': False, 'files_uploaded': 0}
 
+    @staticmethod
+    def storage_path_variants(user_id: str, capsule_folder_name: str, file_type: str) -> List[str]:
+        """
+        获取轻量文件在 Storage 中可能的路径（按优先级排序）
+
+        Args:
+            user_id: 用户 ID (Supabase UUID)
+            capsule_folder_name: 胶囊文件夹名
+            file_type: 文件类型 ('preview', 'rpp', 'metadata', 'capsule')
+
+        Returns:
+            存储路径列表，不支持的类型返回空列表
+        """
+        prefix = f"{user_id}/{capsule_folder_name}"
+        if file_type == 'preview':
+            paths = []
+            for ext in ['.ogg', '.mp3', '.wav']:
+                # 新格式：使用胶囊文件夹名；旧格式：固定 preview 文件名（向后兼容）
+                paths.append(f"{prefix}/{capsule_folder_name}{ext}")
+                paths.append(f"{prefix}/preview{ext}")
+            return paths
+        if file_type == 'rpp':
+            return [f"{prefix}/{capsule_folder_name}.rpp", f"{prefix}/project.rpp"]
+        if file_type == 'metadata':
+            return [f"{prefix}/metadata.json"]
+        if file_type == 'capsule':
+            return [f"{prefix}/capsule.capsule"]
+        return []
+
     def download_file(self, user_id: str, capsule_folder_name: str, file_type: str,
-                     local_path: str) -> bool:
+                     local_path: str, cancel_event=None, progress_callback=None,
+                     bytes_callback=None) -> bool:
         """
         从 Supabase Storage 下载文件
 
@@ -954,6 +1395,9 @@ class SupabaseClient:
             capsule_folder_name: 胶囊文件夹名（如：magic_ianzhao_20260111_213145）
             file_type: 文件类型 ('preview', 'rpp', 'capsule', 或 'audio_folder')
             local_path: 本地保存路径
+            cancel_event: 取消令牌（仅 audio_folder）
+            progress_callback: (files_done, total_files, filename)（仅 audio_folder）
+            bytes_callback: (downloaded_bytes, total_bytes)（仅 audio_folder）
 
         Returns:
             是否成功
@@ -963,18 +1407,16 @@ class SupabaseClient:
 
             # 下载整个 Audio 文件夹
             if file_type == 'audio_folder':
-                return self._download_audio_folder(user_id, capsule_folder_name, local_path)
+                return self._download_audio_folder(user_id, capsule_folder_name, local_path,
+                                                   cancel_event=cancel_event,
+                                                   progress_callback=progress_callback,
+                                                   bytes_callback=bytes_callback)
 
             # 确定存储路径
             if file_type == 'preview':
                 # 优先尝试动态文件名（新格式），然后回退到 preview.ogg（旧格式）
-                possible_paths = []
-                for ext in ['.ogg', '.mp3', '.wav']:
-                    # 新格式：使用胶囊文件夹名
-                    possible_paths.append(f"{user_id}/{capsule_folder_name}/{capsule_folder_name}{ext}")
-                    # 旧格式：固定 preview 文件名（向后兼容）
-                    possible_paths.append(f"{user_id}/{capsule_folder_name}/preview{ext}")
-                
+                possible_paths = self.storage_path_variants(user_id, capsule_folder_name, file_type)
+
                 for storage_path in possible_paths:
                     try:
                         result = self.client.storage.from_('capsule-files').download(storage_path)
@@ -987,16 +1429,16 @@ class SupabaseClient:
                     return False
             elif file_type == 'rpp':
                 # 使用胶囊文件夹名作为 RPP 文件名（而非硬编码的 project.rpp）
-                storage_path = f"{user_id}/{capsule_folder_name}/{capsule_folder_name}.rpp"
+                storage_path, legacy_path = self.storage_path_variants(user_id, capsule_folder_name, file_type)
                 try:
                     result = self.client.storage.from_('capsule-files').download(storage_path)
                 except Exception as e:
                     # 兼容旧数据：如果新路径不存在，尝试旧的 project.rpp
                     print(f"⚠️ 尝试新路径失败，尝试旧路径 project.rpp: {e}")
-                    storage_path = f"{user_id}/{capsule_folder_name}/project.rpp"
+                    storage_path = legacy_path
                     result = self.client.storage.from_('capsule-files').download(storage_path)
             elif file_type == 'metadata':
-                storage_path = f"{user_id}/{capsule_folder_name}/metadata.json"
+                storage_path = self.storage_path_variants(user_id, capsule_folder_name, file_type)[0]
                 try:
                     result = self.client.storage.from_('capsule-files').download(storage_path)
                 except Exception as e:
@@ -1014,9 +1456,11 @@ class SupabaseClient:
             local_file = Path(local_path)
             local_file.parent.mkdir(parents=True, exist_ok=True)
 
-            # 保存文件
-            with open(local_path, 'wb') as f:
+            # 保存文件（先写临时文件再原子替换，中断不会留下半截文件）
+            part_path = f"{local_path}.part"
+            with open(part_path, 'wb') as f:
                 f.write(result)
+            os.replace(part_path, local_path)
 
             print(f"✓ 下载文件成功: {storage_path} -> {local_path}")
             return True
@@ -1027,7 +1471,8 @@ class SupabaseClient:
             traceback.print_exc()
             return False
 
-    def _download_audio_folder(self, user_id: str, capsule_folder_name: str, local_capsule_dir: str) -> bool:
+    def _download_audio_folder(self, user_id: str, capsule_folder_name: str, local_capsule_dir: str,
+                               cancel_event=None, progress_callback=None, bytes_callback=None) -> bool:
         """
         从云端下载 Audio 文件夹到本地
 
@@ -1035,6 +1480,9 @@ class SupabaseClient:
             user_id: 用户 ID (Supabase UUID)
             capsule_folder_name: 胶囊文件夹名（如：magic_ianzhao_20260111_213145）
             local_capsule_dir: 本地胶囊目录（会自动创建 Audio 子目录）
+            cancel_event: 取消令牌（threading.Event，可选）
+            progress_callback: (files_done, total_files, filename)（可选）
+            bytes_callback: (downloaded_bytes, total_bytes)（可选）
 
         Returns:
             是否成功
@@ -1060,45 +1508,30 @@ class SupabaseClient:
                 print(f"✗云端 Audio 文件夹为空")
                 return False
 
-            files_downloaded = 0
-            total_size = 0
-            errors = []
-
-            # 下载每个音频文件
-            for file_info in files:
-                try:
-                    filename = file_info['name']
-                    storage_path = f"{cloud_folder}{filename}"
-                    local_path = local_audio_dir / filename
-
-                    # 下载文件
-                    file_content = self.client.storage.from_(bucket_name).download(storage_path)
-
-                    # 保存到本地
-                    with open(local_path, 'wb') as f:
-                        f.write(file_content)
-
-                    file_size = len(file_content)
-                    total_size += file_size
-                    files_downloaded += 1
-
-                    print(f"  ✓ {filename} ({file_size:,} bytes)")
-
-                except Exception as e:
-                    error_msg = f"{filename}: {str(e)}"
-                    errors.append(error_msg)
-                    print(f"  ✗ {error_msg}")
+            # 并发流式下载：签名 URL + 断点续传，写临时文件后原子重命名
+            from audio_downloader import get_audio_downloader
+            result = get_audio_downloader(self).download_folder(cloud_folder, local_audio_dir, files,
+                                                                progress_callback=progress_callback,
+                                                                cancel_event=cancel_event,
+                                                                bytes_callback=bytes_callback)
+            if result['cancelled']:
+                print(f"⚠️ Audio 文件夹下载已取消（已完成 {result['files_downloaded']} 个文件）")
+                return False
+            files_downloaded = result['files_downloaded']
+            total_size = result['total_size']
+            errors = result['errors']
 
             print(f"\n✓ Audio 文件夹下载完成:")
             print(f"  成功: {files_downloaded} 个文件")
             print(f"  总大小: {total_size:,} bytes ({total_size / 1024 / 1024:.2f} MB)")
+            print(f"  已存在跳过: {result['files_skipped']} 个文件")
             print(f"  本地路径: {local_audio_dir}")
             if errors:
                 print(f"  失败: {len(errors)} 个文件")
                 for error in errors:
                     print(f"    - {error}")
 
-            return files_downloaded > 0
+            return files_downloaded + result['files_skipped'] > 0
 
         except Exception as e:
             print(f"✗ 下载 Audio 文件夹失败: {e}")
@@ -0,0 +1,350 @@
+"""
+批量同步写入器：胶囊 / 标签 / 坐标的批量上传
+
+替代逐个胶囊调用 upload_capsule / upload_tags / upload_coordinates：
+1. 分块 IN 查询一次载入所有待上传胶囊的行、技术元数据、标签和坐标
+2. 一次（分块）查询找出已存在的云端胶囊（local_id 优先，其次 name）
+3. 分块 upsert cloud_capsules，主体 embedding 直接写在记录里，不再单独请求
+4. 在一个本地事务中回写 cloud_id / cloud_version
+5. 标签分块先删后插，坐标分块 upsert
+"""
+
+import logging
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+# SQLite 单条语句的参数上限（保守值）
+_SQLITE_MAX_PARAMS = 900
+
+# 技术元数据字段（capsule_metadata -> 胶囊记录的 metadata）
+_TECH_METADATA_FIELDS = (
+    'bpm', 'duration', 'sample_rate', 'plugin_count', 'plugin_list',
+    'has_sends', 'has_folder_bus', 'tracks_included',
+)
+
+
+def _chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _embedding_str(embedding: Optional[List[float]]) -> Optional[str]:
+    """pgvector 列需要传字符串格式 "[0.1, -0.2, ...]" """
+    if not embedding:
+        return None
+    return "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+
+class BatchSyncWriter:
+    """批量上传胶囊元数据、标签和坐标"""
+
+    def __init__(self, supabase, user_id: str, db_path: str):
+        """
+        Args:
+            supabase: SupabaseClient 实例
+            user_id: Supabase 用户 ID
+            db_path: 本地数据库路径
+        """
+        self.supabase = supabase
+        self.user_id = user_id
+        self.db_path = db_path
+        self._tags: Dict[int, List[Dict[str, Any]]] = {}
+        self._coords: Dict[int, List[Dict[str, Any]]] = {}
+        self._tag_embeddings: Dict[int, List[Optional[List[float]]]] = {}
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def load_capsules(self, record_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        批量载入胶囊数据（capsules 行 + 技术元数据），同时缓存标签和坐标
+
+        Args:
+            record_ids: 本地胶囊 ID 列表
+
+        Returns:
+            胶囊字典列表（按 record_ids 顺序，不存在的 ID 被跳过）
+        """
+        ids = [rid for rid in dict.fromkeys(record_ids) if rid is not None]
+        if not ids:
+            return []
+
+        capsules: Dict[int, Dict[str, Any]] = {}
+        conn = self._get_connection()
+        try:
+            lens_columns = [
+                row['name'] for row in conn.execute("PRAGMA table_info(capsule_coordinates)")
+                if row['name'].endswith(('_x', '_y'))
+            ]
+
+            for chunk in _chunked(ids, _SQLITE_MAX_PARAMS):
+                placeholders = ",".join(["?"] * len(chunk))
+
+                for row in conn.execute(f"SELECT * FROM capsules WHERE id IN ({placeholders})", chunk):
+                    capsules[row['id']] = dict(row)
+
+                for row in conn.execute(f"""
+                    SELECT capsule_id, {', '.join(_TECH_METADATA_FIELDS)}
+                    FROM capsule_metadata WHERE capsule_id IN ({placeholders})
+                """, chunk):
+                    if row['capsule_id'] in capsules:
+                        capsules[row['capsule_id']].update({k: row[k] for k in _TECH_METADATA_FIELDS})
+
+                for row in conn.execute(f"""
+                    SELECT capsule_id, lens, word_id, word_cn, word_en, x, y
+                    FROM capsule_tags WHERE capsule_id IN ({placeholders})
+                    ORDER BY id
+                """, chunk):
+                    self._tags.setdefault(row['capsule_id'], []).append({
+                        'lens': row['lens'],  # 使用统一的 lens 命名
+                        'word_id': row['word_id'],
+                        'word_cn': row['word_cn'],
+                        'word_en': row['word_en'],
+                        'x': row['x'],
+                        'y': row['y'],
+                    })
+
+                if lens_columns:
+                    for row in conn.execute(f"""
+                        SELECT capsule_id, {', '.join(lens_columns)}
+                        FROM capsule_coordinates WHERE capsule_id IN ({placeholders})
+                    """, chunk):
+                        # 宽表 texture_x / texture_y ... -> 云端 (lens_id, dimension, value)
+                        self._coords[row['capsule_id']] = [{
+                            'lens': column[:-2],
+                            'dimension': column[-1],
+                            'value': row[column],
+                        } for column in lens_columns if row[column] is not None]
+        finally:
+            conn.close()
+
+        return [capsules[rid] for rid in ids if rid in capsules]
+
+    def get_tags(self, capsule_id: int) -> List[Dict[str, Any]]:
+        """已载入的胶囊标签"""
+        return self._tags.get(capsule_id, [])
+
+    def _compute_embeddings(self, capsule: Dict[str, Any]) -> Optional[str]:
+        """计算主体 + 标签 embedding；标签 embedding 缓存到上传标签时使用"""
+        try:
+            from capsule_embedding_service import compute_tag_level_embeddings
+            body_emb, tag_embs = compute_tag_level_embeddings(
+                name=capsule.get('name') or "",
+                description=capsule.get('description') or "",
+                keywords=capsule.get('keywords') or "",
+                tags=self.get_tags(capsule['id']),
+            )
+        except Exception as e:
+            logger.warning(f"计算胶囊 embedding 失败 ({capsule.get('id')}): {e}")
+            return None
+
+        self._tag_embeddings[capsule['id']] = tag_embs or []
+        return _embedding_str(body_emb)
+
+    def upload_capsules(self, capsules: List[Dict[str, Any]],
+                        keywords_only: bool = False) -> Dict[int, Dict[str, Any]]:
+        """
+        分块 upsert 胶囊，并在一个本地事务中回写 cloud_id / cloud_version
+
+        Args:
+            capsules: load_capsules 返回的胶囊列表
+            keywords_only: 已存在的云端胶囊只更新 metadata.keywords（保留云端其余元数据）
+
+        Returns:
+            {本地 ID: {'id': 云端 ID, 'version': int}}（失败的胶囊不在结果中）
+        """
+        if not capsules:
+            return {}
+
+        existing_rows = self.supabase.find_cloud_capsules(
+            self.user_id,
+            [c['id'] for c in capsules],
+            list({c.get('name') for c in capsules if c.get('name')})
+        )
+        if existing_rows is None:
+            return {}
+
+        by_local_id = {row.get('local_id'): row for row in existing_rows}
+        by_name = {}
+        for row in existing_rows:
+            by_name.setdefault(row.get('name'), row)
+
+        now = datetime.utcnow().isoformat()
+        updates, inserts = [], []
+        claimed = set()
+
+        for capsule in capsules:
+            existing = by_local_id.get(capsule['id'])
+            if existing is None:
+                # 如果 local_id 匹配失败，尝试使用 name 匹配（切换文件夹后 local_id 会变化）
+                existing = by_name.get(capsule.get('name'))
+                if existing is not None and existing['id'] in claimed:
+                    existing = None
+
+            embedding = self._compute_embeddings(capsule)
+
+            if existing is None:
+                record = self.supabase.build_cloud_capsule_record(self.user_id, capsule)
+                if embedding:
+                    record['embedding'] = embedding
+                inserts.append(record)
+                continue
+
+            claimed.add(existing['id'])
+            if keywords_only:
+                metadata = existing.get('metadata') or {}
+                if not isinstance(metadata, dict):
+                    metadata = {}
+                keywords_changed = metadata.get('keywords') != capsule.get('keywords')
+                metadata['keywords'] = capsule.get('keywords')
+                record = {
+                    'id': existing['id'],
+                    'user_id': self.user_id,
+                    'local_id': capsule['id'],
+                    'name': existing.get('name') or capsule.get('name'),
+                    'metadata': metadata,
+                    'version': (existing.get('version') or 0) + (1 if keywords_changed else 0),
+                    'last_write_at': now,
+                }
+            else:
+                record = self.supabase.build_cloud_capsule_record(self.user_id, capsule)
+                record['id'] = existing['id']
+                record['version'] = (existing.get('version') or 0) + 1
+            if embedding:
+                record['embedding'] = embedding
+            updates.append(record)
+
+        # 失败的块会逐行重试，个别写不进去的胶囊不在 written 中（下次同步重试）
+        written = []
+        if updates:
+            written.extend(self.supabase.bulk_upsert('cloud_capsules', updates, on_conflict='id')['written'])
+        if inserts:
+            written.extend(
+                self.supabase.bulk_upsert('cloud_capsules', inserts, on_conflict='user_id,local_id')['written']
+            )
+
+        wanted = {c['id'] for c in capsules}
+        results = {
+            row['local_id']: {'id': row['id'], 'version': row.get('version', 1)}
+            for row in written if row.get('local_id') in wanted
+        }
+
+        # 🔧 一个事务内回写 cloud_id（防止后续文件上传失败导致数据不一致）
+        if results:
+            conn = self._get_connection()
+            try:
+                conn.executemany("""
+                    UPDATE capsules
+                    SET cloud_id = ?,
+                        cloud_version = ?
+                    WHERE id = ?
+                """, [(r['id'], r['version'], local_id) for local_id, r in results.items()])
+                conn.commit()
+            finally:
+                conn.close()
+
+        logger.info(f"[SYNC] 批量上传胶囊: 更新 {len(updates)}, 新增 {len(inserts)}, 成功 {len(results)}")
+        return results
+
+    def upload_tags_and_coordinates(self, cloud_ids: Dict[int, str]) -> Dict[str, Any]:
+        """
+        批量上传已载入胶囊的标签和坐标
+
+        Args:
+            cloud_ids: {本地 ID: 云端 ID}
+
+        Returns:
+            {
+                'tags': 是否成功,
+                'coordinates': 是否成功,
+                'failed_ids': [本地 ID]  # 标签或坐标写入失败的胶囊
+            }
+        """
+        tags_by_capsule = {}
+        embeddings_by_capsule = {}
+        coords_by_capsule = {}
+        tag_ids = []
+        coord_ids = []
+        for local_id, cloud_id in cloud_ids.items():
+            tags = self.get_tags(local_id)
+            if tags:
+                tags_by_capsule[cloud_id] = tags
+                embeddings_by_capsule[cloud_id] = self._tag_embeddings.get(local_id) or []
+                tag_ids.append(local_id)
+            else:
+                logger.warning(f"[SYNC] ⚠ 本地胶囊 {local_id} 没有标签")
+            if self._coords.get(local_id):
+                coords_by_capsule[cloud_id] = self._coords[local_id]
+                coord_ids.append(local_id)
+
+        failed_tags = set(self.supabase.bulk_replace_tags(self.user_id, tags_by_capsule, embeddings_by_capsule))
+        failed_coords = set(self.supabase.bulk_upsert_coordinates(self.user_id, coords_by_capsule))
+
+        failed_ids = {local_id for local_id in tag_ids if cloud_ids[local_id] in failed_tags}
+        failed_ids.update(local_id for local_id in coord_ids if cloud_ids[local_id] in failed_coords)
+
+        return {
+            'tags': not failed_tags,
+            'coordinates': not failed_coords,
+            'failed_ids': sorted(failed_ids),
+        }
+
+    def mark_synced(self, versions: Dict[int, int]) -> int:
+        """
+        在一个事务中将胶囊标记为已同步（capsules.cloud_status + sync_status + sync_log）
+
+        Args:
+            versions: {本地 ID: 云端版本号}
+
+        Returns:
+            sync_status 中被标记的记录数
+        """
+        if not versions:
+            return 0
+
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        ids = list(versions.keys())
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                UPDATE capsules
+                SET cloud_status = 'synced',
+                    last_synced_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, [(cid,) for cid in ids])
+
+            cursor.executemany("""
+                UPDATE sync_status
+                SET sync_state = 'synced',
+                    local_version = local_version + 1,
+                    cloud_version = ?,
+                    last_sync_at = ?,
+                    updated_at = ?
+                WHERE table_name = 'capsules' AND record_id = ?
+            """, [(versions[cid], now, now, cid) for cid in ids])
+
+            marked = 0
+            for chunk in _chunked(ids, _SQLITE_MAX_PARAMS):
+                placeholders = ",".join(["?"] * len(chunk))
+                cursor.execute(f"""
+                    INSERT INTO sync_log (table_name, operation, record_id, direction, status, local_version, cloud_version)
+                    SELECT table_name, 'sync', record_id, 'to_cloud', 'success', local_version, cloud_version
+                    FROM sync_status
+                    WHERE table_name = 'capsules' AND record_id IN ({placeholders})
+                """, chunk)
+                marked += cursor.rowcount
+
+            conn.commit()
+            return marked
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
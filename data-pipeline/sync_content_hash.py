@@ -0,0 +1,217 @@
+"""
+同步上传的内容哈希变更检测
+
+每个胶囊按子资源分别计算规范化内容的哈希：
+- metadata:    capsules 表中会上传到云端的字段
+- files:       预览音频 / RPP / metadata.json（文件名 + 大小 + mtime）
+- tags:        capsule_tags 标签集合（与顺序无关）
+- coordinates: capsule_coordinates 各棱镜坐标
+- audio:       Audio 文件夹（文件名 + 大小 + mtime）
+
+sync_content_hashes 表保存当前哈希和上一次成功上传时的哈希，
+上传流程据此跳过未变化的子资源，整颗胶囊未变化时直接跳过。
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 子资源
+RESOURCES = ('metadata', 'files', 'tags', 'coordinates', 'audio')
+
+# 会上传到云端的元数据字段（不含 updated_at / cloud_status 等本地状态）
+METADATA_FIELDS = (
+    'name', 'capsule_type', 'keywords', 'description',
+    'file_path', 'preview_audio', 'rpp_file', 'owner_supabase_user_id',
+)
+
+# 跳过一个子资源时省下的请求数（只计存在性检查 / 查询 / 写入，不含实际文件上传）
+RESOURCE_REQUESTS = {
+    'metadata': 2,     # get_cloud_capsule_by_local_id + 更新
+    'files': 3,        # 3 次 storage_file_exists
+    'tags': 3,         # embedding 更新 + 删除旧标签 + 插入新标签
+    'coordinates': 1,
+    'audio': 1,        # list_audio_files
+}
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.ogg', '.flac', '.aiff')
+
+
+def _digest(payload: Any) -> Tuple[str, int]:
+    """规范化 JSON 的 SHA256 及其字节数"""
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+
+def _file_signature(path: Path) -> Optional[List]:
+    """文件签名：[文件名, 大小, mtime_ns]，不存在返回 None"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [path.name, stat.st_size, stat.st_mtime_ns]
+
+
+class ContentHashTracker:
+    """胶囊子资源内容哈希的计算与存储"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_table()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self):
+        """创建哈希表（如果不存在）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_content_hashes (
+                    capsule_id INTEGER NOT NULL,
+                    resource TEXT NOT NULL,
+                    current_hash TEXT,
+                    uploaded_hash TEXT,
+                    size_bytes INTEGER DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    uploaded_at TIMESTAMP,
+                    PRIMARY KEY (capsule_id, resource)
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def compute(self, capsule: Dict[str, Any], capsule_dir: Optional[Path]) -> Dict[str, Dict[str, Any]]:
+        """
+        计算一个胶囊所有子资源的当前哈希，并写入 current_hash
+
+        Args:
+            capsule: 胶囊元数据（_get_capsule_metadata_only 的结果）
+            capsule_dir: 本地胶囊目录（None 表示不可用）
+
+        Returns:
+            {resource: {'hash': str, 'bytes': int}}，bytes 为上传该子资源的大致字节数
+        """
+        from capsule_db import _tag_set_hash
+
+        capsule_id = capsule['id']
+        result: Dict[str, Dict[str, Any]] = {}
+
+        metadata_hash, metadata_bytes = _digest({k: capsule.get(k) for k in METADATA_FIELDS})
+        result['metadata'] = {'hash': metadata_hash, 'bytes': metadata_bytes}
+
+        conn = self._get_connection()
+        try:
+            tag_rows = [tuple(row) for row in conn.execute("""
+                SELECT lens, word_id, word_cn, word_en, x, y
+                FROM capsule_tags WHERE capsule_id = ?
+            """, (capsule_id,))]
+            result['tags'] = {
+                'hash': _tag_set_hash(tag_rows),
+                'bytes': _digest([list(row) for row in tag_rows])[1],
+            }
+
+            coord_row = conn.execute(
+                "SELECT * FROM capsule_coordinates WHERE capsule_id = ?", (capsule_id,)
+            ).fetchone()
+            coords = {k: coord_row[k] for k in coord_row.keys()} if coord_row else {}
+            coords_hash, coords_bytes = _digest(coords)
+            result['coordinates'] = {'hash': coords_hash, 'bytes': coords_bytes}
+        finally:
+            conn.close()
+
+        files, files_bytes = [], 0
+        audio, audio_bytes = [], 0
+        if capsule_dir is not None:
+            for name in (capsule.get('preview_audio'), capsule.get('rpp_file'), 'metadata.json'):
+                if name:
+                    signature = _file_signature(capsule_dir / name)
+                    files.append(signature or [name, None, None])
+                    files_bytes += signature[1] if signature else 0
+
+            audio_dir = capsule_dir / "Audio"
+            if audio_dir.is_dir():
+                for entry in sorted(audio_dir.iterdir()):
+                    if entry.is_file() and not entry.name.startswith('.') \
+                            and entry.suffix.lower() in AUDIO_EXTENSIONS:
+                        signature = _file_signature(entry)
+                        if signature:
+                            audio.append(signature)
+                            audio_bytes += signature[1]
+
+        result['files'] = {'hash': _digest(files)[0], 'bytes': files_bytes}
+        result['audio'] = {'hash': _digest(audio)[0], 'bytes': audio_bytes}
+
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO sync_content_hashes (capsule_id, resource, current_hash, size_bytes, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(capsule_id, resource) DO UPDATE SET
+                    current_hash = excluded.current_hash,
+                    size_bytes = excluded.size_bytes,
+                    updated_at = CASE WHEN sync_content_hashes.current_hash IS excluded.current_hash
+                                      THEN sync_content_hashes.updated_at ELSE CURRENT_TIMESTAMP END
+            """, [(capsule_id, resource, info['hash'], info['bytes']) for resource, info in result.items()])
+            conn.commit()
+        finally:
+            conn.close()
+
+        return result
+
+    def get_uploaded(self, capsule_id: int) -> Dict[str, Optional[str]]:
+        """
+        获取上一次成功上传时的哈希
+
+        Returns:
+            {resource: uploaded_hash}
+        """
+        conn = self._get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT resource, uploaded_hash FROM sync_content_hashes WHERE capsule_id = ?
+            """, (capsule_id,)).fetchall()
+            return {row['resource']: row['uploaded_hash'] for row in rows}
+        finally:
+            conn.close()
+
+    def changed_resources(self, current: Dict[str, Dict[str, Any]],
+                          uploaded: Dict[str, Optional[str]]) -> List[str]:
+        """返回当前哈希与上次上传哈希不同的子资源"""
+        return [r for r in RESOURCES if r in current and current[r]['hash'] != uploaded.get(r)]
+
+    def mark_uploaded(self, capsule_id: int, resources: List[str]):
+        """将指定子资源的 current_hash 记为已上传（单事务）"""
+        if not resources:
+            return
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                UPDATE sync_content_hashes
+                SET uploaded_hash = current_hash, uploaded_at = CURRENT_TIMESTAMP
+                WHERE capsule_id = ? AND resource = ?
+            """, [(capsule_id, r) for r in resources])
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def savings(current: Dict[str, Dict[str, Any]], skipped: List[str]) -> Dict[str, int]:
+        """
+        估算跳过的子资源省下的字节数和请求数
+
+        Returns:
+            {'bytes': int, 'requests': int}
+        """
+        return {
+            'bytes': sum(current[r]['bytes'] for r in skipped if r in current),
+            'requests': sum(RESOURCE_REQUESTS.get(r, 0) for r in skipped),
+        }
@@ -0,0 +1,374 @@
+"""
+同步意图缓冲区
+
+保存路径频繁调用 mark_for_sync（连续编辑同一胶囊会产生几十条 sync_log 和多次重复上传）。
+缓冲区在进程内合并标记：
+- 同一 (表, 记录) 在一个刷新窗口内只保留一条意图，操作类型按 create / update / delete 合并
+- 刷新时一个事务批量 upsert sync_status，每条合并后的意图只写一条 sync_log
+- 最后一次标记后静默一段时间，按用户入队一次后台上传：只上传这段时间内标记过的胶囊，
+  不做全局下载（同步任务队列，相同任务自动去重）
+- 定期按保留策略压缩 sync_log（过期行、被后续记录取代的 pending 行、总行数上限）
+
+读取待同步记录前调用 flush_pending_intents(db_path)，保证读到刚标记的记录。
+"""
+
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, Set
+
+logger = logging.getLogger(__name__)
+
+# 默认参数（config.json -> sync_intents 覆盖）
+DEFAULT_INTENT_CONFIG = {
+    'flush_delay_seconds': 1.0,       # 第一次标记后最多缓冲多久再落库
+    'max_buffered': 500,              # 缓冲的意图数达到上限时立即落库
+    'auto_upload': True,              # 静默期后自动触发后台上传
+    'quiet_seconds': 30.0,            # 最后一次标记后的静默期（秒）
+    'log_retain_days': 30,            # sync_log 保留天数（failed / conflict 不受此限制）
+    'log_failed_retain_days': 90,     # failed / conflict 日志保留天数
+    'log_max_rows': 20000,            # sync_log 最多保留行数（最新的）
+    'compact_interval_seconds': 3600, # 压缩间隔
+}
+
+
+def get_intent_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取缓冲区参数：默认值 < config.json 的 sync_intents 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_INTENT_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('sync_intents') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_INTENT_CONFIG and value is not None:
+                config[key] = type(DEFAULT_INTENT_CONFIG[key])(value)
+
+    return config
+
+
+# 记录 ID 即胶囊 ID 的表（自动上传按这些记录限定胶囊范围）
+CAPSULE_TABLES = ('capsules', 'capsule_tags', 'capsule_coordinates')
+
+
+def _merge_operation(previous: Optional[str], operation: str) -> str:
+    """合并同一记录的操作类型：delete 优先；create 后的 update 仍是 create；delete 后再 create 视为 update"""
+    if previous is None:
+        return operation
+    if operation == 'delete':
+        return 'delete'
+    if previous == 'delete':
+        return 'update'
+    if previous == 'create':
+        return 'create'
+    return operation
+
+
+def compact_sync_log(conn: sqlite3.Connection, retain_days: int, failed_retain_days: int,
+                     max_rows: int) -> Dict[str, int]:
+    """
+    按保留策略压缩 sync_log（调用方负责提交事务）
+
+    1. 删除超过 retain_days 的记录（failed / conflict 保留 failed_retain_days）
+    2. 删除已被同一记录后续日志取代的 pending 行
+    3. 只保留最新的 max_rows 行
+
+    Returns:
+        {'expired': int, 'superseded': int, 'overflow': int}
+    """
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        DELETE FROM sync_log
+        WHERE (status NOT IN ('failed', 'conflict') AND created_at < datetime('now', ?))
+           OR created_at < datetime('now', ?)
+    """, (f'-{int(retain_days)} days', f'-{int(failed_retain_days)} days'))
+    expired = cursor.rowcount
+
+    cursor.execute("""
+        DELETE FROM sync_log
+        WHERE status = 'pending'
+        AND id NOT IN (
+            SELECT MAX(id) FROM sync_log GROUP BY table_name, record_id
+        )
+    """)
+    superseded = cursor.rowcount
+
+    cursor.execute("""
+        DELETE FROM sync_log
+        WHERE id <= (SELECT id FROM sync_log ORDER BY id DESC LIMIT 1 OFFSET ?)
+    """, (int(max_rows),))
+    overflow = cursor.rowcount
+
+    return {'expired': expired, 'superseded': superseded, 'overflow': overflow}
+
+
+class SyncIntentBuffer:
+    """合并待同步标记，批量落库并防抖触发自动上传"""
+
+    def __init__(self, db_path: str, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            config_overrides: 覆盖 DEFAULT_INTENT_CONFIG
+        """
+        self.db_path = db_path
+        self.config = get_intent_config(config_overrides)
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._intents: Dict[Tuple[str, int], str] = {}
+        self._first_mark_at: Optional[float] = None
+        self._last_mark_at: Optional[float] = None
+        self._upload_users: Dict[str, Set[int]] = {}
+        self._next_compact_at = time.monotonic()
+        self._stats = {'marks': 0, 'flushed': 0, 'flushes': 0, 'uploads_scheduled': 0}
+
+        self._thread = threading.Thread(target=self._run, name='sync-intents', daemon=True)
+        self._thread.start()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def mark(self, table_name: str, record_id: int, operation: str = 'update',
+             user_id: Optional[str] = None):
+        """
+        记录同步意图（不立即写库）
+
+        Args:
+            table_name: 表名
+            record_id: 记录 ID
+            operation: 操作类型 ('create', 'update', 'delete')
+            user_id: 当前用户（提供时静默期后为该用户自动上传该胶囊）
+        """
+        key = (table_name, int(record_id))
+        now = time.monotonic()
+        with self._cond:
+            self._intents[key] = _merge_operation(self._intents.get(key), operation)
+            self._stats['marks'] += 1
+            if self._first_mark_at is None:
+                self._first_mark_at = now
+            self._last_mark_at = now
+            if user_id and self.config['auto_upload'] and table_name in CAPSULE_TABLES:
+                capsule_ids = self._upload_users.setdefault(user_id, set())
+                if self._intents[key] == 'delete' and table_name == 'capsules':
+                    capsule_ids.discard(key[1])  # 已删除的胶囊没有可上传的内容
+                else:
+                    capsule_ids.add(key[1])
+            self._cond.notify()
+
+    def pending_count(self) -> int:
+        """缓冲中尚未落库的意图数"""
+        with self._cond:
+            return len(self._intents)
+
+    def get_stats(self) -> Dict[str, int]:
+        """累计统计：标记次数、落库意图数、落库次数、触发的自动上传次数"""
+        with self._cond:
+            return dict(self._stats, buffered=len(self._intents))
+
+    def flush(self) -> bool:
+        """
+        立即把缓冲的意图写入数据库（一个事务）
+
+        Returns:
+            是否成功（失败时意图放回缓冲区，下次刷新重试）
+        """
+        with self._flush_lock:
+            with self._cond:
+                intents = self._intents
+                self._intents = {}
+                self._first_mark_at = None
+            if not intents:
+                return True
+
+            now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            conn = self._get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.executemany("""
+                    INSERT INTO sync_status (table_name, record_id, sync_state, updated_at)
+                    VALUES (?, ?, 'pending', ?)
+                    ON CONFLICT(table_name, record_id) DO UPDATE SET
+                        sync_state = 'pending',
+                        updated_at = excluded.updated_at
+                """, [(table, record_id, now) for (table, record_id) in intents])
+                cursor.executemany("""
+                    INSERT INTO sync_log (table_name, operation, record_id, direction, status)
+                    VALUES (?, ?, ?, 'to_cloud', 'pending')
+                """, [(table, operation, record_id) for (table, record_id), operation in intents.items()])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"写入同步标记失败: {e}")
+                with self._cond:
+                    # 放回缓冲区（期间的新标记优先合并在后）
+                    for key, operation in intents.items():
+                        if key in self._intents:
+                            self._intents[key] = _merge_operation(operation, self._intents[key])
+                        else:
+                            self._intents[key] = operation
+                    if self._first_mark_at is None:
+                        self._first_mark_at = time.monotonic()
+                return False
+            finally:
+                conn.close()
+
+            with self._cond:
+                self._stats['flushed'] += len(intents)
+                self._stats['flushes'] += 1
+            logger.debug(f"[SYNC] 同步标记落库: {len(intents)} 条")
+            return True
+
+    def compact(self) -> Dict[str, int]:
+        """按保留策略压缩 sync_log"""
+        conn = self._get_connection()
+        try:
+            result = compact_sync_log(
+                conn,
+                self.config['log_retain_days'],
+                self.config['log_failed_retain_days'],
+                self.config['log_max_rows'],
+            )
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            logger.warning(f"压缩 sync_log 失败: {e}")
+            return {'expired': 0, 'superseded': 0, 'overflow': 0}
+        finally:
+            conn.close()
+
+        if any(result.values()):
+            print(f"🧹 sync_log 压缩: 过期 {result['expired']}, 已取代 {result['superseded']}, "
+                  f"超出上限 {result['overflow']}")
+        return result
+
+    def _schedule_uploads(self, users: Dict[str, Set[int]]):
+        """
+        为每个用户入队一次后台上传（排队中的相同任务会被复用）
+
+        只上传静默期内标记过的胶囊（capsule_ids），upload_only 跳过全局下载和资产检查，
+        一次编辑不会触发整库双向同步。
+
+        Args:
+            users: {用户 ID: 胶囊 ID 集合}
+        """
+        try:
+            from sync_job_queue import get_sync_job_queue, PRIORITY_BACKGROUND
+            queue = get_sync_job_queue(self.db_path)
+        except Exception as e:
+            logger.warning(f"自动上传入队失败: {e}")
+            return
+
+        for user_id, capsule_ids in users.items():
+            if not capsule_ids:
+                continue
+            try:
+                queue.enqueue('lightweight', user_id, {
+                    'include_previews': False,
+                    'capsule_ids': sorted(capsule_ids),
+                    'force': False,
+                    'upload_only': True
+                }, PRIORITY_BACKGROUND)
+                with self._cond:
+                    self._stats['uploads_scheduled'] += 1
+            except Exception as e:
+                logger.warning(f"自动上传入队失败 ({user_id}): {e}")
+
+    def _next_deadline(self) -> Tuple[float, bool, bool, bool]:
+        """(下一个截止时间, 是否该落库, 是否该上传, 是否该压缩)，需持有 _cond"""
+        now = time.monotonic()
+        deadlines = [self._next_compact_at]
+
+        flush_due = False
+        if self._intents:
+            flush_at = self._first_mark_at + self.config['flush_delay_seconds']
+            flush_due = now >= flush_at or len(self._intents) >= self.config['max_buffered']
+            deadlines.append(flush_at)
+
+        upload_due = False
+        if self._upload_users and self._last_mark_at is not None:
+            upload_at = self._last_mark_at + self.config['quiet_seconds']
+            upload_due = now >= upload_at
+            deadlines.append(upload_at)
+
+        return min(deadlines), flush_due, upload_due, now >= self._next_compact_at
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline, flush_due, upload_due, compact_due = self._next_deadline()
+                if not (flush_due or upload_due or compact_due):
+                    self._cond.wait(timeout=max(0.05, deadline - time.monotonic()))
+                    continue
+                users = {}
+                if upload_due:
+                    users = self._upload_users
+                    self._upload_users = {}
+
+            try:
+                if flush_due or upload_due:
+                    self.flush()
+                if users:
+                    self._schedule_uploads(users)
+                if compact_due:
+                    self._next_compact_at = time.monotonic() + self.config['compact_interval_seconds']
+                    self.compact()
+            except Exception as e:
+                logger.error(f"同步意图缓冲区处理失败: {e}")
+                time.sleep(1.0)
+
+
+# 全局单例（按数据库路径）
+_buffers: Dict[str, SyncIntentBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_sync_intent_buffer(db_path: str) -> SyncIntentBuffer:
+    """
+    获取数据库对应的同步意图缓冲区（首次调用时创建后台线程）
+
+    Args:
+        db_path: 数据库路径
+
+    Returns:
+        SyncIntentBuffer 实例
+    """
+    db_path = str(db_path)
+    with _buffers_lock:
+        buffer = _buffers.get(db_path)
+        if buffer is None:
+            buffer = SyncIntentBuffer(db_path)
+            _buffers[db_path] = buffer
+        return buffer
+
+
+def flush_pending_intents(db_path: str) -> bool:
+    """把该数据库缓冲中的意图落库（缓冲区不存在时什么都不做）"""
+    buffer = _buffers.get(str(db_path))
+    return buffer.flush() if buffer else True
+
+
+@atexit.register
+def _flush_all_on_exit():
+    for buffer in list(_buffers.values()):
+        try:
+            buffer.flush()
+        except Exception:
+            pass
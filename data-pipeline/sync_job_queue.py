@@ -0,0 +1,670 @@
+"""
+持久化同步任务队列
+
+同步工作（轻量上传、仅下载、Audio 上传、关键词同步、表上传）建模为 sync_jobs 表中的任务：
+- 后台工作线程池按优先级执行（用户触发 > 后台），同优先级按入队顺序
+- 相同任务（类型 + 用户 + 参数）在排队期间只保留一条，重复入队返回已有任务 ID，
+  用户触发的重复入队会把排队任务提升到更高优先级
+- 同一用户的同类型任务串行执行：相同任务正在执行时新入队的任务排队等待它结束，
+  不会与它并发（执行中的任务可能已经读过旧数据，所以不直接复用执行中的任务）
+- 进程崩溃或退出时正在执行的任务会在下次启动时重新排队（超过最大尝试次数则标记失败）
+- 进度写在任务行中（节流），HTTP 层只负责入队并按任务 ID 读取进度 / 结果
+
+任务处理函数通过 register_sync_job_handler(job_type, handler) 注册：
+    handler(job: Dict, reporter: JobReporter) -> Dict  # 返回值作为任务结果保存
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数字越大越优先）
+PRIORITY_USER = 10
+PRIORITY_BACKGROUND = 0
+
+# 任务状态
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED)
+
+# 默认参数（config.json -> sync_jobs 覆盖）
+DEFAULT_JOB_QUEUE_CONFIG = {
+    'max_workers': 2,             # 工作线程数
+    'max_attempts': 3,            # 单个任务最多执行次数（含崩溃后恢复）
+    'progress_interval': 0.5,     # 进度写库最小间隔（秒）
+    'idle_poll_seconds': 5.0,     # 空闲时检查新任务的间隔（其他进程入队的任务）
+    'retain_days': 7,             # 已结束任务保留天数
+}
+
+_HANDLERS: Dict[str, Callable[[Dict[str, Any], 'JobReporter'], Dict[str, Any]]] = {}
+
+
+def get_job_queue_config(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    获取队列参数：默认值 < config.json 的 sync_jobs 字段 < 调用方覆盖
+
+    Args:
+        overrides: 调用方覆盖值（None 值忽略）
+
+    Returns:
+        参数字典
+    """
+    config = dict(DEFAULT_JOB_QUEUE_CONFIG)
+
+    try:
+        from common import load_user_config
+        user_config = load_user_config().get('sync_jobs') or {}
+    except Exception:
+        user_config = {}
+
+    for source in (user_config, overrides or {}):
+        for key, value in source.items():
+            if key in DEFAULT_JOB_QUEUE_CONFIG and value is not None:
+                config[key] = type(DEFAULT_JOB_QUEUE_CONFIG[key])(value)
+
+    return config
+
+
+def register_sync_job_handler(job_type: str,
+                              handler: Callable[[Dict[str, Any], 'JobReporter'], Dict[str, Any]]):
+    """
+    注册任务处理函数
+
+    Args:
+        job_type: 任务类型（如 'lightweight'）
+        handler: handler(job, reporter) -> 结果字典
+    """
+    _HANDLERS[job_type] = handler
+
+
+def _dedup_key(job_type: str, user_id: Optional[str], payload: Dict[str, Any]) -> str:
+    """任务去重键：类型 + 用户 + 规范化参数"""
+    data = json.dumps([job_type, user_id, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class SyncJobStore:
+    """sync_jobs 表的读写"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_table()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_table(self):
+        """创建任务表（如果不存在）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_type TEXT NOT NULL,
+                    user_id TEXT,
+                    payload TEXT DEFAULT '{}',
+                    dedup_key TEXT NOT NULL,
+                    priority INTEGER DEFAULT 0,
+                    status TEXT DEFAULT 'queued',
+                    progress INTEGER DEFAULT 0,
+                    stage TEXT,
+                    message TEXT,
+                    progress_data TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    max_attempts INTEGER DEFAULT 3,
+                    not_before TIMESTAMP,
+                    worker_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_dedup_queued
+                ON sync_jobs(dedup_key) WHERE status = 'queued'
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_sync_jobs_claim
+                ON sync_jobs(status, priority DESC, id)
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for key in ('payload', 'progress_data', 'result'):
+            if job.get(key):
+                try:
+                    job[key] = json.loads(job[key])
+                except (TypeError, ValueError):
+                    pass
+        return job
+
+    def enqueue(self, job_type: str, user_id: Optional[str], payload: Dict[str, Any],
+                priority: int, max_attempts: int) -> Tuple[int, bool]:
+        """
+        入队；相同任务已在排队时复用已有任务（并提升优先级）
+
+        Returns:
+            (任务 ID, 是否新建)
+        """
+        dedup_key = _dedup_key(job_type, user_id, payload)
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""
+                SELECT id, priority FROM sync_jobs
+                WHERE dedup_key = ? AND status = 'queued'
+            """, (dedup_key,)).fetchone()
+
+            if row:
+                if priority > row['priority']:
+                    # 用户主动触发：提升优先级并取消退避等待
+                    conn.execute("""
+                        UPDATE sync_jobs
+                        SET priority = ?, not_before = NULL, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (priority, row['id']))
+                conn.commit()
+                return row['id'], False
+
+            cursor = conn.execute("""
+                INSERT INTO sync_jobs (job_type, user_id, payload, dedup_key, priority, max_attempts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (job_type, user_id, json.dumps(payload, ensure_ascii=False, default=str),
+                  dedup_key, priority, max_attempts))
+            conn.commit()
+            return cursor.lastrowid, True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """原子领取优先级最高的排队任务（同一用户的同类型任务正在执行时跳过）"""
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""
+                SELECT id FROM sync_jobs AS q
+                WHERE q.status = 'queued'
+                  AND (q.not_before IS NULL OR q.not_before <= datetime('now'))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM sync_jobs AS r
+                      WHERE r.status = 'running'
+                        AND r.job_type = q.job_type
+                        AND r.user_id IS q.user_id
+                  )
+                ORDER BY q.priority DESC, q.id
+                LIMIT 1
+            """).fetchone()
+            if not row:
+                conn.commit()
+                return None
+
+            conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'running',
+                    attempts = attempts + 1,
+                    worker_id = ?,
+                    error = NULL,
+                    not_before = NULL,
+                    started_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (worker_id, row['id']))
+            job = conn.execute("SELECT * FROM sync_jobs WHERE id = ?", (row['id'],)).fetchone()
+            conn.commit()
+            return self._decode(job)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def update_progress(self, job_id: int, percent: Optional[int], stage: Optional[str],
+                        message: Optional[str], progress_data: Dict[str, Any]):
+        """写入任务进度"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                UPDATE sync_jobs
+                SET progress = COALESCE(?, progress),
+                    stage = COALESCE(?, stage),
+                    message = COALESCE(?, message),
+                    progress_data = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (percent, stage, message,
+                  json.dumps(progress_data, ensure_ascii=False, default=str), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def finish(self, job_id: int, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None):
+        """标记任务结束"""
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                UPDATE sync_jobs
+                SET status = ?,
+                    progress = CASE WHEN ? = 'completed' THEN 100 ELSE progress END,
+                    result = ?,
+                    error = ?,
+                    finished_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, status,
+                  json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                  error, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def requeue(self, job_id: int, error: str) -> bool:
+        """
+        执行失败后重新排队（未超过最大尝试次数时）
+
+        Returns:
+            是否重新排队
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            job = conn.execute("""
+                SELECT attempts, max_attempts, dedup_key FROM sync_jobs WHERE id = ?
+            """, (job_id,)).fetchone()
+            duplicate = conn.execute("""
+                SELECT 1 FROM sync_jobs WHERE dedup_key = ? AND status = 'queued'
+            """, (job['dedup_key'],)).fetchone() if job else None
+
+            if not job or job['attempts'] >= job['max_attempts'] or duplicate:
+                conn.commit()
+                return False
+
+            # 指数退避：10s, 20s, 40s ...
+            delay = 10 * 2 ** max(0, job['attempts'] - 1)
+            conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'queued', worker_id = NULL, error = ?,
+                    not_before = datetime('now', ?), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (error, f"+{delay} seconds", job_id))
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def recover_interrupted(self) -> Dict[str, int]:
+        """
+        启动时处理上次进程遗留的 running 任务
+
+        Returns:
+            {'requeued': int, 'failed': int, 'superseded': int}
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # 同样的任务已经在排队：遗留任务由排队任务代替
+            superseded = conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'cancelled', error = '被排队中的相同任务取代',
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+                  AND dedup_key IN (SELECT dedup_key FROM sync_jobs WHERE status = 'queued')
+            """).rowcount
+            failed = conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'failed', error = '任务多次中断，已放弃',
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND attempts >= max_attempts
+            """).rowcount
+            requeued = conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'queued', worker_id = NULL, error = '进程中断，已重新排队',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+            """).rowcount
+            conn.commit()
+            return {'requeued': requeued, 'failed': failed, 'superseded': superseded}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._decode(row) if row else None
+        finally:
+            conn.close()
+
+    def list(self, user_id: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 50) -> List[Dict[str, Any]]:
+        """按时间倒序列出任务"""
+        sql = "SELECT * FROM sync_jobs WHERE 1 = 1"
+        params: List[Any] = []
+        if user_id:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._get_connection()
+        try:
+            return [self._decode(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def cancel(self, job_id: int) -> bool:
+        """取消排队中的任务（执行中的任务不可取消）"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("""
+                UPDATE sync_jobs
+                SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued'
+            """, (job_id,))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def find_capsule_progress(self, capsule_id: int) -> Optional[Dict[str, Any]]:
+        """从最近的任务进度中查找单个胶囊的上传进度（进程重启后仍可读取）"""
+        conn = self._get_connection()
+        try:
+            row = conn.execute("""
+                SELECT json_extract(progress_data, '$.capsules."' || ? || '"') AS capsule_progress
+                FROM sync_jobs
+                WHERE progress_data IS NOT NULL
+                  AND json_extract(progress_data, '$.capsules."' || ? || '"') IS NOT NULL
+                ORDER BY id DESC
+                LIMIT 1
+            """, (str(capsule_id), str(capsule_id))).fetchone()
+            return json.loads(row['capsule_progress']) if row and row['capsule_progress'] else None
+        except sqlite3.OperationalError:
+            # 未编译 JSON1 扩展
+            return None
+        finally:
+            conn.close()
+
+    def purge(self, retain_days: int) -> int:
+        """删除超过保留期的已结束任务"""
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("""
+                DELETE FROM sync_jobs
+                WHERE status IN ('completed', 'failed', 'cancelled')
+                  AND finished_at < datetime('now', ?)
+            """, (f"-{int(retain_days)} days",))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+
+class JobReporter:
+    """任务进度上报（节流写库）"""
+
+    def __init__(self, store: SyncJobStore, job_id: int, interval: float):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._percent: Optional[int] = None
+        self._stage: Optional[str] = None
+        self._message: Optional[str] = None
+        self._data: Dict[str, Any] = {}
+        self._dirty = False
+        self._last_write = 0.0
+
+    def update(self, percent: Optional[int] = None, stage: Optional[str] = None,
+               message: Optional[str] = None, **data):
+        """
+        更新进度
+
+        Args:
+            percent: 总体百分比
+            stage: 阶段名称
+            message: 说明
+            **data: 合并到 progress_data 的附加字段
+        """
+        with self._lock:
+            if percent is not None:
+                self._percent = int(percent)
+            if stage is not None:
+                self._stage = stage
+            if message is not None:
+                self._message = message
+            self._data.update(data)
+            self._dirty = True
+        self._write(force=False)
+
+    def update_capsule(self, capsule_id: int, capsule_progress: Dict[str, Any]):
+        """记录单个胶囊的进度（progress_data.capsules）"""
+        with self._lock:
+            self._data.setdefault('capsules', {})[str(capsule_id)] = capsule_progress
+            self._dirty = True
+        self._write(force=False)
+
+    def flush(self):
+        """立即写入未保存的进度"""
+        self._write(force=True)
+
+    def _write(self, force: bool):
+        with self._lock:
+            now = time.monotonic()
+            if not self._dirty or (not force and now - self._last_write < self.interval):
+                return
+            snapshot = (self._percent, self._stage, self._message, json.loads(json.dumps(self._data, default=str)))
+            self._dirty = False
+            self._last_write = now
+        try:
+            self.store.update_progress(self.job_id, *snapshot)
+        except Exception as e:
+            logger.warning(f"写入任务进度失败 (job={self.job_id}): {e}")
+
+
+class SyncJobQueue:
+    """同步任务队列：入队 + 后台工作线程池"""
+
+    def __init__(self, db_path: str, config_overrides: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: 数据库路径
+            config_overrides: 覆盖 DEFAULT_JOB_QUEUE_CONFIG
+        """
+        self.db_path = db_path
+        self.config = get_job_queue_config(config_overrides)
+        self.store = SyncJobStore(db_path)
+
+        self._workers: List[threading.Thread] = []
+        self._running = False
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+
+    def start(self):
+        """恢复中断任务并启动工作线程"""
+        if self._running:
+            return
+
+        recovered = self.store.recover_interrupted()
+        purged = self.store.purge(self.config['retain_days'])
+        if any(recovered.values()) or purged:
+            print(f"🔁 同步任务恢复: 重新排队 {recovered['requeued']}, 放弃 {recovered['failed']}, "
+                  f"取代 {recovered['superseded']}, 清理历史 {purged}")
+
+        self._running = True
+        for i in range(max(1, self.config['max_workers'])):
+            worker = threading.Thread(target=self._worker_loop, args=(f"sync-worker-{i + 1}",),
+                                      name=f"sync-worker-{i + 1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f"🚀 同步任务队列已启动（工作线程: {len(self._workers)}）")
+
+    def stop(self, timeout: float = 5.0):
+        """停止工作线程（执行中的任务会在下次启动时重新排队）"""
+        self._running = False
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers.clear()
+
+    def enqueue(self, job_type: str, user_id: Optional[str] = None,
+                payload: Optional[Dict[str, Any]] = None,
+                priority: int = PRIORITY_BACKGROUND) -> Tuple[int, bool]:
+        """
+        入队（相同任务排队中时复用）
+
+        Args:
+            job_type: 任务类型
+            user_id: 用户 ID
+            payload: 任务参数（JSON 可序列化）
+            priority: 优先级（PRIORITY_USER / PRIORITY_BACKGROUND）
+
+        Returns:
+            (任务 ID, 是否新建)
+        """
+        job_id, created = self.store.enqueue(job_type, user_id, payload or {}, priority,
+                                             self.config['max_attempts'])
+        if created:
+            logger.info(f"[JOBS] 入队: #{job_id} {job_type} (优先级 {priority})")
+        else:
+            logger.info(f"[JOBS] 复用排队中的相同任务: #{job_id} {job_type}")
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id, created
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务（含进度 / 结果）"""
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: int) -> bool:
+        """取消排队中的任务"""
+        return self.store.cancel(job_id)
+
+    def wait(self, job_id: int, timeout: Optional[float] = None,
+             return_on_retry: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        等待任务结束
+
+        Args:
+            job_id: 任务 ID
+            timeout: 最长等待秒数（None 表示一直等待）
+            return_on_retry: 执行失败并重新排队（等待退避重试）时也返回
+
+        Returns:
+            任务字典（超时则为当前状态）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES:
+                return job
+            if return_on_retry and job['status'] == STATUS_QUEUED and job['not_before']:
+                return job
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._finished:
+                # 其他进程执行的任务不会通知本进程，最多 1 秒复查一次
+                self._finished.wait(timeout=1.0 if remaining is None else min(1.0, remaining))
+
+    def _worker_loop(self, worker_id: str):
+        while self._running:
+            try:
+                job = self.store.claim(worker_id)
+            except Exception as e:
+                logger.error(f"[JOBS] 领取任务失败: {e}")
+                job = None
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=self.config['idle_poll_seconds'])
+                continue
+
+            self._run_job(job)
+            with self._finished:
+                self._finished.notify_all()
+            with self._wakeup:
+                # 等待同类型任务结束的排队任务现在可以领取
+                self._wakeup.notify_all()
+
+    def _run_job(self, job: Dict[str, Any]):
+        job_id = job['id']
+        handler = _HANDLERS.get(job['job_type'])
+        if handler is None:
+            self.store.finish(job_id, STATUS_FAILED, error=f"未知任务类型: {job['job_type']}")
+            return
+
+        reporter = JobReporter(self.store, job_id, self.config['progress_interval'])
+        started = time.perf_counter()
+        print(f"▶️  同步任务 #{job_id} {job['job_type']} 开始（第 {job['attempts']} 次）")
+        try:
+            result = handler(job, reporter) or {}
+            reporter.flush()
+            self.store.finish(job_id, STATUS_COMPLETED, result=result)
+            print(f"✅ 同步任务 #{job_id} 完成（{time.perf_counter() - started:.1f}s）")
+        except Exception as e:
+            reporter.flush()
+            logger.error(f"[JOBS] 任务 #{job_id} 失败: {e}", exc_info=True)
+            if self.store.requeue(job_id, str(e)):
+                print(f"🔄 同步任务 #{job_id} 失败，重新排队: {e}")
+            else:
+                self.store.finish(job_id, STATUS_FAILED, error=str(e))
+                print(f"❌ 同步任务 #{job_id} 失败: {e}")
+
+
+# 全局单例
+_sync_job_queue: Optional[SyncJobQueue] = None
+_sync_job_queue_lock = threading.Lock()
+
+
+def get_sync_job_queue(db_path: Optional[str] = None) -> SyncJobQueue:
+    """
+    获取同步任务队列单例（首次调用时启动工作线程）
+
+    Args:
+        db_path: 数据库路径（可选，不提供则从 PathManager 获取）
+
+    Returns:
+        SyncJobQueue 实例
+    """
+    global _sync_job_queue
+    with _sync_job_queue_lock:
+        if _sync_job_queue is None:
+            if db_path is None:
+                from common import PathManager
+                db_path = str(PathManager.get_instance().db_path)
+            _sync_job_queue = SyncJobQueue(db_path)
+            _sync_job_queue.start()
+        return _sync_job_queue
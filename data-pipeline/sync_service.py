@@ -10,21 +10,42 @@ import json
 import logging
 import threading
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable
 
 # 配置日志
 logger = logging.getLogger(__name__)
 _UPLOAD_PROGRESS = {}
 _UPLOAD_PROGRESS_LOCK = threading.Lock()
+_UPLOAD_PROGRESS_LISTENERS: List[Callable[[int, Dict[str, Any]], None]] = []
+
+
+def add_upload_progress_listener(listener: Callable[[int, Dict[str, Any]], None]) -> None:
+    """注册胶囊上传进度监听（如同步任务把进度持久化到 sync_jobs）"""
+    with _UPLOAD_PROGRESS_LOCK:
+        _UPLOAD_PROGRESS_LISTENERS.append(listener)
+
+
+def remove_upload_progress_listener(listener: Callable[[int, Dict[str, Any]], None]) -> None:
+    with _UPLOAD_PROGRESS_LOCK:
+        if listener in _UPLOAD_PROGRESS_LISTENERS:
+            _UPLOAD_PROGRESS_LISTENERS.remove(listener)
 
 
 def _set_upload_progress(capsule_id: int, data: Dict[str, Any]) -> None:
     with _UPLOAD_PROGRESS_LOCK:
-        _UPLOAD_PROGRESS[capsule_id] = {
+        entry = {
             **data,
             'capsule_id': capsule_id,
             'updated_at': datetime.utcnow().isoformat()
         }
+        _UPLOAD_PROGRESS[capsule_id] = entry
+        listeners = list(_UPLOAD_PROGRESS_LISTENERS)
+    for listener in listeners:
+        try:
+            listener(capsule_id, entry)
+        except Exception as e:
+            logger.debug(f"上传进度监听失败: {e}")
 
 
 def _get_upload_progress(capsule_id: int) -> Optional[Dict[str, Any]]:
@@ -35,7 +56,36 @@ def _get_upload_progress(capsule_id: int) -> Optional[Dict[str, Any]]:
 def _clear_upload_progress(capsule_id: int) -> None:
     with _UPLOAD_PROGRESS_LOCK:
         _UPLOAD_PROGRESS.pop(capsule_id, None)
-from pathlib import Path
+
+
+def _audio_progress_reporter(capsule_id: int, base_percent: int = 0, span: int = 100):
+    """
+    生成 Audio 上传进度回调：按已发送字节数折算到 [base_percent, base_percent + span)
+
+    Args:
+        capsule_id: 胶囊 ID
+        base_percent: Audio 阶段的起始百分比
+        span: Audio 阶段占用的百分比区间
+    """
+    def _report(uploaded: int, total: int, filename: str, bytes_sent: int = 0, total_bytes: int = 0):
+        if total_bytes > 0:
+            fraction = bytes_sent / total_bytes
+        elif total > 0:
+            fraction = uploaded / total
+        else:
+            fraction = 0.95
+        _set_upload_progress(capsule_id, {
+            'status': 'uploading',
+            'stage': '上传 Audio',
+            'percent': min(99, base_percent + int(fraction * span)),
+            'current_file': filename,
+            'uploaded_files': uploaded,
+            'total_files': total,
+            'uploaded_bytes': bytes_sent,
+            'total_bytes': total_bytes,
+            'message': '上传音频文件...'
+        })
+    return _report
 
 
 class SyncService:
@@ -390,10 +440,17 @@ class SyncService:
                 result = supabase.upload_audio_files(
                     user_id=user_id,
                     capsule_folder_name=capsule_rel_path,
-                    audio_files=missing_files
+                    audio_files=missing_files,
+                    progress_callback=_audio_progress_reporter(cap_id)
                 )
                 if result and result.get('success', False):
                     uploaded += 1
+                    _set_upload_progress(cap_id, {
+                        'status': 'completed',
+                        'stage': '上传 Audio',
+                        'percent': 100,
+                        'message': 'Audio 上传完成'
+                    })
                     conn = self._get_connection()
                     try:
                         cursor = conn.cursor()
@@ -408,6 +465,12 @@ class SyncService:
                         conn.close()
                 else:
                     errors.append(f"{cap_name}: Audio 上传失败")
+                    _set_upload_progress(cap_id, {
+                        'status': 'error',
+                        'stage': '上传 Audio',
+                        'percent': 100,
+                        'message': 'Audio 上传失败'
+                    })
             except Exception as e:
                 errors.append(f"{cap_name}: {e}")
 
@@ -609,60 +672,40 @@ class SyncService:
         json_str = json.dumps(data, sort_keys=True)
         return hashlib.sha256(json_str.encode()).hexdigest()
 
-    def mark_for_sync(self, table_name: str, record_id: int, operation: str = 'update') -> bool:
+    def mark_for_sync(self, table_name: str, record_id: int, operation: str = 'update',
+                      user_id: Optional[str] = None, immediate: bool = False) -> bool:
         """
         标记记录为待同步
 
+        标记先进入进程内的同步意图缓冲区：同一记录的重复标记会被合并，
+        随后一个事务批量写入 sync_status / sync_log；静默期后自动入队后台上传。
+
         Args:
             table_name: 表名
             record_id: 记录 ID
             operation: 操作类型 ('create', 'update', 'delete')
+            user_id: 当前用户 ID（提供时静默期后自动上传）
+            immediate: 立即落库（默认 False）
 
         Returns:
             是否成功
         """
-        conn = self._get_connection()
         try:
-            cursor = conn.cursor()
-
-            # 检查记录是否已存在
-            cursor.execute("""
-                SELECT sync_state FROM sync_status
-                WHERE table_name = ? AND record_id = ?
-            """, (table_name, record_id))
-
-            existing = cursor.fetchone()
-
-            if existing:
-                # 更新现有记录
-                cursor.execute("""
-                    UPDATE sync_status
-                    SET sync_state = 'pending',
-                        updated_at = ?
-                    WHERE table_name = ? AND record_id = ?
-                """, (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), table_name, record_id))
-            else:
-                # 插入新记录
-                cursor.execute("""
-                    INSERT INTO sync_status (table_name, record_id, sync_state)
-                    VALUES (?, ?, 'pending')
-                """, (table_name, record_id))
-
-            # 记录日志
-            cursor.execute("""
-                INSERT INTO sync_log (table_name, operation, record_id, direction, status)
-                VALUES (?, ?, ?, 'to_cloud', 'pending')
-            """, (table_name, operation, record_id))
-
-            conn.commit()
-            return True
-
+            from sync_intent_buffer import get_sync_intent_buffer
+            buffer = get_sync_intent_buffer(self.db_path)
+            buffer.mark(table_name, record_id, operation, user_id=user_id)
+            return buffer.flush() if immediate else True
         except Exception as e:
-            conn.rollback()
             print(f"❌ 标记同步失败: {e}")
             return False
-        finally:
-            conn.close()
+
+    def _flush_sync_intents(self) -> None:
+        """读取待同步状态前，把缓冲中的标记落库"""
+        try:
+            from sync_intent_buffer import flush_pending_intents
+            flush_pending_intents(self.db_path)
+        except Exception as e:
+            logger.warning(f"同步标记落库失败: {e}")
 
     def get_pending_records(self, table_name: str = None) -> List[Dict]:
         """
@@ -674,6 +717,7 @@ class SyncService:
         Returns:
             待同步记录列表
         """
+        self._flush_sync_intents()
         conn = self._get_connection()
         try:
             cursor = conn.cursor()
@@ -760,6 +804,25 @@ class SyncService:
         finally:
             conn.close()
 
+    def _mark_capsule_cloud_synced(self, record_id: int):
+        """
+        更新 capsules 表的 cloud_status / last_synced_at
+
+        前端通过 capsule.cloud_status 判断状态，sync_status 之外必须同时更新此字段
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE capsules
+                SET cloud_status = 'synced',
+                    last_synced_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (record_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
     def record_sync_error(self, table_name: str, operation: str, record_id: int, error_message: str) -> bool:
         """
         记录同步错误
@@ -799,6 +862,7 @@ class SyncService:
         Returns:
             同步状态字典，包含云端待下载数量
         """
+        self._flush_sync_intents()
         conn = self._get_connection()
         try:
             cursor = conn.cursor()
@@ -1005,15 +1069,599 @@ class SyncService:
 
     # ========== Phase G2: 仅下载模式（启动同步专用） ==========
 
-    def download_only(self, user_id: str, include_previews: bool = True) -> Dict[str, Any]:
+    # ========== 增量启动同步：高水位线 ==========
+
+    # 每页下载的云端胶囊数量
+    DELTA_PAGE_SIZE = 500
+
+    # 每页下载的云端标签数量
+    TAG_PAGE_SIZE = 1000
+
+    def _ensure_watermark_table(self, conn) -> None:
+        """创建同步高水位线表（如果不存在）"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_watermarks (
+                user_id TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                high_water_at TEXT,
+                high_water_id TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, scope)
+            )
+        """)
+
+    def _record_sync_failures(self, user_id: str, scope: str, record_ids: List[str],
+                              failed: List[Dict[str, Any]]) -> None:
+        """
+        记录被跳过的云端记录（水位线已越过它们，云端再次更新时会重新出现在增量中）
+
+        Args:
+            user_id: Supabase 用户 ID
+            scope: 范围
+            record_ids: 本页全部记录 ID（合并成功的清除之前的失败记录）
+            failed: [{'id', 'error'}, ...]
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_failed_records (
+                    user_id TEXT NOT NULL,
+                    scope TEXT NOT NULL,
+                    record_id TEXT NOT NULL,
+                    error TEXT,
+                    failed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, scope, record_id)
+                )
+            """)
+            conn.executemany(
+                "DELETE FROM sync_failed_records WHERE user_id = ? AND scope = ? AND record_id = ?",
+                [(user_id, scope, str(record_id)) for record_id in record_ids]
+            )
+            conn.executemany("""
+                INSERT OR REPLACE INTO sync_failed_records (user_id, scope, record_id, error, failed_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, [(user_id, scope, str(f['id']), f['error']) for f in failed])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_sync_watermark(self, user_id: str, scope: str) -> Dict[str, Optional[str]]:
+        """
+        读取同步高水位线
+
+        Args:
+            user_id: Supabase 用户 ID
+            scope: 范围（'capsules' 为胶囊 updated_at，'capsules_deleted' 为墓碑 deleted_at）
+
+        Returns:
+            {'at': 时间戳字符串或 None, 'id': 同一时间戳下最后处理的云端 ID 或 None}
+        """
+        conn = self._get_connection()
+        try:
+            self._ensure_watermark_table(conn)
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT high_water_at, high_water_id FROM sync_watermarks
+                WHERE user_id = ? AND scope = ?
+            """, (user_id, scope))
+            row = cursor.fetchone()
+            if not row:
+                return {'at': None, 'id': None}
+            return {'at': row['high_water_at'], 'id': row['high_water_id']}
+        finally:
+            conn.close()
+
+    def set_sync_watermark(self, user_id: str, scope: str, at: Optional[str], record_id: Optional[str] = None) -> None:
+        """
+        保存同步高水位线
+
+        Args:
+            user_id: Supabase 用户 ID
+            scope: 范围
+            at: 时间戳（None 表示清除，下次全量同步）
+            record_id: 同一时间戳下最后处理的云端 ID
+        """
+        conn = self._get_connection()
+        try:
+            self._ensure_watermark_table(conn)
+            conn.execute("""
+                INSERT INTO sync_watermarks (user_id, scope, high_water_at, high_water_id, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(user_id, scope) DO UPDATE SET
+                    high_water_at = excluded.high_water_at,
+                    high_water_id = excluded.high_water_id,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (user_id, scope, at, record_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _extract_cloud_fields(cloud_data: Dict) -> Dict[str, Any]:
+        """从云端记录中提取本地胶囊字段（metadata 优先）"""
+        metadata = cloud_data.get('metadata', {})
+        if isinstance(metadata, dict):
+            return {
+                'preview_audio': metadata.get('preview_audio'),
+                'keywords': metadata.get('keywords'),
+                'description': metadata.get('description'),
+                'capsule_type': metadata.get('capsule_type', cloud_data.get('capsule_type', 'magic')),
+            }
+        return {
+            'preview_audio': None,
+            'keywords': cloud_data.get('keywords'),
+            'description': cloud_data.get('description'),
+            'capsule_type': cloud_data.get('capsule_type', 'magic'),
+        }
+
+    @staticmethod
+    def _detect_cloud_asset_status(export_dir: Optional[Path], file_path: str) -> str:
+        """新建胶囊时检测本地是否已有完整资产（Audio/*.wav）"""
+        if export_dir is None or not file_path:
+            return 'cloud_only'
+        audio_dir = export_dir / file_path / "Audio"
+        if audio_dir.exists() and any(audio_dir.glob("*.wav")):
+            return 'local'
+        # 只有预览文件（OGG）保持 cloud_only，local 意味着有完整的 Audio/WAV 文件
+        return 'cloud_only'
+
+    def reconcile_cloud_capsules(self, cloud_capsules: List[Dict]) -> Dict[str, Any]:
+        """
+        批量将云端胶囊合并到本地（单连接、单事务）
+
+        一次查询载入 cloud_id / uuid / name -> 本地 ID 映射，按
+        cloud_id -> uuid -> name 的顺序匹配，然后用 executemany 批量更新和插入。
+        匹配与字段规则与 _update_local_capsule_metadata / _create_local_capsule_from_cloud 一致：
+        - 云端 preview_audio 为空时保留本地值
+        - 按云端 file_path（没有时为名称）刷新本地文件夹路径，云端重命名后不会留下旧路径
+        - 不覆盖 asset_status；已关联胶囊不覆盖 cloud_status
+        - 通过 uuid / name 关联的胶囊写入 cloud_id 并标记 synced
+
+        Args:
+            cloud_capsules: 云端胶囊记录列表
+
+        Returns:
+            {'created': int, 'updated': int, 'linked': int, 'created_ids': [...]}
+        """
+        result = {'created': 0, 'updated': 0, 'linked': 0, 'created_ids': []}
+        if not cloud_capsules:
+            return result
+
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name, uuid, cloud_id, preview_audio FROM capsules ORDER BY id")
+            by_cloud_id, by_uuid, by_name, local_preview = {}, {}, {}, {}
+            for row in cursor.fetchall():
+                if row['cloud_id']:
+                    by_cloud_id.setdefault(row['cloud_id'], row['id'])
+                if row['uuid']:
+                    by_uuid.setdefault(row['uuid'], row['id'])
+                if row['name'] and not row['cloud_id']:
+                    # 只有未关联云端的本地胶囊参与名称匹配
+                    by_name.setdefault(row['name'], row['id'])
+                local_preview[row['id']] = row['preview_audio']
+
+            updates = []   # 已关联：只更新元数据
+            links = []     # 新关联：元数据 + cloud_id
+            inserts = []
+            export_dir = None
+
+            for cloud_data in cloud_capsules:
+                cloud_id = cloud_data.get('id')
+                cloud_name = cloud_data.get('name')
+                cloud_uuid = cloud_data.get('uuid', str(cloud_id))
+                fields = self._extract_cloud_fields(cloud_data)
+                owner_id = cloud_data.get('user_id')
+                cloud_file_path = cloud_data.get('file_path') or cloud_name
+
+                local_id = by_cloud_id.get(cloud_id)
+                if local_id is not None:
+                    updates.append((
+                        cloud_name, fields['capsule_type'], fields['keywords'], fields['description'],
+                        fields['preview_audio'] or local_preview.get(local_id),
+                        cloud_file_path, owner_id, now, local_id
+                    ))
+                    continue
+
+                # 🔥 cloud_id 匹配失败时按 uuid / name 关联（防止本地扫描的胶囊重复插入）
+                local_id = by_uuid.get(cloud_uuid) if cloud_uuid else None
+                if local_id is None and cloud_name:
+                    local_id = by_name.get(cloud_name)
+
+                if local_id is not None:
+                    links.append((
+                        cloud_name, fields['capsule_type'], fields['keywords'], fields['description'],
+                        fields['preview_audio'] or local_preview.get(local_id),
+                        cloud_file_path, cloud_id, owner_id, now, local_id
+                    ))
+                    by_cloud_id[cloud_id] = local_id
+                    by_name.pop(cloud_name, None)
+                    continue
+
+                if export_dir is None and not inserts:
+                    try:
+                        from common import PathManager
+                        export_dir = Path(PathManager.get_instance().export_dir)
+                    except Exception as e:
+                        logger.warning(f"   ⚠️ 检测本地文件失败: {e}")
+                inserts.append((
+                    cloud_uuid,  # 使用云端 ID 作为 uuid
+                    cloud_name,
+                    fields['capsule_type'],
+                    fields['keywords'],
+                    fields['description'],
+                    fields['preview_audio'],
+                    cloud_file_path,  # 文件路径默认为 name
+                    f"{cloud_name}.rpp" if cloud_name else None,  # rpp_file 默认命名规则
+                    cloud_id,
+                    self._detect_cloud_asset_status(export_dir, cloud_file_path),
+                    owner_id,
+                    cloud_data.get('created_at'),
+                    now
+                ))
+
+            if updates:
+                cursor.executemany("""
+                    UPDATE capsules
+                    SET name = ?, capsule_type = ?, keywords = ?, description = ?,
+                        preview_audio = ?, file_path = COALESCE(?, file_path),
+                        owner_supabase_user_id = ?, updated_at = ?
+                    WHERE id = ?
+                """, updates)
+
+            if links:
+                # 🔥 同时设置 audio_uploaded = 1，因为云端已有完整数据
+                cursor.executemany("""
+                    UPDATE capsules
+                    SET name = ?, capsule_type = ?, keywords = ?, description = ?,
+                        preview_audio = ?, file_path = COALESCE(?, file_path),
+                        cloud_id = ?, cloud_status = 'synced',
+                        audio_uploaded = 1, owner_supabase_user_id = ?, updated_at = ?
+                    WHERE id = ?
+                """, links)
+
+            if inserts:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) FROM capsules")
+                max_id_before = cursor.fetchone()[0]
+                # 🔥 audio_uploaded = 1，因为从云端同步的胶囊，Audio 已在云端
+                cursor.executemany("""
+                    INSERT INTO capsules (
+                        uuid, name, capsule_type, keywords, description, preview_audio, file_path,
+                        rpp_file,
+                        cloud_id, cloud_status, asset_status, audio_uploaded,
+                        owner_supabase_user_id,
+                        created_at, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'synced', ?, 1, ?, ?, ?)
+                """, inserts)
+                cursor.execute("SELECT id FROM capsules WHERE id > ? ORDER BY id", (max_id_before,))
+                result['created_ids'] = [row[0] for row in cursor.fetchall()]
+
+            conn.commit()
+
+            result['updated'] = len(updates)
+            result['linked'] = len(links)
+            result['created'] = len(inserts)
+            return result
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _reconcile_with_fallback(self, cloud_capsules: List[Dict]) -> Dict[str, Any]:
+        """
+        合并一批云端胶囊：先整批一个事务，失败时逐条合并并跳过出错的记录
+
+        Returns:
+            reconcile_cloud_capsules 的结果，外加 'failed': [{'id', 'name', 'error'}, ...]
+
+        Raises:
+            sqlite3.OperationalError: 数据库本身不可用（锁定 / 只读 / I/O 错误），不是某条记录的问题
+        """
+        try:
+            merged = self.reconcile_cloud_capsules(cloud_capsules)
+            merged['failed'] = []
+            return merged
+        except sqlite3.OperationalError:
+            raise
+        except Exception as e:
+            logger.warning(f"   ⚠️ 整批合并 {len(cloud_capsules)} 个云端胶囊失败，改为逐条合并: {e}")
+
+        merged = {'created': 0, 'updated': 0, 'linked': 0, 'created_ids': [], 'failed': []}
+        for cloud_data in cloud_capsules:
+            try:
+                single = self.reconcile_cloud_capsules([cloud_data])
+            except sqlite3.OperationalError:
+                raise
+            except Exception as e:
+                merged['failed'].append({
+                    'id': cloud_data.get('id'), 'name': cloud_data.get('name'), 'error': str(e)
+                })
+                continue
+            for key in ('created', 'updated', 'linked'):
+                merged[key] += single[key]
+            merged['created_ids'].extend(single['created_ids'])
+        return merged
+
+    def _download_capsule_delta(self, supabase, user_id: str, full: bool = False) -> Dict[str, Any]:
+        """
+        按高水位线增量下载云端胶囊并合并到本地
+
+        - 按 (updated_at, id) 游标分页，每页处理完成后推进高水位线（中途失败下次从断点继续）
+        - 整页合并失败时逐条合并，个别出错的记录记入 sync_failed_records 后跳过，
+          不会让一条坏数据永远卡住水位线；数据库本身出错（锁定 / 只读）时保留水位线
+        - 按 (deleted_at, id) 游标分页查询墓碑检测云端删除，本地标记 cloud_status = 'deleted'
+
+        Args:
+            supabase: SupabaseClient 实例
+            user_id: Supabase 用户 ID
+            full: 忽略高水位线，全量下载
+
+        Returns:
+            {'changed': int, 'created': int, 'deleted': int, 'skipped': int, 'pages': int, 'errors': [...]}
+        """
+        result = {'changed': 0, 'created': 0, 'deleted': 0, 'skipped': 0, 'pages': 0, 'errors': []}
+
+        watermark = {'at': None, 'id': None} if full else self.get_sync_watermark(user_id, 'capsules')
+        if watermark['at']:
+            logger.info(f"   增量同步：自 {watermark['at']} 之后的变更")
+        else:
+            logger.info("   首次同步：全量下载")
+
+        after_at, after_id = watermark['at'], watermark['id']
+        while True:
+            page = supabase.download_capsules_page(
+                user_id, after_updated_at=after_at, after_id=after_id,
+                page_size=self.DELTA_PAGE_SIZE
+            )
+            if page is None:
+                result['errors'].append("下载云端胶囊失败（已保留上次的同步位置）")
+                break
+            if not page:
+                break
+
+            result['pages'] += 1
+            try:
+                merged = self._reconcile_with_fallback(page)
+            except sqlite3.OperationalError as e:
+                # 本地数据库问题：保留水位线，下次从本页开始重试
+                error_msg = f"合并 {len(page)} 个云端胶囊失败: {e}"
+                result['errors'].append(error_msg)
+                logger.error(f"   ✗ {error_msg}")
+                break
+
+            try:
+                self._record_sync_failures(user_id, 'capsules', [c.get('id') for c in page], merged['failed'])
+            except Exception as e:
+                logger.warning(f"   ⚠️ 记录同步失败的胶囊失败: {e}")
+            for failed in merged['failed']:
+                error_msg = f"跳过云端胶囊 {failed['name']} ({failed['id']}): {failed['error']}"
+                result['errors'].append(error_msg)
+                logger.error(f"   ✗ {error_msg}")
+
+            result['created'] += merged['created']
+            result['changed'] += len(page) - len(merged['failed'])
+            result['skipped'] += len(merged['failed'])
+            if merged['linked']:
+                logger.info(f"   ℹ️ 通过 uuid / 名称关联 cloud_id: {merged['linked']} 个")
+
+            after_at, after_id = page[-1].get('updated_at'), page[-1].get('id')
+            self.set_sync_watermark(user_id, 'capsules', after_at, after_id)
+
+            if len(page) < self.DELTA_PAGE_SIZE:
+                break
+
+        # 墓碑：云端软删除的胶囊
+        tomb_mark = {'at': None, 'id': None} if full else self.get_sync_watermark(user_id, 'capsules_deleted')
+        after_at, after_id = tomb_mark['at'], tomb_mark['id']
+        while True:
+            tombstones = supabase.download_deleted_capsules_page(
+                user_id, after_deleted_at=after_at, after_id=after_id,
+                page_size=self.DELTA_PAGE_SIZE
+            )
+            if tombstones is None:
+                result['errors'].append("查询云端已删除胶囊失败")
+                break
+            if not tombstones:
+                break
+
+            result['deleted'] += self._mark_cloud_deleted([t['id'] for t in tombstones])
+            after_at, after_id = tombstones[-1].get('deleted_at'), tombstones[-1].get('id')
+            self.set_sync_watermark(user_id, 'capsules_deleted', after_at, after_id)
+
+            if len(tombstones) < self.DELTA_PAGE_SIZE:
+                break
+
+        if result['deleted']:
+            logger.info(f"   🗑️  云端已删除 {result['deleted']} 个胶囊，已标记为 deleted")
+
+        return result
+
+    def _mark_cloud_deleted(self, cloud_ids: List[str]) -> int:
+        """
+        将云端已删除的胶囊标记为 cloud_status = 'deleted'（不删除本地数据）
+
+        Returns:
+            标记的本地胶囊数量
+        """
+        if not cloud_ids:
+            return 0
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            marked = 0
+            for i in range(0, len(cloud_ids), 500):
+                chunk = cloud_ids[i:i + 500]
+                placeholders = ",".join(["?"] * len(chunk))
+                cursor.execute(f"""
+                    UPDATE capsules SET cloud_status = 'deleted'
+                    WHERE cloud_id IN ({placeholders}) AND cloud_status != 'deleted'
+                """, chunk)
+                marked += cursor.rowcount
+            conn.commit()
+            return marked
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"   ⚠️  标记云端已删除胶囊失败: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def _download_tag_delta(self, supabase, user_id: str, full: bool = False) -> Dict[str, Any]:
+        """
+        批量同步云端标签（替代逐个胶囊调用 sync_tags_from_cloud）
+
+        1. 按 (updated_at, id) 游标分页拉取高水位线之后变更的标签，只记录变更的胶囊
+           （一页里的标签不一定是该胶囊的完整集合，不能直接拿来替换本地标签）
+        2. 按 (deleted_at, capsule_id) 游标拉取标签删除墓碑，云端删了标签的胶囊同样算作变更
+        3. 本地有 cloud_id 但没有标签的胶囊（如刚从云端新建）也重新拉取
+        4. 对这些胶囊用 IN 查询下载完整标签集合；云端已无标签的胶囊按空集合处理
+        5. 与本地标签集合哈希比对，只对真正变化的胶囊在一个事务内应用差异
+        6. 全部成功后推进高水位线
+
+        Args:
+            supabase: SupabaseClient 实例
+            user_id: Supabase 用户 ID
+            full: 忽略高水位线，全量拉取
+
+        Returns:
+            {'capsules': int, 'updated': int, 'skipped': int, 'rows': int, 'pages': int,
+             'synced_ids': set(本地胶囊 ID，云端有标签), 'errors': [...]}
+        """
+        from capsule_db import get_database, _normalize_tag_rows, _tag_set_hash
+
+        result = {'capsules': 0, 'updated': 0, 'skipped': 0, 'rows': 0, 'pages': 0,
+                  'synced_ids': set(), 'errors': []}
+
+        watermark = {'at': None, 'id': None} if full else self.get_sync_watermark(user_id, 'capsule_tags')
+        after_at, after_id = watermark['at'], watermark['id']
+
+        # 1. 分页拉取变更的标签，只取胶囊 ID
+        changed_cloud_ids = set()
+        while True:
+            page = supabase.download_tags_page(after_updated_at=after_at, after_id=after_id,
+                                               page_size=self.TAG_PAGE_SIZE)
+            if page is None:
+                result['errors'].append("下载云端标签失败（已保留上次的同步位置）")
+                return result
+            if not page:
+                break
+
+            result['pages'] += 1
+            changed_cloud_ids.update(tag.get('capsule_id') for tag in page)
+
+            after_at, after_id = page[-1].get('updated_at'), page[-1].get('id')
+            if len(page) < self.TAG_PAGE_SIZE:
+                break
+
+        # 2. 标签删除墓碑（全量模式下所有胶囊都会重新拉取，只需要推进位置）
+        tomb_mark = {'at': None, 'id': None} if full else self.get_sync_watermark(user_id, 'capsule_tags_deleted')
+        tomb_at, tomb_id = tomb_mark['at'], tomb_mark['id']
+        while True:
+            tombstones = supabase.download_tag_deletions_page(
+                after_deleted_at=tomb_at, after_capsule_id=tomb_id, page_size=self.TAG_PAGE_SIZE
+            )
+            if tombstones is None:
+                result['errors'].append("下载云端标签删除记录失败（已保留上次的同步位置）")
+                return result
+            if not tombstones:
+                break
+
+            changed_cloud_ids.update(t.get('capsule_id') for t in tombstones)
+            tomb_at, tomb_id = tombstones[-1].get('deleted_at'), tombstones[-1].get('capsule_id')
+            if len(tombstones) < self.TAG_PAGE_SIZE:
+                break
+
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT c.id, c.cloud_id,
+                       EXISTS (SELECT 1 FROM capsule_tags t WHERE t.capsule_id = c.id) AS has_tags
+                FROM capsules c
+                WHERE c.cloud_id IS NOT NULL
+            """)
+            local_rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        local_by_cloud = {row['cloud_id']: row['id'] for row in local_rows}
+
+        # 3. 本地无标签的胶囊（增量模式下它们的标签可能早于水位线）
+        if full:
+            refetch = set(local_by_cloud)
+        else:
+            refetch = {cloud_id for cloud_id in changed_cloud_ids if cloud_id in local_by_cloud}
+            refetch.update(row['cloud_id'] for row in local_rows if not row['has_tags'])
+
+        # 4. 下载完整标签集合
+        cloud_groups: Dict[str, List[Dict]] = {cloud_id: [] for cloud_id in refetch}
+        if refetch:
+            tags = supabase.download_tags_for_capsules(sorted(refetch))
+            if tags is None:
+                result['errors'].append("下载变更胶囊的云端标签失败（已保留上次的同步位置）")
+                return result
+            result['rows'] = len(tags)
+            for tag in tags:
+                if tag.get('capsule_id') in cloud_groups:
+                    cloud_groups[tag['capsule_id']].append(tag)
+
+        # 5. 哈希比对，只应用有变化的胶囊
+        cloud_tags_by_local: Dict[int, List[Dict]] = {}
+        for cloud_id, tags in cloud_groups.items():
+            cloud_tags_by_local[local_by_cloud[cloud_id]] = [{
+                'lens': tag.get('lens_id') or tag.get('lens'),  # 兼容不同字段名
+                'word_id': tag.get('word_id'),
+                'word_cn': tag.get('word_cn'),
+                'word_en': tag.get('word_en'),
+                'x': tag.get('x'),
+                'y': tag.get('y'),
+            } for tag in tags]
+
+        result['capsules'] = len(cloud_tags_by_local)
+        result['synced_ids'] = {cid for cid, tags in cloud_tags_by_local.items() if tags}
+
+        db = get_database(self.db_path)
+        if cloud_tags_by_local:
+            local_hashes = db.get_capsule_tag_hashes(list(cloud_tags_by_local))
+            changed = {
+                cid: tags for cid, tags in cloud_tags_by_local.items()
+                if _tag_set_hash(_normalize_tag_rows(cid, tags)) != local_hashes.get(cid)
+            }
+            result['skipped'] = len(cloud_tags_by_local) - len(changed)
+
+            if changed:
+                try:
+                    # 来自云端的标签不需要再标记待同步
+                    db.bulk_update_capsule_tags(changed, mark_sync=False)
+                    result['updated'] = len(changed)
+                except Exception as e:
+                    result['errors'].append(f"应用云端标签失败: {e}")
+                    return result
+
+        # 6. 推进高水位线
+        if after_at and (after_at, after_id) != (watermark['at'], watermark['id']):
+            self.set_sync_watermark(user_id, 'capsule_tags', after_at, after_id)
+        if tomb_at and (tomb_at, tomb_id) != (tomb_mark['at'], tomb_mark['id']):
+            self.set_sync_watermark(user_id, 'capsule_tags_deleted', tomb_at, tomb_id)
+
+        return result
+
+    def download_only(self, user_id: str, include_previews: bool = True, full: bool = False) -> Dict[str, Any]:
         """
         仅下载模式：只从云端下载数据，不上传本地变更
 
-        用途：启动同步（BootSync），避免每次启动都上传本地数据
+        用途：启动同步（BootSync），避免每次启动都上传本地数据。
+        胶囊元数据按高水位线增量下载，启动开销与变更量成正比，而不是与库大小成正比。
 
         Args:
             user_id: Supabase 用户 ID
             include_previews: 是否自动下载预览音频（默认 True）
+            full: 忽略高水位线，全量下载（默认 False）
 
         Returns:
             同步结果：{
@@ -1026,12 +1674,17 @@ class SyncService:
         """
         import time
         from supabase_client import get_supabase_client
+        from preview_prefetch import get_prefetch_config
 
         start_time = time.time()
         errors = []
         downloaded_count = 0
+        deleted_count = 0
         preview_downloaded = 0
 
+        # 关闭 boot_sync_previews 后，预览改由预取服务按前端提示（可见胶囊 / 最近搜索）下载
+        include_previews = include_previews and get_prefetch_config()['boot_sync_previews']
+
         logger.info("=" * 60)
         logger.info("🔄 仅下载模式（启动同步）")
         logger.info("=" * 60)
@@ -1044,42 +1697,15 @@ class SyncService:
             logger.info("📥 步骤 1: 下载全球胶囊元数据...")
             supabase = get_supabase_client()
             if supabase:
-                cloud_capsules = supabase.download_capsules(user_id)
-
-                if cloud_capsules:
-                    logger.info(f"   发现 {len(cloud_capsules)} 个全球胶囊")
-
-                    for cloud_capsule in cloud_capsules:
-                        try:
-                            # 检查本地是否存在（多级匹配：cloud_id -> name）
-                            local_capsule = self._get_local_capsule_by_cloud_id(cloud_capsule['id'])
-                            
-                            # 🔥 如果 cloud_id 匹配失败，尝试用 name 匹配（防止本地扫描的胶囊未关联）
-                            if not local_capsule:
-                                local_capsule = self._get_local_capsule_by_name(cloud_capsule['name'])
-                                if local_capsule:
-                                    # 关联 cloud_id
-                                    self._set_capsule_cloud_id(local_capsule['id'], cloud_capsule['id'])
-                                    logger.info(f"   ℹ️ 通过名称匹配并关联 cloud_id: {cloud_capsule['name']}")
-
-                            if local_capsule:
-                                # 更新本地元数据（不覆盖本地修改）
-                                self._update_local_capsule_metadata(local_capsule['id'], cloud_capsule)
-                                owner_id = cloud_capsule.get('user_id', 'unknown')[:8]
-                                logger.info(f"   ✓ 更新胶囊 {cloud_capsule['name']} (by {owner_id}...)")
-                            else:
-                                # 创建新胶囊（仅元数据）
-                                new_capsule_id = self._create_local_capsule_from_cloud(cloud_capsule)
-                                owner_id = cloud_capsule.get('user_id', 'unknown')[:8]
-                                logger.info(f"   ✓ 新增胶囊 {cloud_capsule['name']} (by {owner_id}...)")
-                                downloaded_count += 1
+                delta = self._download_capsule_delta(supabase, user_id, full=full)
+                downloaded_count += delta['created']
+                deleted_count = delta['deleted']
+                errors.extend(delta['errors'])
 
-                        except Exception as e:
-                            error_msg = f"同步胶囊 {cloud_capsule.get('name', 'Unknown')} 失败: {e}"
-                            errors.append(error_msg)
-                            logger.error(f"   ✗ {error_msg}")
+                if delta['changed']:
+                    logger.info(f"   变更 {delta['changed']} 个胶囊（新增 {delta['created']}，{delta['pages']} 页）")
                 else:
-                    logger.info("   云端暂无胶囊数据")
+                    logger.info("   云端无新变更")
             else:
                 logger.warning("   ⚠️  Supabase 客户端未初始化，跳过云端下载")
 
@@ -1107,120 +1733,125 @@ class SyncService:
             if local_capsules:
                 logger.info(f"   检查 {len(local_capsules)} 个胶囊的轻量资产...")
 
-                for idx, cap in enumerate(local_capsules, 1):
-                    cap_id, cap_name, cap_uuid, preview_audio, cloud_status, asset_status, owner_id, cloud_id, cap_file_path = cap
+                # 准备本地路径 - 从 PathManager 获取导出目录
+                from common import PathManager
+                pm = PathManager.get_instance()
+                export_dir = pm.export_dir
+                logger.info(f"   使用导出目录: {export_dir}")
 
-                    # 准备本地路径 - 从 PathManager 获取导出目录
-                    from common import PathManager
-                    pm = PathManager.get_instance()
-                    export_dir = pm.export_dir
-                    logger.info(f"   使用导出目录: {export_dir}")
+                # 2a. 扫描本地文件，收集缺失的轻量资产（只访问本地文件系统）
+                capsule_dirs = {}
+                from http_pool import PRIORITY_BULK
+                fetch_jobs = []
+                for cap in local_capsules:
+                    cap_id, cap_name, cap_uuid, preview_audio, cloud_status, asset_status, owner_id, cloud_id, cap_file_path = cap
 
                     capsule_rel_path = cap_file_path or cap_name
                     capsule_dir = Path(export_dir) / capsule_rel_path
-
-                    # ✅ 状态自愈：如果本地有 Audio 文件夹，更新 asset_status
-                    if self._has_local_audio_files(capsule_dir):
-                        if self._update_asset_status_if_needed(cap_id, asset_status, 'local'):
-                            logger.info(f"   ✨ 检测到本地音频，修正资产状态: {cap_name} -> local")
-                        asset_status = 'local'
-                    needs_download = []
+                    capsule_dirs[cap_id] = capsule_dir
 
                     try:
+                        # ✅ 状态自愈：如果本地有 Audio 文件夹，更新 asset_status
+                        if self._has_local_audio_files(capsule_dir):
+                            if self._update_asset_status_if_needed(cap_id, asset_status, 'local'):
+                                logger.info(f"   ✨ 检测到本地音频，修正资产状态: {cap_name} -> local")
+
+                        needs_download = []
+
                         # 检查 metadata.json 文件
-                        metadata_path = capsule_dir / "metadata.json"
-                        if not metadata_path.exists():
+                        if not (capsule_dir / "metadata.json").exists():
                             needs_download.append(('metadata', 'metadata.json'))
-                        
-                        # 检查 OGG 预览文件
-                        if preview_audio:
-                            ogg_path = capsule_dir / preview_audio
-                            if not ogg_path.exists():
-                                needs_download.append(('preview', preview_audio))
+
+                        # 检查 OGG 预览文件（关闭时由预览预取服务按前端提示下载）
+                        if include_previews and preview_audio and not (capsule_dir / preview_audio).exists():
+                            needs_download.append(('preview', preview_audio))
 
                         # 检查 RPP 项目文件（使用胶囊名称）
                         rpp_filename = f"{cap_name}.rpp"
-                        rpp_path = capsule_dir / rpp_filename
-                        if not rpp_path.exists():
+                        if not (capsule_dir / rpp_filename).exists():
                             needs_download.append(('rpp', rpp_filename))
 
-                        # 下载缺失的文件
                         if needs_download and owner_id:
-                            if not supabase:
-                                logger.warning(f"   ⚠️  Supabase 客户端未初始化，跳过文件下载")
-                                break
-
-                            for file_type, filename in needs_download:
-                                try:
-                                    print(f"   [{idx}/{len(local_capsules)}] 下载 {filename}", end='\r')
-
-                                    # 构建本地路径
-                                    local_path = capsule_dir / filename
-
-                                    # 确保目录存在
-                                    capsule_dir.mkdir(parents=True, exist_ok=True)
+                            # 注意：云端文件夹使用胶囊名称，而不是 uuid
+                            fetch_jobs.append({
+                                'capsule_id': cap_id,
+                                'owner_id': owner_id,
+                                'folder': cap_name,
+                                'local_dir': capsule_dir,
+                                'files': needs_download,
+                                # 启动同步是后台下载：不占用试听预览的交互带宽
+                                'priority': PRIORITY_BULK,
+                            })
+                    except Exception as e:
+                        error_msg = f"检查 {cap_name} 资产失败: {e}"
+                        errors.append(error_msg)
+                        logger.error(f"   ✗ {error_msg}")
 
-                                    # 调用下载
-                                    # 注意：云端文件夹使用胶囊名称，而不是 uuid
-                                    success = supabase.download_file(
-                                        user_id=owner_id,
-                                        capsule_folder_name=cap_name,
-                                        file_type=file_type,
-                                        local_path=str(local_path)
-                                    )
+                # 2b. 并发下载缺失文件
+                if fetch_jobs:
+                    if supabase:
+                        from asset_fetcher import get_asset_fetcher
+                        logger.info(f"   并发下载 {len(fetch_jobs)} 个胶囊的缺失文件...")
+                        fetched = get_asset_fetcher(supabase, self.db_path).fetch_all(fetch_jobs)
+                        preview_downloaded += sum(
+                            1 for file_types in fetched['downloaded'].values() if 'preview' in file_types
+                        )
+                        for error in fetched['errors']:
+                            errors.append(f"下载 {error} 失败")
+                        logger.info(
+                            f"   ✓ 下载 {fetched['files_downloaded']} 个文件"
+                            f"（{fetched['bytes'] / 1048576:.1f} MB, "
+                            f"{fetched['bytes_per_sec'] / 1048576:.2f} MB/s, "
+                            f"{fetched['requests']} 次请求, 云端缺失 {fetched['files_missing']} 个）"
+                        )
+                    else:
+                        logger.warning(f"   ⚠️  Supabase 客户端未初始化，跳过文件下载")
+
+                # 2c. 批量同步云端 Tags（一次分页查询 + 一个本地事务）
+                tags_from_cloud = False
+                if supabase:
+                    logger.info("   🏷️  批量拉取云端 Tags...")
+                    tag_delta = self._download_tag_delta(supabase, user_id, full=full)
+                    if tag_delta['errors']:
+                        errors.extend(tag_delta['errors'])
+                    else:
+                        tags_from_cloud = True
+                        logger.info(
+                            f"   ✓ Tags: {tag_delta['rows']} 行 / {tag_delta['capsules']} 个胶囊, "
+                            f"更新 {tag_delta['updated']}, 未变化 {tag_delta['skipped']}"
+                        )
+
+                conn = self._get_connection()
+                try:
+                    tagged_ids = {row[0] for row in conn.execute("SELECT DISTINCT capsule_id FROM capsule_tags")}
+                finally:
+                    conn.close()
 
-                                    if success:
-                                        if file_type == 'preview':
-                                            preview_downloaded += 1
-                                        logger.info(f"   ✓ [{idx}/{len(local_capsules)}] {filename}")
-                                    else:
-                                        logger.warning(f"   ✗ [{idx}/{len(local_capsules)}] {filename} 下载失败")
+                # 2d. metadata.json 兜底导入 Tags，写入技术元数据
+                from tags_service import get_tags_service
+                tags_service = get_tags_service()
 
-                                except Exception as e:
-                                    error_msg = f"下载 {cap_name}/{filename} 失败: {e}"
-                                    errors.append(error_msg)
-                                    logger.error(f"   ✗ {error_msg}")
+                for cap in local_capsules:
+                    cap_id, cap_name, cap_uuid, preview_audio, cloud_status, asset_status, owner_id, cloud_id, cap_file_path = cap
+                    metadata_path = capsule_dirs[cap_id] / "metadata.json"
 
-                        # 🏷️ 处理 Tags：优先使用云端数据库，文件作为备份
-                        try:
-                            from tags_service import get_tags_service
-                            tags_service = get_tags_service()
-                            
-                            # 使用已解包的 cloud_id 变量
-                            if cloud_id and supabase:
-                                # 尝试从云端数据库拉取 Tags
-                                logger.info(f"   🏷️  尝试从云端数据库拉取 Tags...")
-                                tags_synced = tags_service.sync_tags_from_cloud(cap_id, cloud_id)
-                                
-                                if tags_synced:
-                                    logger.info(f"   ✓ Tags 已从云端同步")
-                                else:
-                                    # 如果云端没有 Tags，尝试从 metadata.json 导入
-                                    metadata_path = capsule_dir / "metadata.json"
-                                    if metadata_path.exists():
-                                        logger.info(f"   ⚠️  云端无 Tags，尝试从 metadata.json 导入...")
-                                        tags_service.merge_tags_from_metadata(cap_id, metadata_path)
+                    # 🏷️ 云端没有 Tags（或离线）时，从 metadata.json 导入
+                    try:
+                        if cap_id not in tagged_ids and metadata_path.exists():
+                            if cloud_id and tags_from_cloud:
+                                logger.info(f"   ⚠️  {cap_name}: 云端无 Tags，尝试从 metadata.json 导入...")
                             else:
-                                # 离线模式：从 metadata.json 导入
-                                metadata_path = capsule_dir / "metadata.json"
-                                if metadata_path.exists():
-                                    logger.info(f"   ℹ️  离线模式，从 metadata.json 导入 Tags...")
-                                    tags_service.merge_tags_from_metadata(cap_id, metadata_path)
-                        except Exception as e:
-                            logger.warning(f"   ⚠️  Tags 处理失败: {e}")
-
-                        # 📊 处理技术元数据：从 metadata.json 写入 capsule_metadata 表
-                        try:
-                            metadata_path = capsule_dir / "metadata.json"
-                            if metadata_path.exists():
-                                self._save_metadata_to_db(cap_id, metadata_path)
-                        except Exception as e:
-                            logger.warning(f"   ⚠️  元数据写入失败: {e}")
+                                logger.info(f"   ℹ️  {cap_name}: 离线模式，从 metadata.json 导入 Tags...")
+                            tags_service.merge_tags_from_metadata(cap_id, metadata_path)
+                    except Exception as e:
+                        logger.warning(f"   ⚠️  Tags 处理失败: {e}")
 
+                    # 📊 处理技术元数据：从 metadata.json 写入 capsule_metadata 表
+                    try:
+                        if metadata_path.exists():
+                            self._save_metadata_to_db(cap_id, metadata_path)
                     except Exception as e:
-                        error_msg = f"检查 {cap_name} 资产失败: {e}"
-                        errors.append(error_msg)
-                        logger.error(f"   ✗ {error_msg}")
+                        logger.warning(f"   ⚠️  元数据写入失败: {e}")
 
                 logger.info("")
                 logger.info(f"   ✓ 预览音频下载: {preview_downloaded} 个")
@@ -1243,6 +1874,7 @@ class SyncService:
         logger.info("📊 仅下载完成")
         logger.info("=" * 60)
         logger.info(f"下载胶囊数: {downloaded_count}")
+        logger.info(f"云端已删除: {deleted_count}")
         logger.info(f"预览音频下载: {preview_downloaded}")
         logger.info(f"错误数量: {len(errors)}")
         logger.info(f"耗时: {duration:.2f} 秒")
@@ -1259,6 +1891,7 @@ class SyncService:
         return {
             'success': len(errors) == 0,
             'downloaded_count': downloaded_count,
+            'deleted_count': deleted_count,
             'preview_downloaded': preview_downloaded,
             'errors': errors,
             'duration_seconds': duration
@@ -1266,19 +1899,28 @@ class SyncService:
 
     # ========== Phase B.4: 轻量级同步（元数据 + 预览音频） ==========
 
-    def sync_metadata_lightweight(self, user_id: str, include_previews: bool = True, capsule_ids: list = None) -> Dict[str, Any]:
+    def sync_metadata_lightweight(self, user_id: str, include_previews: bool = True, capsule_ids: list = None,
+                                  force_upload: bool = False, upload_only: bool = False) -> Dict[str, Any]:
         """
         轻量级同步：仅同步元数据 + 预览音频（可选）
 
+        上传前按子资源（metadata / files / tags / audio）计算内容哈希，
+        与上次成功上传的哈希相同的子资源直接跳过，整颗胶囊未变化时不发任何请求。
+
         Args:
             user_id: Supabase 用户 ID
             include_previews: 是否自动下载预览音频（默认 True）
             capsule_ids: 指定要同步的胶囊 ID 列表（可选，为 None 则同步所有）
+            force_upload: 忽略内容哈希，重新上传全部子资源（默认 False）
+            upload_only: 只执行步骤 1 上传，跳过云端下载和资产检查（默认 False）
 
         Returns:
             同步结果：{
                 'success': bool,
                 'synced_count': int,
+                'unchanged_count': int,
+                'avoided_requests': int,
+                'avoided_bytes': int,
                 'preview_downloaded': int,
                 'errors': List[str],
                 'duration_seconds': float
@@ -1286,11 +1928,17 @@ class SyncService:
         """
         import time
         from supabase_client import get_supabase_client
+        from sync_content_hash import ContentHashTracker
 
         start_time = time.time()
         errors = []
         synced_count = 0
+        unchanged_count = 0
+        avoided = {'bytes': 0, 'requests': 0}
         preview_downloaded = 0
+        hash_tracker = ContentHashTracker(self.db_path)
+        # 此流程会上传的子资源（坐标由标签推导，不单独上传）
+        upload_resources = ('metadata', 'files', 'tags', 'audio')
 
         print("=" * 60)
         print("🔄 轻量级同步开始")
@@ -1348,26 +1996,66 @@ class SyncService:
                         print(f"   🔍 [DEBUG] 胶囊名称: {capsule_name}")
                         print(f"   🔍 [DEBUG] 胶囊目录: {capsule_dir}")
 
+                        from common import PathManager
+                        pm = PathManager.get_instance()
+                        full_capsule_dir = pm.export_dir / capsule_dir
+
+                        # #️⃣ 内容哈希：与上次成功上传的哈希比较，只上传变化的子资源
+                        current_hashes = hash_tracker.compute(
+                            capsule_data, full_capsule_dir if full_capsule_dir.exists() else None
+                        )
+                        if force_upload or not capsule_data.get('cloud_id'):
+                            changed = set(upload_resources)
+                        else:
+                            changed = set(hash_tracker.changed_resources(
+                                current_hashes, hash_tracker.get_uploaded(record_id)
+                            )) & set(upload_resources)
+                        skipped = [r for r in upload_resources if r not in changed]
+                        saved = hash_tracker.savings(current_hashes, skipped)
+                        avoided['bytes'] += saved['bytes']
+                        avoided['requests'] += saved['requests']
+
+                        if not changed:
+                            print(f"   ✓ 内容未变化，跳过上传: {capsule_name}")
+                            self.mark_as_synced('capsules', record_id)
+                            self._mark_capsule_cloud_synced(record_id)
+                            unchanged_count += 1
+                            _set_upload_progress(record_id, {
+                                'status': 'completed',
+                                'stage': '完成',
+                                'percent': 100,
+                                'message': '内容未变化'
+                            })
+                            continue
+
+                        print(f"   #️⃣ 变化的子资源: {', '.join(r for r in upload_resources if r in changed)}")
+                        uploaded_resources = []
+
                         # 上传元数据到 Supabase Database（仅 keywords 更新）
                         print(f"   🔍 [DEBUG] 准备上传元数据到 Database...")
-                        # 🔥 传入胶囊名称，防止切换文件夹后 local_id 变化导致重复上传
-                        existing_cloud = supabase.get_cloud_capsule_by_local_id(user_id, capsule_data.get('id'), capsule_name)
                         result = None
-                        if existing_cloud:
-                            cloud_id = existing_cloud.get('id')
-                            remote_meta = existing_cloud.get('metadata') or {}
-                            remote_keywords = remote_meta.get('keywords') if isinstance(remote_meta, dict) else None
-                            local_keywords = capsule_data.get('keywords')
-                            if local_keywords != remote_keywords:
-                                result = supabase.update_capsule_keywords(user_id, capsule_data.get('id'), local_keywords)
-                            else:
-                                result = existing_cloud
+                        if 'metadata' not in changed:
+                            print(f"   ✓ 元数据未变化，跳过")
+                            result = {'id': capsule_data.get('cloud_id'), 'version': None}
                         else:
-                            result = supabase.upload_capsule(user_id, capsule_data)
+                            # 🔥 传入胶囊名称，防止切换文件夹后 local_id 变化导致重复上传
+                            existing_cloud = supabase.get_cloud_capsule_by_local_id(user_id, capsule_data.get('id'), capsule_name)
+                            if existing_cloud:
+                                cloud_id = existing_cloud.get('id')
+                                remote_meta = existing_cloud.get('metadata') or {}
+                                remote_keywords = remote_meta.get('keywords') if isinstance(remote_meta, dict) else None
+                                local_keywords = capsule_data.get('keywords')
+                                if local_keywords != remote_keywords:
+                                    result = supabase.update_capsule_keywords(user_id, capsule_data.get('id'), local_keywords)
+                                else:
+                                    result = existing_cloud
+                            else:
+                                result = supabase.upload_capsule(user_id, capsule_data)
                         print(f"   🔍 [DEBUG] 元数据上传结果: {result is not None}")
 
                         if result:
                             cloud_id = result.get('id') if result else None
+                            uploaded_resources.append('metadata')
                             print(f"   ✓ 上传胶囊元数据: {capsule_name} (cloud_id={cloud_id})")
                             _set_upload_progress(record_id, {
                                 'status': 'uploading',
@@ -1383,7 +2071,7 @@ class SyncService:
                                 cursor.execute("""
                                     UPDATE capsules
                                     SET cloud_id = ?,
-                                        cloud_version = ?
+                                        cloud_version = COALESCE(?, cloud_version)
                                     WHERE id = ?
                                 """, (cloud_id, result.get('version', 1), record_id))
                                 conn.commit()
@@ -1392,10 +2080,6 @@ class SyncService:
                                 conn.close()
                             
                             # 📁 上传文件到 Supabase Storage（原子化操作）
-                            from common import PathManager
-                            pm = PathManager.get_instance()
-                            full_capsule_dir = pm.export_dir / capsule_dir
-                            
                             print(f"\n   🔍 [DEBUG] ========== 文件上传检查 ==========")
                             print(f"   🔍 [DEBUG] 导出目录: {pm.export_dir}")
                             print(f"   🔍 [DEBUG] 胶囊目录: {capsule_dir}")
@@ -1414,11 +2098,15 @@ class SyncService:
                                     'percent': 15,
                                     'message': '检查本地文件...'
                                 })
+
+                                check_files = 'files' in changed
+                                if not check_files:
+                                    print(f"   ✓ 预览音频 / RPP / metadata.json 未变化，跳过检查")
                                 
                                 # 🎵 上传预览音频
                                 preview_audio = capsule_data.get('preview_audio')
                                 print(f"   🔍 [DEBUG] 预览音频文件名: {preview_audio}")
-                                if preview_audio:
+                                if preview_audio and check_files:
                                     preview_path = full_capsule_dir / preview_audio
                                     print(f"   🔍 [DEBUG] 预览音频路径: {preview_path}")
                                     print(f"   🔍 [DEBUG] 预览音频存在? {preview_path.exists()}")
@@ -1466,7 +2154,7 @@ class SyncService:
                                 # 📄 上传 RPP 项目文件
                                 rpp_file = capsule_data.get('rpp_file')
                                 print(f"   🔍 [DEBUG] RPP 文件名: {rpp_file}")
-                                if rpp_file:
+                                if rpp_file and check_files:
                                     rpp_path = full_capsule_dir / rpp_file
                                     print(f"   🔍 [DEBUG] RPP 路径: {rpp_path}")
                                     print(f"   🔍 [DEBUG] RPP 存在? {rpp_path.exists()}")
@@ -1515,7 +2203,9 @@ class SyncService:
                                 metadata_file = full_capsule_dir / "metadata.json"
                                 print(f"   🔍 [DEBUG] metadata.json 路径: {metadata_file}")
                                 print(f"   🔍 [DEBUG] metadata.json 存在? {metadata_file.exists()}")
-                                if metadata_file.exists():
+                                if not check_files:
+                                    pass
+                                elif metadata_file.exists():
                                     metadata_exists = supabase.storage_file_exists(user_id, capsule_dir, "metadata.json")
                                     if metadata_exists:
                                         print(f"   ✓ metadata.json 已存在于云端，跳过上传")
@@ -1558,7 +2248,9 @@ class SyncService:
                                 audio_folder = full_capsule_dir / "Audio"
                                 print(f"   🔍 [DEBUG] Audio 路径: {audio_folder}")
                                 print(f"   🔍 [DEBUG] Audio 存在? {audio_folder.exists()}")
-                                if audio_folder.exists() and audio_folder.is_dir():
+                                if 'audio' not in changed:
+                                    print(f"   ✓ Audio 文件夹未变化，跳过检查")
+                                elif audio_folder.exists() and audio_folder.is_dir():
                                     audio_files = [
                                         entry for entry in audio_folder.iterdir()
                                         if entry.is_file() and not entry.name.startswith('.')
@@ -1591,28 +2283,11 @@ class SyncService:
                                         else:
                                             print(f"   → 上传 Audio 文件夹（缺失 {len(missing_files)} 个文件）...")
                                             try:
-                                                total_files = len(missing_files)
-
-                                                def _audio_progress(uploaded, total, filename):
-                                                    if total <= 0:
-                                                        percent = 95
-                                                    else:
-                                                        percent = 40 + int((uploaded / total) * 60)
-                                                    _set_upload_progress(record_id, {
-                                                        'status': 'uploading',
-                                                        'stage': '上传 Audio',
-                                                        'percent': min(99, percent),
-                                                        'current_file': filename,
-                                                        'uploaded_files': uploaded,
-                                                        'total_files': total,
-                                                        'message': '上传音频文件...'
-                                                    })
-
                                                 audio_result = supabase.upload_audio_files(
                                                     user_id=user_id,
                                                     capsule_folder_name=capsule_dir,
                                                     audio_files=missing_files,
-                                                    progress_callback=_audio_progress
+                                                    progress_callback=_audio_progress_reporter(record_id, 40, 60)
                                                 )
                                                 if audio_result and audio_result.get('success', False):
                                                     print(f"   ✓ Audio 文件夹上传成功")
@@ -1658,6 +2333,8 @@ class SyncService:
                             
                             # 🔒 关键决断点：只有所有文件都上传成功，才标记为 synced
                             if all_files_uploaded:
+                                uploaded_resources.extend(['files', 'audio'])
+
                                 # 🏷️ 自动上传关键词到 cloud_capsule_tags 表
                                 # 确保其他用户同步后能看到关键词
                                 try:
@@ -1680,7 +2357,9 @@ class SyncService:
                                         })
                                     conn_tags.close()
                                     
-                                    if local_tags and cloud_id:
+                                    if 'tags' not in changed:
+                                        print(f"   ✓ 关键词未变化，跳过")
+                                    elif local_tags and cloud_id:
                                         tag_embeddings = []
                                         try:
                                             from capsule_embedding_service import update_embedding_for_cloud_capsule
@@ -1700,32 +2379,24 @@ class SyncService:
                                         print(f"   🏷️  上传 {len(local_tags)} 个关键词到 cloud_capsule_tags...")
                                         tags_uploaded = supabase.upload_tags(user_id, cloud_id, local_tags, tag_embeddings=tag_embeddings or [])
                                         if tags_uploaded:
+                                            uploaded_resources.append('tags')
                                             print(f"   ✓ 关键词上传成功")
                                         else:
                                             print(f"   ⚠️ 关键词上传失败（不影响胶囊同步状态）")
                                     elif not local_tags:
+                                        uploaded_resources.append('tags')
                                         print(f"   ℹ️  该胶囊暂无关键词")
                                 except Exception as tags_err:
                                     print(f"   ⚠️ 上传关键词异常: {tags_err}（不影响胶囊同步状态）")
                                 
                                 # 更新 sync_status 表
                                 self.mark_as_synced('capsules', record_id)
+                                hash_tracker.mark_uploaded(record_id, uploaded_resources)
                                 
                                 # 🔧 关键修复：同时更新 capsules 表的 cloud_status 字段
                                 # 前端通过 capsule.cloud_status 判断状态，必须更新此字段
-                                conn = self._get_connection()
-                                try:
-                                    cursor = conn.cursor()
-                                    cursor.execute("""
-                                        UPDATE capsules
-                                        SET cloud_status = 'synced',
-                                            last_synced_at = CURRENT_TIMESTAMP
-                                        WHERE id = ?
-                                    """, (record_id,))
-                                    conn.commit()
-                                    print(f"   ✓ 已更新 capsules.cloud_status = 'synced'")
-                                finally:
-                                    conn.close()
+                                self._mark_capsule_cloud_synced(record_id)
+                                print(f"   ✓ 已更新 capsules.cloud_status = 'synced'")
                                 
                                 synced_count += 1
                                 print(f"   ✅ 胶囊 {record_id} 完全同步成功")
@@ -1775,218 +2446,214 @@ class SyncService:
 
             print()
 
-            # 2. 下载云端变更（元数据）
-            print("📥 步骤 2: 下载全球胶囊元数据...")
-            print("   [GLOBAL SYNC] 拉取所有用户的胶囊（仅元数据）")
-            supabase = get_supabase_client()
-            if supabase:
-                # 获取云端所有胶囊的元数据（Phase G: 全球同步）
-                cloud_capsules = supabase.download_capsules(user_id)
+            # 仅上传（自动上传）：跳过步骤 2-4 的全局下载和资产检查
+            if upload_only:
+                print("ℹ️  仅上传模式：跳过云端下载")
+                print()
+            else:
+                # 2. 下载云端变更（元数据）
+                print("📥 步骤 2: 下载全球胶囊元数据...")
+                print("   [GLOBAL SYNC] 拉取所有用户的胶囊（仅元数据）")
+                supabase = get_supabase_client()
+                if supabase:
+                    # 获取云端所有胶囊的元数据（Phase G: 全球同步）
+                    cloud_capsules = supabase.download_capsules(user_id)
 
-                if cloud_capsules:
-                    print(f"   [GLOBAL SYNC] 发现 {len(cloud_capsules)} 个全球胶囊")
+                    if cloud_capsules:
+                        print(f"   [GLOBAL SYNC] 发现 {len(cloud_capsules)} 个全球胶囊")
 
-                    # 统计不同用户的胶囊
-                    user_stats = {}
-                    for cap in cloud_capsules:
-                        uid = cap.get('user_id', 'unknown')
-                        user_stats[uid] = user_stats.get(uid, 0) + 1
+                        # 统计不同用户的胶囊
+                        user_stats = {}
+                        for cap in cloud_capsules:
+                            uid = cap.get('user_id', 'unknown')
+                            user_stats[uid] = user_stats.get(uid, 0) + 1
 
-                    print(f"   [GLOBAL SYNC] 用户分布: {user_stats}")
+                        print(f"   [GLOBAL SYNC] 用户分布: {user_stats}")
 
-                    for cloud_capsule in cloud_capsules:
                         try:
-                            # 检查本地是否存在
-                            local_capsule = self._get_local_capsule_by_cloud_id(cloud_capsule['id'])
-
-                            if local_capsule:
-                                # 更新本地元数据
-                                self._update_local_capsule_metadata(local_capsule['id'], cloud_capsule)
-                                owner_id = cloud_capsule.get('user_id', 'unknown')[:8]
-                                print(f"   ✓ 更新胶囊 {cloud_capsule['name']} (by {owner_id}...)")
-                            else:
-                                # 创建新胶囊（仅元数据）
-                                new_capsule_id = self._create_local_capsule_from_cloud(cloud_capsule)
-                                owner_id = cloud_capsule.get('user_id', 'unknown')[:8]
-                                print(f"   ✓ 新增胶囊 {cloud_capsule['name']} (by {owner_id}...)")
-                                synced_count += 1
-
-                        except Exception as e:
-                            error_msg = f"同步胶囊 {cloud_capsule.get('name', 'Unknown')} 失败: {e}"
+                            merged = self._reconcile_with_fallback(cloud_capsules)
+                            synced_count += merged['created']
+                            print(f"   ✓ 合并云端胶囊: 新增 {merged['created']}, 更新 {merged['updated']}, 关联 {merged['linked']}")
+                            for failed in merged['failed']:
+                                error_msg = f"跳过云端胶囊 {failed['name']} ({failed['id']}): {failed['error']}"
+                                errors.append(error_msg)
+                                print(f"   ✗ {error_msg}")
+                        except sqlite3.OperationalError as e:
+                            error_msg = f"合并 {len(cloud_capsules)} 个云端胶囊失败: {e}"
                             errors.append(error_msg)
                             print(f"   ✗ {error_msg}")
+                    else:
+                        print("   [GLOBAL SYNC] 云端暂无胶囊数据")
                 else:
-                    print("   [GLOBAL SYNC] 云端暂无胶囊数据")
-            else:
-                print("   ⚠️  Supabase 客户端未初始化，跳过云端下载")
+                    print("   ⚠️  Supabase 客户端未初始化，跳过云端下载")
 
-            print()
+                print()
 
-            # 3. 下载轻量资产文件（OGG 预览 + RPP 项目文件）
-            logger.info("📥 步骤 3: 下载轻量资产文件（OGG + RPP）...")
+                # 3. 下载轻量资产文件（OGG 预览 + RPP 项目文件）
+                logger.info("📥 步骤 3: 下载轻量资产文件（OGG + RPP）...")
 
-            # 获取所有需要检查的本地胶囊（包括新增和更新的）
-            from capsule_db import get_database
-            db = get_database()
-            db.connect()
-            cursor = db.conn.cursor()
+                # 获取所有需要检查的本地胶囊（包括新增和更新的）
+                from capsule_db import get_database
+                db = get_database()
+                db.connect()
+                cursor = db.conn.cursor()
 
-            cursor.execute("""
-                SELECT id, name, uuid, preview_audio, cloud_status, asset_status,
-                       owner_supabase_user_id, cloud_id, file_path
-                FROM capsules
-                WHERE cloud_id IS NOT NULL
-                ORDER BY id
-            """)
-            local_capsules = cursor.fetchall()
+                cursor.execute("""
+                    SELECT id, name, uuid, preview_audio, cloud_status, asset_status,
+                           owner_supabase_user_id, cloud_id, file_path
+                    FROM capsules
+                    WHERE cloud_id IS NOT NULL
+                    ORDER BY id
+                """)
+                local_capsules = cursor.fetchall()
 
-            db.close()
+                db.close()
 
-            logger.info(f"   查询到 {len(local_capsules)} 个胶囊需要检查轻量资产")
+                logger.info(f"   查询到 {len(local_capsules)} 个胶囊需要检查轻量资产")
 
-            if local_capsules:
-                logger.info(f"   检查 {len(local_capsules)} 个胶囊的轻量资产...")
+                if local_capsules:
+                    logger.info(f"   检查 {len(local_capsules)} 个胶囊的轻量资产...")
 
-                for idx, cap in enumerate(local_capsules, 1):
-                    cap_id, cap_name, cap_uuid, preview_audio, cloud_status, asset_status, owner_id, cloud_id, cap_file_path = cap
+                    for idx, cap in enumerate(local_capsules, 1):
+                        cap_id, cap_name, cap_uuid, preview_audio, cloud_status, asset_status, owner_id, cloud_id, cap_file_path = cap
 
-                    logger.info(f"   [{idx}/{len(local_capsules)}] 检查胶囊: {cap_name}, owner_id: {owner_id}")
+                        logger.info(f"   [{idx}/{len(local_capsules)}] 检查胶囊: {cap_name}, owner_id: {owner_id}")
 
-                    # 准备本地路径 - 从 PathManager 获取导出目录
-                    from common import PathManager
-                    pm = PathManager.get_instance()
-                    export_dir = pm.export_dir
-                    logger.info(f"   使用导出目录: {export_dir}")
+                        # 准备本地路径 - 从 PathManager 获取导出目录
+                        from common import PathManager
+                        pm = PathManager.get_instance()
+                        export_dir = pm.export_dir
+                        logger.info(f"   使用导出目录: {export_dir}")
 
-                    capsule_rel_path = cap_file_path or cap_name
-                    capsule_dir = Path(export_dir) / capsule_rel_path
+                        capsule_rel_path = cap_file_path or cap_name
+                        capsule_dir = Path(export_dir) / capsule_rel_path
 
-                    # ✅ 状态自愈：如果本地有 Audio 文件夹，更新 asset_status
-                    if self._has_local_audio_files(capsule_dir):
-                        if self._update_asset_status_if_needed(cap_id, asset_status, 'local'):
-                            logger.info(f"   ✨ 检测到本地音频，修正资产状态: {cap_name} -> local")
-                        asset_status = 'local'
-                    needs_download = []
-                    current_file = ''
+                        # ✅ 状态自愈：如果本地有 Audio 文件夹，更新 asset_status
+                        if self._has_local_audio_files(capsule_dir):
+                            if self._update_asset_status_if_needed(cap_id, asset_status, 'local'):
+                                logger.info(f"   ✨ 检测到本地音频，修正资产状态: {cap_name} -> local")
+                            asset_status = 'local'
+                        needs_download = []
+                        current_file = ''
 
-                    try:
-                        # 检查 metadata.json 文件
-                        metadata_path = capsule_dir / "metadata.json"
-                        if not metadata_path.exists():
-                            needs_download.append(('metadata', 'metadata.json'))
-                            current_file = f"{cap_name}/metadata.json"
-                            logger.info(f"      - 需要下载元数据: metadata.json")
+                        try:
+                            # 检查 metadata.json 文件
+                            metadata_path = capsule_dir / "metadata.json"
+                            if not metadata_path.exists():
+                                needs_download.append(('metadata', 'metadata.json'))
+                                current_file = f"{cap_name}/metadata.json"
+                                logger.info(f"      - 需要下载元数据: metadata.json")
                         
-                        # 检查 OGG 预览文件
-                        if preview_audio:
-                            ogg_path = capsule_dir / preview_audio
-                            if not ogg_path.exists():
-                                needs_download.append(('preview', preview_audio))
+                            # 检查 OGG 预览文件
+                            if preview_audio:
+                                ogg_path = capsule_dir / preview_audio
+                                if not ogg_path.exists():
+                                    needs_download.append(('preview', preview_audio))
+                                    if not current_file:
+                                        current_file = f"{cap_name}/preview.{preview_audio.split('.')[-1]}"
+                                    logger.info(f"      - 需要下载预览音频: {preview_audio}")
+
+                            # 检查 RPP 项目文件（使用胶囊名称）
+                            rpp_filename = f"{cap_name}.rpp"
+                            rpp_path = capsule_dir / rpp_filename
+                            if not rpp_path.exists():
+                                needs_download.append(('rpp', rpp_filename))
                                 if not current_file:
-                                    current_file = f"{cap_name}/preview.{preview_audio.split('.')[-1]}"
-                                logger.info(f"      - 需要下载预览音频: {preview_audio}")
-
-                        # 检查 RPP 项目文件（使用胶囊名称）
-                        rpp_filename = f"{cap_name}.rpp"
-                        rpp_path = capsule_dir / rpp_filename
-                        if not rpp_path.exists():
-                            needs_download.append(('rpp', rpp_filename))
-                            if not current_file:
-                                current_file = f"{cap_name}/{rpp_filename}"
-                            logger.info(f"      - 需要下载项目文件: {rpp_filename}")
-
-                        if not needs_download:
-                            logger.info(f"      ✓ 所有轻量资产已存在")
-
-                        # 下载缺失的文件
-                        if needs_download and owner_id:
-                            supabase = get_supabase_client()
-                            if not supabase:
-                                logger.warning(f"   ⚠️  Supabase 客户端未初始化，跳过文件下载")
-                                break
-
-                            for file_type, filename in needs_download:
-                                try:
-                                    logger.info(f"   [{idx}/{len(local_capsules)}] 正在下载 {filename}...")
-
-                                    # 构建本地路径
-                                    local_path = capsule_dir / filename
-
-                                    # 确保目录存在
-                                    capsule_dir.mkdir(parents=True, exist_ok=True)
-
-                                    # 调用下载
-                                    # 注意：云端文件夹使用胶囊名称，而不是 uuid
-                                    success = supabase.download_file(
-                                        user_id=owner_id,
-                                        capsule_folder_name=cap_name,
-                                        file_type=file_type,
-                                        local_path=str(local_path)
-                                    )
-
-                                    if success:
-                                        if file_type == 'preview':
-                                            preview_downloaded += 1
-                                        logger.info(f"   ✓ [{idx}/{len(local_capsules)}] {filename} 下载成功")
-                                    else:
-                                        logger.error(f"   ✗ [{idx}/{len(local_capsules)}] {filename} 下载失败")
+                                    current_file = f"{cap_name}/{rpp_filename}"
+                                logger.info(f"      - 需要下载项目文件: {rpp_filename}")
+
+                            if not needs_download:
+                                logger.info(f"      ✓ 所有轻量资产已存在")
+
+                            # 下载缺失的文件
+                            if needs_download and owner_id:
+                                supabase = get_supabase_client()
+                                if not supabase:
+                                    logger.warning(f"   ⚠️  Supabase 客户端未初始化，跳过文件下载")
+                                    break
+
+                                for file_type, filename in needs_download:
+                                    try:
+                                        logger.info(f"   [{idx}/{len(local_capsules)}] 正在下载 {filename}...")
+
+                                        # 构建本地路径
+                                        local_path = capsule_dir / filename
+
+                                        # 确保目录存在
+                                        capsule_dir.mkdir(parents=True, exist_ok=True)
+
+                                        # 调用下载
+                                        # 注意：云端文件夹使用胶囊名称，而不是 uuid
+                                        success = supabase.download_file(
+                                            user_id=owner_id,
+                                            capsule_folder_name=cap_name,
+                                            file_type=file_type,
+                                            local_path=str(local_path)
+                                        )
+
+                                        if success:
+                                            if file_type == 'preview':
+                                                preview_downloaded += 1
+                                            logger.info(f"   ✓ [{idx}/{len(local_capsules)}] {filename} 下载成功")
+                                        else:
+                                            logger.error(f"   ✗ [{idx}/{len(local_capsules)}] {filename} 下载失败")
 
-                                except Exception as e:
-                                    error_msg = f"下载 {cap_name}/{filename} 失败: {e}"
-                                    errors.append(error_msg)
-                                    logger.error(f"   ✗ {error_msg}")
+                                    except Exception as e:
+                                        error_msg = f"下载 {cap_name}/{filename} 失败: {e}"
+                                        errors.append(error_msg)
+                                        logger.error(f"   ✗ {error_msg}")
                         
-                        # 🏷️ 处理 Tags：优先使用云端数据库，文件作为备份
-                        try:
-                            from tags_service import get_tags_service
-                            tags_service = get_tags_service()
+                            # 🏷️ 处理 Tags：优先使用云端数据库，文件作为备份
+                            try:
+                                from tags_service import get_tags_service
+                                tags_service = get_tags_service()
                             
-                            # 使用已解包的 cloud_id 变量
-                            if cloud_id and supabase:
-                                # 尝试从云端数据库拉取 Tags
-                                logger.info(f"   🏷️  尝试从云端数据库拉取 Tags...")
-                                tags_synced = tags_service.sync_tags_from_cloud(cap_id, cloud_id)
+                                # 使用已解包的 cloud_id 变量
+                                if cloud_id and supabase:
+                                    # 尝试从云端数据库拉取 Tags
+                                    logger.info(f"   🏷️  尝试从云端数据库拉取 Tags...")
+                                    tags_synced = tags_service.sync_tags_from_cloud(cap_id, cloud_id)
                                 
-                                if tags_synced:
-                                    logger.info(f"   ✓ Tags 已从云端同步")
+                                    if tags_synced:
+                                        logger.info(f"   ✓ Tags 已从云端同步")
+                                    else:
+                                        # 如果云端没有 Tags，尝试从 metadata.json 导入
+                                        metadata_path = capsule_dir / "metadata.json"
+                                        if metadata_path.exists():
+                                            logger.info(f"   ⚠️  云端无 Tags，尝试从 metadata.json 导入...")
+                                            tags_service.merge_tags_from_metadata(cap_id, metadata_path)
                                 else:
-                                    # 如果云端没有 Tags，尝试从 metadata.json 导入
+                                    # 离线模式：从 metadata.json 导入
                                     metadata_path = capsule_dir / "metadata.json"
                                     if metadata_path.exists():
-                                        logger.info(f"   ⚠️  云端无 Tags，尝试从 metadata.json 导入...")
+                                        logger.info(f"   ℹ️  离线模式，从 metadata.json 导入 Tags...")
                                         tags_service.merge_tags_from_metadata(cap_id, metadata_path)
-                            else:
-                                # 离线模式：从 metadata.json 导入
+                            except Exception as e:
+                                logger.warning(f"   ⚠️  Tags 处理失败: {e}")
+
+                            # 📊 处理技术元数据：从 metadata.json 写入 capsule_metadata 表
+                            try:
                                 metadata_path = capsule_dir / "metadata.json"
                                 if metadata_path.exists():
-                                    logger.info(f"   ℹ️  离线模式，从 metadata.json 导入 Tags...")
-                                    tags_service.merge_tags_from_metadata(cap_id, metadata_path)
-                        except Exception as e:
-                            logger.warning(f"   ⚠️  Tags 处理失败: {e}")
+                                    self._save_metadata_to_db(cap_id, metadata_path)
+                            except Exception as e:
+                                logger.warning(f"   ⚠️  元数据写入失败: {e}")
 
-                        # 📊 处理技术元数据：从 metadata.json 写入 capsule_metadata 表
-                        try:
-                            metadata_path = capsule_dir / "metadata.json"
-                            if metadata_path.exists():
-                                self._save_metadata_to_db(cap_id, metadata_path)
                         except Exception as e:
-                            logger.warning(f"   ⚠️  元数据写入失败: {e}")
-
-                    except Exception as e:
-                        error_msg = f"检查 {cap_name} 资产失败: {e}"
-                        errors.append(error_msg)
-                        logger.error(f"   ✗ {error_msg}")
+                            error_msg = f"检查 {cap_name} 资产失败: {e}"
+                            errors.append(error_msg)
+                            logger.error(f"   ✗ {error_msg}")
 
-                logger.info(f"   ✓ 预览音频下载: {preview_downloaded} 个")
+                    logger.info(f"   ✓ 预览音频下载: {preview_downloaded} 个")
 
-            else:
-                logger.info("   ✓ 无需下载资产（本地暂无胶囊）")
+                else:
+                    logger.info("   ✓ 无需下载资产（本地暂无胶囊）")
 
-            # 4. 不自动下载源 WAV（按需下载）
-            print("📥 步骤 4: 源 WAV 文件")
-            print("   ℹ️  源 WAV 文件采用按需下载策略")
-            print("   ℹ️  用户点击\"导入\"时才会下载 WAV")
-            print()
+                # 4. 不自动下载源 WAV（按需下载）
+                print("📥 步骤 4: 源 WAV 文件")
+                print("   ℹ️  源 WAV 文件采用按需下载策略")
+                print("   ℹ️  用户点击\"导入\"时才会下载 WAV")
+                print()
 
         except Exception as e:
             error_msg = f"同步过程出错: {e}"
@@ -2001,6 +2668,7 @@ class SyncService:
         print("📊 同步完成")
         print("=" * 60)
         print(f"同步胶囊数: {synced_count}")
+        print(f"内容未变化: {unchanged_count}（省下 {avoided['requests']} 次请求, {avoided['bytes'] / 1048576:.1f} MB）")
         print(f"预览音频下载: {preview_downloaded}")
         print(f"错误数量: {len(errors)}")
         print(f"耗时: {duration:.2f} 秒")
@@ -2017,6 +2685,9 @@ class SyncService:
         return {
             'success': len(errors) == 0,
             'synced_count': synced_count,
+            'unchanged_count': unchanged_count,
+            'avoided_requests': avoided['requests'],
+            'avoided_bytes': avoided['bytes'],
             'preview_downloaded': preview_downloaded,
             'errors': errors,
             'duration_seconds': duration
@@ -7,6 +7,7 @@ Tags 同步服务模块
 
 import json
 import logging
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
@@ -27,6 +28,12 @@ class TagsService:
         self.db = db
         self.supabase = supabase_client
 
+        # 标签修改后的后续任务（embedding 刷新），按胶囊去重，后台单线程处理
+        self._followup_lock = threading.Lock()
+        self._followup_pending: List[int] = []
+        self._followup_queued = set()
+        self._followup_thread: Optional[threading.Thread] = None
+
     def sync_tags_to_cloud(self, capsule_id: int, cloud_id: str, user_id: str) -> bool:
         """
         将本地 Tags 上传到云端数据库
@@ -367,6 +374,96 @@ class TagsService:
             logger.error(traceback.format_exc())
             return False
 
+    def queue_followups(self, capsule_ids: List[int]) -> int:
+        """
+        为标签已修改的胶囊排队后续任务（每个胶囊只排队一次）
+
+        关键词聚合与待同步标记已在 bulk_update_capsule_tags 的事务内完成，
+        这里只处理需要网络/模型的工作：刷新已上传胶囊的云端主体 embedding
+        以及本地混合搜索的向量索引，使搜索在下次完整同步前也能反映新关键词。
+
+        Args:
+            capsule_ids: 胶囊 ID 列表
+
+        Returns:
+            新加入队列的胶囊数量
+        """
+        added = 0
+        with self._followup_lock:
+            for capsule_id in capsule_ids:
+                if capsule_id in self._followup_queued:
+                    continue
+                self._followup_queued.add(capsule_id)
+                self._followup_pending.append(capsule_id)
+                added += 1
+
+            if self._followup_pending and (
+                self._followup_thread is None or not self._followup_thread.is_alive()
+            ):
+                self._followup_thread = threading.Thread(
+                    target=self._run_followups, daemon=True
+                )
+                self._followup_thread.start()
+
+        if added:
+            logger.info(f"[TagsService] 已排队 {added} 个胶囊的 embedding 刷新")
+        return added
+
+    def _run_followups(self):
+        """后台处理排队的胶囊，队列清空后线程退出"""
+        from capsule_db import get_database
+
+        # 使用独立的数据库实例，避免与请求线程共享连接
+        db = get_database()
+
+        while True:
+            with self._followup_lock:
+                if not self._followup_pending:
+                    self._followup_thread = None
+                    return
+                capsule_id = self._followup_pending.pop(0)
+                self._followup_queued.discard(capsule_id)
+
+            try:
+                self._refresh_cloud_embedding(db, capsule_id)
+            except Exception as e:
+                logger.warning(f"[TagsService] 胶囊 {capsule_id} embedding 刷新失败: {e}")
+
+            try:
+                from hybrid_search import get_hybrid_search_service
+                get_hybrid_search_service(db.db_path).vector_index.refresh([capsule_id])
+            except ImportError:
+                pass  # numpy 未安装时没有本地向量索引
+            except Exception as e:
+                logger.warning(f"[TagsService] 胶囊 {capsule_id} 本地向量刷新失败: {e}")
+
+    def _refresh_cloud_embedding(self, db, capsule_id: int) -> bool:
+        """
+        重新计算并上传胶囊主体 embedding（name + description + keywords）
+
+        未上传到云端的胶囊会在首次上传时计算，这里直接跳过
+        """
+        if not self.supabase:
+            return False
+
+        capsule = db.get_capsules_with_tags([capsule_id]).get(capsule_id)
+        if not capsule or not capsule.get('cloud_id'):
+            return False
+
+        from capsule_embedding_service import get_embedding_for_body
+        body_emb = get_embedding_for_body(
+            name=capsule.get('name') or "",
+            description=capsule.get('description') or "",
+            keywords=capsule.get('keywords') or "",
+        )
+        if not body_emb:
+            return False
+
+        ok = self.supabase.update_capsule_embedding(capsule['cloud_id'], body_emb)
+        if ok:
+            logger.info(f"[TagsService]   ✓ 已刷新胶囊 {capsule_id} 的云端 embedding")
+        return ok
+
 
 # ==========================================
 # 全局实例
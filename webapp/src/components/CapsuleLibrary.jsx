@@ -53,6 +53,11 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
   const [semanticSearchError, setSemanticSearchError] = useState(null);
   const semanticSearchDebounceRef = useRef(null);
 
+  // 预览预取提示：可见的胶囊 + 最近的搜索（debounce 后发送给后端预取服务）
+  const visibleCapsuleIdsRef = useRef(new Set());
+  const recentSearchesRef = useRef([]);
+  const prefetchHintTimerRef = useRef(null);
+
   // 管理模式
   const [isAdmin, setIsAdmin] = useState(false);
 
@@ -70,6 +75,7 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
   const currentTimeDisplayRef = useRef(null); // 直接更新 DOM，避免 timeupdate 触发重渲染导致卡顿
   const durationDisplayRef = useRef(null);
   const autoPlayRef = useRef(false);
+  const playStartRef = useRef(null); // { id, t }：点击播放的时间，首次出声时上报 TTFA
 
   // 元数据缓存（每个胶囊的 metadata.json）
   const [metadataCache, setMetadataCache] = useState({});
@@ -445,6 +451,36 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [viewMode, capsules, refreshTrigger]); // 🔥 移除 tagsCache 依赖，避免无限循环
 
+  // 预览预取提示：debounce 后发送当前可见的胶囊和最近的搜索（失败忽略，不影响浏览）
+  const sendPrefetchHint = () => {
+    if (prefetchHintTimerRef.current) {
+      clearTimeout(prefetchHintTimerRef.current);
+    }
+    prefetchHintTimerRef.current = setTimeout(async () => {
+      const visible = Array.from(visibleCapsuleIdsRef.current);
+      const searches = recentSearchesRef.current;
+      if (visible.length === 0 && searches.length === 0) return;
+      try {
+        const { authFetch } = await import('../utils/apiClient.js');
+        await authFetch('http://localhost:5002/api/previews/prefetch', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ visible, searches })
+        });
+      } catch (err) {
+        // 预取只是优化
+      }
+    }, 600);
+  };
+
+  useEffect(() => {
+    return () => {
+      if (prefetchHintTimerRef.current) {
+        clearTimeout(prefetchHintTimerRef.current);
+      }
+    };
+  }, []);
+
   // 语义搜索：debounce 后请求 API
   useEffect(() => {
     const q = searchQuery.trim();
@@ -469,6 +505,9 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
         if (data.success && Array.isArray(data.capsules)) {
           setSemanticSearchResults(data.capsules);
           setSemanticSearchError(data.error || null);
+          // 最近 3 个不同的搜索，供预取服务预取前几个结果
+          recentSearchesRef.current = [q, ...recentSearchesRef.current.filter(s => s !== q)].slice(0, 3);
+          sendPrefetchHint();
         } else {
           setSemanticSearchResults([]);
           setSemanticSearchError(data.error || 'search_failed');
@@ -539,6 +578,32 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
     });
   }, [capsules, searchQuery, selectedType, semanticSearchResults]);
 
+  // 列表视图：观察进入视口（含上下 200px）的胶囊
+  useEffect(() => {
+    visibleCapsuleIdsRef.current = new Set();
+    if (viewMode !== 'list' || typeof IntersectionObserver === 'undefined') return;
+
+    const observer = new IntersectionObserver((entries) => {
+      let changed = false;
+      for (const entry of entries) {
+        const capsuleId = Number(entry.target.dataset.capsuleId);
+        if (entry.isIntersecting) {
+          if (!visibleCapsuleIdsRef.current.has(capsuleId)) {
+            visibleCapsuleIdsRef.current.add(capsuleId);
+            changed = true;
+          }
+        } else if (visibleCapsuleIdsRef.current.delete(capsuleId)) {
+          changed = true;
+        }
+      }
+      if (changed) sendPrefetchHint();
+    }, { rootMargin: '200px 0px' });
+
+    document.querySelectorAll('[data-capsule-id]').forEach(el => observer.observe(el));
+    return () => observer.disconnect();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [viewMode, filteredCapsules]);
+
   // 统计信息
   const stats = useMemo(() => {
     const typeCounts = capsules.reduce((acc, capsule) => {
@@ -674,6 +739,7 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
     } else {
       // 播放新的胶囊
       autoPlayRef.current = true; // 标记需要自动播放
+      playStartRef.current = { id: capsule.id, t: performance.now() };
       setNowPlaying(capsule);
       setIsPlaying(true);
       progressRef.current = 0;
@@ -851,16 +917,12 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
         }
         setUploadingCapsules(prev => ({ ...prev, [capsule.id]: true }));
         toastId = toast.loading(t('librarySync.uploadingCapsule', { name: capsule.name }));
-        const { authFetch } = await import('../utils/apiClient.js');
+        const { runSyncJob } = await import('../utils/apiClient.js');
         
-        // 使用轻量级同步端点进行上传
-        const requestPromise = authFetch('http://localhost:5002/api/sync/lightweight', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ 
-            include_previews: true,
-            capsule_ids: [capsule.id] // 只同步指定的胶囊
-          })
+        // 使用轻量级同步端点进行上传（异步任务，轮询结果）
+        const requestPromise = runSyncJob('/sync/lightweight', {
+          include_previews: true,
+          capsule_ids: [capsule.id] // 只同步指定的胶囊
         });
         stopProgressPoll = await startUploadProgressPoll(capsule.id, toastId, (status) => {
           if (status === 'completed') {
@@ -868,11 +930,10 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
             onSyncComplete && onSyncComplete();
           }
         });
-        const response = await requestPromise;
+        const { status: responseStatus, body: result } = await requestPromise;
         
-        const isOk = response.ok || response.status === 207;
+        const isOk = responseStatus === 200 || responseStatus === 207;
         if (isOk) {
-          const result = await response.json();
           if (result.success) {
             toast.update(toastId, t('librarySync.uploadedToCloud'), 'success');
             toastFinalized = true;
@@ -889,16 +950,16 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
             onSyncComplete && onSyncComplete();
           } else {
             const message = result.error || t('librarySync.syncWarning');
-            const type = response.status === 207 ? 'warning' : 'error';
+            const type = responseStatus === 207 ? 'warning' : 'error';
             toast.update(toastId, t('librarySync.uploadCompleteWithMessage', { message }), type);
             toastFinalized = true;
-            if (response.status === 207) {
+            if (responseStatus === 207) {
               window.dispatchEvent(new CustomEvent('sync-completed'));
               onSyncComplete && onSyncComplete();
             }
           }
         } else {
-          toast.update(toastId, t('librarySync.uploadFailedHttp', { status: response.status }), 'error');
+          toast.update(toastId, t('librarySync.uploadFailedHttp', { status: responseStatus }), 'error');
           toastFinalized = true;
         }
       } catch (error) {
@@ -919,19 +980,14 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
     } else if (status === 'remote') {
       // 状态 2: 需下载 - 从云端拉取最新元数据
       try {
-        const { authFetch } = await import('../utils/apiClient.js');
+        const { runSyncJob } = await import('../utils/apiClient.js');
         
-        // 使用轻量级同步端点拉取最新数据
-        const response = await authFetch('http://localhost:5002/api/sync/lightweight', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ 
-            include_previews: true 
-          })
+        // 使用轻量级同步端点拉取最新数据（异步任务，轮询结果）
+        const { status: responseStatus, body: result } = await runSyncJob('/sync/lightweight', {
+          include_previews: true 
         });
         
-        if (response.ok) {
-          const result = await response.json();
+        if (responseStatus === 200 || responseStatus === 207) {
           if (result.success) {
             toast.success(t('librarySync.syncedCloudData'));
             // 刷新胶囊列表
@@ -944,7 +1000,7 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
             toast.error(t('librarySync.syncFailedError', { message: result.error || t('librarySync.unknownError') }));
           }
         } else {
-          toast.error(t('librarySync.syncFailedHttp', { status: response.status }));
+          toast.error(t('librarySync.syncFailedHttp', { status: responseStatus }));
         }
       } catch (error) {
         console.error('同步失败:', error);
@@ -964,16 +1020,12 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
         }
         setUploadingCapsules(prev => ({ ...prev, [capsule.id]: true }));
         toastId = toast.loading(t('librarySync.reuploadingCapsule', { name: capsule.name }));
-        const { authFetch } = await import('../utils/apiClient.js');
+        const { runSyncJob } = await import('../utils/apiClient.js');
 
-        // 使用轻量级同步端点进行强制上传
-        const requestPromise = authFetch('http://localhost:5002/api/sync/lightweight', {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            include_previews: true,
-            capsule_ids: [capsule.id] // 强制上传指定的胶囊
-          })
+        // 使用轻量级同步端点进行强制上传（异步任务，轮询结果）
+        const requestPromise = runSyncJob('/sync/lightweight', {
+          include_previews: true,
+          capsule_ids: [capsule.id] // 强制上传指定的胶囊
         });
         stopProgressPoll = await startUploadProgressPoll(capsule.id, toastId, (status) => {
           if (status === 'completed') {
@@ -981,11 +1033,10 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
             onSyncComplete && onSyncComplete();
           }
         });
-        const response = await requestPromise;
+        const { status: responseStatus, body: result } = await requestPromise;
 
-        const isOk = response.ok || response.status === 207;
+        const isOk = responseStatus === 200 || responseStatus === 207;
         if (isOk) {
-          const result = await response.json();
           if (result.success) {
             toast.update(toastId, t('librarySync.reuploadedToCloud'), 'success');
             toastFinalized = true;
@@ -1002,16 +1053,16 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
             onSyncComplete && onSyncComplete();
           } else {
             const message = result.error || t('librarySync.syncWarning');
-            const type = response.status === 207 ? 'warning' : 'error';
+            const type = responseStatus === 207 ? 'warning' : 'error';
             toast.update(toastId, t('librarySync.reuploadCompleteWithMessage', { message }), type);
             toastFinalized = true;
-            if (response.status === 207) {
+            if (responseStatus === 207) {
               window.dispatchEvent(new CustomEvent('sync-completed'));
               onSyncComplete && onSyncComplete();
             }
           }
         } else {
-          toast.update(toastId, t('librarySync.reuploadFailedHttp', { status: response.status }), 'error');
+          toast.update(toastId, t('librarySync.reuploadFailedHttp', { status: responseStatus }), 'error');
           toastFinalized = true;
         }
       } catch (error) {
@@ -1319,6 +1370,7 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
           ? 'bg-zinc-800/80 border-zinc-600 shadow-[0_0_20px_rgba(0,0,0,0.5)]'
           : 'bg-zinc-900/40 border-zinc-800/50 hover:bg-zinc-800/60 hover:border-zinc-700'
         }`}
+        data-capsule-id={capsule.id}
         onClick={() => handlePlay(capsule)}
       >
         {/* 左侧彩色指示条 */}
@@ -1744,6 +1796,25 @@ function CapsuleLibrary({ capsules = [], onEdit, onDelete, onBack, onImport, onI
           src={audioUrl}
           onPlay={() => setIsPlaying(true)}
           onPause={() => setIsPlaying(false)}
+          onPlaying={async () => {
+            // 首次出声：上报点击播放到第一帧音频的时间（每次切换胶囊只上报一次）
+            const start = playStartRef.current;
+            if (!start || start.id !== nowPlaying?.id) return;
+            playStartRef.current = null;
+            try {
+              const { authFetch } = await import('../utils/apiClient.js');
+              await authFetch('http://localhost:5002/api/previews/playback', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                  capsule_id: start.id,
+                  ttfa_ms: Math.round(performance.now() - start.t)
+                })
+              });
+            } catch (err) {
+              // 指标上报失败忽略
+            }
+          }}
           onCanPlay={() => {
             // 音频加载完成且可以播放时，如果 shouldAutoPlay 为 true 则自动播放
             if (autoPlayRef.current) {
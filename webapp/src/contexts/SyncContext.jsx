@@ -9,7 +9,7 @@
  */
 
 import { createContext, useContext, useState, useEffect, useCallback } from 'react';
-import { authFetch } from '../utils/apiClient';
+import { authFetch, runSyncJob } from '../utils/apiClient';
 import i18n from '../i18n';
 
 // 创建 SyncContext
@@ -116,18 +116,13 @@ export const SyncProvider = ({ children }) => {
       // 调用后端关键词同步接口
       setSyncStatus(prev => ({ ...prev, syncProgress: 30, syncStep: i18n.t('syncIndicator.syncStepCompare') }));
       
-      const response = await authFetch('http://localhost:5002/api/sync/sync-tags', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-      });
+      // 异步任务：入队后轮询结果
+      const { status: responseStatus, body: result } = await runSyncJob('/sync/sync-tags');
 
-      if (!response.ok && response.status !== 207) {
-        throw new Error(`关键词同步失败: ${response.status}`);
+      if (responseStatus !== 200 && responseStatus !== 207) {
+        throw new Error(result.error || `关键词同步失败: ${responseStatus}`);
       }
 
-      const result = await response.json();
       console.log('🏷️ 关键词同步结果:', result);
 
       if (!result.success) {
@@ -195,21 +190,15 @@ export const SyncProvider = ({ children }) => {
       setSyncStatus(prev => ({ ...prev, syncProgress: 10, syncStep: i18n.t('bootSync.syncing') }));
       onProgress?.({ phase: i18n.t('bootSync.syncing'), current: 0, total: 0, percentage: 10 });
 
-      const response = await authFetch('http://localhost:5002/api/sync/download-only', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          include_previews: true,
-        }),
+      // 异步任务：入队后轮询结果（启动同步可能持续较久，不占用一个长时间阻塞的请求）
+      const { status: responseStatus, body: result } = await runSyncJob('/sync/download-only', {
+        include_previews: true,
       });
 
-      if (!response.ok) {
-        throw new Error(`仅下载同步失败: ${response.status}`);
+      if (responseStatus !== 200 && responseStatus !== 207) {
+        throw new Error(result.error || `仅下载同步失败: ${responseStatus}`);
       }
 
-      const result = await response.json();
       console.log('🔄 [BootSync] 仅下载同步结果:', result);
 
       if (result.success) {
@@ -380,23 +369,16 @@ setSyncStatus(prev => ({ ...prev, syncProgress: 100, syncStep: i18n.t('syncIndic
         percentage: 10
       });
 
-      const response = await authFetch('http://localhost:5002/api/sync/lightweight', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          include_previews: true,  // 自动下载预览音频
-          force: false
-        }),
+      // 异步任务：入队后轮询结果
+      const { status: responseStatus, body: result } = await runSyncJob('/sync/lightweight', {
+        include_previews: true,  // 自动下载预览音频
+        force: false
       });
 
-      const result = await response.json();
-
       // 检查响应是否成功
       // 207 Multi-Status 表示部分成功（有警告但仍同步成功）
-      if (!response.ok && response.status !== 207) {
-        throw new Error(`轻量同步失败: ${response.status}`);
+      if (responseStatus !== 200 && responseStatus !== 207) {
+        throw new Error(result.error || `轻量同步失败: ${responseStatus}`);
       }
 
       // 即使 success 为 false（207 响应），只要 synced_count > 0 就算部分成功
@@ -130,6 +130,63 @@ export async function authFetch(url, options = {}) {
   return response;
 }
 
+const FINISHED_JOB_STATUSES = ['completed', 'failed', 'cancelled'];
+
+/**
+ * 提交同步任务并轮询结果
+ *
+ * 同步端点以 async 模式入队，立即返回 202 + job_id，随后轮询 /api/sync/jobs/<id>，
+ * 不会让一个 HTTP 请求一直阻塞到同步结束。
+ *
+ * @param {string} path - 同步端点（如 '/sync/lightweight'）
+ * @param {object} body - 请求体
+ * @param {object} options - { intervalMs: 轮询间隔, onProgress: (job) => void }
+ * @returns {Promise<{status: number, body: object}>}
+ *   status 与同步响应一致：200 成功 / 207 部分成功 / 其他为失败；body 为 { success, error, data }
+ */
+export async function runSyncJob(path, body = {}, { intervalMs = 1000, onProgress } = {}) {
+  const response = await authFetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ ...body, async: true }),
+  });
+  const submitted = await response.json().catch(() => ({}));
+  if (response.status !== 202) {
+    // 入队前出错（或后端直接返回结果）：原样返回
+    return { status: response.status, body: submitted };
+  }
+
+  const jobId = submitted.data.job_id;
+  for (;;) {
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+
+    const jobResponse = await authFetch(`${API_BASE_URL}/sync/jobs/${jobId}`);
+    if (!jobResponse.ok) {
+      return { status: jobResponse.status, body: { success: false, error: `获取同步任务失败: ${jobResponse.status}` } };
+    }
+    const job = (await jobResponse.json()).data;
+    onProgress?.(job);
+
+    if (job.status === 'queued' && job.not_before) {
+      // 执行失败，等待退避重试：按失败返回，任务仍会在后台重试
+      return { status: 500, body: { success: false, error: job.error || '同步失败，稍后自动重试', data: { job_id: jobId } } };
+    }
+    if (!FINISHED_JOB_STATUSES.includes(job.status)) {
+      continue;
+    }
+    if (job.status !== 'completed') {
+      return { status: 500, body: { success: false, error: job.error || job.status, data: { job_id: jobId } } };
+    }
+
+    const result = job.result || {};
+    const success = result.success !== false;
+    return {
+      status: success ? 200 : 207,
+      body: { success, error: success ? undefined : '同步过程中出现错误', data: { ...result, job_id: jobId } },
+    };
+  }
+}
+
 /**
  * 导出 base URL 供其他地方使用
  */